@@ -146,7 +146,12 @@ def get_latest_seat_count(realm: Realm) -> int:
     return get_seat_count(realm, extra_non_guests_count=0, extra_guests_count=0)
 
 
-@cache_with_key(lambda realm: get_realm_seat_count_cache_key(realm.id), timeout=3600 * 24)
+@cache_with_key(
+    lambda realm: get_realm_seat_count_cache_key(realm.id),
+    timeout=3600 * 24,
+    single_flight=True,
+    serve_stale=True,
+)
 def get_cached_seat_count(realm: Realm) -> int:
     # This is a cache value  we're intentionally okay with not invalidating.
     # All that means is that this value will lag up to 24 hours before getting updated.
@@ -131,13 +131,19 @@ class zulip::app_frontend_base {
   # of memory.
   $queues_multiprocess_default = $zulip::common::total_memory_mb > 3800
   $queues_multiprocess = zulipconf('application_server', 'queue_workers_multiprocess', $queues_multiprocess_default)
+  # In the multiprocess mode, whether to fork the queue processors
+  # from a single process which has loaded Django, so that they share
+  # most of their memory, rather than starting each separately.
+  $queues_forking = zulipconf('application_server', 'queue_workers_forking', false)
   $queues = [
     'deferred_work',
+    'deferred_work_priority',
     'digest_emails',
     'email_mirror',
     'embed_links',
     'embedded_bots',
     'email_senders',
+    'email_senders_priority',
     'missedmessage_emails',
     'missedmessage_mobile_notifications',
     'outgoing_webhooks',
@@ -14,9 +14,11 @@ from scripts.lib.zulip_tools import atomic_nagios_write, get_config, get_config_
 
 normal_queues = [
     "deferred_work",
+    "deferred_work_priority",
     "digest_emails",
     "email_mirror",
     "email_senders",
+    "email_senders_priority",
     "embed_links",
     "embedded_bots",
     "missedmessage_emails",
@@ -1,4 +1,5 @@
 import itertools
+import time
 from collections import defaultdict
 from collections.abc import Iterable
 from collections.abc import Set as AbstractSet
@@ -30,6 +31,7 @@ from zerver.lib.exceptions import (
     StreamWildcardMentionNotAllowedError,
     TopicWildcardMentionNotAllowedError,
 )
+from zerver.lib.first_unread_cache import invalidate_first_unread_for_recipients
 from zerver.lib.markdown import MessageRenderingResult, topic_links
 from zerver.lib.markdown import version as markdown_version
 from zerver.lib.mention import MentionBackend, MentionData, silent_mention_syntax_for_user
@@ -63,6 +65,7 @@ from zerver.lib.topic import (
     save_message_for_edit_use_case,
     update_edit_history,
     update_messages_for_topic_edit,
+    update_topic_summaries,
 )
 from zerver.lib.types import EditHistoryEvent
 from zerver.lib.url_encoding import near_stream_message_url
@@ -793,6 +796,16 @@ def do_update_message(
     # freshly-fetched-from-the-database changed messages.
     changed_messages = save_changes_for_propagation_mode()
 
+    if topic_name is not None or new_stream is not None:
+        assert stream_being_edited is not None
+        assert stream_being_edited.recipient_id is not None
+        assert target_stream.recipient_id is not None
+        update_topic_summaries(realm.id, stream_being_edited.recipient_id, [orig_topic_name])
+        update_topic_summaries(realm.id, target_stream.recipient_id, [target_topic_name])
+        invalidate_first_unread_for_recipients(
+            [stream_being_edited.recipient_id, target_stream.recipient_id]
+        )
+
     realm_id: int | None = None
     if stream_being_edited is not None:
         realm_id = stream_being_edited.realm_id
@@ -1393,6 +1406,7 @@ def check_update_message(
             # `render_incoming_message` call earlier in this function.
             "message_realm_id": user_profile.realm_id,
             "urls": list(links_for_embed),
+            "queued_at": time.time(),
         }
         queue_json_publish("embed_links", event_data)
 
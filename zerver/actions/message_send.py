@@ -1,4 +1,5 @@
 import logging
+import time
 from collections import defaultdict
 from collections.abc import Callable, Collection, Sequence
 from collections.abc import Set as AbstractSet
@@ -38,6 +39,7 @@ from zerver.lib.exceptions import (
     TopicWildcardMentionNotAllowedError,
     ZephyrMessageAlreadySentError,
 )
+from zerver.lib.first_unread_cache import note_new_messages_for_recipients
 from zerver.lib.markdown import MessageRenderingResult, render_message_markdown
 from zerver.lib.markdown import version as markdown_version
 from zerver.lib.mention import MentionBackend, MentionData
@@ -58,9 +60,12 @@ from zerver.lib.notification_data import (
     get_user_group_mentions_data,
     user_allows_notifications_in_StreamTopic,
 )
+from zerver.lib.partial import partial
 from zerver.lib.query_helpers import query_for_ids
 from zerver.lib.queue import queue_event_on_commit
+from zerver.lib.recent_private_conversations import increment_recent_private_conversations
 from zerver.lib.recipient_users import recipient_for_user_profiles
+from zerver.lib.register_snapshot import invalidate_register_snapshot_for_event
 from zerver.lib.stream_subscription import (
     get_subscriptions_for_send_message,
     num_subscribers_for_stream_id,
@@ -70,7 +75,7 @@ from zerver.lib.streams import access_stream_for_send_message, ensure_stream, su
 from zerver.lib.string_validation import check_stream_name
 from zerver.lib.thumbnail import get_user_upload_previews, rewrite_thumbnailed_images
 from zerver.lib.timestamp import timestamp_to_datetime
-from zerver.lib.topic import participants_for_topic
+from zerver.lib.topic import increment_topic_summaries, participants_for_topic
 from zerver.lib.url_preview.types import UrlEmbedData
 from zerver.lib.user_groups import is_any_user_in_group, is_user_in_group
 from zerver.lib.user_message import UserMessageLite, bulk_insert_ums
@@ -858,6 +863,12 @@ def do_send_messages(
     user_message_flags: dict[int, dict[int, list[str]]] = defaultdict(dict)
 
     Message.objects.bulk_create(send_request.message for send_request in send_message_requests)
+    increment_topic_summaries(send_request.message for send_request in send_message_requests)
+    note_new_messages_for_recipients(
+        send_request.message.recipient_id
+        for send_request in send_message_requests
+        if send_request.message.is_stream_message()
+    )
 
     # Claim attachments in message
     for send_request in send_message_requests:
@@ -930,6 +941,13 @@ def do_send_messages(
         )
 
     bulk_insert_ums(ums)
+    increment_recent_private_conversations(
+        (
+            send_request.message,
+            user_message_flags[send_request.message.id].keys(),
+        )
+        for send_request in send_message_requests
+    )
 
     for send_request in send_message_requests:
         do_widget_post_save_actions(send_request)
@@ -1166,6 +1184,16 @@ def do_send_messages(
             if send_request.stream.first_message_id is None:
                 send_request.stream.first_message_id = send_request.message.id
                 send_request.stream.save(update_fields=["first_message_id"])
+                # Clients don't get an event for this, but the cached
+                # /register sections embedding the channel (e.g. default
+                # channels) include first_message_id.
+                transaction.on_commit(
+                    partial(
+                        invalidate_register_snapshot_for_event,
+                        send_request.stream.realm_id,
+                        "stream",
+                    )
+                )
 
             # Performance note: This check can theoretically do
             # database queries in a loop if many messages are being
@@ -1201,6 +1229,7 @@ def do_send_messages(
                 "message_content": send_request.message.content,
                 "message_realm_id": send_request.realm.id,
                 "urls": list(send_request.links_for_embed),
+                "queued_at": time.time(),
             }
             queue_event_on_commit("embed_links", event_data)
 
@@ -17,12 +17,14 @@ from zerver.actions.default_streams import (
 )
 from zerver.actions.message_send import internal_send_stream_message
 from zerver.lib.cache import (
+    cache_delete,
     cache_delete_many,
     cache_set,
     display_recipient_cache_key,
     to_dict_cache_key_id,
 )
 from zerver.lib.exceptions import JsonableError
+from zerver.lib.first_unread_cache import invalidate_first_unread_for_recipients
 from zerver.lib.mention import silent_mention_syntax_for_user
 from zerver.lib.message import get_last_message_id
 from zerver.lib.queue import queue_event_on_commit, queue_json_publish
@@ -48,6 +50,7 @@ from zerver.lib.streams import (
     stream_to_dict,
 )
 from zerver.lib.subscription_info import get_subscribers_query
+from zerver.lib.topic import rebuild_topic_summaries_for_stream
 from zerver.lib.types import APISubscriptionDict
 from zerver.lib.users import (
     get_subscribers_of_target_user_subscriptions,
@@ -264,7 +267,9 @@ def do_unarchive_stream(stream: Stream, new_name: str, *, acting_user: UserProfi
         ]
     )
 
-    # Update caches
+    # Update caches.  Deleting the key first invalidates any copies
+    # in other processes' local caches; see LOCAL_CACHE_KEY_FAMILIES.
+    cache_delete(display_recipient_cache_key(stream.recipient_id))
     cache_set(display_recipient_cache_key(stream.recipient_id), new_name)
     messages = Message.objects.filter(
         # Uses index: zerver_message_realm_recipient_id
@@ -376,6 +381,9 @@ def merge_streams(
         recipient=recipient_to_destroy,
     ).update(recipient=recipient_to_keep)
     bulk_delete_cache_keys(message_ids_to_clear)
+    rebuild_topic_summaries_for_stream(realm.id, recipient_to_keep.id)
+    rebuild_topic_summaries_for_stream(realm.id, recipient_to_destroy.id)
+    invalidate_first_unread_for_recipients([recipient_to_keep.id, recipient_to_destroy.id])
 
     # Remove subscriptions to the old stream.
     if len(subs_to_deactivate) > 0:
@@ -1441,6 +1449,7 @@ def do_rename_stream(stream: Stream, new_name: str, user_profile: UserProfile) -
         recipient_id=recipient_id,
     ).only("id")
 
+    cache_delete(display_recipient_cache_key(recipient_id))
     cache_set(display_recipient_cache_key(recipient_id), stream.name)
 
     # Delete cache entries for everything else, which is cheaper and
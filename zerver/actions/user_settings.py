@@ -326,7 +326,7 @@ def do_regenerate_api_key(user_profile: UserProfile, acting_user: UserProfile) -
         )
 
     event = {"type": "clear_push_device_tokens", "user_profile_id": user_profile.id}
-    queue_json_publish("deferred_work", event)
+    queue_json_publish("deferred_work", event, priority=True)
 
     return new_api_key
 
@@ -4,6 +4,7 @@ from typing import Any
 from django.db import transaction
 from django.utils.timezone import now as timezone_now
 
+from zerver.lib.first_unread_cache import invalidate_first_unread_for_users
 from zerver.lib.timestamp import datetime_to_timestamp
 from zerver.lib.user_topics import (
     bulk_set_user_topic_visibility_policy_in_database,
@@ -41,6 +42,10 @@ def bulk_do_set_user_topic_visibility_policy(
     if len(user_profiles_with_changed_user_topic_rows) == 0:
         return
 
+    invalidate_first_unread_for_users(
+        user_profile.id for user_profile in user_profiles_with_changed_user_topic_rows
+    )
+
     for user_profile in user_profiles_with_changed_user_topic_rows:
         # This first muted_topics event is deprecated and will be removed
         # once clients are migrated to handle the user_topic event type
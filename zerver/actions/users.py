@@ -16,12 +16,17 @@ from zerver.lib.bot_config import ConfigError, get_bot_config, get_bot_configs,
 from zerver.lib.cache import bot_dict_fields
 from zerver.lib.create_user import create_user
 from zerver.lib.invites import revoke_invites_generated_by_user
+from zerver.lib.recent_private_conversations import (
+    get_direct_message_group_conversation_keys,
+    update_recent_private_conversations,
+)
 from zerver.lib.remote_server import maybe_enqueue_audit_log_upload
 from zerver.lib.send_email import clear_scheduled_emails
 from zerver.lib.sessions import delete_user_sessions
 from zerver.lib.stream_subscription import bulk_get_subscriber_peer_info
 from zerver.lib.stream_traffic import get_streams_traffic
 from zerver.lib.streams import get_streams_for_user, stream_to_dict
+from zerver.lib.topic import update_topic_summaries_for_keys
 from zerver.lib.user_counts import realm_user_count_by_role
 from zerver.lib.user_groups import get_system_user_group_for_user
 from zerver.lib.users import (
@@ -73,6 +78,20 @@ def do_delete_user(user_profile: UserProfile, *, acting_user: UserProfile | None
     personal_recipient = user_profile.recipient
 
     with transaction.atomic():
+        # The user's stream messages are deleted along with them, so
+        # the summaries of the topics they posted in are recomputed
+        # afterwards.
+        topic_summary_keys: dict[tuple[int, int], set[str]] = defaultdict(set)
+        # Uses index: zerver_message_realm_sender_recipient (prefix)
+        for realm_id, recipient_id, topic_name in (
+            Message.objects.filter(
+                realm_id=realm.id, sender=user_profile, recipient__type=Recipient.STREAM
+            )
+            .values_list("realm_id", "recipient_id", "subject")
+            .distinct()
+        ):
+            topic_summary_keys[(realm_id, recipient_id)].add(topic_name)
+
         user_profile.delete()
         # Recipient objects don't get deleted through CASCADE, so we need to handle
         # the user's personal recipient manually. This will also delete all Messages pointing
@@ -100,6 +119,12 @@ def do_delete_user(user_profile: UserProfile, *, acting_user: UserProfile | None
             for recipient in Recipient.objects.filter(id__in=to_resubscribe_recipient_ids)
         ]
         Subscription.objects.bulk_create(subs_to_recreate)
+        # The user's messages to their group direct message
+        # conversations were deleted along with them.
+        update_recent_private_conversations(
+            get_direct_message_group_conversation_keys(to_resubscribe_recipient_ids)
+        )
+        update_topic_summaries_for_keys(topic_summary_keys)
 
         RealmAuditLog.objects.create(
             realm=replacement_user.realm,
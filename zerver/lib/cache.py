@@ -2,18 +2,24 @@
 import hashlib
 import logging
 import os
+import pickle
 import re
 import secrets
 import sys
+import threading
 import time
 import traceback
-from collections.abc import Callable, Iterable, Sequence
+import zlib
+from collections import OrderedDict, defaultdict
+from collections.abc import Callable, Container, Iterable, Sequence
+from dataclasses import dataclass
 from functools import _lru_cache_wrapper, lru_cache, wraps
 from typing import TYPE_CHECKING, Any, Generic, TypeVar
 
 from django.conf import settings
 from django.core.cache import caches
 from django.core.cache.backends.base import BaseCache
+from django.db import transaction
 from django.db.models import Q
 from django_stubs_ext import QuerySetAny
 from typing_extensions import ParamSpec
@@ -43,6 +49,16 @@ def get_remote_cache_requests() -> int:
     return remote_cache_total_requests
 
 
+# Number of cache_with_key misses that were served by waiting for
+# another process to compute the value (or from its previous value),
+# rather than recomputing it; see single_flight_cache_fill.
+single_flight_stampedes_avoided = 0
+
+
+def get_single_flight_stampedes_avoided() -> int:
+    return single_flight_stampedes_avoided
+
+
 def remote_cache_stats_start() -> None:
     global remote_cache_time_start
     remote_cache_time_start = time.time()
@@ -54,6 +70,96 @@ def remote_cache_stats_finish() -> None:
     remote_cache_total_time += time.time() - remote_cache_time_start
 
 
+@dataclass(frozen=True)
+class CacheKeyFamily:
+    """A family of cache keys, named by the part of the key before the
+    first colon.  timeout is the timeout that the family's entries
+    should be set with (None meaning the backend's default timeout),
+    and value describes the cached values, for the audit_cache_families
+    management command."""
+
+    name: str
+    timeout: int | None
+    value: str
+
+
+@dataclass
+class CacheKeyFamilyStats:
+    hits: int = 0
+    misses: int = 0
+    sets: int = 0
+    deletes: int = 0
+    # Sets with a timeout other than the family's declared timeout.
+    timeout_mismatches: int = 0
+    time: float = 0.0
+
+
+cache_key_families: dict[str, CacheKeyFamily] = {}
+# Keys outside every registered family are counted together, so that
+# keys without a prefix (like tweet IDs) can't make this grow without
+# bound.
+UNREGISTERED_CACHE_KEY_FAMILY = "unregistered"
+cache_key_family_stats: dict[str, CacheKeyFamilyStats] = defaultdict(CacheKeyFamilyStats)
+
+
+def register_cache_key_family(name: str, *, timeout: int | None, value: str) -> None:
+    assert name not in cache_key_families, f"Duplicate cache key family {name}"
+    cache_key_families[name] = CacheKeyFamily(name=name, timeout=timeout, value=value)
+
+
+def get_cache_key_family_stats() -> dict[str, CacheKeyFamilyStats]:
+    return cache_key_family_stats
+
+
+def cache_key_family_name(key: str) -> str:
+    return key.split(":", 1)[0]
+
+
+def get_cache_key_family_stats_for_key(key: str) -> CacheKeyFamilyStats:
+    family = cache_key_family_name(key)
+    if family not in cache_key_families:
+        family = UNREGISTERED_CACHE_KEY_FAMILY
+    return cache_key_family_stats[family]
+
+
+# These are called right after remote_cache_stats_finish, and split
+# the time of the request evenly between its keys.
+def record_cache_family_gets(keys: list[str], found: Container[str]) -> None:
+    if not keys:
+        return
+    elapsed = (time.time() - remote_cache_time_start) / len(keys)
+    for key in keys:
+        stats = get_cache_key_family_stats_for_key(key)
+        if key in found:
+            stats.hits += 1
+        else:
+            stats.misses += 1
+        stats.time += elapsed
+
+
+def record_cache_family_sets(keys: list[str], timeout: int | None) -> None:
+    if not keys:
+        return
+    elapsed = (time.time() - remote_cache_time_start) / len(keys)
+    for key in keys:
+        stats = get_cache_key_family_stats_for_key(key)
+        stats.sets += 1
+        family = cache_key_families.get(cache_key_family_name(key))
+        if family is not None and family.timeout != timeout:
+            stats.timeout_mismatches += 1
+        stats.time += elapsed
+
+
+def record_cache_family_deletes(keys: list[str]) -> None:
+    if not keys:
+        return
+    elapsed = (time.time() - remote_cache_time_start) / len(keys)
+    for key in keys:
+        stats = get_cache_key_family_stats_for_key(key)
+        stats.deletes += 1
+        stats.time += elapsed
+
+
 def get_or_create_key_prefix() -> str:
     if settings.PUPPETEER_TESTS:
         # This sets the prefix for the benefit of the Puppeteer tests.
@@ -114,13 +220,23 @@ def cache_with_key(
     keyfunc: Callable[ParamT, str],
     cache_name: str | None = None,
     timeout: int | None = None,
+    single_flight: bool = False,
+    serve_stale: bool = False,
 ) -> Callable[[Callable[ParamT, ReturnT]], Callable[ParamT, ReturnT]]:
     """Decorator which applies Django caching to a function.
 
     Decorator argument is a function which computes a cache key
     from the original function's arguments.  You are responsible
     for avoiding collisions with other uses of this decorator or
-    other uses of caching."""
+    other uses of caching.
+
+    single_flight is intended for hot keys that are expensive to
+    compute: on a miss, only one process computes the value, while
+    any others wait for it (see single_flight_cache_fill).  With
+    serve_stale, those others instead use the previous value, if
+    any, which is only appropriate for functions whose callers can
+    tolerate a value that is out of date by a few seconds."""
+    assert single_flight or not serve_stale
 
     def decorator(func: Callable[ParamT, ReturnT]) -> Callable[ParamT, ReturnT]:
         @wraps(func)
@@ -139,22 +255,103 @@ def cache_with_key(
             if val is not None:
                 return val[0]
 
-            val = func(*args, **kwargs)
-            if isinstance(val, QuerySetAny):
-                logging.error(
-                    "cache_with_key attempted to store a full QuerySet object -- declining to cache",
-                    stack_info=True,
+            def fetch() -> ReturnT:
+                val = func(*args, **kwargs)
+                if isinstance(val, QuerySetAny):
+                    logging.error(
+                        "cache_with_key attempted to store a full QuerySet object -- declining to cache",
+                        stack_info=True,
+                    )
+                else:
+                    cache_set(key, val, cache_name=cache_name, timeout=timeout)
+                    if serve_stale:
+                        cache_set(
+                            stale_value_cache_key(key),
+                            val,
+                            cache_name=cache_name,
+                            timeout=STALE_VALUE_TIMEOUT,
+                        )
+                return val
+
+            if single_flight:
+                return single_flight_cache_fill(
+                    key, fetch, cache_name=cache_name, serve_stale=serve_stale
                 )
-            else:
-                cache_set(key, val, cache_name=cache_name, timeout=timeout)
-
-            return val
+            return fetch()
 
         return func_with_caching
 
     return decorator
 
 
+# How long the process computing a single-flight value holds its
+# lock; this bounds how long others are blocked if it dies.
+SINGLE_FLIGHT_LOCK_TIMEOUT = 10
+# How long other processes wait for the value before giving up and
+# computing it themselves.
+SINGLE_FLIGHT_WAIT_TIME = 2.0
+SINGLE_FLIGHT_POLL_INTERVAL = 0.05
+# Stale copies are kept longer than the values themselves, so that
+# they are still around after the value expires or is flushed.
+STALE_VALUE_TIMEOUT = 3600 * 24 * 14
+
+
+register_cache_key_family("single_flight_lock", timeout=SINGLE_FLIGHT_LOCK_TIMEOUT, value="bool")
+
+
+def single_flight_lock_cache_key(key: str) -> str:
+    # Hashed, since the key itself may already be close to the
+    # memcached key length limit.
+    return f"single_flight_lock:{hashlib.sha1(key.encode()).hexdigest()}"
+
+
+register_cache_key_family(
+    "stale_value", timeout=STALE_VALUE_TIMEOUT, value="Any; see single_flight_cache_fill"
+)
+
+
+def stale_value_cache_key(key: str) -> str:
+    return f"stale_value:{hashlib.sha1(key.encode()).hexdigest()}"
+
+
+def single_flight_cache_fill(
+    key: str, fetch: Callable[[], ReturnT], *, cache_name: str | None, serve_stale: bool
+) -> ReturnT:
+    """Called after a cache miss for key, to avoid a stampede of
+    processes all running the same expensive query after a hot key
+    is flushed.  The process that takes a short-lived lock runs fetch,
+    which computes and caches the value; others use the previous
+    value if serve_stale is set and it is available, and otherwise
+    poll the cache for the new value for a short time.
+    """
+    global single_flight_stampedes_avoided
+
+    lock_key = single_flight_lock_cache_key(key)
+    if cache_add(lock_key, True, cache_name=cache_name, timeout=SINGLE_FLIGHT_LOCK_TIMEOUT):
+        try:
+            return fetch()
+        finally:
+            cache_delete(lock_key, cache_name=cache_name)
+
+    if serve_stale:
+        val = cache_get(stale_value_cache_key(key), cache_name=cache_name)
+        if val is not None:
+            single_flight_stampedes_avoided += 1
+            return val[0]
+
+    deadline = time.monotonic() + SINGLE_FLIGHT_WAIT_TIME
+    while time.monotonic() < deadline:
+        time.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+        val = cache_get(key, cache_name=cache_name)
+        if val is not None:
+            single_flight_stampedes_avoided += 1
+            return val[0]
+
+    # The process holding the lock is taking too long, or died
+    # without releasing it.
+    return fetch()
+
+
 class InvalidCacheKeyError(Exception):
     pass
 
@@ -195,27 +392,64 @@ def cache_set(
     cache_backend = get_cache_backend(cache_name)
     cache_backend.set(final_key, (val,), timeout=timeout)
     remote_cache_stats_finish()
+    record_cache_family_sets([key], timeout)
+    local_cache_set_many({key: (val,)}, cache_name)
+
+
+def cache_add(
+    key: str, val: Any, cache_name: str | None = None, timeout: int | None = None
+) -> bool:
+    """Like cache_set, but only sets the value if the key is not
+    already present, atomically; returns whether it was set."""
+    final_key = KEY_PREFIX + key
+    validate_cache_key(final_key)
+
+    remote_cache_stats_start()
+    cache_backend = get_cache_backend(cache_name)
+    ret = cache_backend.add(final_key, (val,), timeout=timeout)
+    remote_cache_stats_finish()
+    record_cache_family_sets([key], timeout)
+    return ret
 
 
 def cache_get(key: str, cache_name: str | None = None) -> Any:
     final_key = KEY_PREFIX + key
     validate_cache_key(final_key)
 
+    generations = local_cache_generations_for_keys([key], cache_name)
+    if generations:
+        local_ret = local_cache_get_many(generations)
+        if key in local_ret:
+            return local_ret[key]
+
     remote_cache_stats_start()
     cache_backend = get_cache_backend(cache_name)
     ret = cache_backend.get(final_key)
     remote_cache_stats_finish()
+    record_cache_family_gets([key], () if ret is None else (key,))
+    if generations and ret is not None:
+        local_cache_store({key: ret}, generations)
     return ret
 
 
 def cache_get_many(keys: list[str], cache_name: str | None = None) -> dict[str, Any]:
-    keys = [KEY_PREFIX + key for key in keys]
     for key in keys:
-        validate_cache_key(key)
+        validate_cache_key(KEY_PREFIX + key)
+
+    generations = local_cache_generations_for_keys(keys, cache_name)
+    local_ret = local_cache_get_many(generations) if generations else {}
+    remote_keys = [KEY_PREFIX + key for key in keys if key not in local_ret]
+    if not remote_keys:
+        return local_ret
+
     remote_cache_stats_start()
-    ret = get_cache_backend(cache_name).get_many(keys)
+    ret = get_cache_backend(cache_name).get_many(remote_keys)
     remote_cache_stats_finish()
-    return {key[len(KEY_PREFIX) :]: value for key, value in ret.items()}
+    remote_ret = {key[len(KEY_PREFIX) :]: value for key, value in ret.items()}
+    record_cache_family_gets([key for key in keys if key not in local_ret], remote_ret)
+    if generations:
+        local_cache_store(remote_ret, generations)
+    return {**local_ret, **remote_ret}
 
 
 def safe_cache_get_many(keys: list[str], cache_name: str | None = None) -> dict[str, Any]:
@@ -243,10 +477,11 @@ def cache_set_many(
         new_key = KEY_PREFIX + key
         validate_cache_key(new_key)
         new_items[new_key] = items[key]
-    items = new_items
     remote_cache_stats_start()
-    get_cache_backend(cache_name).set_many(items, timeout=timeout)
+    get_cache_backend(cache_name).set_many(new_items, timeout=timeout)
     remote_cache_stats_finish()
+    record_cache_family_sets(list(items), timeout)
+    local_cache_set_many(items, cache_name)
 
 
 def safe_cache_set_many(
@@ -277,15 +512,200 @@ def cache_delete(key: str, cache_name: str | None = None) -> None:
     remote_cache_stats_start()
     get_cache_backend(cache_name).delete(final_key)
     remote_cache_stats_finish()
+    record_cache_family_deletes([key])
+    local_cache_delete_many([key], cache_name)
 
 
 def cache_delete_many(items: Iterable[str], cache_name: str | None = None) -> None:
+    items = list(items)
     keys = [KEY_PREFIX + item for item in items]
     for key in keys:
         validate_cache_key(key)
     remote_cache_stats_start()
     get_cache_backend(cache_name).delete_many(keys)
     remote_cache_stats_finish()
+    record_cache_family_deletes(items)
+    local_cache_delete_many(items, cache_name)
+
+
+def get_generation_tokens(keys: list[str]) -> dict[str, str]:
+    """Generation tokens are random strings embedded in other cache keys,
+    so that a family of cache entries can be invalidated at once by
+    discarding the token (see discard_generation_tokens), without
+    having to know every key in the family.  A missing token is
+    replaced with a fresh one.
+    """
+    tokens = {key: value[0] for key, value in cache_get_many(keys).items()}
+    missing = {key: secrets.token_hex(8) for key in keys if key not in tokens}
+    if missing:
+        cache_set_many({key: (token,) for key, token in missing.items()})
+        tokens.update(missing)
+    return tokens
+
+
+def discard_generation_tokens(keys: list[str]) -> None:
+    # We discard the tokens both immediately, so that code later in
+    # the same transaction sees the change, and after commit, so that
+    # a concurrent request which recomputed the value from a database
+    # snapshot taken before our commit cannot leave a stale entry
+    # under the current tokens.
+    cache_delete_many(keys)
+    transaction.on_commit(lambda: cache_delete_many(keys))
+
+
+# The in-process ("local") tier of the cache.
+#
+# For a few key families that are read on nearly every request, each
+# process keeps recently used values in a small LRU cache in front of
+# memcached, saving a network round trip per read.  (A key's family
+# is the part of the key before the first colon.)
+#
+# Deleting a key in one process must also invalidate it in the others.
+# Each family's keys are split into buckets, each with a generation
+# token (see get_generation_tokens) that deleting a key discards.
+# Every process fetches all of the tokens in one request at most once
+# every REMOTE_CACHE_LOCAL_TIER_CHECK_SECONDS, and local entries are
+# only used while their bucket's token is unchanged since the entry
+# was fetched from memcached.  So other processes' deletions take
+# effect locally within that interval, and entries also expire after
+# REMOTE_CACHE_LOCAL_TIER_TTL_SECONDS regardless.
+#
+# That delay is why user profiles aren't cached here: a deactivated
+# user or a rotated API key must stop authenticating immediately.
+LOCAL_CACHE_KEY_FAMILIES = {
+    "display_recipient_dict",
+    "single_user_display_recipient",
+}
+LOCAL_CACHE_GENERATION_BUCKETS = 16
+register_cache_key_family("local_cache_generation", timeout=None, value="str")
+
+# Maps keys to their pickled value (so that callers can't modify the
+# cached copy), bucket generation token, and expiry time.
+local_cache: OrderedDict[str, tuple[bytes, str, float]] = OrderedDict()
+# Some requests fetch data from several threads; see RegisterSectionFetcher.
+local_cache_lock = threading.Lock()
+local_cache_generations: dict[str, str] = {}
+local_cache_generations_checked = 0.0
+local_cache_hits: dict[str, int] = defaultdict(int)
+local_cache_misses: dict[str, int] = defaultdict(int)
+
+
+def get_local_cache_hits() -> dict[str, int]:
+    return local_cache_hits
+
+
+def get_local_cache_misses() -> dict[str, int]:
+    return local_cache_misses
+
+
+def local_cache_generation_key(key: str) -> str | None:
+    family = cache_key_family_name(key)
+    if family not in LOCAL_CACHE_KEY_FAMILIES:
+        return None
+    bucket = zlib.crc32(key.encode()) % LOCAL_CACHE_GENERATION_BUCKETS
+    return f"local_cache_generation:{family}:{bucket}"
+
+
+def local_cache_enabled(cache_name: str | None) -> bool:
+    return settings.REMOTE_CACHE_LOCAL_TIER_MAX_ENTRIES > 0 and cache_name in (None, "default")
+
+
+def refresh_local_cache_generations() -> None:
+    global local_cache_generations_checked
+
+    now = time.monotonic()
+    if now - local_cache_generations_checked < settings.REMOTE_CACHE_LOCAL_TIER_CHECK_SECONDS:
+        return
+    local_cache_generations_checked = now
+    local_cache_generations.update(
+        get_generation_tokens(
+            [
+                f"local_cache_generation:{family}:{bucket}"
+                for family in LOCAL_CACHE_KEY_FAMILIES
+                for bucket in range(LOCAL_CACHE_GENERATION_BUCKETS)
+            ]
+        )
+    )
+
+
+def local_cache_generations_for_keys(keys: list[str], cache_name: str | None) -> dict[str, str]:
+    """Returns the current generation token for each of the keys that
+    belongs in the local tier.  Tokens are read before fetching the
+    values, so that an entry can never be newer than its token."""
+    if not local_cache_enabled(cache_name):
+        return {}
+    generation_keys = {key: local_cache_generation_key(key) for key in keys}
+    if not any(generation_keys.values()):
+        return {}
+    refresh_local_cache_generations()
+    return {
+        key: local_cache_generations[generation_key]
+        for key, generation_key in generation_keys.items()
+        if generation_key is not None
+    }
+
+
+def local_cache_get_many(generations: dict[str, str]) -> dict[str, Any]:
+    now = time.monotonic()
+    ret = {}
+    with local_cache_lock:
+        for key, generation in generations.items():
+            family = cache_key_family_name(key)
+            entry = local_cache.get(KEY_PREFIX + key)
+            if entry is not None and entry[1] == generation and entry[2] > now:
+                local_cache.move_to_end(KEY_PREFIX + key)
+                ret[key] = entry[0]
+                local_cache_hits[family] += 1
+            else:
+                local_cache_misses[family] += 1
+    # These are values we pickled ourselves, in local_cache_store.
+    return {key: pickle.loads(value) for key, value in ret.items()}  # noqa: S301
+
+
+def local_cache_store(items: dict[str, Any], generations: dict[str, str]) -> None:
+    expires = time.monotonic() + settings.REMOTE_CACHE_LOCAL_TIER_TTL_SECONDS
+    entries = {
+        KEY_PREFIX + key: (pickle.dumps(value), generations[key], expires)
+        for key, value in items.items()
+        if key in generations
+    }
+    with local_cache_lock:
+        for final_key, entry in entries.items():
+            local_cache[final_key] = entry
+            local_cache.move_to_end(final_key)
+        while len(local_cache) > settings.REMOTE_CACHE_LOCAL_TIER_MAX_ENTRIES:
+            local_cache.popitem(last=False)
+
+
+def local_cache_set_many(items: dict[str, Any], cache_name: str | None) -> None:
+    generations = local_cache_generations_for_keys(list(items), cache_name)
+    if generations:
+        local_cache_store(items, generations)
+
+
+def local_cache_delete_many(keys: list[str], cache_name: str | None) -> None:
+    if not local_cache_enabled(cache_name):
+        return
+    generation_keys = set()
+    with local_cache_lock:
+        for key in keys:
+            generation_key = local_cache_generation_key(key)
+            if generation_key is not None:
+                local_cache.pop(KEY_PREFIX + key, None)
+                generation_keys.add(generation_key)
+    if generation_keys:
+        # Other processes will notice the new tokens at their next
+        # refresh, and stop using their copies of these keys.
+        discard_generation_tokens(sorted(generation_keys))
+
+
+def flush_local_cache() -> None:
+    global local_cache_generations_checked
+
+    with local_cache_lock:
+        local_cache.clear()
+    local_cache_generations.clear()
+    local_cache_generations_checked = 0.0
 
 
 def filter_good_and_bad_keys(keys: list[str]) -> tuple[list[str], list[str]]:
@@ -398,18 +818,36 @@ def bulk_cached_fetch(
     )
 
 
+register_cache_key_family("preview_url", timeout=None, value="UrlEmbedData | None")
+
+
 def preview_url_cache_key(url: str) -> str:
     return f"preview_url:{hashlib.sha1(url.encode()).hexdigest()}"
 
 
+register_cache_key_family(
+    "display_recipient_dict",
+    timeout=3600 * 24 * 7,
+    value="list[UserDisplayRecipient], or a stream name",
+)
+
+
 def display_recipient_cache_key(recipient_id: int) -> str:
     return f"display_recipient_dict:{recipient_id}"
 
 
+register_cache_key_family(
+    "single_user_display_recipient", timeout=None, value="UserDisplayRecipient"
+)
+
+
 def single_user_display_recipient_cache_key(user_id: int) -> str:
     return f"single_user_display_recipient:{user_id}"
 
 
+register_cache_key_family("user_profile", timeout=3600 * 24 * 7, value="UserProfile")
+
+
 def user_profile_cache_key_id(email: str, realm_id: int) -> str:
     return f"user_profile:{hashlib.sha1(email.strip().encode()).hexdigest()}:{realm_id}"
 
@@ -418,22 +856,39 @@ def user_profile_cache_key(email: str, realm: "Realm") -> str:
     return user_profile_cache_key_id(email, realm.id)
 
 
+register_cache_key_family(
+    "user_profile_by_delivery_email", timeout=3600 * 24 * 7, value="UserProfile"
+)
+
+
 def user_profile_delivery_email_cache_key(delivery_email: str, realm_id: int) -> str:
     return f"user_profile_by_delivery_email:{hashlib.sha1(delivery_email.strip().encode()).hexdigest()}:{realm_id}"
 
 
+register_cache_key_family("bot_profile", timeout=3600 * 24 * 7, value="UserProfile")
+
+
 def bot_profile_cache_key(email: str, realm_id: int) -> str:
     return f"bot_profile:{hashlib.sha1(email.strip().encode()).hexdigest()}"
 
 
+register_cache_key_family("user_profile_by_id", timeout=3600 * 24 * 7, value="UserProfile")
+
+
 def user_profile_by_id_cache_key(user_profile_id: int) -> str:
     return f"user_profile_by_id:{user_profile_id}"
 
 
+register_cache_key_family("user_profile_by_api_key", timeout=3600 * 24 * 7, value="UserProfile")
+
+
 def user_profile_by_api_key_cache_key(api_key: str) -> str:
     return f"user_profile_by_api_key:{api_key}"
 
 
+register_cache_key_family("get_cross_realm_dicts", timeout=None, value="list[APIUserDict]")
+
+
 def get_cross_realm_dicts_key() -> str:
     emails = list(settings.CROSS_REALM_BOT_EMAILS)
     raw_key = ",".join(sorted(emails))
@@ -461,26 +916,44 @@ realm_user_dict_fields: list[str] = [
 ]
 
 
+register_cache_key_family("realm_user_dicts", timeout=3600 * 24 * 7, value="list[RealmUserDict]")
+
+
 def realm_user_dicts_cache_key(realm_id: int) -> str:
     return f"realm_user_dicts:{realm_id}"
 
 
+register_cache_key_family("muting_users_list", timeout=3600 * 24 * 7, value="set[int]")
+
+
 def get_muting_users_cache_key(muted_user_id: int) -> str:
     return f"muting_users_list:{muted_user_id}"
 
 
+register_cache_key_family("realm_used_upload_space", timeout=3600 * 24 * 7, value="int")
+
+
 def get_realm_used_upload_space_cache_key(realm_id: int) -> str:
     return f"realm_used_upload_space:{realm_id}"
 
 
+register_cache_key_family("realm_seat_count", timeout=3600 * 24, value="int")
+
+
 def get_realm_seat_count_cache_key(realm_id: int) -> str:
     return f"realm_seat_count:{realm_id}"
 
 
+register_cache_key_family("active_user_ids", timeout=3600 * 24 * 7, value="list[int]")
+
+
 def active_user_ids_cache_key(realm_id: int) -> str:
     return f"active_user_ids:{realm_id}"
 
 
+register_cache_key_family("active_non_guest_user_ids", timeout=3600 * 24 * 7, value="list[int]")
+
+
 def active_non_guest_user_ids_cache_key(realm_id: int) -> str:
     return f"active_non_guest_user_ids:{realm_id}"
 
@@ -502,6 +975,9 @@ bot_dict_fields: list[str] = [
 ]
 
 
+register_cache_key_family("bot_dicts_in_realm", timeout=3600 * 24 * 7, value="list[dict[str, Any]]")
+
+
 def bot_dicts_in_realm_cache_key(realm_id: int) -> str:
     return f"bot_dicts_in_realm:{realm_id}"
 
@@ -614,18 +1090,32 @@ def flush_realm(
         cache_delete(realm_text_description_cache_key(realm))
 
 
+register_cache_key_family("realm_alert_words", timeout=3600 * 24, value="dict[int, list[str]]")
+
+
 def realm_alert_words_cache_key(realm_id: int) -> str:
     return f"realm_alert_words:{realm_id}"
 
 
+register_cache_key_family(
+    "realm_alert_words_automaton", timeout=3600 * 24, value="ahocorasick.Automaton"
+)
+
+
 def realm_alert_words_automaton_cache_key(realm_id: int) -> str:
     return f"realm_alert_words_automaton:{realm_id}"
 
 
+register_cache_key_family("realm_rendered_description", timeout=3600 * 24 * 7, value="str")
+
+
 def realm_rendered_description_cache_key(realm: "Realm") -> str:
     return f"realm_rendered_description:{realm.string_id}"
 
 
+register_cache_key_family("realm_text_description", timeout=3600 * 24 * 7, value="str")
+
+
 def realm_text_description_cache_key(realm: "Realm") -> str:
     return f"realm_text_description:{realm.string_id}"
 
@@ -663,6 +1153,11 @@ def flush_used_upload_space_cache(
         cache_delete(get_realm_used_upload_space_cache_key(attachment.owner.realm_id))
 
 
+register_cache_key_family(
+    "message_dict", timeout=3600 * 24, value="bytes; see stringify_message_dict"
+)
+
+
 def to_dict_cache_key_id(message_id: int) -> str:
     return f"message_dict:{message_id}"
 
@@ -671,6 +1166,9 @@ def to_dict_cache_key(message: "Message", realm_id: int | None = None) -> str:
     return to_dict_cache_key_id(message.id)
 
 
+register_cache_key_family("open_graph_description_path", timeout=3600 * 24, value="str | None")
+
+
 def open_graph_description_cache_key(content: bytes, request_url: str) -> str:
     return f"open_graph_description_path:{hashlib.sha1(request_url.encode()).hexdigest()}"
 
@@ -1,13 +1,17 @@
 # See https://zulip.readthedocs.io/en/latest/subsystems/caching.html for docs
 import logging
+import time
 from collections.abc import Callable, Iterable
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import timedelta
 from typing import Any
 
+import bmemcached
 from django.conf import settings
 from django.contrib.sessions.models import Session
+from django.core.cache import cache as django_cache
 from django.db import connection
-from django.db.models import QuerySet
+from django.db.models import Max, QuerySet
 from django.utils.timezone import now as timezone_now
 from django_stubs_ext import ValuesQuerySet
 
@@ -17,15 +21,21 @@ from django_stubs_ext import ValuesQuerySet
 from analytics.models import RealmCount
 from zerver.lib.cache import (
     cache_set_many,
+    display_recipient_cache_key,
     get_remote_cache_requests,
     get_remote_cache_time,
+    single_user_display_recipient_cache_key,
+    to_dict_cache_key_id,
     user_profile_by_api_key_cache_key,
     user_profile_cache_key_id,
 )
+from zerver.lib.display_recipient import TinyStreamResult, display_recipient_fields
+from zerver.lib.message_cache import MessageDict, stringify_message_dict
 from zerver.lib.safe_session_cached_db import SessionStore
 from zerver.lib.sessions import session_engine
+from zerver.lib.types import UserDisplayRecipient
 from zerver.lib.users import get_all_api_keys
-from zerver.models import Client, UserProfile
+from zerver.models import Client, Message, Stream, UserProfile
 from zerver.models.clients import get_client_cache_key
 
 
@@ -58,25 +68,76 @@ def session_cache_items(
     items_for_remote_cache[store.cache_key] = store.decode(session.session_data)
 
 
-def get_active_realm_ids() -> ValuesQuerySet[RealmCount, int]:
+def get_realm_ids_by_activity() -> list[int]:
     """For installations like Zulip Cloud hosting a lot of realms, it only makes
     sense to do cache-filling work for realms that have any currently
     active users/clients.  Otherwise, we end up with every single-user
     trial organization that has ever been created costing us N streams
     worth of cache work (where N is the number of default streams for
     a new organization).
+
+    The busiest realms come first, so that their caches are filled
+    before those of realms that see less traffic.
     """
     date = timezone_now() - timedelta(days=2)
-    return (
+    return list(
         RealmCount.objects.filter(end_time__gte=date, property="1day_actives::day", value__gt=0)
-        .distinct("realm_id")
+        .values("realm_id")
+        .annotate(actives=Max("value"))
+        .order_by("-actives", "realm_id")
         .values_list("realm_id", flat=True)
     )
 
 
-def get_users() -> QuerySet[UserProfile]:
+def get_realm_users(realm_id: int) -> QuerySet[UserProfile]:
     return UserProfile.objects.select_related("realm", "bot_owner").filter(
-        long_term_idle=False, realm__in=get_active_realm_ids()
+        realm_id=realm_id, long_term_idle=False
+    )
+
+
+def get_realm_display_recipient_users(realm_id: int) -> ValuesQuerySet[UserProfile, Any]:
+    return UserProfile.objects.filter(realm_id=realm_id, long_term_idle=False).values(
+        *display_recipient_fields
+    )
+
+
+def get_realm_streams(realm_id: int) -> ValuesQuerySet[Stream, TinyStreamResult]:
+    return Stream.objects.filter(realm_id=realm_id).values("recipient_id", "name")
+
+
+# How many of each realm's most recent messages to fill the to_dict
+# cache with; these are what clients fetch first after a restart.
+RECENT_MESSAGES_TO_FILL = 1000
+
+
+def get_realm_recent_message_dicts(realm_id: int) -> list[dict[str, Any]]:
+    message_ids = list(
+        # Uses index: zerver_message_realm_id
+        Message.objects.filter(realm_id=realm_id)
+        .order_by("-id")
+        .values_list("id", flat=True)[:RECENT_MESSAGES_TO_FILL]
+    )
+    return MessageDict.ids_to_dict(message_ids)
+
+
+def user_display_recipient_cache_items(
+    items_for_remote_cache: dict[str, tuple[UserDisplayRecipient]],
+    user_dict: UserDisplayRecipient,
+) -> None:
+    items_for_remote_cache[single_user_display_recipient_cache_key(user_dict["id"])] = (user_dict,)
+
+
+def stream_display_recipient_cache_items(
+    items_for_remote_cache: dict[str, tuple[str]], stream: TinyStreamResult
+) -> None:
+    items_for_remote_cache[display_recipient_cache_key(stream["recipient_id"])] = (stream["name"],)
+
+
+def message_cache_items(
+    items_for_remote_cache: dict[str, tuple[bytes]], message_dict: dict[str, Any]
+) -> None:
+    items_for_remote_cache[to_dict_cache_key_id(message_dict["id"])] = (
+        stringify_message_dict(message_dict),
     )
 
 
@@ -89,7 +150,6 @@ def get_users() -> QuerySet[UserProfile]:
 cache_fillers: dict[
     str, tuple[Callable[[], Iterable[Any]], Callable[[dict[str, Any], Any], None], int, int]
 ] = {
-    "user": (get_users, user_cache_items, 3600 * 24 * 7, 10000),
     "client": (
         Client.objects.all,
         client_cache_items,
@@ -99,6 +159,27 @@ cache_fillers: dict[
     "session": (Session.objects.all, session_cache_items, 3600 * 24 * 7, 10000),
 }
 
+# Like cache_fillers, but the objects queries take a realm ID; these
+# are filled one realm at a time, in get_realm_ids_by_activity order.
+realm_cache_fillers: dict[
+    str, tuple[Callable[[int], Iterable[Any]], Callable[[dict[str, Any], Any], None], int, int]
+] = {
+    "user": (get_realm_users, user_cache_items, 3600 * 24 * 7, 10000),
+    "user_display_recipient": (
+        get_realm_display_recipient_users,
+        user_display_recipient_cache_items,
+        3600 * 24 * 7,
+        10000,
+    ),
+    "stream_display_recipient": (
+        get_realm_streams,
+        stream_display_recipient_cache_items,
+        3600 * 24 * 7,
+        10000,
+    ),
+    "message": (get_realm_recent_message_dicts, message_cache_items, 3600 * 24, 1000),
+}
+
 
 class SQLQueryCounter:
     def __init__(self) -> None:
@@ -116,26 +197,129 @@ class SQLQueryCounter:
         return execute(sql, params, many, context)
 
 
-def fill_remote_cache(cache: str) -> None:
+class DBQueryThrottle:
+    """Counts database queries, and sleeps as needed to keep their
+    average rate below max_db_queries_per_second (if set), so that
+    filling caches doesn't compete with serving traffic."""
+
+    def __init__(self, max_db_queries_per_second: float | None) -> None:
+        self.counter = SQLQueryCounter()
+        self.max_db_queries_per_second = max_db_queries_per_second
+        self.start = time.monotonic()
+
+    def throttle(self) -> None:
+        if self.max_db_queries_per_second is None:
+            return
+        delay = self.start + self.counter.count / self.max_db_queries_per_second - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def fill_remote_cache_items(
+    objects: Iterable[Any],
+    items_filler: Callable[[dict[str, Any], Any], None],
+    timeout: int,
+    batch_size: int,
+    db_query_throttle: DBQueryThrottle,
+) -> int:
+    items_for_remote_cache: dict[str, Any] = {}
+    count = 0
+    for obj in objects:
+        items_filler(items_for_remote_cache, obj)
+        count += 1
+        if count % batch_size == 0:
+            cache_set_many(items_for_remote_cache, timeout=timeout)
+            items_for_remote_cache = {}
+            db_query_throttle.throttle()
+    cache_set_many(items_for_remote_cache, timeout=timeout)
+    db_query_throttle.throttle()
+    return count
+
+
+def fill_remote_cache(cache: str, max_db_queries_per_second: float | None = None) -> None:
     remote_cache_time_start = get_remote_cache_time()
     remote_cache_requests_start = get_remote_cache_requests()
-    items_for_remote_cache: dict[str, Any] = {}
     (objects, items_filler, timeout, batch_size) = cache_fillers[cache]
-    count = 0
-    db_query_counter = SQLQueryCounter()
-    with connection.execute_wrapper(db_query_counter):
-        for obj in objects():
-            items_filler(items_for_remote_cache, obj)
-            count += 1
-            if count % batch_size == 0:
-                cache_set_many(items_for_remote_cache, timeout=3600 * 24)
-                items_for_remote_cache = {}
-        cache_set_many(items_for_remote_cache, timeout=3600 * 24 * 7)
+    db_query_throttle = DBQueryThrottle(max_db_queries_per_second)
+    with connection.execute_wrapper(db_query_throttle.counter):
+        count = fill_remote_cache_items(
+            objects(), items_filler, timeout, batch_size, db_query_throttle
+        )
     logging.info(
         "Successfully populated %s cache: %d items, %d DB queries, %d memcached sets, %.2f seconds",
         cache,
         count,
-        db_query_counter.count,
+        db_query_throttle.counter.count,
         get_remote_cache_requests() - remote_cache_requests_start,
         get_remote_cache_time() - remote_cache_time_start,
     )
+
+
+def fill_realm_remote_caches(
+    realm_id: int, caches: list[str], max_db_queries_per_second: float | None
+) -> int:
+    db_query_throttle = DBQueryThrottle(max_db_queries_per_second)
+    count = 0
+    with connection.execute_wrapper(db_query_throttle.counter):
+        for cache in caches:
+            (objects, items_filler, timeout, batch_size) = realm_cache_fillers[cache]
+            count += fill_remote_cache_items(
+                objects(realm_id), items_filler, timeout, batch_size, db_query_throttle
+            )
+    return count
+
+
+def fill_realms_remote_caches(
+    caches: list[str], processes: int, max_db_queries_per_second: float | None = None
+) -> None:
+    """Fills the realm_cache_fillers caches for all recently active
+    realms, busiest first, using a pool of processes.  The rate limit
+    on database queries is shared between the processes."""
+    start = time.monotonic()
+    realm_ids = get_realm_ids_by_activity()
+    total_count = 0
+
+    def log_progress(realm_id: int, count: int, done: int) -> None:
+        logging.info(
+            "Populated %s caches for realm %d (%d/%d): %d items, %.2f seconds elapsed",
+            ", ".join(caches),
+            realm_id,
+            done,
+            len(realm_ids),
+            count,
+            time.monotonic() - start,
+        )
+
+    if processes == 1:
+        for done, realm_id in enumerate(realm_ids, start=1):
+            count = fill_realm_remote_caches(realm_id, caches, max_db_queries_per_second)
+            total_count += count
+            log_progress(realm_id, count, done)
+    else:
+        # Forked processes must not share the parent's connections.
+        if max_db_queries_per_second is not None:
+            max_db_queries_per_second /= processes
+        connection.close()
+        _cache = django_cache._cache  # type: ignore[attr-defined] # not in stubs
+        assert isinstance(_cache, bmemcached.Client)
+        _cache.disconnect_all()
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            # The pool starts tasks in the order they were submitted.
+            futures = {
+                executor.submit(
+                    fill_realm_remote_caches, realm_id, caches, max_db_queries_per_second
+                ): realm_id
+                for realm_id in realm_ids
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                count = future.result()
+                total_count += count
+                log_progress(futures[future], count, done)
+
+    logging.info(
+        "Successfully populated %s caches for %d realms: %d items, %.2f seconds",
+        ", ".join(caches),
+        len(realm_ids),
+        total_count,
+        time.monotonic() - start,
+    )
@@ -1,5 +1,6 @@
 # See https://zulip.readthedocs.io/en/latest/subsystems/notifications.html
 
+import functools
 import logging
 import os
 import re
@@ -7,6 +8,7 @@ import subprocess
 import sys
 import zoneinfo
 from collections import defaultdict
+from collections.abc import Collection, Mapping
 from dataclasses import dataclass
 from datetime import timedelta
 from email.headerregistry import Address
@@ -16,6 +18,7 @@ import lxml.html
 from bs4 import BeautifulSoup
 from django.conf import settings
 from django.contrib.auth import get_backends
+from django.db.models import Q
 from django.utils.timezone import now as timezone_now
 from django.utils.translation import gettext as _
 from django.utils.translation import override as override_language
@@ -26,7 +29,7 @@ from zerver.lib.display_recipient import get_display_recipient
 from zerver.lib.markdown.fenced_code import FENCE_RE
 from zerver.lib.message import bulk_access_messages
 from zerver.lib.notification_data import get_mentioned_user_group
-from zerver.lib.queue import queue_json_publish
+from zerver.lib.queue import queue_json_publish, queue_json_publish_batch
 from zerver.lib.send_email import FromAddress, send_future_email
 from zerver.lib.soft_deactivation import soft_reactivate_if_personal_notification
 from zerver.lib.tex import change_katex_to_raw_latex
@@ -183,15 +186,23 @@ def add_quote_prefix_in_text(content: str) -> str:
     return "\n".join(output)
 
 
+MessagePayloadKey = tuple[int, str | None, str, str, str]
+
+
 def build_message_list(
     user: UserProfile,
     messages: list[Message],
     stream_id_map: dict[int, Stream] | None = None,  # only needs id, name
+    message_payloads: dict[MessagePayloadKey, dict[str, str]] | None = None,
 ) -> list[dict[str, Any]]:
     """
     Builds the message list object for the message notification email template.
     The messages are collapsed into per-recipient and per-sender blocks, like
     our web interface
+
+    If message_payloads is passed, it is used to reuse the rendered
+    content of each message between users whose settings render it
+    the same way.
     """
     messages_to_render: list[dict[str, Any]] = []
 
@@ -223,6 +234,14 @@ def build_message_list(
         return message_plain, str(message_soup)
 
     def build_message_payload(message: Message, sender: str | None = None) -> dict[str, str]:
+        if message_payloads is None:
+            return render_message_payload(message, sender)
+        key = (message.id, sender, user.realm.url, user.emojiset, user.default_language)
+        if key not in message_payloads:
+            message_payloads[key] = render_message_payload(message, sender)
+        return message_payloads[key]
+
+    def render_message_payload(message: Message, sender: str | None) -> dict[str, str]:
         plain = message.content
         plain = fix_plaintext_image_urls(plain)
         # There's a small chance of colliding with non-Zulip URLs containing
@@ -376,8 +395,103 @@ def include_realm_name_in_missedmessage_emails_subject(user_profile: UserProfile
     )
 
 
+class MissedMessageEmailBatch:
+    """Data for sending the missed-message emails for several users,
+    which is loaded with a few queries for all of them, rather than
+    separately for each user.  After a message mentions many users,
+    it is loaded once, and rendered once per distinct language and
+    emojiset, rather than once per user.
+
+    The emails are published to the email_senders queue together, by
+    publish_emails."""
+
+    def __init__(self, message_ids_by_user: Mapping[int, Collection[int]]) -> None:
+        all_message_ids = {
+            message_id for message_ids in message_ids_by_user.values() for message_id in message_ids
+        }
+        # Note: This query structure automatically filters out any
+        # messages that were permanently deleted, since those would now be
+        # in the ArchivedMessage table, not the Message table.
+        self.messages: dict[int, Message] = {
+            message.id: message
+            for message in Message.objects.filter(id__in=all_message_ids)
+            # Cancel missed-message emails for deleted messages
+            .exclude(content="(deleted)")
+            .select_related("recipient", "sender")
+        }
+        # The flags of each of the messages which each user has yet
+        # to read.  Each user's rows are limited to their own messages,
+        # rather than every message in the batch.
+        user_message_filters = [
+            Q(
+                user_profile_id=user_profile_id,
+                message_id__in=[
+                    message_id for message_id in message_ids if message_id in self.messages
+                ],
+            )
+            for user_profile_id, message_ids in message_ids_by_user.items()
+        ]
+        self.unread_flags: dict[tuple[int, int], int] = {}
+        if user_message_filters:
+            self.unread_flags = {
+                (user_profile_id, message_id): flags
+                for user_profile_id, message_id, flags in UserMessage.objects.filter(
+                    functools.reduce(lambda a, b: a | b, user_message_filters),
+                    flags__andz=UserMessage.flags.read.mask,
+                ).values_list("user_profile_id", "message_id", "flags")
+            }
+        self.streams: dict[int, Stream] = {
+            stream.id: stream
+            for stream in Stream.objects.filter(
+                id__in={
+                    message.recipient.type_id
+                    for message in self.messages.values()
+                    if message.recipient.type == Recipient.STREAM
+                }
+            ).only("id", "name")
+        }
+        self.context_messages: dict[int, list[Message]] = {}
+        self.message_payloads: dict[MessagePayloadKey, dict[str, str]] = {}
+        self.emails: list[dict[str, Any]] = []
+
+    def get_unread_messages(
+        self, user_profile_id: int, message_ids: Collection[int]
+    ) -> list[Message]:
+        return [
+            self.messages[message_id]
+            for message_id in sorted(message_ids)
+            if (user_profile_id, message_id) in self.unread_flags
+        ]
+
+    def has_any_mentions(self, user_profile_id: int, message_id: int) -> bool:
+        flags = self.unread_flags[(user_profile_id, message_id)]
+        return bool(
+            flags
+            & (
+                UserMessage.flags.mentioned.mask
+                | UserMessage.flags.stream_wildcard_mentioned.mask
+                | UserMessage.flags.topic_wildcard_mentioned.mask
+                | UserMessage.flags.group_mentioned.mask
+            )
+        )
+
+    def get_context_for_message(self, message: Message) -> list[Message]:
+        if message.id not in self.context_messages:
+            self.context_messages[message.id] = list(
+                get_context_for_message(message).select_related("recipient", "sender")
+            )
+        return self.context_messages[message.id]
+
+    def publish_emails(self) -> None:
+        queue_json_publish_batch([("email_senders", email) for email in self.emails])
+        self.emails = []
+
+
 def do_send_missedmessage_events_reply_in_zulip(
-    user_profile: UserProfile, missed_messages: list[dict[str, Any]], message_count: int
+    user_profile: UserProfile,
+    missed_messages: list[dict[str, Any]],
+    message_count: int,
+    batch: MissedMessageEmailBatch | None = None,
 ) -> None:
     """
     Send a reminder email to a user if she's missed some direct messages
@@ -391,6 +505,8 @@ def do_send_missedmessage_events_reply_in_zulip(
     `user_profile` is the user to send the reminder to
     `missed_messages` is a list of dictionaries to Message objects and other data
                       for a group of messages that share a recipient (and topic)
+    `batch` is the MissedMessageEmailBatch to add the email to, if any; otherwise
+            the email is queued immediately
     """
     from zerver.context_processors import common_context
 
@@ -524,7 +640,10 @@ def do_send_missedmessage_events_reply_in_zulip(
             )
         message = missed_messages[0]["message"]
         assert message.recipient.type == Recipient.STREAM
-        stream = Stream.objects.only("id", "name").get(id=message.recipient.type_id)
+        if batch is not None and message.recipient.type_id in batch.streams:
+            stream = batch.streams[message.recipient.type_id]
+        else:
+            stream = Stream.objects.only("id", "name").get(id=message.recipient.type_id)
         narrow_url = topic_narrow_url(
             realm=user_profile.realm,
             stream=stream,
@@ -558,6 +677,8 @@ def do_send_missedmessage_events_reply_in_zulip(
             messages=build_message_list(
                 user=user_profile,
                 messages=[m["message"] for m in missed_messages],
+                stream_id_map=batch.streams if batch is not None else None,
+                message_payloads=batch.message_payloads if batch is not None else None,
             ),
             sender_str=", ".join(sender.full_name for sender in senders),
             realm_str=user_profile.realm.name,
@@ -583,7 +704,10 @@ def do_send_missedmessage_events_reply_in_zulip(
         "reply_to_email": str(Address(display_name=reply_to_name, addr_spec=reply_to_address)),
         "context": context,
     }
-    queue_json_publish("email_senders", email_dict)
+    if batch is not None:
+        batch.emails.append(email_dict)
+    else:
+        queue_json_publish("email_senders", email_dict)
 
     user_profile.last_reminder = timezone_now()
     user_profile.save(update_fields=["last_reminder"])
@@ -596,8 +720,19 @@ class MissedMessageData:
 
 
 def handle_missedmessage_emails(
-    user_profile_id: int, message_ids: dict[int, MissedMessageData]
+    user_profile_id: int,
+    message_ids: dict[int, MissedMessageData],
+    batch: MissedMessageEmailBatch | None = None,
 ) -> None:
+    """Sends the missed-message emails for one user.  To send them for
+    many users, pass a MissedMessageEmailBatch for all of them, and
+    call its publish_emails afterwards."""
+    if batch is None:
+        batch = MissedMessageEmailBatch({user_profile_id: message_ids.keys()})
+        handle_missedmessage_emails(user_profile_id, message_ids, batch)
+        batch.publish_emails()
+        return
+
     user_profile = get_user_profile_by_id(user_profile_id)
     if user_profile.is_bot:  # nocoverage
         # We don't expect to reach here for bot users. However, this code exists
@@ -612,17 +747,7 @@ def handle_missedmessage_emails(
         # BUG: Investigate why it's possible to get here.
         return  # nocoverage
 
-    # Note: This query structure automatically filters out any
-    # messages that were permanently deleted, since those would now be
-    # in the ArchivedMessage table, not the Message table.
-    messages = Message.objects.filter(
-        # Uses index: zerver_message_pkey
-        usermessage__user_profile_id=user_profile,
-        id__in=message_ids,
-        usermessage__flags=~UserMessage.flags.read,
-        # Cancel missed-message emails for deleted messages
-    ).exclude(content="(deleted)")
-
+    messages = batch.get_unread_messages(user_profile_id, message_ids.keys())
     if not messages:
         return
 
@@ -643,8 +768,8 @@ def handle_missedmessage_emails(
 
     for msg_list in messages_by_bucket.values():
         msg = min(msg_list, key=lambda msg: msg.date_sent)
-        if msg.is_stream_message() and UserMessage.has_any_mentions(user_profile_id, msg.id):
-            context_messages = get_context_for_message(msg)
+        if msg.is_stream_message() and batch.has_any_mentions(user_profile_id, msg.id):
+            context_messages = batch.get_context_for_message(msg)
             filtered_context_messages = bulk_access_messages(user_profile, context_messages)
             msg_list.extend(filtered_context_messages)
 
@@ -672,6 +797,7 @@ def handle_missedmessage_emails(
             user_profile,
             list(unique_messages.values()),
             message_count_by_bucket[bucket_tup],
+            batch,
         )
 
 
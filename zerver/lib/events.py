@@ -4,9 +4,12 @@ import copy
 import logging
 import time
 from collections.abc import Callable, Collection, Iterable, Sequence
-from typing import Any
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, TypeVar
 
 from django.conf import settings
+from django.db import connection
 from django.utils.translation import gettext as _
 from typing_extensions import NotRequired, TypedDict
 
@@ -45,6 +48,10 @@ from zerver.lib.onboarding_steps import get_next_onboarding_steps
 from zerver.lib.presence import get_presence_for_user, get_presences_for_realm
 from zerver.lib.realm_icon import realm_icon_url
 from zerver.lib.realm_logo import get_realm_logo_source, get_realm_logo_url
+from zerver.lib.register_snapshot import (
+    get_register_snapshot,
+    get_register_snapshot_sections_for_events,
+)
 from zerver.lib.scheduled_messages import get_undelivered_scheduled_messages
 from zerver.lib.soft_deactivation import reactivate_user_if_soft_deactivated
 from zerver.lib.sounds import get_available_notification_sounds
@@ -73,6 +80,7 @@ from zerver.lib.users import (
     get_users_for_api,
     is_administrator_role,
     max_message_id_for_user,
+    user_dicts_to_columns,
 )
 from zerver.lib.utils import optional_bytes_to_mib
 from zerver.models import (
@@ -104,6 +112,8 @@ from zerver.models.streams import get_default_stream_groups
 from zerver.tornado.django_api import get_user_events, request_event_queue
 from zproject.backends import email_auth_enabled, password_auth_enabled
 
+T = TypeVar("T")
+
 
 def add_realm_logo_fields(state: dict[str, Any], realm: Realm) -> None:
     state["realm_logo_url"] = get_realm_logo_url(realm, night=False)
@@ -124,6 +134,61 @@ def always_want(msg_type: str) -> bool:
     return True
 
 
+register_section_executor: ThreadPoolExecutor | None = None
+
+
+def get_register_section_executor() -> ThreadPoolExecutor:
+    global register_section_executor
+    if register_section_executor is None:
+        register_section_executor = ThreadPoolExecutor(
+            max_workers=settings.REGISTER_SECTION_FETCH_THREADS,
+            thread_name_prefix="register-section",
+        )
+    return register_section_executor
+
+
+def run_register_section(fetch: Callable[[], T]) -> T:
+    try:
+        return fetch()
+    finally:
+        # Each worker thread has its own database connection, which
+        # it keeps for later sections, as requests do, up to
+        # CONN_MAX_AGE; this closes it if it is too old or broken.
+        connection.close_if_unusable_or_obsolete()
+
+
+class RegisterSectionFetcher:
+    """Starts the expensive, independent sections of
+    fetch_initial_state_data early, so that with
+    REGISTER_SECTION_FETCH_THREADS set they run concurrently on
+    separate database connections while the rest of the state is
+    computed.
+
+    submit() returns a function which returns the section's data;
+    fetch_initial_state_data calls it at the point where the section
+    would otherwise have been computed, so the resulting state is
+    assembled in the same order either way.  Without threads, the
+    returned function simply computes the section when called.
+
+    Sections run this way must only read from the database, and must
+    not depend on other parts of the state.
+    """
+
+    def __init__(self) -> None:
+        # Other threads cannot see data written by an uncommitted
+        # transaction (which includes the test suite), so we only use
+        # threads outside of a transaction.
+        self.concurrent = (
+            settings.REGISTER_SECTION_FETCH_THREADS > 0 and not connection.in_atomic_block
+        )
+
+    def submit(self, fetch: Callable[[], T]) -> Callable[[], T]:
+        if not self.concurrent:
+            return fetch
+        future = get_register_section_executor().submit(run_register_section, fetch)
+        return future.result
+
+
 def fetch_initial_state_data(
     user_profile: UserProfile | None,
     *,
@@ -141,6 +206,7 @@ def fetch_initial_state_data(
     pronouns_field_type_supported: bool = True,
     linkifier_url_template: bool = False,
     user_list_incomplete: bool = False,
+    known_section_versions: dict[str, str] | None = None,
 ) -> dict[str, Any]:
     """When `event_types` is None, fetches the core data powering the
     web app's `page_params` and `/api/v1/register` (for mobile/terminal
@@ -161,6 +227,89 @@ def fetch_initial_state_data(
     else:
         want = set(event_types).__contains__
 
+    if presence_last_update_id_fetched_by_client is not None:
+        # This param being submitted by the client, means they want to use
+        # the modern API.
+        slim_presence = True
+
+    # Start the sections that dominate the cost of registering in
+    # large organizations; see RegisterSectionFetcher.
+    section_fetcher = RegisterSectionFetcher()
+    if user_profile is not None:
+        if want("presence"):
+            fetch_presences = section_fetcher.submit(
+                lambda: get_presences_for_realm(
+                    realm,
+                    slim_presence,
+                    last_update_id_fetched_by_client=presence_last_update_id_fetched_by_client,
+                    requesting_user_profile=user_profile,
+                )
+            )
+        if want("recent_private_conversations"):
+            fetch_recent_private_conversations = section_fetcher.submit(
+                lambda: get_recent_private_conversations(user_profile)
+            )
+        if want("subscription"):
+            fetch_subscriptions = section_fetcher.submit(
+                lambda: gather_subscriptions_helper(
+                    user_profile,
+                    include_subscribers=include_subscribers,
+                )
+            )
+        if want("update_message_flags") and want("message"):
+            fetch_raw_unread_msgs = section_fetcher.submit(
+                lambda: get_raw_unread_data(user_profile)
+            )
+        if want("user_status"):
+            fetch_user_status = section_fetcher.submit(
+                lambda: get_all_users_status_dict(realm=realm, user_profile=user_profile)
+            )
+    if want("realm_user"):
+        fetch_raw_users = section_fetcher.submit(
+            lambda: get_users_for_api(
+                realm,
+                user_profile,
+                client_gravatar=client_gravatar,
+                user_avatar_url_field_optional=user_avatar_url_field_optional,
+                # Don't send custom profile field values to spectators.
+                include_custom_profile_fields=user_profile is not None,
+                user_list_incomplete=user_list_incomplete,
+            )
+        )
+
+    # Sections that are identical for every user in the realm are
+    # served from a shared cache; see zerver.lib.register_snapshot.
+    is_guest_or_spectator = user_profile is None or user_profile.is_guest
+    snapshot_fetchers: dict[str, Callable[[], Any]] = {}
+    if want("custom_profile_fields") and user_profile is not None:
+        snapshot_fetchers["custom_profile_fields"] = lambda: [
+            f.as_dict() for f in custom_profile_fields_for_realm(realm.id)
+        ]
+    if want("realm_domains"):
+        snapshot_fetchers["realm_domains"] = lambda: get_realm_domains(realm)
+    if want("realm_emoji"):
+        snapshot_fetchers["realm_emoji"] = lambda: get_all_custom_emoji_for_realm(realm.id)
+    if want("realm_linkifiers") and linkifier_url_template:
+        snapshot_fetchers["realm_linkifiers"] = lambda: linkifiers_for_realm(realm.id)
+    if want("realm_playgrounds"):
+        snapshot_fetchers["realm_playgrounds"] = lambda: get_realm_playgrounds(realm)
+    if want("realm_user_groups"):
+        snapshot_fetchers["realm_user_groups"] = lambda: user_groups_in_realm_serialized(realm)
+    if want("default_streams") and not is_guest_or_spectator:
+        snapshot_fetchers["realm_default_streams"] = lambda: get_default_streams_for_realm_as_dicts(
+            realm.id
+        )
+    if want("default_stream_groups") and not is_guest_or_spectator:
+        snapshot_fetchers["realm_default_stream_groups"] = (
+            lambda: default_stream_groups_to_dicts_sorted(get_default_stream_groups(realm))
+        )
+    snapshot = get_register_snapshot(realm.id, snapshot_fetchers, known_section_versions)
+    realm_snapshot = snapshot.sections
+    if known_section_versions is not None:
+        # Sections the client already has are omitted from the state
+        # below; the client is expected to keep its copy of those.
+        state["section_versions"] = snapshot.versions
+
     # Show the version info unconditionally.
     state["zulip_version"] = ZULIP_VERSION
     state["zulip_feature_level"] = API_FEATURE_LEVEL
@@ -174,16 +323,15 @@ def fetch_initial_state_data(
             # Spectators can't access full user profiles or
             # personal settings, so we send an empty list.
             state["custom_profile_fields"] = []
-        else:
-            fields = custom_profile_fields_for_realm(realm.id)
-            state["custom_profile_fields"] = [f.as_dict() for f in fields]
+        elif "custom_profile_fields" in realm_snapshot:
+            state["custom_profile_fields"] = realm_snapshot["custom_profile_fields"]
         state["custom_profile_field_types"] = {
             item[4]: {"id": item[0], "name": str(item[1])}
             for item in CustomProfileField.ALL_FIELD_TYPES
         }
 
         if not pronouns_field_type_supported:
-            for field in state["custom_profile_fields"]:
+            for field in state.get("custom_profile_fields", []):
                 if field["type"] == CustomProfileField.PRONOUNS:
                     field["type"] = CustomProfileField.SHORT_TEXT
 
@@ -237,18 +385,8 @@ def fetch_initial_state_data(
         state["muted_users"] = [] if user_profile is None else get_user_mutes(user_profile)
 
     if want("presence"):
-        if presence_last_update_id_fetched_by_client is not None:
-            # This param being submitted by the client, means they want to use
-            # the modern API.
-            slim_presence = True
-
         if user_profile is not None:
-            presences, presence_last_update_id_fetched_by_server = get_presences_for_realm(
-                realm,
-                slim_presence,
-                last_update_id_fetched_by_client=presence_last_update_id_fetched_by_client,
-                requesting_user_profile=user_profile,
-            )
+            presences, presence_last_update_id_fetched_by_server = fetch_presences()
             state["presences"] = presences
             state["presence_last_update_id"] = presence_last_update_id_fetched_by_server
         else:
@@ -485,15 +623,16 @@ def fetch_initial_state_data(
             get_available_notification_sounds()
         )
 
-    if want("realm_domains"):
-        state["realm_domains"] = get_realm_domains(realm)
+    if want("realm_domains") and "realm_domains" in realm_snapshot:
+        state["realm_domains"] = realm_snapshot["realm_domains"]
 
-    if want("realm_emoji"):
-        state["realm_emoji"] = get_all_custom_emoji_for_realm(realm.id)
+    if want("realm_emoji") and "realm_emoji" in realm_snapshot:
+        state["realm_emoji"] = realm_snapshot["realm_emoji"]
 
     if want("realm_linkifiers"):
         if linkifier_url_template:
-            state["realm_linkifiers"] = linkifiers_for_realm(realm.id)
+            if "realm_linkifiers" in realm_snapshot:
+                state["realm_linkifiers"] = realm_snapshot["realm_linkifiers"]
         else:
             # When URL template is not supported by the client, return an empty list
             # because the new format is incompatible with the old URL format strings
@@ -507,11 +646,11 @@ def fetch_initial_state_data(
         # backwards-compatible `realm_filters` event would not render the it properly.
         state["realm_filters"] = []
 
-    if want("realm_playgrounds"):
-        state["realm_playgrounds"] = get_realm_playgrounds(realm)
+    if want("realm_playgrounds") and "realm_playgrounds" in realm_snapshot:
+        state["realm_playgrounds"] = realm_snapshot["realm_playgrounds"]
 
-    if want("realm_user_groups"):
-        state["realm_user_groups"] = user_groups_in_realm_serialized(realm)
+    if want("realm_user_groups") and "realm_user_groups" in realm_snapshot:
+        state["realm_user_groups"] = realm_snapshot["realm_user_groups"]
 
     if user_profile is not None:
         settings_user = user_profile
@@ -542,15 +681,7 @@ def fetch_initial_state_data(
             web_home_view="recent_topics",
         )
     if want("realm_user"):
-        state["raw_users"] = get_users_for_api(
-            realm,
-            user_profile,
-            client_gravatar=client_gravatar,
-            user_avatar_url_field_optional=user_avatar_url_field_optional,
-            # Don't send custom profile field values to spectators.
-            include_custom_profile_fields=user_profile is not None,
-            user_list_incomplete=user_list_incomplete,
-        )
+        state["raw_users"] = fetch_raw_users()
         state["cross_realm_bots"] = list(get_cross_realm_dicts())
 
         # For the user's own avatar URL, we force
@@ -646,15 +777,12 @@ def fetch_initial_state_data(
         # which is more efficient to update, and is rewritten to the
         # final format in post_process_state.
         state["raw_recent_private_conversations"] = (
-            {} if user_profile is None else get_recent_private_conversations(user_profile)
+            {} if user_profile is None else fetch_recent_private_conversations()
         )
 
     if want("subscription"):
         if user_profile is not None:
-            sub_info = gather_subscriptions_helper(
-                user_profile,
-                include_subscribers=include_subscribers,
-            )
+            sub_info = fetch_subscriptions()
         else:
             sub_info = get_web_public_subs(realm)
 
@@ -669,7 +797,7 @@ def fetch_initial_state_data(
         # message event.
 
         if user_profile is not None:
-            state["raw_unread_msgs"] = get_raw_unread_data(user_profile)
+            state["raw_unread_msgs"] = fetch_raw_unread_msgs()
         else:
             # For logged-out visitors, we treat all messages as read;
             # calling this helper lets us return empty objects in the
@@ -703,16 +831,14 @@ def fetch_initial_state_data(
             # all default streams, so we pretend the organization
             # doesn't have any.
             state["realm_default_streams"] = []
-        else:
-            state["realm_default_streams"] = get_default_streams_for_realm_as_dicts(realm.id)
+        elif "realm_default_streams" in realm_snapshot:
+            state["realm_default_streams"] = realm_snapshot["realm_default_streams"]
 
     if want("default_stream_groups"):
         if settings_user.is_guest:
             state["realm_default_stream_groups"] = []
-        else:
-            state["realm_default_stream_groups"] = default_stream_groups_to_dicts_sorted(
-                get_default_stream_groups(realm)
-            )
+        elif "realm_default_stream_groups" in realm_snapshot:
+            state["realm_default_stream_groups"] = realm_snapshot["realm_default_stream_groups"]
 
     if want("stop_words"):
         state["stop_words"] = read_stop_words()
@@ -742,11 +868,7 @@ def fetch_initial_state_data(
 
     if want("user_status"):
         # We require creating an account to access statuses.
-        state["user_status"] = (
-            {}
-            if user_profile is None
-            else get_all_users_status_dict(realm=realm, user_profile=user_profile)
-        )
+        state["user_status"] = {} if user_profile is None else fetch_user_status()
 
     if want("user_topic"):
         state["user_topics"] = [] if user_profile is None else get_user_topics(user_profile)
@@ -775,6 +897,18 @@ def fetch_initial_state_data(
     return state
 
 
+@dataclass(frozen=True)
+class ApplyEventOptions:
+    """The parts of the client's /register request that affect how
+    events are applied to its state."""
+
+    client_gravatar: bool
+    slim_presence: bool
+    include_subscribers: bool
+    linkifier_url_template: bool
+    user_list_incomplete: bool
+
+
 def apply_events(
     user_profile: UserProfile,
     *,
@@ -787,6 +921,13 @@ def apply_events(
     linkifier_url_template: bool,
     user_list_incomplete: bool,
 ) -> None:
+    options = ApplyEventOptions(
+        client_gravatar=client_gravatar,
+        slim_presence=slim_presence,
+        include_subscribers=include_subscribers,
+        linkifier_url_template=linkifier_url_template,
+        user_list_incomplete=user_list_incomplete,
+    )
     for event in events:
         if fetch_event_types is not None and event["type"] not in fetch_event_types:
             # TODO: continuing here is not, most precisely, correct.
@@ -798,16 +939,7 @@ def apply_events(
             # `apply_event`.  For now, be careful in your choice of
             # `fetch_event_types`.
             continue
-        apply_event(
-            user_profile,
-            state=state,
-            event=event,
-            client_gravatar=client_gravatar,
-            slim_presence=slim_presence,
-            include_subscribers=include_subscribers,
-            linkifier_url_template=linkifier_url_template,
-            user_list_incomplete=user_list_incomplete,
-        )
+        apply_event(user_profile, state=state, event=event, options=options)
 
 
 def apply_event(
@@ -815,843 +947,1102 @@ def apply_event(
     *,
     state: dict[str, Any],
     event: dict[str, Any],
-    client_gravatar: bool,
-    slim_presence: bool,
-    include_subscribers: bool,
-    linkifier_url_template: bool,
-    user_list_incomplete: bool,
+    options: ApplyEventOptions,
 ) -> None:
-    if event["type"] == "message":
-        state["max_message_id"] = max(state["max_message_id"], event["message"]["id"])
-        if "raw_unread_msgs" in state and "read" not in event["flags"]:
-            apply_unread_message_event(
-                user_profile,
-                state["raw_unread_msgs"],
-                event["message"],
-                event["flags"],
+    """Updates state, as returned by fetch_initial_state_data, to
+    reflect the event.  Each event type has its own function in
+    EVENT_APPLIERS, which only touches the parts of the state that
+    events of that type can change; so the state can be kept up to
+    date one event at a time."""
+    applier = EVENT_APPLIERS.get(event["type"])
+    if applier is None:
+        raise AssertionError("Unexpected event type {}".format(event["type"]))
+    applier(user_profile, state, event, options)
+
+
+def ignore_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    pass
+
+
+def apply_message_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    state["max_message_id"] = max(state["max_message_id"], event["message"]["id"])
+    if "raw_unread_msgs" in state and "read" not in event["flags"]:
+        apply_unread_message_event(
+            user_profile,
+            state["raw_unread_msgs"],
+            event["message"],
+            event["flags"],
+        )
+
+    if event["message"]["type"] != "stream":
+        if "raw_recent_private_conversations" in state:
+            # Handle maintaining the recent_private_conversations data structure.
+            conversations = state["raw_recent_private_conversations"]
+            recipient_id = get_recent_conversations_recipient_id(
+                user_profile, event["message"]["recipient_id"], event["message"]["sender_id"]
             )
 
-        if event["message"]["type"] != "stream":
-            if "raw_recent_private_conversations" in state:
-                # Handle maintaining the recent_private_conversations data structure.
-                conversations = state["raw_recent_private_conversations"]
-                recipient_id = get_recent_conversations_recipient_id(
-                    user_profile, event["message"]["recipient_id"], event["message"]["sender_id"]
+            if recipient_id not in conversations:
+                conversations[recipient_id] = dict(
+                    user_ids=sorted(
+                        user_dict["id"]
+                        for user_dict in event["message"]["display_recipient"]
+                        if user_dict["id"] != user_profile.id
+                    ),
                 )
+            conversations[recipient_id]["max_message_id"] = event["message"]["id"]
+        return
+
+    # Below, we handle maintaining first_message_id.
+    for sub_dict in state.get("subscriptions", []):
+        if (
+            event["message"]["stream_id"] == sub_dict["stream_id"]
+            and sub_dict["first_message_id"] is None
+        ):
+            sub_dict["first_message_id"] = event["message"]["id"]
+    for stream_dict in state.get("streams", []):
+        if (
+            event["message"]["stream_id"] == stream_dict["stream_id"]
+            and stream_dict["first_message_id"] is None
+        ):
+            stream_dict["first_message_id"] = event["message"]["id"]
+
+
+def apply_drafts_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    if event["op"] == "add":
+        state["drafts"].extend(event["drafts"])
+    else:
+        if event["op"] == "update":
+            event_draft_idx = event["draft"]["id"]
 
-                if recipient_id not in conversations:
-                    conversations[recipient_id] = dict(
-                        user_ids=sorted(
-                            user_dict["id"]
-                            for user_dict in event["message"]["display_recipient"]
-                            if user_dict["id"] != user_profile.id
-                        ),
-                    )
-                conversations[recipient_id]["max_message_id"] = event["message"]["id"]
-            return
+            def _draft_update_action(i: int) -> None:
+                state["drafts"][i] = event["draft"]
 
-        # Below, we handle maintaining first_message_id.
-        for sub_dict in state.get("subscriptions", []):
-            if (
-                event["message"]["stream_id"] == sub_dict["stream_id"]
-                and sub_dict["first_message_id"] is None
-            ):
-                sub_dict["first_message_id"] = event["message"]["id"]
-        for stream_dict in state.get("streams", []):
-            if (
-                event["message"]["stream_id"] == stream_dict["stream_id"]
-                and stream_dict["first_message_id"] is None
-            ):
-                stream_dict["first_message_id"] = event["message"]["id"]
+        elif event["op"] == "remove":
+            event_draft_idx = event["draft_id"]
 
-    elif event["type"] == "heartbeat":
-        # It may be impossible for a heartbeat event to actually reach
-        # this code path. But in any case, they're noops.
-        pass
+            def _draft_update_action(i: int) -> None:
+                del state["drafts"][i]
 
-    elif event["type"] == "drafts":
-        if event["op"] == "add":
-            state["drafts"].extend(event["drafts"])
-        else:
-            if event["op"] == "update":
-                event_draft_idx = event["draft"]["id"]
-
-                def _draft_update_action(i: int) -> None:
-                    state["drafts"][i] = event["draft"]
-
-            elif event["op"] == "remove":
-                event_draft_idx = event["draft_id"]
-
-                def _draft_update_action(i: int) -> None:
-                    del state["drafts"][i]
-
-            # We have to perform a linear search for the draft that
-            # was either edited or removed since we have a list
-            # ordered by the last edited timestamp and not id.
-            state_draft_idx = None
-            for idx, draft in enumerate(state["drafts"]):
-                if draft["id"] == event_draft_idx:
-                    state_draft_idx = idx
-                    break
-            assert state_draft_idx is not None
-            _draft_update_action(state_draft_idx)
-
-    elif event["type"] == "scheduled_messages":
-        if event["op"] == "add":
-            # Since bulk addition of scheduled messages will not be used by a normal user.
-            assert len(event["scheduled_messages"]) == 1
+        # We have to perform a linear search for the draft that
+        # was either edited or removed since we have a list
+        # ordered by the last edited timestamp and not id.
+        state_draft_idx = None
+        for idx, draft in enumerate(state["drafts"]):
+            if draft["id"] == event_draft_idx:
+                state_draft_idx = idx
+                break
+        assert state_draft_idx is not None
+        _draft_update_action(state_draft_idx)
 
-            state["scheduled_messages"].append(event["scheduled_messages"][0])
-            # Sort in ascending order of scheduled_delivery_timestamp.
-            state["scheduled_messages"].sort(
-                key=lambda scheduled_message: scheduled_message["scheduled_delivery_timestamp"]
-            )
 
-        if event["op"] == "update":
-            for idx, scheduled_message in enumerate(state["scheduled_messages"]):
+def apply_scheduled_messages_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    if event["op"] == "add":
+        # Since bulk addition of scheduled messages will not be used by a normal user.
+        assert len(event["scheduled_messages"]) == 1
+
+        state["scheduled_messages"].append(event["scheduled_messages"][0])
+        # Sort in ascending order of scheduled_delivery_timestamp.
+        state["scheduled_messages"].sort(
+            key=lambda scheduled_message: scheduled_message["scheduled_delivery_timestamp"]
+        )
+
+    if event["op"] == "update":
+        for idx, scheduled_message in enumerate(state["scheduled_messages"]):
+            if (
+                scheduled_message["scheduled_message_id"]
+                == event["scheduled_message"]["scheduled_message_id"]
+            ):
+                state["scheduled_messages"][idx] = event["scheduled_message"]
+                # If scheduled_delivery_timestamp was changed, we need to sort it again.
                 if (
-                    scheduled_message["scheduled_message_id"]
-                    == event["scheduled_message"]["scheduled_message_id"]
+                    scheduled_message["scheduled_delivery_timestamp"]
+                    != event["scheduled_message"]["scheduled_delivery_timestamp"]
                 ):
-                    state["scheduled_messages"][idx] = event["scheduled_message"]
-                    # If scheduled_delivery_timestamp was changed, we need to sort it again.
-                    if (
-                        scheduled_message["scheduled_delivery_timestamp"]
-                        != event["scheduled_message"]["scheduled_delivery_timestamp"]
-                    ):
-                        state["scheduled_messages"].sort(
-                            key=lambda scheduled_message: scheduled_message[
-                                "scheduled_delivery_timestamp"
-                            ]
-                        )
-                    break
+                    state["scheduled_messages"].sort(
+                        key=lambda scheduled_message: scheduled_message[
+                            "scheduled_delivery_timestamp"
+                        ]
+                    )
+                break
 
-        if event["op"] == "remove":
-            for idx, scheduled_message in enumerate(state["scheduled_messages"]):
-                if scheduled_message["scheduled_message_id"] == event["scheduled_message_id"]:
-                    del state["scheduled_messages"][idx]
-
-    elif event["type"] == "onboarding_steps":
-        state["onboarding_steps"] = event["onboarding_steps"]
-    elif event["type"] == "custom_profile_fields":
-        state["custom_profile_fields"] = event["fields"]
-        custom_profile_field_ids = {field["id"] for field in state["custom_profile_fields"]}
-
-        if "raw_users" in state:
-            for user_dict in state["raw_users"].values():
-                if "profile_data" not in user_dict:
-                    continue
-                profile_data = user_dict["profile_data"]
-                for field_id, field_data in list(profile_data.items()):
-                    if int(field_id) not in custom_profile_field_ids:
-                        del profile_data[field_id]
-    elif event["type"] == "realm_user":
-        person = event["person"]
-        person_user_id = person["user_id"]
+    if event["op"] == "remove":
+        for idx, scheduled_message in enumerate(state["scheduled_messages"]):
+            if scheduled_message["scheduled_message_id"] == event["scheduled_message_id"]:
+                del state["scheduled_messages"][idx]
 
-        if event["op"] == "add":
-            person = copy.deepcopy(person)
-
-            if client_gravatar:
-                email_address_visibility = UserProfile.objects.get(
-                    id=person_user_id
-                ).email_address_visibility
-                if email_address_visibility != UserProfile.EMAIL_ADDRESS_VISIBILITY_EVERYONE:
-                    client_gravatar = False
-
-            if client_gravatar and person["avatar_url"].startswith("https://secure.gravatar.com/"):
-                person["avatar_url"] = None
-            person["is_active"] = True
-            if not person["is_bot"]:
-                person["profile_data"] = {}
-            state["raw_users"][person_user_id] = person
-        elif event["op"] == "update":
-            is_me = person_user_id == user_profile.id
-
-            if is_me:
-                if "avatar_url" in person and "avatar_url" in state:
-                    state["avatar_source"] = person["avatar_source"]
-                    state["avatar_url"] = person["avatar_url"]
-                    state["avatar_url_medium"] = person["avatar_url_medium"]
-
-                if "role" in person:
-                    state["is_admin"] = is_administrator_role(person["role"])
-                    state["is_owner"] = person["role"] == UserProfile.ROLE_REALM_OWNER
-                    state["is_moderator"] = person["role"] == UserProfile.ROLE_MODERATOR
-                    state["is_guest"] = person["role"] == UserProfile.ROLE_GUEST
-                    # Recompute properties based on is_admin/is_guest
-                    state["can_create_private_streams"] = user_profile.can_create_private_streams()
-                    state["can_create_public_streams"] = user_profile.can_create_public_streams()
-                    state["can_create_web_public_streams"] = (
-                        user_profile.can_create_web_public_streams()
-                    )
-                    state["can_create_streams"] = (
-                        state["can_create_private_streams"]
-                        or state["can_create_public_streams"]
-                        or state["can_create_web_public_streams"]
-                    )
-                    state["can_subscribe_other_users"] = user_profile.can_subscribe_other_users()
-                    state["can_invite_others_to_realm"] = user_profile.can_invite_users_by_email()
-
-                    if state["is_guest"]:
-                        state["realm_default_streams"] = []
-                    else:
-                        state["realm_default_streams"] = get_default_streams_for_realm_as_dicts(
-                            user_profile.realm_id
-                        )
 
-                for field in ["delivery_email", "email", "full_name", "is_billing_admin"]:
-                    if field in person and field in state:
-                        state[field] = person[field]
-
-                if "new_email" in person:
-                    state["email"] = person["new_email"]
-
-                # In the unlikely event that the current user
-                # just changed to/from being an admin, we need
-                # to add/remove the data on all bots in the
-                # realm.  This is ugly and probably better
-                # solved by removing the all-realm-bots data
-                # given to admin users from this flow.
-                if "role" in person and "realm_bots" in state:
-                    prev_state = state["raw_users"][user_profile.id]
-                    was_admin = prev_state["is_admin"]
-                    now_admin = is_administrator_role(person["role"])
-
-                    if was_admin and not now_admin:
-                        state["realm_bots"] = []
-                    if not was_admin and now_admin:
-                        state["realm_bots"] = get_owned_bot_dicts(user_profile)
-
-            if person_user_id in state["raw_users"]:
-                p = state["raw_users"][person_user_id]
-
-                if "avatar_url" in person:
-                    # Respect the client_gravatar setting in the `users` data.
-                    if client_gravatar:
-                        email_address_visibility = UserProfile.objects.get(
-                            id=person_user_id
-                        ).email_address_visibility
-                        if (
-                            email_address_visibility
-                            != UserProfile.EMAIL_ADDRESS_VISIBILITY_EVERYONE
-                        ):
-                            client_gravatar = False
-
-                    if client_gravatar and person["avatar_url"].startswith(
-                        "https://secure.gravatar.com/"
-                    ):
-                        person["avatar_url"] = None
-                        person["avatar_url_medium"] = None
-
-                for field in p:
-                    if field in person:
-                        p[field] = person[field]
-
-                if "role" in person:
-                    p["is_admin"] = is_administrator_role(person["role"])
-                    p["is_owner"] = person["role"] == UserProfile.ROLE_REALM_OWNER
-                    p["is_guest"] = person["role"] == UserProfile.ROLE_GUEST
-
-                if "is_billing_admin" in person:
-                    p["is_billing_admin"] = person["is_billing_admin"]
-
-                if "custom_profile_field" in person:
-                    custom_field_id = str(person["custom_profile_field"]["id"])
-                    custom_field_new_value = person["custom_profile_field"]["value"]
-                    if custom_field_new_value is None and "profile_data" in p:
-                        p["profile_data"].pop(custom_field_id, None)
-                    elif "rendered_value" in person["custom_profile_field"]:
-                        p["profile_data"][custom_field_id] = {
-                            "value": custom_field_new_value,
-                            "rendered_value": person["custom_profile_field"]["rendered_value"],
-                        }
-                    else:
-                        p["profile_data"][custom_field_id] = {
-                            "value": custom_field_new_value,
-                        }
-
-                if "new_email" in person:
-                    p["email"] = person["new_email"]
-
-                if "is_active" in person and not person["is_active"] and include_subscribers:
-                    for sub in state["subscriptions"]:
-                        sub["subscribers"] = [
-                            user_id for user_id in sub["subscribers"] if user_id != person_user_id
-                        ]
-        elif event["op"] == "remove":
-            if person_user_id in state["raw_users"]:
-                if user_list_incomplete:
-                    del state["raw_users"][person_user_id]
+def apply_onboarding_steps_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    state["onboarding_steps"] = event["onboarding_steps"]
+
+
+def apply_custom_profile_fields_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    state["custom_profile_fields"] = event["fields"]
+    custom_profile_field_ids = {field["id"] for field in state["custom_profile_fields"]}
+
+    if "raw_users" in state:
+        for user_dict in state["raw_users"].values():
+            if "profile_data" not in user_dict:
+                continue
+            profile_data = user_dict["profile_data"]
+            for field_id, field_data in list(profile_data.items()):
+                if int(field_id) not in custom_profile_field_ids:
+                    del profile_data[field_id]
+
+
+def apply_realm_user_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    client_gravatar = options.client_gravatar
+    person = event["person"]
+    person_user_id = person["user_id"]
+
+    if event["op"] == "add":
+        person = copy.deepcopy(person)
+
+        if client_gravatar:
+            email_address_visibility = UserProfile.objects.get(
+                id=person_user_id
+            ).email_address_visibility
+            if email_address_visibility != UserProfile.EMAIL_ADDRESS_VISIBILITY_EVERYONE:
+                client_gravatar = False
+
+        if client_gravatar and person["avatar_url"].startswith("https://secure.gravatar.com/"):
+            person["avatar_url"] = None
+        person["is_active"] = True
+        if not person["is_bot"]:
+            person["profile_data"] = {}
+        state["raw_users"][person_user_id] = person
+    elif event["op"] == "update":
+        is_me = person_user_id == user_profile.id
+
+        if is_me:
+            if "avatar_url" in person and "avatar_url" in state:
+                state["avatar_source"] = person["avatar_source"]
+                state["avatar_url"] = person["avatar_url"]
+                state["avatar_url_medium"] = person["avatar_url_medium"]
+
+            if "role" in person:
+                state["is_admin"] = is_administrator_role(person["role"])
+                state["is_owner"] = person["role"] == UserProfile.ROLE_REALM_OWNER
+                state["is_moderator"] = person["role"] == UserProfile.ROLE_MODERATOR
+                state["is_guest"] = person["role"] == UserProfile.ROLE_GUEST
+                # Recompute properties based on is_admin/is_guest
+                state["can_create_private_streams"] = user_profile.can_create_private_streams()
+                state["can_create_public_streams"] = user_profile.can_create_public_streams()
+                state["can_create_web_public_streams"] = (
+                    user_profile.can_create_web_public_streams()
+                )
+                state["can_create_streams"] = (
+                    state["can_create_private_streams"]
+                    or state["can_create_public_streams"]
+                    or state["can_create_web_public_streams"]
+                )
+                state["can_subscribe_other_users"] = user_profile.can_subscribe_other_users()
+                state["can_invite_others_to_realm"] = user_profile.can_invite_users_by_email()
+
+                if state["is_guest"]:
+                    state["realm_default_streams"] = []
                 else:
-                    inaccessible_user_dict = get_data_for_inaccessible_user(
-                        user_profile.realm, person_user_id
+                    state["realm_default_streams"] = get_default_streams_for_realm_as_dicts(
+                        user_profile.realm_id
                     )
-                    state["raw_users"][person_user_id] = inaccessible_user_dict
 
-            if include_subscribers:
+            for field in ["delivery_email", "email", "full_name", "is_billing_admin"]:
+                if field in person and field in state:
+                    state[field] = person[field]
+
+            if "new_email" in person:
+                state["email"] = person["new_email"]
+
+            # In the unlikely event that the current user
+            # just changed to/from being an admin, we need
+            # to add/remove the data on all bots in the
+            # realm.  This is ugly and probably better
+            # solved by removing the all-realm-bots data
+            # given to admin users from this flow.
+            if "role" in person and "realm_bots" in state:
+                prev_state = state["raw_users"][user_profile.id]
+                was_admin = prev_state["is_admin"]
+                now_admin = is_administrator_role(person["role"])
+
+                if was_admin and not now_admin:
+                    state["realm_bots"] = []
+                if not was_admin and now_admin:
+                    state["realm_bots"] = get_owned_bot_dicts(user_profile)
+
+        if person_user_id in state["raw_users"]:
+            p = state["raw_users"][person_user_id]
+
+            if "avatar_url" in person:
+                # Respect the client_gravatar setting in the `users` data.
+                if client_gravatar:
+                    email_address_visibility = UserProfile.objects.get(
+                        id=person_user_id
+                    ).email_address_visibility
+                    if email_address_visibility != UserProfile.EMAIL_ADDRESS_VISIBILITY_EVERYONE:
+                        client_gravatar = False
+
+                if client_gravatar and person["avatar_url"].startswith(
+                    "https://secure.gravatar.com/"
+                ):
+                    person["avatar_url"] = None
+                    person["avatar_url_medium"] = None
+
+            for field in p:
+                if field in person:
+                    p[field] = person[field]
+
+            if "role" in person:
+                p["is_admin"] = is_administrator_role(person["role"])
+                p["is_owner"] = person["role"] == UserProfile.ROLE_REALM_OWNER
+                p["is_guest"] = person["role"] == UserProfile.ROLE_GUEST
+
+            if "is_billing_admin" in person:
+                p["is_billing_admin"] = person["is_billing_admin"]
+
+            if "custom_profile_field" in person:
+                custom_field_id = str(person["custom_profile_field"]["id"])
+                custom_field_new_value = person["custom_profile_field"]["value"]
+                if custom_field_new_value is None and "profile_data" in p:
+                    p["profile_data"].pop(custom_field_id, None)
+                elif "rendered_value" in person["custom_profile_field"]:
+                    p["profile_data"][custom_field_id] = {
+                        "value": custom_field_new_value,
+                        "rendered_value": person["custom_profile_field"]["rendered_value"],
+                    }
+                else:
+                    p["profile_data"][custom_field_id] = {
+                        "value": custom_field_new_value,
+                    }
+
+            if "new_email" in person:
+                p["email"] = person["new_email"]
+
+            if "is_active" in person and not person["is_active"] and options.include_subscribers:
                 for sub in state["subscriptions"]:
                     sub["subscribers"] = [
                         user_id for user_id in sub["subscribers"] if user_id != person_user_id
                     ]
-        else:
-            raise AssertionError("Unexpected event type {type}/{op}".format(**event))
-    elif event["type"] == "realm_bot":
-        if event["op"] == "add":
-            state["realm_bots"].append(event["bot"])
-        elif event["op"] == "delete":
-            state["realm_bots"] = [
-                item for item in state["realm_bots"] if item["user_id"] != event["bot"]["user_id"]
-            ]
-        elif event["op"] == "update":
-            for bot in state["realm_bots"]:
-                if bot["user_id"] == event["bot"]["user_id"]:
-                    if "owner_id" in event["bot"]:
-                        bot_owner_id = event["bot"]["owner_id"]
-                        bot["owner_id"] = bot_owner_id
-                    else:
-                        bot.update(event["bot"])
-        else:
-            raise AssertionError("Unexpected event type {type}/{op}".format(**event))
-    elif event["type"] == "stream":
-        if event["op"] == "create":
-            for stream in event["streams"]:
-                stream_data = copy.deepcopy(stream)
-                if include_subscribers:
-                    stream_data["subscribers"] = []
-
-                # Here we need to query the database to check whether the
-                # user was previously subscribed. If they were, we need to
-                # include the stream in the unsubscribed list after adding
-                # personal subscription metadata (such as configured stream
-                # color; most of the other personal setting have no effect
-                # when not subscribed).
-                unsubscribed_stream_sub = Subscription.objects.filter(
-                    user_profile=user_profile,
-                    recipient__type_id=stream["stream_id"],
-                    recipient__type=Recipient.STREAM,
-                ).values(
-                    *Subscription.API_FIELDS,
-                    "recipient_id",
-                    "active",
+    elif event["op"] == "remove":
+        if person_user_id in state["raw_users"]:
+            if options.user_list_incomplete:
+                del state["raw_users"][person_user_id]
+            else:
+                inaccessible_user_dict = get_data_for_inaccessible_user(
+                    user_profile.realm, person_user_id
                 )
+                state["raw_users"][person_user_id] = inaccessible_user_dict
 
-                if len(unsubscribed_stream_sub) == 1:
-                    unsubscribed_stream_dict = build_unsubscribed_sub_from_stream_dict(
-                        user_profile, unsubscribed_stream_sub[0], stream_data
-                    )
-                    if include_subscribers:
-                        unsubscribed_stream_dict["subscribers"] = []
-                    state["unsubscribed"].append(unsubscribed_stream_dict)
+        if options.include_subscribers:
+            for sub in state["subscriptions"]:
+                sub["subscribers"] = [
+                    user_id for user_id in sub["subscribers"] if user_id != person_user_id
+                ]
+    else:
+        raise AssertionError("Unexpected event type {type}/{op}".format(**event))
+
+
+def apply_realm_bot_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    if event["op"] == "add":
+        state["realm_bots"].append(event["bot"])
+    elif event["op"] == "delete":
+        state["realm_bots"] = [
+            item for item in state["realm_bots"] if item["user_id"] != event["bot"]["user_id"]
+        ]
+    elif event["op"] == "update":
+        for bot in state["realm_bots"]:
+            if bot["user_id"] == event["bot"]["user_id"]:
+                if "owner_id" in event["bot"]:
+                    bot_owner_id = event["bot"]["owner_id"]
+                    bot["owner_id"] = bot_owner_id
                 else:
-                    assert len(unsubscribed_stream_sub) == 0
-                    state["never_subscribed"].append(stream_data)
+                    bot.update(event["bot"])
+    else:
+        raise AssertionError("Unexpected event type {type}/{op}".format(**event))
 
-                if "streams" in state:
-                    state["streams"].append(stream)
 
-            state["unsubscribed"].sort(key=lambda elt: elt["name"])
-            state["never_subscribed"].sort(key=lambda elt: elt["name"])
-            if "streams" in state:
-                state["streams"].sort(key=lambda elt: elt["name"])
+def apply_stream_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    if event["op"] == "create":
+        for stream in event["streams"]:
+            stream_data = copy.deepcopy(stream)
+            if options.include_subscribers:
+                stream_data["subscribers"] = []
+
+            # Here we need to query the database to check whether the
+            # user was previously subscribed. If they were, we need to
+            # include the stream in the unsubscribed list after adding
+            # personal subscription metadata (such as configured stream
+            # color; most of the other personal setting have no effect
+            # when not subscribed).
+            unsubscribed_stream_sub = Subscription.objects.filter(
+                user_profile=user_profile,
+                recipient__type_id=stream["stream_id"],
+                recipient__type=Recipient.STREAM,
+            ).values(
+                *Subscription.API_FIELDS,
+                "recipient_id",
+                "active",
+            )
 
-        if event["op"] == "delete":
-            deleted_stream_ids = {stream["stream_id"] for stream in event["streams"]}
-            if "streams" in state:
-                state["streams"] = [
-                    s for s in state["streams"] if s["stream_id"] not in deleted_stream_ids
-                ]
+            if len(unsubscribed_stream_sub) == 1:
+                unsubscribed_stream_dict = build_unsubscribed_sub_from_stream_dict(
+                    user_profile, unsubscribed_stream_sub[0], stream_data
+                )
+                if options.include_subscribers:
+                    unsubscribed_stream_dict["subscribers"] = []
+                state["unsubscribed"].append(unsubscribed_stream_dict)
+            else:
+                assert len(unsubscribed_stream_sub) == 0
+                state["never_subscribed"].append(stream_data)
 
-            state["subscriptions"] = [
-                stream
-                for stream in state["subscriptions"]
-                if stream["stream_id"] not in deleted_stream_ids
+            if "streams" in state:
+                state["streams"].append(stream)
+
+        state["unsubscribed"].sort(key=lambda elt: elt["name"])
+        state["never_subscribed"].sort(key=lambda elt: elt["name"])
+        if "streams" in state:
+            state["streams"].sort(key=lambda elt: elt["name"])
+
+    if event["op"] == "delete":
+        deleted_stream_ids = {stream["stream_id"] for stream in event["streams"]}
+        if "streams" in state:
+            state["streams"] = [
+                s for s in state["streams"] if s["stream_id"] not in deleted_stream_ids
             ]
 
-            state["unsubscribed"] = [
-                stream
-                for stream in state["unsubscribed"]
-                if stream["stream_id"] not in deleted_stream_ids
-            ]
+        state["subscriptions"] = [
+            stream
+            for stream in state["subscriptions"]
+            if stream["stream_id"] not in deleted_stream_ids
+        ]
 
-            state["never_subscribed"] = [
-                stream
-                for stream in state["never_subscribed"]
-                if stream["stream_id"] not in deleted_stream_ids
-            ]
+        state["unsubscribed"] = [
+            stream
+            for stream in state["unsubscribed"]
+            if stream["stream_id"] not in deleted_stream_ids
+        ]
 
-        if event["op"] == "update":
-            # For legacy reasons, we call stream data 'subscriptions' in
-            # the state var here, for the benefit of the JS code.
-            for sub_list in [
-                state["subscriptions"],
-                state["unsubscribed"],
-                state["never_subscribed"],
-            ]:
-                for obj in sub_list:
-                    if obj["name"].lower() == event["name"].lower():
-                        obj[event["property"]] = event["value"]
-                        if event["property"] == "description":
-                            obj["rendered_description"] = event["rendered_description"]
+        state["never_subscribed"] = [
+            stream
+            for stream in state["never_subscribed"]
+            if stream["stream_id"] not in deleted_stream_ids
+        ]
+
+    if event["op"] == "update":
+        # For legacy reasons, we call stream data 'subscriptions' in
+        # the state var here, for the benefit of the JS code.
+        for sub_list in [
+            state["subscriptions"],
+            state["unsubscribed"],
+            state["never_subscribed"],
+        ]:
+            for obj in sub_list:
+                if obj["name"].lower() == event["name"].lower():
+                    obj[event["property"]] = event["value"]
+                    if event["property"] == "description":
+                        obj["rendered_description"] = event["rendered_description"]
+                    if event.get("history_public_to_subscribers") is not None:
+                        obj["history_public_to_subscribers"] = event[
+                            "history_public_to_subscribers"
+                        ]
+                    if event.get("is_web_public") is not None:
+                        obj["is_web_public"] = event["is_web_public"]
+        # Also update the pure streams data
+        if "streams" in state:
+            for stream in state["streams"]:
+                if stream["name"].lower() == event["name"].lower():
+                    prop = event["property"]
+                    if prop in stream:
+                        stream[prop] = event["value"]
+                        if prop == "description":
+                            stream["rendered_description"] = event["rendered_description"]
                         if event.get("history_public_to_subscribers") is not None:
-                            obj["history_public_to_subscribers"] = event[
+                            stream["history_public_to_subscribers"] = event[
                                 "history_public_to_subscribers"
                             ]
                         if event.get("is_web_public") is not None:
-                            obj["is_web_public"] = event["is_web_public"]
-            # Also update the pure streams data
-            if "streams" in state:
-                for stream in state["streams"]:
-                    if stream["name"].lower() == event["name"].lower():
-                        prop = event["property"]
-                        if prop in stream:
-                            stream[prop] = event["value"]
-                            if prop == "description":
-                                stream["rendered_description"] = event["rendered_description"]
-                            if event.get("history_public_to_subscribers") is not None:
-                                stream["history_public_to_subscribers"] = event[
-                                    "history_public_to_subscribers"
-                                ]
-                            if event.get("is_web_public") is not None:
-                                stream["is_web_public"] = event["is_web_public"]
-
-    elif event["type"] == "default_streams":
-        state["realm_default_streams"] = event["default_streams"]
-    elif event["type"] == "default_stream_groups":
-        state["realm_default_stream_groups"] = event["default_stream_groups"]
-    elif event["type"] == "realm":
-        if event["op"] == "update":
-            field = "realm_" + event["property"]
-            state[field] = event["value"]
-
-            if event["property"] == "plan_type":
-                # Then there are some extra fields that also need to be set.
-                state["zulip_plan_is_not_limited"] = event["value"] != Realm.PLAN_TYPE_LIMITED
-                # upload_quota is in bytes, so we need to convert it to MiB.
-                upload_quota_bytes = event["extra_data"]["upload_quota"]
-                state["realm_upload_quota_mib"] = optional_bytes_to_mib(upload_quota_bytes)
-
-            if field == "realm_jitsi_server_url":
-                state["jitsi_server_url"] = (
-                    state["realm_jitsi_server_url"]
-                    if state["realm_jitsi_server_url"] is not None
-                    else state["server_jitsi_server_url"]
-                )
+                            stream["is_web_public"] = event["is_web_public"]
 
-            policy_permission_dict = {
-                "invite_to_stream_policy": "can_subscribe_other_users",
-                "invite_to_realm_policy": "can_invite_others_to_realm",
-            }
 
-            # Tricky interaction: Whether we can create streams and can subscribe other users
-            # can get changed here.
+def apply_default_streams_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    state["realm_default_streams"] = event["default_streams"]
+
 
-            if field == "realm_waiting_period_threshold":
-                for policy, permission in policy_permission_dict.items():
-                    if permission in state:
-                        state[permission] = user_profile.has_permission(policy)
+def apply_default_stream_groups_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    state["realm_default_stream_groups"] = event["default_stream_groups"]
 
-            if (
-                event["property"] in policy_permission_dict
-                and policy_permission_dict[event["property"]] in state
-            ):
-                state[policy_permission_dict[event["property"]]] = user_profile.has_permission(
-                    event["property"]
+
+def apply_realm_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    if event["op"] == "update":
+        field = "realm_" + event["property"]
+        state[field] = event["value"]
+
+        if event["property"] == "plan_type":
+            # Then there are some extra fields that also need to be set.
+            state["zulip_plan_is_not_limited"] = event["value"] != Realm.PLAN_TYPE_LIMITED
+            # upload_quota is in bytes, so we need to convert it to MiB.
+            upload_quota_bytes = event["extra_data"]["upload_quota"]
+            state["realm_upload_quota_mib"] = optional_bytes_to_mib(upload_quota_bytes)
+
+        if field == "realm_jitsi_server_url":
+            state["jitsi_server_url"] = (
+                state["realm_jitsi_server_url"]
+                if state["realm_jitsi_server_url"] is not None
+                else state["server_jitsi_server_url"]
+            )
+
+        policy_permission_dict = {
+            "invite_to_stream_policy": "can_subscribe_other_users",
+            "invite_to_realm_policy": "can_invite_others_to_realm",
+        }
+
+        # Tricky interaction: Whether we can create streams and can subscribe other users
+        # can get changed here.
+
+        if field == "realm_waiting_period_threshold":
+            for policy, permission in policy_permission_dict.items():
+                if permission in state:
+                    state[permission] = user_profile.has_permission(policy)
+
+        if (
+            event["property"] in policy_permission_dict
+            and policy_permission_dict[event["property"]] in state
+        ):
+            state[policy_permission_dict[event["property"]]] = user_profile.has_permission(
+                event["property"]
+            )
+    elif event["op"] == "update_dict":
+        for key, value in event["data"].items():
+            state["realm_" + key] = value
+            # It's a bit messy, but this is where we need to
+            # update the state for whether password authentication
+            # is enabled on this server.
+            if key == "authentication_methods":
+                state["realm_password_auth_enabled"] = (
+                    value["Email"]["enabled"] or value["LDAP"]["enabled"]
                 )
-        elif event["op"] == "update_dict":
-            for key, value in event["data"].items():
-                state["realm_" + key] = value
-                # It's a bit messy, but this is where we need to
-                # update the state for whether password authentication
-                # is enabled on this server.
-                if key == "authentication_methods":
-                    state["realm_password_auth_enabled"] = (
-                        value["Email"]["enabled"] or value["LDAP"]["enabled"]
-                    )
-                    state["realm_email_auth_enabled"] = value["Email"]["enabled"]
-
-                if key in [
-                    "can_create_public_channel_group",
-                    "can_create_private_channel_group",
-                    "can_create_web_public_channel_group",
-                ]:
-                    if key == "can_create_public_channel_group":
-                        state["realm_create_public_stream_policy"] = (
-                            get_corresponding_policy_value_for_group_setting(
-                                user_profile.realm,
-                                "can_create_public_channel_group",
-                                Realm.COMMON_POLICY_TYPES,
-                            )
+                state["realm_email_auth_enabled"] = value["Email"]["enabled"]
+
+            if key in [
+                "can_create_public_channel_group",
+                "can_create_private_channel_group",
+                "can_create_web_public_channel_group",
+            ]:
+                if key == "can_create_public_channel_group":
+                    state["realm_create_public_stream_policy"] = (
+                        get_corresponding_policy_value_for_group_setting(
+                            user_profile.realm,
+                            "can_create_public_channel_group",
+                            Realm.COMMON_POLICY_TYPES,
                         )
-                        state["can_create_public_streams"] = user_profile.has_permission(key)
-                    elif key == "can_create_private_channel_group":
-                        state["realm_create_private_stream_policy"] = (
-                            get_corresponding_policy_value_for_group_setting(
-                                user_profile.realm,
-                                "can_create_private_channel_group",
-                                Realm.COMMON_POLICY_TYPES,
-                            )
+                    )
+                    state["can_create_public_streams"] = user_profile.has_permission(key)
+                elif key == "can_create_private_channel_group":
+                    state["realm_create_private_stream_policy"] = (
+                        get_corresponding_policy_value_for_group_setting(
+                            user_profile.realm,
+                            "can_create_private_channel_group",
+                            Realm.COMMON_POLICY_TYPES,
                         )
-                        state["can_create_private_streams"] = user_profile.has_permission(key)
-                    else:
-                        state["realm_create_web_public_stream_policy"] = (
-                            get_corresponding_policy_value_for_group_setting(
-                                user_profile.realm,
-                                "can_create_web_public_channel_group",
-                                Realm.CREATE_WEB_PUBLIC_STREAM_POLICY_TYPES,
-                            )
+                    )
+                    state["can_create_private_streams"] = user_profile.has_permission(key)
+                else:
+                    state["realm_create_web_public_stream_policy"] = (
+                        get_corresponding_policy_value_for_group_setting(
+                            user_profile.realm,
+                            "can_create_web_public_channel_group",
+                            Realm.CREATE_WEB_PUBLIC_STREAM_POLICY_TYPES,
                         )
-                        state["can_create_web_public_streams"] = user_profile.has_permission(key)
-
-                    state["can_create_streams"] = (
-                        state["can_create_private_streams"]
-                        or state["can_create_public_streams"]
-                        or state["can_create_web_public_streams"]
                     )
-        elif event["op"] == "deactivated":
-            # The realm has just been deactivated.  If our request had
-            # arrived a moment later, we'd have rendered the
-            # deactivation UI; if it'd been a moment sooner, we've
-            # have rendered the app and then immediately got this
-            # event (or actually, more likely, an auth error on GET
-            # /events) and immediately reloaded into the same
-            # deactivation UI. Passing achieves the same result.
-            pass
-        else:
-            raise AssertionError("Unexpected event type {type}/{op}".format(**event))
-    elif event["type"] == "realm_user_settings_defaults":
-        if event["op"] == "update":
-            state["realm_user_settings_defaults"][event["property"]] = event["value"]
-        else:
-            raise AssertionError("Unexpected event type {type}/{op}".format(**event))
-    elif event["type"] == "subscription":
-        if event["op"] == "add":
-            added_stream_ids = {sub["stream_id"] for sub in event["subscriptions"]}
-            was_added = lambda s: s["stream_id"] in added_stream_ids
+                    state["can_create_web_public_streams"] = user_profile.has_permission(key)
 
-            existing_stream_ids = {sub["stream_id"] for sub in state["subscriptions"]}
+                state["can_create_streams"] = (
+                    state["can_create_private_streams"]
+                    or state["can_create_public_streams"]
+                    or state["can_create_web_public_streams"]
+                )
+    elif event["op"] == "deactivated":
+        # The realm has just been deactivated.  If our request had
+        # arrived a moment later, we'd have rendered the
+        # deactivation UI; if it'd been a moment sooner, we've
+        # have rendered the app and then immediately got this
+        # event (or actually, more likely, an auth error on GET
+        # /events) and immediately reloaded into the same
+        # deactivation UI. Passing achieves the same result.
+        pass
+    else:
+        raise AssertionError("Unexpected event type {type}/{op}".format(**event))
 
-            # add the new subscriptions
-            for sub in event["subscriptions"]:
-                if sub["stream_id"] not in existing_stream_ids:
-                    if "subscribers" in sub and not include_subscribers:
-                        sub = copy.deepcopy(sub)
-                        del sub["subscribers"]
-                    state["subscriptions"].append(sub)
 
-            # remove them from unsubscribed if they had been there
-            state["unsubscribed"] = [s for s in state["unsubscribed"] if not was_added(s)]
+def apply_realm_user_settings_defaults_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    if event["op"] == "update":
+        state["realm_user_settings_defaults"][event["property"]] = event["value"]
+    else:
+        raise AssertionError("Unexpected event type {type}/{op}".format(**event))
 
-            # remove them from never_subscribed if they had been there
-            state["never_subscribed"] = [s for s in state["never_subscribed"] if not was_added(s)]
 
-        elif event["op"] == "remove":
-            removed_stream_ids = {sub["stream_id"] for sub in event["subscriptions"]}
-            was_removed = lambda s: s["stream_id"] in removed_stream_ids
+def apply_subscription_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    if event["op"] == "add":
+        added_stream_ids = {sub["stream_id"] for sub in event["subscriptions"]}
+        was_added = lambda s: s["stream_id"] in added_stream_ids
 
-            # Find the subs we are affecting.
-            removed_subs = list(filter(was_removed, state["subscriptions"]))
+        existing_stream_ids = {sub["stream_id"] for sub in state["subscriptions"]}
 
-            # Remove our user from the subscribers of the removed subscriptions.
-            if include_subscribers:
-                for sub in removed_subs:
-                    sub["subscribers"].remove(user_profile.id)
+        # add the new subscriptions
+        for sub in event["subscriptions"]:
+            if sub["stream_id"] not in existing_stream_ids:
+                if "subscribers" in sub and not options.include_subscribers:
+                    sub = copy.deepcopy(sub)
+                    del sub["subscribers"]
+                state["subscriptions"].append(sub)
 
-            state["unsubscribed"] += removed_subs
+        # remove them from unsubscribed if they had been there
+        state["unsubscribed"] = [s for s in state["unsubscribed"] if not was_added(s)]
 
-            # Now filter out the removed subscriptions from subscriptions.
-            state["subscriptions"] = [s for s in state["subscriptions"] if not was_removed(s)]
+        # remove them from never_subscribed if they had been there
+        state["never_subscribed"] = [s for s in state["never_subscribed"] if not was_added(s)]
 
-        elif event["op"] == "update":
-            for sub in state["subscriptions"]:
-                if sub["stream_id"] == event["stream_id"]:
-                    sub[event["property"]] = event["value"]
-        elif event["op"] == "peer_add":
-            if include_subscribers:
-                stream_ids = set(event["stream_ids"])
-                user_ids = set(event["user_ids"])
-
-                for sub_dict in [
-                    state["subscriptions"],
-                    state["unsubscribed"],
-                    state["never_subscribed"],
-                ]:
-                    for sub in sub_dict:
-                        if sub["stream_id"] in stream_ids:
-                            subscribers = set(sub["subscribers"]) | user_ids
-                            sub["subscribers"] = sorted(subscribers)
-        elif event["op"] == "peer_remove":
-            if include_subscribers:
-                stream_ids = set(event["stream_ids"])
-                user_ids = set(event["user_ids"])
-
-                for sub_dict in [
-                    state["subscriptions"],
-                    state["unsubscribed"],
-                    state["never_subscribed"],
-                ]:
-                    for sub in sub_dict:
-                        if sub["stream_id"] in stream_ids:
-                            subscribers = set(sub["subscribers"]) - user_ids
-                            sub["subscribers"] = sorted(subscribers)
-        else:
-            raise AssertionError("Unexpected event type {type}/{op}".format(**event))
-    elif event["type"] == "presence":
-        # Note: Fetch_initial_state_data includes
-        # a presence_last_update_id value, reflecting the Max .last_update_id
-        # value of the UserPresence objects in the data. Events don't carry
-        # information about the last_update_id of the UserPresence object
-        # to which they correspond, so we don't (and can't) attempt to update that initial
-        # presence data here.
-        # This means that the state resulting from fetch_initial_state + apply_events will not
-        # match the state of a hypothetical fetch_initial_state fetch that included the fully
-        # updated data. This is intended and not a bug.
-        if slim_presence:
-            user_key = str(event["user_id"])
-        else:
-            user_key = event["email"]
-        state["presences"][user_key] = get_presence_for_user(event["user_id"], slim_presence)[
-            user_key
-        ]
-    elif event["type"] == "update_message":
-        # We don't return messages in /register, so we don't need to
-        # do anything for content updates, but we may need to update
-        # the unread_msgs data if the topic of an unread message changed.
-        if "raw_unread_msgs" in state and "new_stream_id" in event:
-            stream_dict = state["raw_unread_msgs"]["stream_dict"]
-            stream_id = event["new_stream_id"]
-            for message_id in event["message_ids"]:
-                if message_id in stream_dict:
-                    stream_dict[message_id]["stream_id"] = stream_id
-
-        if "raw_unread_msgs" in state and TOPIC_NAME in event:
-            stream_dict = state["raw_unread_msgs"]["stream_dict"]
-            topic_name = event[TOPIC_NAME]
-            for message_id in event["message_ids"]:
-                if message_id in stream_dict:
-                    stream_dict[message_id]["topic"] = topic_name
-    elif event["type"] == "delete_message":
-        if "message_id" in event:
-            message_ids = [event["message_id"]]
-        else:
-            message_ids = event["message_ids"]  # nocoverage
-        state["max_message_id"] = max_message_id_for_user(user_profile)
+    elif event["op"] == "remove":
+        removed_stream_ids = {sub["stream_id"] for sub in event["subscriptions"]}
+        was_removed = lambda s: s["stream_id"] in removed_stream_ids
 
-        if "raw_unread_msgs" in state:
-            for remove_id in message_ids:
-                remove_message_id_from_unread_mgs(state["raw_unread_msgs"], remove_id)
-
-        # The remainder of this block is about maintaining recent_private_conversations
-        if "raw_recent_private_conversations" not in state or event["message_type"] != "private":
-            return
-
-        # OK, we just deleted what had been the max_message_id for
-        # this recent conversation; we need to recompute that value
-        # from scratch.  Definitely don't need to re-query everything,
-        # but this case is likely rare enough that it's reasonable to do so.
-        state["raw_recent_private_conversations"] = get_recent_private_conversations(user_profile)
-    elif event["type"] == "reaction":
-        # The client will get the message with the reactions directly
-        pass
-    elif event["type"] == "submessage":
-        # The client will get submessages with their messages
-        pass
-    elif event["type"] == "typing":
-        # Typing notification events are transient and thus ignored
-        pass
-    elif event["type"] == "attachment":
-        # Attachment events are just for updating the "uploads" UI;
-        # they are not sent directly.
-        pass
-    elif event["type"] == "update_message_flags":
-        # We don't return messages in `/register`, so most flags we
-        # can ignore, but we do need to update the unread_msgs data if
-        # unread state is changed.
-        if "raw_unread_msgs" in state and event["flag"] == "read" and event["op"] == "add":
-            for remove_id in event["messages"]:
-                remove_message_id_from_unread_mgs(state["raw_unread_msgs"], remove_id)
-        if "raw_unread_msgs" in state and event["flag"] == "read" and event["op"] == "remove":
-            for message_id_str, message_details in event["message_details"].items():
-                add_message_to_unread_msgs(
-                    user_profile.id,
-                    state["raw_unread_msgs"],
-                    int(message_id_str),
-                    message_details,
-                )
-        if event["flag"] == "starred" and "starred_messages" in state:
-            if event["op"] == "add":
-                state["starred_messages"] += event["messages"]
-            if event["op"] == "remove":
-                state["starred_messages"] = [
-                    message
-                    for message in state["starred_messages"]
-                    if message not in event["messages"]
-                ]
-    elif event["type"] == "realm_domains":
+        # Find the subs we are affecting.
+        removed_subs = list(filter(was_removed, state["subscriptions"]))
+
+        # Remove our user from the subscribers of the removed subscriptions.
+        if options.include_subscribers:
+            for sub in removed_subs:
+                sub["subscribers"].remove(user_profile.id)
+
+        state["unsubscribed"] += removed_subs
+
+        # Now filter out the removed subscriptions from subscriptions.
+        state["subscriptions"] = [s for s in state["subscriptions"] if not was_removed(s)]
+
+    elif event["op"] == "update":
+        for sub in state["subscriptions"]:
+            if sub["stream_id"] == event["stream_id"]:
+                sub[event["property"]] = event["value"]
+    elif event["op"] == "peer_add":
+        if options.include_subscribers:
+            stream_ids = set(event["stream_ids"])
+            user_ids = set(event["user_ids"])
+
+            for sub_dict in [
+                state["subscriptions"],
+                state["unsubscribed"],
+                state["never_subscribed"],
+            ]:
+                for sub in sub_dict:
+                    if sub["stream_id"] in stream_ids:
+                        subscribers = set(sub["subscribers"]) | user_ids
+                        sub["subscribers"] = sorted(subscribers)
+    elif event["op"] == "peer_remove":
+        if options.include_subscribers:
+            stream_ids = set(event["stream_ids"])
+            user_ids = set(event["user_ids"])
+
+            for sub_dict in [
+                state["subscriptions"],
+                state["unsubscribed"],
+                state["never_subscribed"],
+            ]:
+                for sub in sub_dict:
+                    if sub["stream_id"] in stream_ids:
+                        subscribers = set(sub["subscribers"]) - user_ids
+                        sub["subscribers"] = sorted(subscribers)
+    else:
+        raise AssertionError("Unexpected event type {type}/{op}".format(**event))
+
+
+def apply_presence_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    # Note: Fetch_initial_state_data includes
+    # a presence_last_update_id value, reflecting the Max .last_update_id
+    # value of the UserPresence objects in the data. Events don't carry
+    # information about the last_update_id of the UserPresence object
+    # to which they correspond, so we don't (and can't) attempt to update that initial
+    # presence data here.
+    # This means that the state resulting from fetch_initial_state + apply_events will not
+    # match the state of a hypothetical fetch_initial_state fetch that included the fully
+    # updated data. This is intended and not a bug.
+    if options.slim_presence:
+        user_key = str(event["user_id"])
+    else:
+        user_key = event["email"]
+    state["presences"][user_key] = get_presence_for_user(event["user_id"], options.slim_presence)[
+        user_key
+    ]
+
+
+def apply_update_message_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    # We don't return messages in /register, so we don't need to
+    # do anything for content updates, but we may need to update
+    # the unread_msgs data if the topic of an unread message changed.
+    if "raw_unread_msgs" in state and "new_stream_id" in event:
+        stream_dict = state["raw_unread_msgs"]["stream_dict"]
+        stream_id = event["new_stream_id"]
+        for message_id in event["message_ids"]:
+            if message_id in stream_dict:
+                stream_dict[message_id]["stream_id"] = stream_id
+
+    if "raw_unread_msgs" in state and TOPIC_NAME in event:
+        stream_dict = state["raw_unread_msgs"]["stream_dict"]
+        topic_name = event[TOPIC_NAME]
+        for message_id in event["message_ids"]:
+            if message_id in stream_dict:
+                stream_dict[message_id]["topic"] = topic_name
+
+
+def apply_delete_message_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    if "message_id" in event:
+        message_ids = [event["message_id"]]
+    else:
+        message_ids = event["message_ids"]  # nocoverage
+    state["max_message_id"] = max_message_id_for_user(user_profile)
+
+    if "raw_unread_msgs" in state:
+        for remove_id in message_ids:
+            remove_message_id_from_unread_mgs(state["raw_unread_msgs"], remove_id)
+
+    # The remainder of this block is about maintaining recent_private_conversations
+    if "raw_recent_private_conversations" not in state or event["message_type"] != "private":
+        return
+
+    # OK, we just deleted what had been the max_message_id for
+    # this recent conversation; we need to recompute that value
+    # from scratch.  Definitely don't need to re-query everything,
+    # but this case is likely rare enough that it's reasonable to do so.
+    state["raw_recent_private_conversations"] = get_recent_private_conversations(user_profile)
+
+
+def apply_update_message_flags_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    # We don't return messages in `/register`, so most flags we
+    # can ignore, but we do need to update the unread_msgs data if
+    # unread state is changed.
+    if "raw_unread_msgs" in state and event["flag"] == "read" and event["op"] == "add":
+        for remove_id in event["messages"]:
+            remove_message_id_from_unread_mgs(state["raw_unread_msgs"], remove_id)
+    if "raw_unread_msgs" in state and event["flag"] == "read" and event["op"] == "remove":
+        for message_id_str, message_details in event["message_details"].items():
+            add_message_to_unread_msgs(
+                user_profile.id,
+                state["raw_unread_msgs"],
+                int(message_id_str),
+                message_details,
+            )
+    if event["flag"] == "starred" and "starred_messages" in state:
         if event["op"] == "add":
-            state["realm_domains"].append(event["realm_domain"])
-        elif event["op"] == "change":
-            for realm_domain in state["realm_domains"]:
-                if realm_domain["domain"] == event["realm_domain"]["domain"]:
-                    realm_domain["allow_subdomains"] = event["realm_domain"]["allow_subdomains"]
-        elif event["op"] == "remove":
-            state["realm_domains"] = [
-                realm_domain
-                for realm_domain in state["realm_domains"]
-                if realm_domain["domain"] != event["domain"]
+            state["starred_messages"] += event["messages"]
+        if event["op"] == "remove":
+            state["starred_messages"] = [
+                message for message in state["starred_messages"] if message not in event["messages"]
             ]
+
+
+def apply_realm_domains_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    if event["op"] == "add":
+        state["realm_domains"].append(event["realm_domain"])
+    elif event["op"] == "change":
+        for realm_domain in state["realm_domains"]:
+            if realm_domain["domain"] == event["realm_domain"]["domain"]:
+                realm_domain["allow_subdomains"] = event["realm_domain"]["allow_subdomains"]
+    elif event["op"] == "remove":
+        state["realm_domains"] = [
+            realm_domain
+            for realm_domain in state["realm_domains"]
+            if realm_domain["domain"] != event["domain"]
+        ]
+    else:
+        raise AssertionError("Unexpected event type {type}/{op}".format(**event))
+
+
+def apply_realm_emoji_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    state["realm_emoji"] = event["realm_emoji"]
+
+
+def apply_alert_words_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    state["alert_words"] = event["alert_words"]
+
+
+def apply_muted_topics_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    state["muted_topics"] = event["muted_topics"]
+
+
+def apply_muted_users_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    state["muted_users"] = event["muted_users"]
+
+
+def apply_realm_linkifiers_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    # We only send realm_linkifiers event to clients that indicate
+    # support for linkifiers with URL templates. Otherwise, silently
+    # ignore the event.
+    if options.linkifier_url_template:
+        state["realm_linkifiers"] = event["realm_linkifiers"]
+
+
+def apply_realm_playgrounds_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    state["realm_playgrounds"] = event["realm_playgrounds"]
+
+
+def apply_update_display_settings_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    if event["setting_name"] != "timezone":
+        assert event["setting_name"] in UserProfile.display_settings_legacy
+    state[event["setting_name"]] = event["setting"]
+
+
+def apply_update_global_notifications_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    assert event["notification_name"] in UserProfile.notification_settings_legacy
+    state[event["notification_name"]] = event["setting"]
+
+
+def apply_user_settings_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    # time zone setting is not included in property_types dict because
+    # this setting is not a part of UserBaseSettings class.
+    if event["property"] != "timezone":
+        assert event["property"] in UserProfile.property_types
+    if event["property"] in {
+        **UserProfile.display_settings_legacy,
+        **UserProfile.notification_settings_legacy,
+    }:
+        state[event["property"]] = event["value"]
+    state["user_settings"][event["property"]] = event["value"]
+
+
+def apply_user_group_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    if event["op"] == "add":
+        state["realm_user_groups"].append(event["group"])
+        state["realm_user_groups"].sort(key=lambda group: group["id"])
+    elif event["op"] == "update":
+        for user_group in state["realm_user_groups"]:
+            if user_group["id"] == event["group_id"]:
+                user_group.update(event["data"])
+    elif event["op"] == "add_members":
+        for user_group in state["realm_user_groups"]:
+            if user_group["id"] == event["group_id"]:
+                user_group["members"].extend(event["user_ids"])
+                user_group["members"].sort()
+    elif event["op"] == "remove_members":
+        for user_group in state["realm_user_groups"]:
+            if user_group["id"] == event["group_id"]:
+                members = set(user_group["members"])
+                user_group["members"] = sorted(members - set(event["user_ids"]))
+    elif event["op"] == "add_subgroups":
+        for user_group in state["realm_user_groups"]:
+            if user_group["id"] == event["group_id"]:
+                user_group["direct_subgroup_ids"].extend(event["direct_subgroup_ids"])
+                user_group["direct_subgroup_ids"].sort()
+    elif event["op"] == "remove_subgroups":
+        for user_group in state["realm_user_groups"]:
+            if user_group["id"] == event["group_id"]:
+                subgroups = set(user_group["direct_subgroup_ids"])
+                user_group["direct_subgroup_ids"] = sorted(
+                    subgroups - set(event["direct_subgroup_ids"])
+                )
+    elif event["op"] == "remove":
+        state["realm_user_groups"] = [
+            ug for ug in state["realm_user_groups"] if ug["id"] != event["group_id"]
+        ]
+    else:
+        raise AssertionError("Unexpected event type {type}/{op}".format(**event))
+
+
+def apply_user_status_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    user_id_str = str(event["user_id"])
+    user_status = state["user_status"]
+    away = event.get("away")
+    status_text = event.get("status_text")
+    emoji_name = event.get("emoji_name")
+    emoji_code = event.get("emoji_code")
+    reaction_type = event.get("reaction_type")
+
+    if user_id_str not in user_status:
+        user_status[user_id_str] = {}
+
+    if away is not None:
+        if away:
+            user_status[user_id_str]["away"] = True
         else:
-            raise AssertionError("Unexpected event type {type}/{op}".format(**event))
-    elif event["type"] == "realm_emoji":
-        state["realm_emoji"] = event["realm_emoji"]
-    elif event["type"] == "realm_export":
-        # These realm export events are only available to
-        # administrators, and aren't included in page_params.
-        pass
-    elif event["type"] == "alert_words":
-        state["alert_words"] = event["alert_words"]
-    elif event["type"] == "muted_topics":
-        state["muted_topics"] = event["muted_topics"]
-    elif event["type"] == "muted_users":
-        state["muted_users"] = event["muted_users"]
-    elif event["type"] == "realm_linkifiers":
-        # We only send realm_linkifiers event to clients that indicate
-        # support for linkifiers with URL templates. Otherwise, silently
-        # ignore the event.
-        if linkifier_url_template:
-            state["realm_linkifiers"] = event["realm_linkifiers"]
-    elif event["type"] == "realm_playgrounds":
-        state["realm_playgrounds"] = event["realm_playgrounds"]
-    elif event["type"] == "update_display_settings":
-        if event["setting_name"] != "timezone":
-            assert event["setting_name"] in UserProfile.display_settings_legacy
-        state[event["setting_name"]] = event["setting"]
-    elif event["type"] == "update_global_notifications":
-        assert event["notification_name"] in UserProfile.notification_settings_legacy
-        state[event["notification_name"]] = event["setting"]
-    elif event["type"] == "user_settings":
-        # time zone setting is not included in property_types dict because
-        # this setting is not a part of UserBaseSettings class.
-        if event["property"] != "timezone":
-            assert event["property"] in UserProfile.property_types
-        if event["property"] in {
-            **UserProfile.display_settings_legacy,
-            **UserProfile.notification_settings_legacy,
-        }:
-            state[event["property"]] = event["value"]
-        state["user_settings"][event["property"]] = event["value"]
-    elif event["type"] == "invites_changed":
-        pass
-    elif event["type"] == "user_group":
-        if event["op"] == "add":
-            state["realm_user_groups"].append(event["group"])
-            state["realm_user_groups"].sort(key=lambda group: group["id"])
-        elif event["op"] == "update":
-            for user_group in state["realm_user_groups"]:
-                if user_group["id"] == event["group_id"]:
-                    user_group.update(event["data"])
-        elif event["op"] == "add_members":
-            for user_group in state["realm_user_groups"]:
-                if user_group["id"] == event["group_id"]:
-                    user_group["members"].extend(event["user_ids"])
-                    user_group["members"].sort()
-        elif event["op"] == "remove_members":
-            for user_group in state["realm_user_groups"]:
-                if user_group["id"] == event["group_id"]:
-                    members = set(user_group["members"])
-                    user_group["members"] = sorted(members - set(event["user_ids"]))
-        elif event["op"] == "add_subgroups":
-            for user_group in state["realm_user_groups"]:
-                if user_group["id"] == event["group_id"]:
-                    user_group["direct_subgroup_ids"].extend(event["direct_subgroup_ids"])
-                    user_group["direct_subgroup_ids"].sort()
-        elif event["op"] == "remove_subgroups":
-            for user_group in state["realm_user_groups"]:
-                if user_group["id"] == event["group_id"]:
-                    subgroups = set(user_group["direct_subgroup_ids"])
-                    user_group["direct_subgroup_ids"] = sorted(
-                        subgroups - set(event["direct_subgroup_ids"])
-                    )
-        elif event["op"] == "remove":
-            state["realm_user_groups"] = [
-                ug for ug in state["realm_user_groups"] if ug["id"] != event["group_id"]
-            ]
+            user_status[user_id_str].pop("away", None)
+
+    if status_text is not None:
+        if status_text == "":
+            user_status[user_id_str].pop("status_text", None)
         else:
-            raise AssertionError("Unexpected event type {type}/{op}".format(**event))
-    elif event["type"] == "user_status":
-        user_id_str = str(event["user_id"])
-        user_status = state["user_status"]
-        away = event.get("away")
-        status_text = event.get("status_text")
-        emoji_name = event.get("emoji_name")
-        emoji_code = event.get("emoji_code")
-        reaction_type = event.get("reaction_type")
-
-        if user_id_str not in user_status:
-            user_status[user_id_str] = {}
-
-        if away is not None:
-            if away:
-                user_status[user_id_str]["away"] = True
-            else:
-                user_status[user_id_str].pop("away", None)
+            user_status[user_id_str]["status_text"] = status_text
 
-        if status_text is not None:
-            if status_text == "":
-                user_status[user_id_str].pop("status_text", None)
+        if emoji_name is not None:
+            if emoji_name == "":
+                user_status[user_id_str].pop("emoji_name", None)
             else:
-                user_status[user_id_str]["status_text"] = status_text
+                user_status[user_id_str]["emoji_name"] = emoji_name
 
-            if emoji_name is not None:
-                if emoji_name == "":
-                    user_status[user_id_str].pop("emoji_name", None)
+            if emoji_code is not None:
+                if emoji_code == "":
+                    user_status[user_id_str].pop("emoji_code", None)
                 else:
-                    user_status[user_id_str]["emoji_name"] = emoji_name
-
-                if emoji_code is not None:
-                    if emoji_code == "":
-                        user_status[user_id_str].pop("emoji_code", None)
-                    else:
-                        user_status[user_id_str]["emoji_code"] = emoji_code
-
-                if reaction_type is not None:
-                    if reaction_type == UserStatus.UNICODE_EMOJI and emoji_name == "":
-                        user_status[user_id_str].pop("reaction_type", None)
-                    else:
-                        user_status[user_id_str]["reaction_type"] = reaction_type
-
-        if not user_status[user_id_str]:
-            user_status.pop(user_id_str, None)
-
-        state["user_status"] = user_status
-    elif event["type"] == "user_topic":
-        if event["visibility_policy"] == UserTopic.VisibilityPolicy.INHERIT:
-            user_topics_state = state["user_topics"]
-            for i in range(len(user_topics_state)):
-                if (
-                    user_topics_state[i]["stream_id"] == event["stream_id"]
-                    and user_topics_state[i]["topic_name"] == event["topic_name"]
-                ):
-                    del user_topics_state[i]
-                    break
-        else:
-            fields = ["stream_id", "topic_name", "visibility_policy", "last_updated"]
-            state["user_topics"].append({x: event[x] for x in fields})
-    elif event["type"] == "has_zoom_token":
-        state["has_zoom_token"] = event["value"]
-    elif event["type"] == "web_reload_client":
-        # This is an unlikely race, where the queue was created with a
-        # previous Tornado process, which restarted, and subsequently
-        # was told by restart-server to tell its old clients to
-        # reload.  We warn, since we do not expect this race to be
-        # possible, but the worst expected outcome is that the client
-        # retains the old JS instead of reloading.
-        logging.warning("Got a web_reload_client event during apply_events")
-    elif event["type"] == "restart":
-        # The Tornado process restarted.  This has no effect; we ignore it.
-        pass
+                    user_status[user_id_str]["emoji_code"] = emoji_code
+
+            if reaction_type is not None:
+                if reaction_type == UserStatus.UNICODE_EMOJI and emoji_name == "":
+                    user_status[user_id_str].pop("reaction_type", None)
+                else:
+                    user_status[user_id_str]["reaction_type"] = reaction_type
+
+    if not user_status[user_id_str]:
+        user_status.pop(user_id_str, None)
+
+    state["user_status"] = user_status
+
+
+def apply_user_topic_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    if event["visibility_policy"] == UserTopic.VisibilityPolicy.INHERIT:
+        user_topics_state = state["user_topics"]
+        for i in range(len(user_topics_state)):
+            if (
+                user_topics_state[i]["stream_id"] == event["stream_id"]
+                and user_topics_state[i]["topic_name"] == event["topic_name"]
+            ):
+                del user_topics_state[i]
+                break
     else:
-        raise AssertionError("Unexpected event type {}".format(event["type"]))
+        fields = ["stream_id", "topic_name", "visibility_policy", "last_updated"]
+        state["user_topics"].append({x: event[x] for x in fields})
+
+
+def apply_has_zoom_token_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    state["has_zoom_token"] = event["value"]
+
+
+def apply_web_reload_client_event(
+    user_profile: UserProfile,
+    state: dict[str, Any],
+    event: dict[str, Any],
+    options: ApplyEventOptions,
+) -> None:
+    # This is an unlikely race, where the queue was created with a
+    # previous Tornado process, which restarted, and subsequently
+    # was told by restart-server to tell its old clients to
+    # reload.  We warn, since we do not expect this race to be
+    # possible, but the worst expected outcome is that the client
+    # retains the old JS instead of reloading.
+    logging.warning("Got a web_reload_client event during apply_events")
+
+
+# Maps each event type to the function that applies events of that
+# type to a state dictionary; see apply_event.
+EVENT_APPLIERS: dict[
+    str, Callable[[UserProfile, dict[str, Any], dict[str, Any], ApplyEventOptions], None]
+] = {
+    "message": apply_message_event,
+    # It may be impossible for a heartbeat event to actually reach
+    # this code path. But in any case, they're noops.
+    "heartbeat": ignore_event,
+    "drafts": apply_drafts_event,
+    "scheduled_messages": apply_scheduled_messages_event,
+    "onboarding_steps": apply_onboarding_steps_event,
+    "custom_profile_fields": apply_custom_profile_fields_event,
+    "realm_user": apply_realm_user_event,
+    "realm_bot": apply_realm_bot_event,
+    "stream": apply_stream_event,
+    "default_streams": apply_default_streams_event,
+    "default_stream_groups": apply_default_stream_groups_event,
+    "realm": apply_realm_event,
+    "realm_user_settings_defaults": apply_realm_user_settings_defaults_event,
+    "subscription": apply_subscription_event,
+    "presence": apply_presence_event,
+    "update_message": apply_update_message_event,
+    "delete_message": apply_delete_message_event,
+    # The client will get the message with the reactions directly
+    "reaction": ignore_event,
+    # The client will get submessages with their messages
+    "submessage": ignore_event,
+    # Typing notification events are transient and thus ignored
+    "typing": ignore_event,
+    # Attachment events are just for updating the "uploads" UI;
+    # they are not sent directly.
+    "attachment": ignore_event,
+    "update_message_flags": apply_update_message_flags_event,
+    "realm_domains": apply_realm_domains_event,
+    "realm_emoji": apply_realm_emoji_event,
+    # These realm export events are only available to
+    # administrators, and aren't included in page_params.
+    "realm_export": ignore_event,
+    "alert_words": apply_alert_words_event,
+    "muted_topics": apply_muted_topics_event,
+    "muted_users": apply_muted_users_event,
+    "realm_linkifiers": apply_realm_linkifiers_event,
+    "realm_playgrounds": apply_realm_playgrounds_event,
+    "update_display_settings": apply_update_display_settings_event,
+    "update_global_notifications": apply_update_global_notifications_event,
+    "user_settings": apply_user_settings_event,
+    "invites_changed": ignore_event,
+    "user_group": apply_user_group_event,
+    "user_status": apply_user_status_event,
+    "user_topic": apply_user_topic_event,
+    "has_zoom_token": apply_has_zoom_token_event,
+    "web_reload_client": apply_web_reload_client_event,
+    # The Tornado process restarted.  This has no effect; we ignore it.
+    "restart": ignore_event,
+}
 
 
 class ClientCapabilities(TypedDict):
@@ -1666,6 +2057,7 @@ class ClientCapabilities(TypedDict):
     user_settings_object: NotRequired[bool]
     linkifier_url_template: NotRequired[bool]
     user_list_incomplete: NotRequired[bool]
+    user_list_columnar: NotRequired[bool]
 
 
 def do_events_register(
@@ -1686,6 +2078,7 @@ def do_events_register(
     fetch_event_types: Collection[str] | None = None,
     spectator_requested_language: str | None = None,
     pronouns_field_type_supported: bool = True,
+    section_versions: dict[str, str] | None = None,
 ) -> dict[str, Any]:
     # Technically we don't need to check this here because
     # build_narrow_predicate will check it, but it's nicer from an error
@@ -1701,6 +2094,11 @@ def do_events_register(
     user_settings_object = client_capabilities.get("user_settings_object", False)
     linkifier_url_template = client_capabilities.get("linkifier_url_template", False)
     user_list_incomplete = client_capabilities.get("user_list_incomplete", False)
+    user_list_columnar = client_capabilities.get("user_list_columnar", False)
+    if user_list_columnar:
+        # The columnar format is meant for large organizations, where
+        # avatar URLs are a significant part of the user list.
+        user_avatar_url_field_optional = True
 
     if fetch_event_types is not None:
         event_types_set: set[str] | None = set(fetch_event_types)
@@ -1741,9 +2139,15 @@ def do_events_register(
             # Force include_streams=False for security reasons.
             include_streams=include_streams,
             spectator_requested_language=spectator_requested_language,
+            known_section_versions=section_versions,
         )
 
-        post_process_state(user_profile, ret, notification_settings_null=False)
+        post_process_state(
+            user_profile,
+            ret,
+            notification_settings_null=False,
+            user_list_columnar=user_list_columnar,
+        )
         return ret
 
     # Fill up the UserMessage rows if a soft-deactivated user has returned
@@ -1774,25 +2178,38 @@ def do_events_register(
     if queue_id is None:
         raise JsonableError(_("Could not allocate event queue"))
 
-    ret = fetch_initial_state_data(
-        user_profile,
-        realm=realm,
-        event_types=event_types_set,
-        queue_id=queue_id,
-        client_gravatar=client_gravatar,
-        user_avatar_url_field_optional=user_avatar_url_field_optional,
-        user_settings_object=user_settings_object,
-        slim_presence=slim_presence,
-        presence_last_update_id_fetched_by_client=presence_last_update_id_fetched_by_client,
-        include_subscribers=include_subscribers,
-        include_streams=include_streams,
-        pronouns_field_type_supported=pronouns_field_type_supported,
-        linkifier_url_template=linkifier_url_template,
-        user_list_incomplete=user_list_incomplete,
-    )
+    def fetch_state(known_section_versions: dict[str, str] | None) -> dict[str, Any]:
+        return fetch_initial_state_data(
+            user_profile,
+            realm=realm,
+            event_types=event_types_set,
+            queue_id=queue_id,
+            client_gravatar=client_gravatar,
+            user_avatar_url_field_optional=user_avatar_url_field_optional,
+            user_settings_object=user_settings_object,
+            slim_presence=slim_presence,
+            presence_last_update_id_fetched_by_client=presence_last_update_id_fetched_by_client,
+            include_subscribers=include_subscribers,
+            include_streams=include_streams,
+            pronouns_field_type_supported=pronouns_field_type_supported,
+            linkifier_url_template=linkifier_url_template,
+            user_list_incomplete=user_list_incomplete,
+            known_section_versions=known_section_versions,
+        )
+
+    ret = fetch_state(section_versions)
 
     # Apply events that came in while we were fetching initial data
     events = get_user_events(user_profile, queue_id, -1)
+    if section_versions is not None:
+        omitted_sections = {section for section in ret["section_versions"] if section not in ret}
+        if omitted_sections & get_register_snapshot_sections_for_events(events):
+            # A section we omitted because the client had it changed
+            # while we were fetching, so the events in the queue
+            # cannot be applied to the client's copy.  This is rare;
+            # just send the full state instead.
+            ret = fetch_state({})
+            events = get_user_events(user_profile, queue_id, -1)
     apply_events(
         user_profile,
         state=ret,
@@ -1805,7 +2222,9 @@ def do_events_register(
         user_list_incomplete=user_list_incomplete,
     )
 
-    post_process_state(user_profile, ret, notification_settings_null)
+    post_process_state(
+        user_profile, ret, notification_settings_null, user_list_columnar=user_list_columnar
+    )
 
     if len(events) > 0:
         ret["last_event_id"] = events[-1]["id"]
@@ -1815,7 +2234,11 @@ def do_events_register(
 
 
 def post_process_state(
-    user_profile: UserProfile | None, ret: dict[str, Any], notification_settings_null: bool
+    user_profile: UserProfile | None,
+    ret: dict[str, Any],
+    notification_settings_null: bool,
+    *,
+    user_list_columnar: bool = False,
 ) -> None:
     """
     NOTE:
@@ -1856,6 +2279,12 @@ def post_process_state(
 
         del ret["raw_users"]
 
+        if user_list_columnar:
+            ret["realm_users_columns"] = user_dicts_to_columns(ret.pop("realm_users"))
+            ret["realm_non_active_users_columns"] = user_dicts_to_columns(
+                ret.pop("realm_non_active_users")
+            )
+
     if "raw_recent_private_conversations" in ret:
         # Reformat recent_private_conversations to be a list of dictionaries, rather than a dict.
         ret["recent_private_conversations"] = sorted(
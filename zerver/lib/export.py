@@ -159,6 +159,7 @@ ALL_ZULIP_TABLES = {
     "zerver_realmplayground",
     "zerver_realmreactivationstatus",
     "zerver_realmuserdefault",
+    "zerver_recentprivateconversation",
     "zerver_recipient",
     "zerver_scheduledemail",
     "zerver_scheduledemail_users",
@@ -168,6 +169,7 @@ ALL_ZULIP_TABLES = {
     "zerver_stream",
     "zerver_submessage",
     "zerver_subscription",
+    "zerver_topicsummary",
     "zerver_useractivity",
     "zerver_useractivityinterval",
     "zerver_usergroup",
@@ -250,6 +252,12 @@ NON_EXPORTED_TABLES = {
     "zerver_submessage",
     # Drafts don't need to be exported as they are supposed to be more ephemeral.
     "zerver_draft",
+    # Topic summaries are derived from zerver_message, and are
+    # recomputed after the messages are imported.
+    "zerver_topicsummary",
+    # Likewise, recent direct message conversations are derived from
+    # zerver_usermessage.
+    "zerver_recentprivateconversation",
     # For any tables listed below here, it's a bug that they are not present in the export.
 }
 
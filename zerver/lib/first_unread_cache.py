@@ -0,0 +1,147 @@
+"""Caching for the first unread message in a channel or topic narrow.
+
+Every client asks for `anchor=first_unread` when the user opens a
+conversation, which requires a query against zerver_usermessage
+filtering on the (unindexed for this purpose) read flag.  For the
+common case of a narrow to a single channel, or a single topic
+within a channel, we cache the answer in memcached.
+
+Rather than trying to track exactly which cached entries a given
+change affects, entries embed "generation" tokens in their cache
+keys, and changes simply discard the relevant token:
+
+* A per-user token, discarded when the user's read flags, muted
+  topics, or set of UserMessage rows change.
+* A per-recipient "edit" token, discarded when messages are moved
+  out of or into the channel, or deleted from it.
+* A per-recipient "send" token, discarded when a new message is
+  sent to the channel.
+
+New messages always have larger IDs than existing ones, so they
+cannot change a cached first unread message ID; the send token is
+thus only checked for entries recording that there were no unread
+messages, which keeps the cache effective in busy channels.  (Two
+concurrent sends can commit out of ID order, so in rare cases the
+cached anchor may be slightly later than the true first unread
+message; this is harmless since the anchor only positions the
+window of messages fetched around it.)
+"""
+
+import hashlib
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+from zerver.lib.cache import (
+    cache_get,
+    cache_set,
+    discard_generation_tokens,
+    get_generation_tokens,
+    register_cache_key_family,
+)
+
+# Cached first unread IDs expire eventually even if nothing changes,
+# which bounds the damage from any invalidation we've missed.
+FIRST_UNREAD_CACHE_TIMEOUT = 3600
+
+first_unread_cache_hits = 0
+first_unread_cache_misses = 0
+
+
+def get_first_unread_cache_hits() -> int:
+    return first_unread_cache_hits
+
+
+def get_first_unread_cache_misses() -> int:
+    return first_unread_cache_misses
+
+
+register_cache_key_family("first_unread_user_generation", timeout=None, value="str")
+register_cache_key_family("first_unread_recipient_edit_generation", timeout=None, value="str")
+register_cache_key_family("first_unread_recipient_send_generation", timeout=None, value="str")
+register_cache_key_family(
+    "first_unread", timeout=FIRST_UNREAD_CACHE_TIMEOUT, value="tuple[int | None, str]"
+)
+
+
+def user_unread_generation_key(user_id: int) -> str:
+    return f"first_unread_user_generation:{user_id}"
+
+
+def recipient_edit_generation_key(recipient_id: int) -> str:
+    return f"first_unread_recipient_edit_generation:{recipient_id}"
+
+
+def recipient_send_generation_key(recipient_id: int) -> str:
+    return f"first_unread_recipient_send_generation:{recipient_id}"
+
+
+def first_unread_cache_key(
+    user_id: int, recipient_id: int, topic_name: str | None, user_token: str, edit_token: str
+) -> str:
+    if topic_name is None:
+        topic_part = "*"
+    else:
+        # Topic names can contain characters that are not valid in
+        # memcached keys, and can be long.
+        topic_part = hashlib.sha1(topic_name.encode()).hexdigest()
+    return f"first_unread:{user_id}:{user_token}:{recipient_id}:{edit_token}:{topic_part}"
+
+
+@dataclass
+class FirstUnreadLookup:
+    found: bool
+    first_unread_id: int | None
+    # Where to store the value once computed; this reflects the
+    # generation tokens that were current before the database was
+    # queried.
+    cache_key: str
+    send_token: str
+
+
+def get_cached_first_unread(
+    user_id: int, recipient_id: int, topic_name: str | None
+) -> FirstUnreadLookup:
+    global first_unread_cache_hits, first_unread_cache_misses
+
+    user_key = user_unread_generation_key(user_id)
+    edit_key = recipient_edit_generation_key(recipient_id)
+    send_key = recipient_send_generation_key(recipient_id)
+    tokens = get_generation_tokens([user_key, edit_key, send_key])
+
+    key = first_unread_cache_key(
+        user_id, recipient_id, topic_name, tokens[user_key], tokens[edit_key]
+    )
+    cached = cache_get(key)
+    if cached is not None:
+        first_unread_id, send_token = cached[0]
+        if first_unread_id is not None or send_token == tokens[send_key]:
+            first_unread_cache_hits += 1
+            return FirstUnreadLookup(True, first_unread_id, key, tokens[send_key])
+
+    first_unread_cache_misses += 1
+    return FirstUnreadLookup(False, None, key, tokens[send_key])
+
+
+def set_cached_first_unread(lookup: FirstUnreadLookup, first_unread_id: int | None) -> None:
+    cache_set(
+        lookup.cache_key, (first_unread_id, lookup.send_token), timeout=FIRST_UNREAD_CACHE_TIMEOUT
+    )
+
+
+def invalidate_first_unread_for_users(user_ids: Iterable[int]) -> None:
+    keys = [user_unread_generation_key(user_id) for user_id in set(user_ids)]
+    if keys:
+        discard_generation_tokens(keys)
+
+
+def invalidate_first_unread_for_recipients(recipient_ids: Iterable[int]) -> None:
+    """For moves and deletions, which can change any cached value."""
+    keys = [recipient_edit_generation_key(recipient_id) for recipient_id in set(recipient_ids)]
+    if keys:
+        discard_generation_tokens(keys)
+
+
+def note_new_messages_for_recipients(recipient_ids: Iterable[int]) -> None:
+    keys = [recipient_send_generation_key(recipient_id) for recipient_id in set(recipient_ids)]
+    if keys:
+        discard_generation_tokens(keys)
@@ -4,7 +4,7 @@ from typing import Any
 
 import requests
 
-from zerver.lib.cache import cache_with_key
+from zerver.lib.cache import cache_with_key, register_cache_key_family
 from zerver.lib.outgoing_http import OutgoingSession
 
 logger = logging.getLogger(__name__)
@@ -47,6 +47,9 @@ class InvalidPlatformError(Exception):
     pass
 
 
+register_cache_key_family("download_link", timeout=60 * 30, value="str")
+
+
 @cache_with_key(lambda platform: f"download_link:{platform}", timeout=60 * 30)
 def get_latest_github_release_download_link_for_platform(platform: str) -> str:
     if platform not in PLATFORM_TO_SETUP_FILE:
@@ -29,11 +29,13 @@ from zerver.lib.markdown import version as markdown_version
 from zerver.lib.message import get_last_message_id
 from zerver.lib.mime_types import guess_type
 from zerver.lib.push_notifications import sends_notifications_directly
+from zerver.lib.recent_private_conversations import rebuild_recent_private_conversations
 from zerver.lib.remote_server import maybe_enqueue_audit_log_upload
 from zerver.lib.server_initialization import create_internal_realm, server_initialized
 from zerver.lib.streams import render_stream_description
 from zerver.lib.thumbnail import BadImageError
 from zerver.lib.timestamp import datetime_to_timestamp
+from zerver.lib.topic import rebuild_topic_summaries_for_stream
 from zerver.lib.upload import ensure_avatar_image, sanitize_name, upload_backend
 from zerver.lib.upload.s3 import get_bucket
 from zerver.lib.user_counts import realm_user_count_by_role
@@ -1554,6 +1556,16 @@ def do_import_realm(import_dir: Path, subdomain: str, processes: int = 1) -> Rea
     with connection.cursor() as cursor:
         cursor.execute(update_first_message_id_query, {"realm_id": realm.id})
 
+    # The topic summaries for imported streams, and users' recent
+    # direct message conversations, aren't part of the export, since
+    # they're derived from the messages.
+    for stream_recipient_id in Stream.objects.filter(realm=realm).values_list(
+        "recipient_id", flat=True
+    ):
+        assert stream_recipient_id is not None
+        rebuild_topic_summaries_for_stream(realm.id, stream_recipient_id)
+    rebuild_recent_private_conversations(UserProfile.objects.filter(realm=realm))
+
     if "zerver_userstatus" in data:
         fix_datetime_fields(data, "zerver_userstatus")
         re_map_foreign_keys(data, "zerver_userstatus", "user_profile", related_table="user_profile")
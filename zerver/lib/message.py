@@ -5,12 +5,10 @@ from datetime import datetime, timedelta
 from typing import Any, TypedDict
 
 from django.conf import settings
-from django.db import connection
 from django.db.models import Exists, Max, OuterRef, QuerySet, Sum
 from django.utils.timezone import now as timezone_now
 from django.utils.translation import gettext as _
 from django_stubs_ext import ValuesQuerySet
-from psycopg2.sql import SQL
 
 from analytics.lib.counts import COUNT_STATS
 from analytics.models import RealmCount
@@ -37,6 +35,7 @@ from zerver.models import (
     Message,
     NamedUserGroup,
     Realm,
+    RecentPrivateConversation,
     Recipient,
     Stream,
     Subscription,
@@ -1060,18 +1059,14 @@ def get_recent_conversations_recipient_id(
 
 
 def get_recent_private_conversations(user_profile: UserProfile) -> dict[int, dict[str, Any]]:
-    """This function uses some carefully optimized SQL queries, designed
-    to use the UserMessage index on private_messages.  It is
-    somewhat complicated by the fact that for 1:1 direct
-    messages, we store the message against a recipient_id of whichever
-    user was the recipient, and thus for 1:1 direct messages sent
-    directly to us, we need to look up the other user from the
-    sender_id on those messages.  You'll see that pattern repeated
-    both here and also in zerver/lib/events.py.
-
-    It may be possible to write this query directly in Django, however
-    it is made much easier by using CTEs, which Django does not
-    natively support.
+    """This function reads the user's RecentPrivateConversation rows,
+    which are maintained as direct messages are sent and deleted (see
+    zerver/lib/recent_private_conversations.py), rather than grouping
+    the user's recent direct messages on every call.  For 1:1 direct
+    messages, the rows are keyed by the recipient_id of the other
+    user, even for messages sent directly to us, whose recipient_id
+    is our own; you'll see that pattern repeated in
+    zerver/lib/events.py.
 
     We return a dictionary structure for convenient modification
     below; this structure is converted into its final form by
@@ -1081,58 +1076,14 @@ def get_recent_private_conversations(user_profile: UserProfile) -> dict[int, dic
     RECENT_CONVERSATIONS_LIMIT = 1000
 
     recipient_map = {}
-    my_recipient_id = user_profile.recipient_id
 
-    query = SQL(
-        """
-        WITH personals AS (
-            SELECT   um.message_id AS message_id
-            FROM     zerver_usermessage um
-            WHERE    um.user_profile_id = %(user_profile_id)s
-            AND      um.flags & 2048 <> 0
-            ORDER BY message_id DESC limit %(conversation_limit)s
-        ),
-        message AS (
-            SELECT message_id,
-                   CASE
-                          WHEN m.recipient_id = %(my_recipient_id)s
-                          THEN m.sender_id
-                          ELSE NULL
-                   END AS sender_id,
-                   CASE
-                          WHEN m.recipient_id <> %(my_recipient_id)s
-                          THEN m.recipient_id
-                          ELSE NULL
-                   END AS outgoing_recipient_id
-            FROM   personals
-            JOIN   zerver_message m
-            ON     personals.message_id = m.id
-        ),
-        unified AS (
-            SELECT    message_id,
-                      COALESCE(zerver_userprofile.recipient_id, outgoing_recipient_id) AS other_recipient_id
-            FROM      message
-            LEFT JOIN zerver_userprofile
-            ON        zerver_userprofile.id = sender_id
-        )
-        SELECT   other_recipient_id,
-                 MAX(message_id)
-        FROM     unified
-        GROUP BY other_recipient_id
-    """
+    # Uses index: zerver_recentprivateconversation_user_max_message_id
+    rows = (
+        RecentPrivateConversation.objects.filter(user_profile_id=user_profile.id)
+        .order_by("-max_message_id")
+        .values_list("recipient_id", "max_message_id")[:RECENT_CONVERSATIONS_LIMIT]
     )
 
-    with connection.cursor() as cursor:
-        cursor.execute(
-            query,
-            {
-                "user_profile_id": user_profile.id,
-                "conversation_limit": RECENT_CONVERSATIONS_LIMIT,
-                "my_recipient_id": my_recipient_id,
-            },
-        )
-        rows = cursor.fetchall()
-
     # The resulting rows will be (recipient_id, max_message_id)
     # objects for all parties we've had recent (group?) private
     # message conversations with, including direct messages with
@@ -65,12 +65,113 @@ def sew_messages_and_submessages(
             message["submessages"].append(submessage)
 
 
+# The to_dict cache stores each message as a version byte followed by
+# a JSON array of MESSAGE_CACHE_FIELDS values, rather than a JSON
+# object, to avoid storing every key name in memcached for every
+# message.  Payloads larger than MESSAGE_CACHE_COMPRESSION_THRESHOLD
+# bytes (which generally means long rendered_content) are additionally
+# zlib-compressed.
+#
+# Changing the set or order of fields, or the layout of reactions and
+# submessages, requires a new format version.  Entries in the original
+# format (a zlib-compressed JSON object, which always starts with a
+# 0x78 byte) are still decoded, so a deploy does not need to flush
+# the cache.
+MESSAGE_CACHE_FORMAT_VERSION_1 = b"\x01"
+MESSAGE_CACHE_FORMAT_VERSION_1_COMPRESSED = b"\x02"
+MESSAGE_CACHE_COMPRESSION_THRESHOLD = 1024
+
+MESSAGE_CACHE_FIELDS = (
+    "id",
+    "sender_id",
+    "content",
+    "recipient_type_id",
+    "recipient_type",
+    "recipient_id",
+    "timestamp",
+    "client",
+    TOPIC_NAME,
+    "sender_realm_id",
+    TOPIC_LINKS,
+    "rendered_content",
+    "is_me_message",
+)
+# Fields which are only present for some messages; None in the
+# encoded array means the field is absent.
+MESSAGE_CACHE_OPTIONAL_FIELDS = ("last_edit_timestamp", "edit_history")
+
+
+def encode_cached_reaction(reaction: dict[str, Any]) -> list[Any]:
+    return [
+        reaction["emoji_name"],
+        reaction["emoji_code"],
+        reaction["reaction_type"],
+        reaction["user_id"],
+        reaction["user"]["email"],
+        reaction["user"]["full_name"],
+    ]
+
+
+def decode_cached_reaction(row: list[Any]) -> dict[str, Any]:
+    emoji_name, emoji_code, reaction_type, user_id, email, full_name = row
+    return {
+        "emoji_name": emoji_name,
+        "emoji_code": emoji_code,
+        "reaction_type": reaction_type,
+        "user": {
+            "email": email,
+            "id": user_id,
+            "full_name": full_name,
+        },
+        "user_id": user_id,
+    }
+
+
+SUBMESSAGE_CACHE_FIELDS = ("id", "message_id", "sender_id", "msg_type", "content")
+
+
 def extract_message_dict(message_bytes: bytes) -> dict[str, Any]:
-    return orjson.loads(zlib.decompress(message_bytes))
+    version = message_bytes[:1]
+    if version == MESSAGE_CACHE_FORMAT_VERSION_1:
+        row = orjson.loads(message_bytes[1:])
+    elif version == MESSAGE_CACHE_FORMAT_VERSION_1_COMPRESSED:
+        row = orjson.loads(zlib.decompress(message_bytes[1:]))
+    else:
+        # The original format, from before the cache was versioned.
+        return orjson.loads(zlib.decompress(message_bytes))
+
+    fields_count = len(MESSAGE_CACHE_FIELDS)
+    message_dict = dict(zip(MESSAGE_CACHE_FIELDS, row[:fields_count], strict=True))
+    optional_values = row[fields_count : fields_count + len(MESSAGE_CACHE_OPTIONAL_FIELDS)]
+    message_dict.update(
+        {
+            field: value
+            for field, value in zip(MESSAGE_CACHE_OPTIONAL_FIELDS, optional_values, strict=True)
+            if value is not None
+        }
+    )
+    reactions, submessages = row[fields_count + len(MESSAGE_CACHE_OPTIONAL_FIELDS) :]
+    message_dict["reactions"] = [decode_cached_reaction(reaction) for reaction in reactions]
+    message_dict["submessages"] = [
+        dict(zip(SUBMESSAGE_CACHE_FIELDS, submessage, strict=True)) for submessage in submessages
+    ]
+    return message_dict
 
 
 def stringify_message_dict(message_dict: dict[str, Any]) -> bytes:
-    return zlib.compress(orjson.dumps(message_dict))
+    row = [message_dict[field] for field in MESSAGE_CACHE_FIELDS]
+    row.extend(message_dict.get(field) for field in MESSAGE_CACHE_OPTIONAL_FIELDS)
+    row.append([encode_cached_reaction(reaction) for reaction in message_dict["reactions"]])
+    row.append(
+        [
+            [submessage[field] for field in SUBMESSAGE_CACHE_FIELDS]
+            for submessage in message_dict["submessages"]
+        ]
+    )
+    encoded = orjson.dumps(row)
+    if len(encoded) > MESSAGE_CACHE_COMPRESSION_THRESHOLD:
+        return MESSAGE_CACHE_FORMAT_VERSION_1_COMPRESSED + zlib.compress(encoded)
+    return MESSAGE_CACHE_FORMAT_VERSION_1 + encoded
 
 
 @cache_with_key(to_dict_cache_key, timeout=3600 * 24)
@@ -186,20 +287,114 @@ class MessageDict:
               make shallow copies here, but performance
               is somewhat important here, as we are
               often fetching hundreds of messages.
+
+        This produces the same result as calling bulk_hydrate_sender_info,
+        bulk_hydrate_recipient_info, and finalize_payload on each
+        object, but works column-wise: the sender and recipient
+        fields (avatar URLs, inaccessible-user placeholders, display
+        recipients) are computed once per distinct sender and
+        conversation in the batch, and then attached to each message,
+        without the intermediate sender_* fields that finalize_payload
+        would immediately delete.
         """
-        MessageDict.bulk_hydrate_sender_info(objs)
-        MessageDict.bulk_hydrate_recipient_info(objs)
+        if not objs:
+            return
 
-        for obj in objs:
-            can_access_sender = obj.get("can_access_sender", True)
-            MessageDict.finalize_payload(
-                obj,
-                apply_markdown,
-                client_gravatar,
-                skip_copy=True,
-                can_access_sender=can_access_sender,
-                realm_host=realm.host,
-            )
+        sender_ids = [obj["sender_id"] for obj in objs]
+        recipient_ids = [obj["recipient_id"] for obj in objs]
+        can_access_sender_column = [obj.pop("can_access_sender", True) for obj in objs]
+
+        sender_rows = MessageDict.get_sender_rows(list(set(sender_ids)))
+        display_recipients = bulk_fetch_display_recipients(
+            {(obj["recipient_id"], obj["recipient_type"], obj["recipient_type_id"]) for obj in objs}
+        )
+
+        sender_fields: dict[tuple[int, bool], dict[str, Any]] = {}
+        recipient_fields: dict[tuple[int, int], dict[str, Any]] = {}
+        content_type = "text/html" if apply_markdown else "text/x-markdown"
+
+        for obj, sender_id, recipient_id, can_access_sender in zip(
+            objs, sender_ids, recipient_ids, can_access_sender_column, strict=True
+        ):
+            user_row = sender_rows[sender_id]
+
+            sender_key = (sender_id, can_access_sender)
+            if sender_key not in sender_fields:
+                sender_fields[sender_key] = MessageDict.get_final_sender_fields(
+                    user_row,
+                    obj["sender_realm_id"],
+                    client_gravatar=client_gravatar,
+                    can_access_sender=can_access_sender,
+                    realm_host=realm.host,
+                )
+
+            # Direct message recipients depend on the sender, since
+            # the sender is added to the display_recipient list.
+            recipient_key = (recipient_id, sender_id)
+            if recipient_key not in recipient_fields:
+                recipient_fields[recipient_key] = MessageDict.get_recipient_fields(
+                    recipient_type=obj["recipient_type"],
+                    recipient_type_id=obj["recipient_type_id"],
+                    display_recipient=display_recipients[recipient_id],
+                    sender_id=sender_id,
+                    sender_email=user_row["email"],
+                    sender_full_name=user_row["full_name"],
+                    sender_is_mirror_dummy=user_row["is_mirror_dummy"],
+                )
+
+            obj.update(sender_fields[sender_key])
+            obj.update(recipient_fields[recipient_key])
+
+            rendered_content = obj.pop("rendered_content")
+            if apply_markdown:
+                obj["content"] = rendered_content
+            obj["content_type"] = content_type
+
+            del obj["sender_realm_id"]
+            del obj["recipient_type"]
+            del obj["recipient_type_id"]
+
+    @staticmethod
+    def get_final_sender_fields(
+        user_row: dict[str, Any],
+        sender_realm_id: int,
+        *,
+        client_gravatar: bool,
+        can_access_sender: bool,
+        realm_host: str,
+    ) -> dict[str, Any]:
+        """
+        The sender fields of an API-format message, as finalize_payload
+        would compute them from a hydrated message dict.
+        """
+        if not can_access_sender:
+            sender_id = user_row["id"]
+            return {
+                "sender_full_name": str(UserProfile.INACCESSIBLE_USER_NAME),
+                "sender_email": Address(
+                    username=f"user{sender_id}", domain=get_fake_email_domain(realm_host)
+                ).addr_spec,
+                "sender_realm_str": user_row["realm__string_id"],
+                "avatar_url": get_avatar_for_inaccessible_user(),
+            }
+
+        if user_row["email_address_visibility"] != UserProfile.EMAIL_ADDRESS_VISIBILITY_EVERYONE:
+            client_gravatar = False
+
+        return {
+            "sender_full_name": user_row["full_name"],
+            "sender_email": user_row["email"],
+            "sender_realm_str": user_row["realm__string_id"],
+            "avatar_url": get_avatar_field(
+                user_id=user_row["id"],
+                realm_id=sender_realm_id,
+                email=user_row["delivery_email"],
+                avatar_source=user_row["avatar_source"],
+                avatar_version=user_row["avatar_version"],
+                medium=False,
+                client_gravatar=client_gravatar,
+            ),
+        }
 
     @staticmethod
     def finalize_payload(
@@ -456,12 +651,7 @@ class MessageDict:
         return obj
 
     @staticmethod
-    def bulk_hydrate_sender_info(objs: list[dict[str, Any]]) -> None:
-        sender_ids = list({obj["sender_id"] for obj in objs})
-
-        if not sender_ids:
-            return
-
+    def get_sender_rows(sender_ids: list[int]) -> dict[int, dict[str, Any]]:
         query = UserProfile.objects.values(
             "id",
             "full_name",
@@ -476,7 +666,16 @@ class MessageDict:
 
         rows = query_for_ids(query, sender_ids, "zerver_userprofile.id")
 
-        sender_dict = {row["id"]: row for row in rows}
+        return {row["id"]: row for row in rows}
+
+    @staticmethod
+    def bulk_hydrate_sender_info(objs: list[dict[str, Any]]) -> None:
+        sender_ids = list({obj["sender_id"] for obj in objs})
+
+        if not sender_ids:
+            return
+
+        sender_dict = MessageDict.get_sender_rows(sender_ids)
 
         for obj in objs:
             sender_id = obj["sender_id"]
@@ -498,14 +697,29 @@ class MessageDict:
         our clients should be able to hyrdrate these fields
         themselves with info they already have on users.
         """
+        obj.update(
+            MessageDict.get_recipient_fields(
+                recipient_type=obj["recipient_type"],
+                recipient_type_id=obj["recipient_type_id"],
+                display_recipient=display_recipient,
+                sender_id=obj["sender_id"],
+                sender_email=obj["sender_email"],
+                sender_full_name=obj["sender_full_name"],
+                sender_is_mirror_dummy=obj["sender_is_mirror_dummy"],
+            )
+        )
 
-        recipient_type = obj["recipient_type"]
-        recipient_type_id = obj["recipient_type_id"]
-        sender_is_mirror_dummy = obj["sender_is_mirror_dummy"]
-        sender_email = obj["sender_email"]
-        sender_full_name = obj["sender_full_name"]
-        sender_id = obj["sender_id"]
-
+    @staticmethod
+    def get_recipient_fields(
+        *,
+        recipient_type: int,
+        recipient_type_id: int,
+        display_recipient: DisplayRecipientT,
+        sender_id: int,
+        sender_email: str,
+        sender_full_name: str,
+        sender_is_mirror_dummy: bool,
+    ) -> dict[str, Any]:
         if recipient_type == Recipient.STREAM:
             display_type = "stream"
         elif recipient_type in (Recipient.DIRECT_MESSAGE_GROUP, Recipient.PERSONAL):
@@ -527,10 +741,13 @@ class MessageDict:
         else:
             raise AssertionError(f"Invalid recipient type {recipient_type}")
 
-        obj["display_recipient"] = display_recipient
-        obj["type"] = display_type
-        if obj["type"] == "stream":
-            obj["stream_id"] = recipient_type_id
+        fields: dict[str, Any] = {
+            "display_recipient": display_recipient,
+            "type": display_type,
+        }
+        if display_type == "stream":
+            fields["stream_id"] = recipient_type_id
+        return fields
 
     @staticmethod
     def bulk_hydrate_recipient_info(objs: list[dict[str, Any]]) -> None:
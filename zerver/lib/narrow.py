@@ -1,4 +1,5 @@
 import re
+import time
 from collections.abc import Callable, Iterable, Sequence
 from dataclasses import dataclass
 from typing import Any, Generic, TypeAlias, TypeVar
@@ -6,11 +7,14 @@ from typing import Any, Generic, TypeAlias, TypeVar
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
 from django.core.exceptions import ValidationError
-from django.db import connection
+from django.db import connection, transaction
+from django.db.models import Max, Min
 from django.utils.translation import gettext as _
+from psycopg2.errors import QueryCanceled
 from pydantic import BaseModel, model_validator
 from sqlalchemy.dialects import postgresql
 from sqlalchemy.engine import Connection, Row
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.sql import (
     ClauseElement,
     ColumnElement,
@@ -34,6 +38,11 @@ from typing_extensions import override
 
 from zerver.lib.addressee import get_user_profiles, get_user_profiles_by_ids
 from zerver.lib.exceptions import ErrorCode, JsonableError, MissingAuthenticationError
+from zerver.lib.first_unread_cache import (
+    FirstUnreadLookup,
+    get_cached_first_unread,
+    set_cached_first_unread,
+)
 from zerver.lib.message import (
     access_message,
     access_web_public_message,
@@ -1074,6 +1083,41 @@ def add_narrow_conditions(
     return (query, is_search)
 
 
+def get_first_unread_cacheable_narrow(
+    user_profile: UserProfile, narrow: list[NarrowParameter] | None
+) -> tuple[int, str | None] | None:
+    """Returns (recipient_id, topic_name) if the first unread message
+    in this narrow can be served from the cache in
+    zerver.lib.first_unread_cache, i.e. the narrow is exactly a
+    channel, or a topic within a channel.  Any other narrow returns
+    None, and is always computed from the database.
+    """
+    if narrow is None or user_profile.realm.is_zephyr_mirror_realm:
+        # Zephyr mirror realms match channels and topics by pattern.
+        return None
+
+    channel_operand = None
+    topic_name = None
+    for term in narrow:
+        if term.negated:
+            return None
+        if term.operator in channel_operators and channel_operand is None:
+            channel_operand = term.operand
+        elif term.operator == "topic" and topic_name is None and isinstance(term.operand, str):
+            topic_name = term.operand
+        else:
+            return None
+
+    if channel_operand is None:
+        return None
+    try:
+        channel = get_stream_by_narrow_operand_access_unchecked(channel_operand, user_profile.realm)
+    except Stream.DoesNotExist:
+        # Let the regular code path report the error.
+        return None
+    return channel.recipient_id, topic_name
+
+
 def find_first_unread_anchor(
     sa_conn: Connection,
     user_profile: UserProfile | None,
@@ -1084,6 +1128,15 @@ def find_first_unread_anchor(
     if user_profile is None:
         return LARGER_THAN_MAX_MESSAGE_ID
 
+    lookup: FirstUnreadLookup | None = None
+    cacheable_narrow = get_first_unread_cacheable_narrow(user_profile, narrow)
+    if cacheable_narrow is not None:
+        lookup = get_cached_first_unread(user_profile.id, *cacheable_narrow)
+        if lookup.found:
+            if lookup.first_unread_id is None:
+                return LARGER_THAN_MAX_MESSAGE_ID
+            return lookup.first_unread_id
+
     # We always need UserMessage in our query, because it has the unread
     # flag for the user.
     need_user_message = True
@@ -1127,6 +1180,9 @@ def find_first_unread_anchor(
     else:
         anchor = LARGER_THAN_MAX_MESSAGE_ID
 
+    if lookup is not None:
+        set_cached_first_unread(lookup, anchor if anchor != LARGER_THAN_MAX_MESSAGE_ID else None)
+
     return anchor
 
 
@@ -1329,11 +1385,161 @@ def post_process_limited_query(
     )
 
 
+def execute_with_statement_timeout(
+    sa_conn: Connection, query: SelectBase, timeout_seconds: float
+) -> list[Row] | None:
+    """
+    Runs query with a PostgreSQL statement timeout, returning None if
+    it was cancelled for running too long.  The query runs in a
+    savepoint, so that a cancelled query doesn't abort the caller's
+    transaction.
+    """
+    timeout_ms = int(timeout_seconds * 1000)
+    if timeout_ms <= 0:
+        return None
+
+    try:
+        with transaction.atomic(savepoint=True), connection.cursor() as cursor:
+            cursor.execute("SET LOCAL statement_timeout = %s", [timeout_ms])
+            rows = list(sa_conn.execute(query).fetchall())
+            # If the query was cancelled, rolling back the savepoint
+            # undoes the SET LOCAL; otherwise we undo it ourselves.
+            cursor.execute("SET LOCAL statement_timeout TO DEFAULT")
+    except OperationalError as e:
+        if isinstance(e.orig, QueryCanceled):
+            return None
+        raise  # nocoverage
+    return rows
+
+
+@dataclass
+class SearchChunkResult:
+    rows: list[Row]
+    # Where the client should continue searching from in each
+    # direction, if we ran out of time before finding enough results.
+    continue_before: int | None
+    continue_after: int | None
+
+
+def fetch_search_rows_in_chunks(
+    sa_conn: Connection,
+    query: Select,
+    id_col: ColumnElement[Integer],
+    *,
+    realm: Realm,
+    anchor: int,
+    include_anchor: bool,
+    num_before: int,
+    num_after: int,
+    anchored_to_left: bool,
+    anchored_to_right: bool,
+    first_visible_message_id: int,
+    timeout_seconds: float,
+) -> SearchChunkResult:
+    """
+    Fallback for searches which are too expensive to run as a single
+    query: we scan outwards from the anchor in ranges of
+    SEARCH_CHUNK_MESSAGE_IDS message IDs, each of which is a cheap
+    query, until we have enough results or run out of time.
+
+    The rows fetched here are equivalent to what limit_query_to_range
+    would have fetched, so they can be passed to
+    post_process_limited_query.
+    """
+    deadline = time.monotonic() + timeout_seconds
+    chunk_size = settings.SEARCH_CHUNK_MESSAGE_IDS
+
+    # Uses index: zerver_message_realm_id
+    id_range = Message.objects.filter(realm_id=realm.id).aggregate(
+        min_id=Min("id"), max_id=Max("id")
+    )
+    if id_range["min_id"] is None:  # nocoverage
+        return SearchChunkResult(rows=[], continue_before=None, continue_after=None)
+    min_id: int = id_range["min_id"]
+    max_id: int = id_range["max_id"]
+
+    # See limit_query_to_range for the semantics of these limits.
+    need_before_query = (not anchored_to_left) and (num_before > 0)
+    need_after_query = (not anchored_to_right) and (num_after > 0)
+    if need_before_query and need_after_query:
+        before_anchor = anchor - 1
+        after_anchor = max(anchor, first_visible_message_id)
+        before_limit = num_before
+        after_limit = num_after + 1
+    elif need_before_query:
+        before_anchor = anchor - (not include_anchor)
+        before_limit = num_before
+        if not anchored_to_right:
+            before_limit += include_anchor
+    elif need_after_query:
+        after_anchor = max(anchor + (not include_anchor), first_visible_message_id)
+        after_limit = num_after + include_anchor
+
+    rows: list[Row] = []
+    continue_before = None
+    continue_after = None
+
+    if need_before_query:
+        before_rows: list[Row] = []
+        upper = min(before_anchor, max_id)
+        while len(before_rows) < before_limit and upper >= min_id:
+            lower = max(upper - chunk_size + 1, min_id)
+            chunk_query = (
+                query.where(and_(id_col >= lower, id_col <= upper))
+                .order_by(id_col.desc())
+                .limit(before_limit - len(before_rows))
+            )
+            chunk_rows = execute_with_statement_timeout(
+                sa_conn, chunk_query, deadline - time.monotonic()
+            )
+            if chunk_rows is None:
+                # Everything newer than `upper` has been searched.
+                continue_before = upper + 1
+                break
+            before_rows.extend(chunk_rows)
+            upper = lower - 1
+        rows.extend(before_rows)
+
+    if need_after_query and continue_before is not None:
+        # We're out of time, so don't start on the newer messages;
+        # the client can search all of them from after_anchor.
+        continue_after = max(after_anchor, min_id) - 1
+    elif need_after_query:
+        after_rows: list[Row] = []
+        lower = max(after_anchor, min_id)
+        while len(after_rows) < after_limit and lower <= max_id:
+            upper = min(lower + chunk_size - 1, max_id)
+            chunk_query = (
+                query.where(and_(id_col >= lower, id_col <= upper))
+                .order_by(id_col.asc())
+                .limit(after_limit - len(after_rows))
+            )
+            chunk_rows = execute_with_statement_timeout(
+                sa_conn, chunk_query, deadline - time.monotonic()
+            )
+            if chunk_rows is None:
+                # Everything older than `lower` has been searched.
+                continue_after = lower - 1
+                break
+            after_rows.extend(chunk_rows)
+            lower = upper + 1
+        rows.extend(after_rows)
+
+    rows.sort(key=lambda row: row[0])
+    return SearchChunkResult(
+        rows=rows, continue_before=continue_before, continue_after=continue_after
+    )
+
+
 @dataclass
 class FetchedMessages(LimitedMessages[Row]):
     anchor: int
     include_history: bool
     is_search: bool
+    # For searches cut short by SEARCH_STATEMENT_TIMEOUT_SECONDS, the
+    # anchors (for include_anchor=False) from which the client can
+    # continue the search in either direction.
+    search_continuation: dict[str, int] | None = None
 
 
 def fetch_messages(
@@ -1346,6 +1552,7 @@ def fetch_messages(
     include_anchor: bool,
     num_before: int,
     num_after: int,
+    allow_partial_search_results: bool = False,
 ) -> FetchedMessages:
     include_history = ok_to_include_history(narrow, user_profile, is_web_public_query)
     if include_history:
@@ -1405,6 +1612,28 @@ def fetch_messages(
 
         first_visible_message_id = get_first_visible_message_id(realm)
 
+        if (
+            is_search
+            and allow_partial_search_results
+            and settings.SEARCH_STATEMENT_TIMEOUT_SECONDS
+            and (num_before > 0 or num_after > 0)
+        ):
+            assert isinstance(query, Select)
+            return fetch_search_messages_with_timeout(
+                sa_conn,
+                query,
+                inner_msg_id_col,
+                realm=realm,
+                anchor=anchor,
+                include_anchor=include_anchor,
+                num_before=num_before,
+                num_after=num_after,
+                anchored_to_left=anchored_to_left,
+                anchored_to_right=anchored_to_right,
+                first_visible_message_id=first_visible_message_id,
+                include_history=include_history,
+            )
+
         query = limit_query_to_range(
             query=query,
             num_before=num_before,
@@ -1427,6 +1656,123 @@ def fetch_messages(
         query = query.prefix_with("/* get_messages */")
         rows = list(sa_conn.execute(query).fetchall())
 
+    return finish_fetched_messages(
+        rows,
+        num_before=num_before,
+        num_after=num_after,
+        anchor=anchor,
+        anchored_to_left=anchored_to_left,
+        anchored_to_right=anchored_to_right,
+        first_visible_message_id=first_visible_message_id,
+        include_history=include_history,
+        is_search=is_search,
+    )
+
+
+def fetch_search_messages_with_timeout(
+    sa_conn: Connection,
+    query: Select,
+    inner_msg_id_col: ColumnElement[Integer],
+    *,
+    realm: Realm,
+    anchor: int,
+    include_anchor: bool,
+    num_before: int,
+    num_after: int,
+    anchored_to_left: bool,
+    anchored_to_right: bool,
+    first_visible_message_id: int,
+    include_history: bool,
+) -> FetchedMessages:
+    """
+    Runs a search under SEARCH_STATEMENT_TIMEOUT_SECONDS, so that an
+    expensive search can't tie up a worker indefinitely.  If the
+    search as a single query takes too long, we fall back to
+    fetch_search_rows_in_chunks, which may return partial results.
+    """
+    timeout_seconds = settings.SEARCH_STATEMENT_TIMEOUT_SECONDS
+    range_query = limit_query_to_range(
+        query=query,
+        num_before=num_before,
+        num_after=num_after,
+        anchor=anchor,
+        include_anchor=include_anchor,
+        anchored_to_left=anchored_to_left,
+        anchored_to_right=anchored_to_right,
+        id_col=inner_msg_id_col,
+        first_visible_message_id=first_visible_message_id,
+    )
+    main_query = range_query.subquery()
+    full_query = (
+        select(*main_query.c)
+        .select_from(main_query)
+        .order_by(column("message_id", Integer).asc())
+        .prefix_with("/* get_messages */")
+    )
+    rows = execute_with_statement_timeout(sa_conn, full_query, timeout_seconds)
+    if rows is not None:
+        return finish_fetched_messages(
+            rows,
+            num_before=num_before,
+            num_after=num_after,
+            anchor=anchor,
+            anchored_to_left=anchored_to_left,
+            anchored_to_right=anchored_to_right,
+            first_visible_message_id=first_visible_message_id,
+            include_history=include_history,
+            is_search=True,
+        )
+
+    chunk_result = fetch_search_rows_in_chunks(
+        sa_conn,
+        query,
+        inner_msg_id_col,
+        realm=realm,
+        anchor=anchor,
+        include_anchor=include_anchor,
+        num_before=num_before,
+        num_after=num_after,
+        anchored_to_left=anchored_to_left,
+        anchored_to_right=anchored_to_right,
+        first_visible_message_id=first_visible_message_id,
+        timeout_seconds=timeout_seconds,
+    )
+    fetched = finish_fetched_messages(
+        chunk_result.rows,
+        num_before=num_before,
+        num_after=num_after,
+        anchor=anchor,
+        anchored_to_left=anchored_to_left,
+        anchored_to_right=anchored_to_right,
+        first_visible_message_id=first_visible_message_id,
+        include_history=include_history,
+        is_search=True,
+    )
+    search_continuation: dict[str, int] = {}
+    if chunk_result.continue_before is not None:
+        fetched.found_oldest = False
+        fetched.history_limited = False
+        search_continuation["before"] = chunk_result.continue_before
+    if chunk_result.continue_after is not None:
+        fetched.found_newest = False
+        search_continuation["after"] = chunk_result.continue_after
+    if search_continuation:
+        fetched.search_continuation = search_continuation
+    return fetched
+
+
+def finish_fetched_messages(
+    rows: list[Row],
+    *,
+    num_before: int,
+    num_after: int,
+    anchor: int,
+    anchored_to_left: bool,
+    anchored_to_right: bool,
+    first_visible_message_id: int,
+    include_history: bool,
+    is_search: bool,
+) -> FetchedMessages:
     query_info = post_process_limited_query(
         rows=rows,
         num_before=num_before,
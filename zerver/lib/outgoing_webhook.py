@@ -25,15 +25,27 @@ from zerver.models.clients import get_client
 from zerver.models.users import get_user_profile_by_id
 
 
+def make_outgoing_webhook_session() -> requests.Session:
+    return OutgoingSession(
+        role="webhook",
+        timeout=settings.OUTGOING_WEBHOOK_TIMEOUT_SECONDS,
+        headers={"User-Agent": "ZulipOutgoingWebhook/" + ZULIP_VERSION},
+    )
+
+
 class OutgoingWebhookServiceInterface(abc.ABC):
-    def __init__(self, token: str, user_profile: UserProfile, service_name: str) -> None:
+    def __init__(
+        self,
+        token: str,
+        user_profile: UserProfile,
+        service_name: str,
+        session: requests.Session | None = None,
+    ) -> None:
         self.token: str = token
         self.user_profile: UserProfile = user_profile
         self.service_name: str = service_name
-        self.session: requests.Session = OutgoingSession(
-            role="webhook",
-            timeout=settings.OUTGOING_WEBHOOK_TIMEOUT_SECONDS,
-            headers={"User-Agent": "ZulipOutgoingWebhook/" + ZULIP_VERSION},
+        self.session: requests.Session = (
+            make_outgoing_webhook_session() if session is None else session
         )
 
     @abc.abstractmethod
@@ -158,10 +170,15 @@ def get_service_interface_class(interface: str) -> Any:
         return AVAILABLE_OUTGOING_WEBHOOK_INTERFACES[interface]
 
 
-def get_outgoing_webhook_service_handler(service: Service) -> Any:
+def get_outgoing_webhook_service_handler(
+    service: Service, session: requests.Session | None = None
+) -> Any:
     service_interface_class = get_service_interface_class(service.interface_name())
     service_interface = service_interface_class(
-        token=service.token, user_profile=service.user_profile, service_name=service.name
+        token=service.token,
+        user_profile=service.user_profile,
+        service_name=service.name,
+        session=session,
     )
     return service_interface
 
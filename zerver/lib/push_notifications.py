@@ -5,7 +5,8 @@ import base64
 import copy
 import logging
 import re
-from collections.abc import Iterable, Mapping, Sequence
+from collections import defaultdict
+from collections.abc import Callable, Mapping, Sequence
 from dataclasses import dataclass
 from email.headerregistry import Address
 from functools import cache
@@ -39,6 +40,7 @@ from zerver.lib.exceptions import ErrorCode, JsonableError
 from zerver.lib.message import access_message_and_usermessage, direct_message_group_users
 from zerver.lib.notification_data import get_mentioned_user_group
 from zerver.lib.remote_server import (
+    PushNotificationBouncerRetryLaterError,
     record_push_notifications_recently_working,
     send_json_to_push_bouncer,
     send_server_data_to_push_bouncer,
@@ -235,8 +237,21 @@ def send_apple_push_notification(
     payload_data: Mapping[str, Any],
     remote: Optional["RemoteZulipServer"] = None,
 ) -> int:
-    if not devices:
-        return 0
+    return send_apple_push_notifications([(user_identity, devices, payload_data)], remote)[0]
+
+
+def send_apple_push_notifications(
+    notifications: Sequence[
+        tuple[UserPushIdentityCompat, Sequence[DeviceToken], Mapping[str, Any]]
+    ],
+    remote: Optional["RemoteZulipServer"] = None,
+) -> list[int]:
+    """Sends each of the (user, devices, payload) notifications, all
+    concurrently over our one APNs connection.  Returns the number of
+    devices each notification was successfully sent to."""
+    successfully_sent_counts = [0] * len(notifications)
+    if not any(devices for user_identity, devices, payload_data in notifications):
+        return successfully_sent_counts
     # We lazily do the APNS imports as part of optimizing Zulip's base
     # import time; since these are only needed in the push
     # notification queue worker, it's best to only import them in the
@@ -250,7 +265,7 @@ def send_apple_push_notification(
             "APNs: Dropping a notification because nothing configured.  "
             "Set ZULIP_SERVICES_URL (or APNS_CERT_FILE)."
         )
-        return 0
+        return successfully_sent_counts
 
     if remote:
         assert settings.ZILENCER_ENABLED
@@ -258,56 +273,55 @@ def send_apple_push_notification(
     else:
         DeviceTokenClass = PushDeviceToken
 
-    if remote:
-        logger.info(
-            "APNs: Sending notification for remote user %s:%s to %d devices",
-            remote.uuid,
-            user_identity,
-            len(devices),
-        )
-    else:
-        logger.info(
-            "APNs: Sending notification for local user %s to %d devices",
-            user_identity,
-            len(devices),
-        )
-    payload_data = dict(modernize_apns_payload(payload_data))
-    message = {**payload_data.pop("custom", {}), "aps": payload_data}
-
-    have_missing_app_id = False
-    for device in devices:
-        if device.ios_app_id is None:
-            # This should be present for all APNs tokens, as an invariant maintained
-            # by the views that add the token to our database.
-            logger.error(
-                "APNs: Missing ios_app_id for user %s device %s", user_identity, device.token
+    # The index of the notification, user, and device for each request.
+    targets: list[tuple[int, UserPushIdentityCompat, DeviceToken]] = []
+    requests: list[aioapns.NotificationRequest] = []
+    for index, (user_identity, devices, payload_data) in enumerate(notifications):
+        if not devices:
+            continue
+        if remote:
+            logger.info(
+                "APNs: Sending notification for remote user %s:%s to %d devices",
+                remote.uuid,
+                user_identity,
+                len(devices),
+            )
+        else:
+            logger.info(
+                "APNs: Sending notification for local user %s to %d devices",
+                user_identity,
+                len(devices),
             )
-            have_missing_app_id = True
-    if have_missing_app_id:
-        devices = [device for device in devices if device.ios_app_id is not None]
+        payload_data = dict(modernize_apns_payload(payload_data))
+        message = {**payload_data.pop("custom", {}), "aps": payload_data}
 
-    async def send_all_notifications() -> (
-        Iterable[tuple[DeviceToken, aioapns.common.NotificationResult | BaseException]]
-    ):
-        requests = [
-            aioapns.NotificationRequest(
-                apns_topic=device.ios_app_id,
-                device_token=device.token,
-                message=message,
-                time_to_live=24 * 3600,
+        for device in devices:
+            if device.ios_app_id is None:
+                # This should be present for all APNs tokens, as an invariant maintained
+                # by the views that add the token to our database.
+                logger.error(
+                    "APNs: Missing ios_app_id for user %s device %s", user_identity, device.token
+                )
+                continue
+            targets.append((index, user_identity, device))
+            requests.append(
+                aioapns.NotificationRequest(
+                    apns_topic=device.ios_app_id,
+                    device_token=device.token,
+                    message=message,
+                    time_to_live=24 * 3600,
+                )
             )
-            for device in devices
-        ]
-        results = await asyncio.gather(
+
+    async def send_all_notifications() -> list[aioapns.common.NotificationResult | BaseException]:
+        return await asyncio.gather(
             *(apns_context.apns.send_notification(request) for request in requests),
             return_exceptions=True,
         )
-        return zip(devices, results, strict=False)
 
     results = apns_context.loop.run_until_complete(send_all_notifications())
 
-    successfully_sent_count = 0
-    for device, result in results:
+    for (index, user_identity, device), result in zip(targets, results, strict=True):
         if isinstance(result, aioapns.exceptions.ConnectionError):
             logger.error(
                 "APNs: ConnectionError sending for user %s to device %s; check certificate expiration",
@@ -322,7 +336,7 @@ def send_apple_push_notification(
                 exc_info=result,
             )
         elif result.is_successful:
-            successfully_sent_count += 1
+            successfully_sent_counts[index] += 1
             logger.info(
                 "APNs: Success sending for user %s to device %s", user_identity, device.token
             )
@@ -343,7 +357,7 @@ def send_apple_push_notification(
                 result.description,
             )
 
-    return successfully_sent_count
+    return successfully_sent_counts
 
 
 #
@@ -450,46 +464,68 @@ def send_android_push_notification(
     options: Additional options to control the FCM message sent.
         For details, see `parse_fcm_options`.
     """
-    if not devices:
-        return 0
+    return send_android_push_notifications([(user_identity, devices, data, options)], remote)[0]
+
+
+# The most messages FCM accepts in one send_each request.
+FCM_MAX_MESSAGES_PER_REQUEST = 500
+
+
+def send_android_push_notifications(
+    notifications: Sequence[
+        tuple[UserPushIdentityCompat, Sequence[DeviceToken], dict[str, Any], dict[str, Any]]
+    ],
+    remote: Optional["RemoteZulipServer"] = None,
+) -> list[int]:
+    """Sends each of the (user, devices, data, options) notifications,
+    as described in send_android_push_notification, with as few FCM
+    requests as possible.  Returns the number of devices each
+    notification was successfully sent to."""
+    successfully_sent_counts = [0] * len(notifications)
+    if not any(devices for user_identity, devices, data, options in notifications):
+        return successfully_sent_counts
     if not fcm_app:
         logger.debug(
             "Skipping sending a FCM push notification since "
             "ZULIP_SERVICE_PUSH_NOTIFICATIONS and ANDROID_FCM_CREDENTIALS_PATH are both unset"
         )
-        return 0
-
-    if remote:
-        logger.info(
-            "FCM: Sending notification for remote user %s:%s to %d devices",
-            remote.uuid,
-            user_identity,
-            len(devices),
-        )
-    else:
-        logger.info(
-            "FCM: Sending notification for local user %s to %d devices", user_identity, len(devices)
-        )
-
-    token_list = [device.token for device in devices]
-    priority = parse_fcm_options(options, data)
+        return successfully_sent_counts
+
+    # The index of the notification and the token for each message.
+    targets: list[tuple[int, str]] = []
+    messages: list[firebase_messaging.Message] = []
+    for index, (user_identity, devices, data, options) in enumerate(notifications):
+        if not devices:
+            continue
+        if remote:
+            logger.info(
+                "FCM: Sending notification for remote user %s:%s to %d devices",
+                remote.uuid,
+                user_identity,
+                len(devices),
+            )
+        else:
+            logger.info(
+                "FCM: Sending notification for local user %s to %d devices",
+                user_identity,
+                len(devices),
+            )
 
-    # The API requires all values to be strings. Our data dict is going to have
-    # things like an integer realm and user ids etc., so just convert everything
-    # like that.
-    data = {k: str(v) if not isinstance(v, str) else v for k, v in data.items()}
-    messages = [
-        firebase_messaging.Message(
-            data=data, token=token, android=firebase_messaging.AndroidConfig(priority=priority)
-        )
-        for token in token_list
-    ]
+        priority = parse_fcm_options(options, data)
 
-    try:
-        batch_response = firebase_messaging.send_each(messages, app=fcm_app)
-    except firebase_exceptions.FirebaseError:
-        logger.warning("Error while pushing to FCM", exc_info=True)
-        return 0
+        # The API requires all values to be strings. Our data dict is going to have
+        # things like an integer realm and user ids etc., so just convert everything
+        # like that.
+        data = {k: str(v) if not isinstance(v, str) else v for k, v in data.items()}
+        for device in devices:
+            targets.append((index, device.token))
+            messages.append(
+                firebase_messaging.Message(
+                    data=data,
+                    token=device.token,
+                    android=firebase_messaging.AndroidConfig(priority=priority),
+                )
+            )
 
     if remote:
         assert settings.ZILENCER_ENABLED
@@ -497,30 +533,41 @@ def send_android_push_notification(
     else:
         DeviceTokenClass = PushDeviceToken
 
-    successfully_sent_count = 0
-    for idx, response in enumerate(batch_response.responses):
-        # We enumerate to have idx to track which token the response
-        # corresponds to. send_each() preserves the order of the messages,
-        # so this works.
-
-        token = token_list[idx]
-        if response.success:
-            successfully_sent_count += 1
-            logger.info("FCM: Sent message with ID: %s to %s", response.message_id, token)
-        else:
-            error = response.exception
-            if isinstance(error, FCMUnregisteredError):
-                logger.info("FCM: Removing %s due to %s", token, error.code)
-
-                # We remove all entries for this token (There
-                # could be multiple for different Zulip servers).
-                DeviceTokenClass._default_manager.filter(
-                    token=token, kind=DeviceTokenClass.FCM
-                ).delete()
+    for start in range(0, len(messages), FCM_MAX_MESSAGES_PER_REQUEST):
+        try:
+            batch_response = firebase_messaging.send_each(
+                messages[start : start + FCM_MAX_MESSAGES_PER_REQUEST], app=fcm_app
+            )
+        except firebase_exceptions.FirebaseError:
+            logger.warning("Error while pushing to FCM", exc_info=True)
+            continue
+
+        # send_each() preserves the order of the messages, so we can
+        # match each response with the token it was sent to.
+        for (index, token), response in zip(
+            targets[start : start + FCM_MAX_MESSAGES_PER_REQUEST],
+            batch_response.responses,
+            strict=False,
+        ):
+            if response.success:
+                successfully_sent_counts[index] += 1
+                logger.info("FCM: Sent message with ID: %s to %s", response.message_id, token)
             else:
-                logger.warning("FCM: Delivery failed for %s: %s:%s", token, error.__class__, error)
+                error = response.exception
+                if isinstance(error, FCMUnregisteredError):
+                    logger.info("FCM: Removing %s due to %s", token, error.code)
+
+                    # We remove all entries for this token (There
+                    # could be multiple for different Zulip servers).
+                    DeviceTokenClass._default_manager.filter(
+                        token=token, kind=DeviceTokenClass.FCM
+                    ).delete()
+                else:
+                    logger.warning(
+                        "FCM: Delivery failed for %s: %s:%s", token, error.__class__, error
+                    )
 
-    return successfully_sent_count
+    return successfully_sent_counts
 
 
 #
@@ -1268,15 +1315,21 @@ def handle_remove_push_notification(user_profile_id: int, message_ids: list[int]
         ).update(flags=F("flags").bitand(~UserMessage.flags.active_mobile_push_notification))
 
 
-def handle_push_notification(user_profile_id: int, missed_message: dict[str, Any]) -> None:
+@dataclass
+class PushNotificationPayloads:
+    apns_payload: dict[str, Any]
+    gcm_payload: dict[str, Any]
+    gcm_options: dict[str, Any]
+
+
+def get_push_notification_payloads(
+    user_profile: UserProfile, missed_message: dict[str, Any]
+) -> PushNotificationPayloads | None:
     """
-    missed_message is the event received by the
-    zerver.worker.missedmessage_mobile_notifications.PushNotificationWorker.consume function.
+    Marks the message in the missed_message event as having an active
+    mobile push notification for the user, and returns the payloads
+    to send for it, or None if no notification should be sent.
     """
-    if not push_notifications_configured():
-        return
-    user_profile = get_user_profile_by_id(user_profile_id)
-
     if user_profile.is_bot:  # nocoverage
         # We don't expect to reach here for bot users. However, this code exists
         # to find and throw away any pre-existing events in the queue while
@@ -1284,16 +1337,16 @@ def handle_push_notification(user_profile_id: int, missed_message: dict[str, Any
         # TODO/compatibility: This block can be removed when one can no longer
         # upgrade from versions <= 4.0 to versions >= 5.0
         logger.warning(
-            "Send-push-notification event found for bot user %s. Skipping.", user_profile_id
+            "Send-push-notification event found for bot user %s. Skipping.", user_profile.id
         )
-        return
+        return None
 
     if not (
         user_profile.enable_offline_push_notifications
         or user_profile.enable_online_push_notifications
     ):
         # BUG: Investigate why it's possible to get here.
-        return  # nocoverage
+        return None  # nocoverage
 
     with transaction.atomic(savepoint=False):
         try:
@@ -1304,18 +1357,18 @@ def handle_push_notification(user_profile_id: int, missed_message: dict[str, Any
             if ArchivedMessage.objects.filter(id=missed_message["message_id"]).exists():
                 # If the cause is a race with the message being deleted,
                 # that's normal and we have no need to log an error.
-                return
+                return None
             logging.info(
                 "Unexpected message access failure handling push notifications: %s %s",
                 user_profile.id,
                 missed_message["message_id"],
             )
-            return
+            return None
 
         if user_message is not None:
             # If the user has read the message already, don't push-notify.
             if user_message.flags.read or user_message.flags.active_mobile_push_notification:
-                return
+                return None
 
             # Otherwise, we mark the message as having an active mobile
             # push notification, so that we can send revocation messages
@@ -1330,10 +1383,10 @@ def handle_push_notification(user_profile_id: int, missed_message: dict[str, Any
                 logger.error(
                     "Could not find UserMessage with message_id %s and user_id %s",
                     missed_message["message_id"],
-                    user_profile_id,
+                    user_profile.id,
                     exc_info=True,
                 )
-                return
+                return None
 
     trigger = missed_message["trigger"]
 
@@ -1397,7 +1450,23 @@ def handle_push_notification(user_profile_id: int, missed_message: dict[str, Any
     gcm_payload, gcm_options = get_message_payload_gcm(
         user_profile, message, mentioned_user_group_id, mentioned_user_group_name, can_access_sender
     )
-    logger.info("Sending push notifications to mobile clients for user %s", user_profile_id)
+    logger.info("Sending push notifications to mobile clients for user %s", user_profile.id)
+    return PushNotificationPayloads(
+        apns_payload=apns_payload, gcm_payload=gcm_payload, gcm_options=gcm_options
+    )
+
+
+def handle_push_notification(user_profile_id: int, missed_message: dict[str, Any]) -> None:
+    """
+    missed_message is the event received by the
+    zerver.worker.missedmessage_mobile_notifications.PushNotificationWorker.consume function.
+    """
+    if not push_notifications_configured():
+        return
+    user_profile = get_user_profile_by_id(user_profile_id)
+    payloads = get_push_notification_payloads(user_profile, missed_message)
+    if payloads is None:
+        return
 
     android_devices = list(
         PushDeviceToken.objects.filter(user=user_profile, kind=PushDeviceToken.FCM).order_by("id")
@@ -1408,7 +1477,12 @@ def handle_push_notification(user_profile_id: int, missed_message: dict[str, Any
     )
     if uses_notification_bouncer():
         send_notifications_to_bouncer(
-            user_profile, apns_payload, gcm_payload, gcm_options, android_devices, apple_devices
+            user_profile,
+            payloads.apns_payload,
+            payloads.gcm_payload,
+            payloads.gcm_options,
+            android_devices,
+            apple_devices,
         )
         return
 
@@ -1421,10 +1495,10 @@ def handle_push_notification(user_profile_id: int, missed_message: dict[str, Any
     user_identity = UserPushIdentityCompat(user_id=user_profile.id)
 
     apple_successfully_sent_count = send_apple_push_notification(
-        user_identity, apple_devices, apns_payload
+        user_identity, apple_devices, payloads.apns_payload
     )
     android_successfully_sent_count = send_android_push_notification(
-        user_identity, android_devices, gcm_payload, gcm_options
+        user_identity, android_devices, payloads.gcm_payload, payloads.gcm_options
     )
 
     do_increment_logging_stat(
@@ -1436,6 +1510,113 @@ def handle_push_notification(user_profile_id: int, missed_message: dict[str, Any
     )
 
 
+def handle_push_notifications(
+    missed_messages: list[dict[str, Any]],
+    handle_exception: Callable[[dict[str, Any], Exception], None],
+) -> list[dict[str, Any]]:
+    """
+    A batched handle_push_notification, for the missedmessage_mobile_notifications
+    worker: loads the users and their devices for all of the events
+    at once, and when sending directly to APNs and FCM, sends all of
+    the notifications together, rather than making separate requests
+    for each user.
+
+    An exception preparing or sending one event's notification is
+    passed to handle_exception with that event, and the other events
+    are still sent.  Events for users who no longer exist are skipped.
+
+    Returns the events which should be retried later, because the
+    push notification bouncer asked us to.
+    """
+    if not push_notifications_configured():
+        return []
+
+    user_profiles = UserProfile.objects.select_related("realm").in_bulk(
+        {missed_message["user_profile_id"] for missed_message in missed_messages}
+    )
+    devices: dict[tuple[int, int], list[PushDeviceToken]] = defaultdict(list)
+    for device in PushDeviceToken.objects.filter(user_id__in=user_profiles.keys()).order_by("id"):
+        devices[(device.user_id, device.kind)].append(device)
+
+    notifications: list[tuple[dict[str, Any], UserProfile, PushNotificationPayloads]] = []
+    for missed_message in missed_messages:
+        user_profile = user_profiles.get(missed_message["user_profile_id"])
+        if user_profile is None:
+            continue
+        try:
+            payloads = get_push_notification_payloads(user_profile, missed_message)
+        except Exception as e:
+            handle_exception(missed_message, e)
+            continue
+        if payloads is not None:
+            notifications.append((missed_message, user_profile, payloads))
+
+    if uses_notification_bouncer():
+        # The bouncer's API takes one notification per request.
+        retry_missed_messages = []
+        for missed_message, user_profile, payloads in notifications:
+            try:
+                send_notifications_to_bouncer(
+                    user_profile,
+                    payloads.apns_payload,
+                    payloads.gcm_payload,
+                    payloads.gcm_options,
+                    devices[(user_profile.id, PushDeviceToken.FCM)],
+                    devices[(user_profile.id, PushDeviceToken.APNS)],
+                )
+            except PushNotificationBouncerRetryLaterError:
+                retry_missed_messages.append(missed_message)
+            except Exception as e:
+                handle_exception(missed_message, e)
+        return retry_missed_messages
+
+    for missed_message, user_profile, payloads in notifications:
+        logger.info(
+            "Sending mobile push notifications for local user %s: %s via FCM devices, %s via APNs devices",
+            user_profile.id,
+            len(devices[(user_profile.id, PushDeviceToken.FCM)]),
+            len(devices[(user_profile.id, PushDeviceToken.APNS)]),
+        )
+    apple_successfully_sent_counts = send_apple_push_notifications(
+        [
+            (
+                UserPushIdentityCompat(user_id=user_profile.id),
+                devices[(user_profile.id, PushDeviceToken.APNS)],
+                payloads.apns_payload,
+            )
+            for missed_message, user_profile, payloads in notifications
+        ]
+    )
+    android_successfully_sent_counts = send_android_push_notifications(
+        [
+            (
+                UserPushIdentityCompat(user_id=user_profile.id),
+                devices[(user_profile.id, PushDeviceToken.FCM)],
+                payloads.gcm_payload,
+                payloads.gcm_options,
+            )
+            for missed_message, user_profile, payloads in notifications
+        ]
+    )
+
+    successfully_sent_counts: dict[int, int] = defaultdict(int)
+    realms: dict[int, Realm] = {}
+    for (missed_message, user_profile, payloads), apple_count, android_count in zip(
+        notifications, apple_successfully_sent_counts, android_successfully_sent_counts, strict=True
+    ):
+        successfully_sent_counts[user_profile.realm_id] += apple_count + android_count
+        realms[user_profile.realm_id] = user_profile.realm
+    for realm_id, successfully_sent_count in successfully_sent_counts.items():
+        do_increment_logging_stat(
+            realms[realm_id],
+            COUNT_STATS["mobile_pushes_sent::day"],
+            None,
+            timezone_now(),
+            increment=successfully_sent_count,
+        )
+    return []
+
+
 def send_test_push_notification_directly_to_devices(
     user_identity: UserPushIdentityCompat,
     devices: Sequence[DeviceToken],
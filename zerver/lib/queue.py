@@ -5,7 +5,7 @@ import threading
 import time
 from abc import ABC, abstractmethod
 from collections import defaultdict
-from collections.abc import Callable, Mapping
+from collections.abc import Callable, Mapping, Sequence
 from typing import Any, Generic, TypeAlias, TypeVar
 
 import orjson
@@ -24,6 +24,13 @@ from typing_extensions import override
 from zerver.lib.utils import assert_is_not_none
 
 MAX_REQUEST_RETRIES = 3
+
+# Queues which mix events that a user is waiting on with bulk work
+# (e.g. realm exports) have a priority lane: a second queue, with its
+# own worker, for events published with priority=True, so that they
+# don't wait behind a backlog of bulk work.
+QUEUES_WITH_PRIORITY_LANE = {"deferred_work", "email_senders"}
+PRIORITY_LANE_SUFFIX = "_priority"
 ChannelT = TypeVar("ChannelT", Channel, BlockingChannel)
 Consumer: TypeAlias = Callable[[ChannelT, Basic.Deliver, pika.BasicProperties, bytes], None]
 
@@ -123,12 +130,21 @@ class QueueClient(Generic[ChannelT], ABC):
     def ensure_queue(self, queue_name: str, callback: Callable[[ChannelT], object]) -> None:
         raise NotImplementedError
 
+    def get_publish_properties(self) -> pika.BasicProperties:
+        return pika.BasicProperties(
+            delivery_mode=2,
+            # Used to measure how long events wait in the queue;
+            # AMQP's timestamp property only has a resolution of
+            # seconds.
+            headers={"published_at_ms": int(time.time() * 1000)},
+        )
+
     def publish(self, queue_name: str, body: bytes) -> None:
         def do_publish(channel: ChannelT) -> None:
             channel.basic_publish(
                 exchange="",
                 routing_key=queue_name,
-                properties=pika.BasicProperties(delivery_mode=2),
+                properties=self.get_publish_properties(),
                 body=body,
             )
 
@@ -146,14 +162,30 @@ class QueueClient(Generic[ChannelT], ABC):
         self.publish(queue_name, data)
 
 
+def get_publish_time(properties: pika.BasicProperties) -> float | None:
+    if properties.headers is None or "published_at_ms" not in properties.headers:
+        # Published before we started recording the time.
+        return None
+    return properties.headers["published_at_ms"] / 1000
+
+
 class SimpleQueueClient(QueueClient[BlockingChannel]):
     connection: pika.BlockingConnection | None
+    # A channel in transactional mode, for publish_batch.
+    tx_channel: BlockingChannel | None
+
+    def __init__(self, rabbitmq_heartbeat: int | None = 0, prefetch: int = 0) -> None:
+        # When each event in the batch currently being consumed was
+        # published, where known.
+        self.batch_publish_times: list[float | None] = []
+        super().__init__(rabbitmq_heartbeat=rabbitmq_heartbeat, prefetch=prefetch)
 
     @override
     def _connect(self) -> None:
         start = time.time()
         self.connection = pika.BlockingConnection(self._get_parameters())
         self.channel = self.connection.channel()
+        self.tx_channel = None
         self.channel.basic_qos(prefetch_count=self.prefetch)
         self.log.info("SimpleQueueClient connected (connecting took %.3fs)", time.time() - start)
 
@@ -184,18 +216,57 @@ class SimpleQueueClient(QueueClient[BlockingChannel]):
 
         callback(self.channel)
 
+    def publish_batch(self, messages: Sequence[tuple[str, bytes]]) -> None:
+        """Publishes the messages in a single AMQP transaction, which
+        the server acknowledges once it has accepted all of them.  If
+        the connection is lost before then, the server discards the
+        whole batch, so it is safe to publish it again.
+
+        pika's BlockingChannel waits for each publisher confirm
+        separately, which is why this uses a transaction, on a
+        channel of its own, rather than confirms."""
+        for queue_name in dict.fromkeys(queue_name for queue_name, _ in messages):
+            self.ensure_queue(queue_name, lambda channel: None)
+        assert self.connection is not None
+        if self.tx_channel is None or not self.tx_channel.is_open:
+            self.tx_channel = self.connection.channel()
+            self.tx_channel.tx_select()
+        properties = self.get_publish_properties()
+        for queue_name, body in messages:
+            self.tx_channel.basic_publish(
+                exchange="", routing_key=queue_name, properties=properties, body=body
+            )
+        self.tx_channel.tx_commit()
+
+    def json_publish_batch(self, events: Sequence[tuple[str, Mapping[str, Any]]]) -> None:
+        messages = [(queue_name, orjson.dumps(event)) for queue_name, event in events]
+        try:
+            self.publish_batch(messages)
+            return
+        except pika.exceptions.AMQPConnectionError:
+            self.log.warning("Failed to send to rabbitmq, trying to reconnect and send again")
+
+        self._reconnect()
+        self.publish_batch(messages)
+
     def start_json_consumer(
         self,
         queue_name: str,
         callback: Callable[[list[dict[str, Any]]], None],
-        batch_size: int = 1,
+        batch_size: int | Callable[[], int] = 1,
         timeout: int | None = None,
     ) -> None:
+        """batch_size may be a function, which is called for the size
+        of each batch, so that the consumer can adjust it as it goes."""
         if batch_size == 1:
             timeout = None
 
+        def get_batch_size() -> int:
+            return batch_size() if callable(batch_size) else batch_size
+
         def do_consume(channel: BlockingChannel) -> None:
             events: list[dict[str, Any]] = []
+            publish_times: list[float | None] = []
             last_process = time.time()
             max_processed: int | None = None
             self.is_consuming = True
@@ -209,12 +280,15 @@ class SimpleQueueClient(QueueClient[BlockingChannel]):
             for method, properties, body in channel.consume(queue_name, inactivity_timeout=timeout):
                 if body is not None:
                     assert method is not None
+                    assert properties is not None
                     events.append(orjson.loads(body))
+                    publish_times.append(get_publish_time(properties))
                     max_processed = method.delivery_tag
                 now = time.time()
-                if len(events) >= batch_size or (timeout and now >= last_process + timeout):
+                if len(events) >= get_batch_size() or (timeout and now >= last_process + timeout):
                     if events:
                         assert max_processed is not None
+                        self.batch_publish_times = publish_times
                         try:
                             callback(events)
                             channel.basic_ack(max_processed, multiple=True)
@@ -223,6 +297,7 @@ class SimpleQueueClient(QueueClient[BlockingChannel]):
                                 channel.basic_nack(max_processed, multiple=True)
                             raise
                         events = []
+                        publish_times = []
                     last_process = now
                 if not self.is_consuming:
                     break
@@ -434,11 +509,20 @@ def set_queue_client(queue_client: SimpleQueueClient | TornadoQueueClient) -> No
     thread_data.queue_client = queue_client
 
 
+def get_priority_lane(queue_name: str) -> str:
+    assert queue_name in QUEUES_WITH_PRIORITY_LANE
+    return queue_name + PRIORITY_LANE_SUFFIX
+
+
 def queue_json_publish(
     queue_name: str,
     event: dict[str, Any],
     processor: Callable[[Any], None] | None = None,
+    *,
+    priority: bool = False,
 ) -> None:
+    if priority:
+        queue_name = get_priority_lane(queue_name)
     if settings.USING_RABBITMQ:
         get_queue_client().json_publish(queue_name, event)
     elif processor:
@@ -451,8 +535,49 @@ def queue_json_publish(
         get_worker(queue_name, disable_timeout=True).consume_single_event(event)
 
 
-def queue_event_on_commit(queue_name: str, event: dict[str, Any]) -> None:
-    transaction.on_commit(lambda: queue_json_publish(queue_name, event))
+def queue_json_publish_batch(events: Sequence[tuple[str, dict[str, Any]]]) -> None:
+    """Publishes each (queue name, event) pair, as queue_json_publish
+    does, but with one round trip to RabbitMQ for all of them."""
+    if len(events) > 1 and settings.USING_RABBITMQ:
+        queue_client = get_queue_client()
+        if isinstance(queue_client, SimpleQueueClient):
+            queue_client.json_publish_batch(events)
+            return
+    for queue_name, event in events:
+        queue_json_publish(queue_name, event)
+
+
+class QueuedEvents:
+    """An on_commit callback, which publishes the events passed to
+    queue_event_on_commit as a batch."""
+
+    def __init__(self) -> None:
+        self.events: list[tuple[str, dict[str, Any]]] = []
+
+    def __call__(self) -> None:
+        queue_json_publish_batch(self.events)
+
+
+def queue_event_on_commit(
+    queue_name: str, event: dict[str, Any], *, priority: bool = False
+) -> None:
+    if priority:
+        queue_name = get_priority_lane(queue_name)
+    connection = transaction.get_connection()
+    if connection.in_atomic_block and connection.run_on_commit:
+        # Django discards an on_commit callback if any savepoint it
+        # was registered in is rolled back, so events can only share
+        # a callback with events queued inside the same savepoints.
+        # We only add to the most recent callback, to keep the order
+        # of other on_commit callbacks relative to these events.
+        savepoint_ids, callback, robust = connection.run_on_commit[-1]
+        if isinstance(callback, QueuedEvents) and savepoint_ids == set(connection.savepoint_ids):
+            callback.events.append((queue_name, event))
+            return
+
+    queued_events = QueuedEvents()
+    queued_events.events.append((queue_name, event))
+    transaction.on_commit(queued_events)
 
 
 def retry_event(
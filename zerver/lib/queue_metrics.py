@@ -0,0 +1,118 @@
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+
+# Upper bounds of the histogram buckets, in the units of the
+# histogram; Prometheus adds a +Inf bucket to each.
+EVENT_AGE_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+CONSUME_SECONDS_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60)
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = buckets
+        # Cumulative, as Prometheus expects: bucket_counts[i] is the
+        # number of observations no larger than buckets[i].
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+
+
+@dataclass
+class QueueWorkerMetrics:
+    """Counters and histograms for one queue worker process, since it
+    started, which are written out in Prometheus's text exposition
+    format for node_exporter's textfile collector to serve."""
+
+    queue_name: str
+    worker_num: int
+    events_consumed: int = 0
+    events_retried: int = 0
+    events_failed: int = 0
+    events_timed_out: int = 0
+    event_age_seconds: Histogram = field(default_factory=lambda: Histogram(EVENT_AGE_BUCKETS))
+    consume_seconds: Histogram = field(default_factory=lambda: Histogram(CONSUME_SECONDS_BUCKETS))
+    batch_size: Histogram = field(default_factory=lambda: Histogram(BATCH_SIZE_BUCKETS))
+
+    def format_labels(self, **extra_labels: str) -> str:
+        labels = {"queue": self.queue_name, "worker": str(self.worker_num), **extra_labels}
+        return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}"
+
+    def format_metric(self, name: str, metric_type: str, help: str, value: float) -> list[str]:
+        return [
+            f"# HELP {name} {help}",
+            f"# TYPE {name} {metric_type}",
+            f"{name}{self.format_labels()} {value}",
+        ]
+
+    def format_histogram(self, name: str, help: str, histogram: Histogram) -> list[str]:
+        lines = [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+        for bound, count in zip(histogram.buckets, histogram.bucket_counts, strict=True):
+            lines.append(f"{name}_bucket{self.format_labels(le=str(bound))} {count}")
+        lines.append(f"{name}_bucket{self.format_labels(le='+Inf')} {histogram.count}")
+        lines.append(f"{name}_sum{self.format_labels()} {histogram.sum}")
+        lines.append(f"{name}_count{self.format_labels()} {histogram.count}")
+        return lines
+
+    def render(self, local_queue_size: int, queue_last_emptied_timestamp: float) -> str:
+        lines = [
+            *self.format_metric(
+                "zulip_queue_worker_events_consumed_total",
+                "counter",
+                "Events which the worker has processed.",
+                self.events_consumed,
+            ),
+            *self.format_metric(
+                "zulip_queue_worker_events_retried_total",
+                "counter",
+                "Events processed which were retries of an earlier, failed attempt.",
+                self.events_retried,
+            ),
+            *self.format_metric(
+                "zulip_queue_worker_events_failed_total",
+                "counter",
+                "Events which raised an exception, and were written to the errors file.",
+                self.events_failed,
+            ),
+            *self.format_metric(
+                "zulip_queue_worker_events_timed_out_total",
+                "counter",
+                "Failed events which exceeded the worker's time limit.",
+                self.events_timed_out,
+            ),
+            *self.format_metric(
+                "zulip_queue_worker_local_queue_size",
+                "gauge",
+                "Events fetched from RabbitMQ which the worker has yet to process.",
+                local_queue_size,
+            ),
+            *self.format_metric(
+                "zulip_queue_worker_last_emptied_timestamp_seconds",
+                "gauge",
+                "When the worker last had no events waiting.",
+                queue_last_emptied_timestamp,
+            ),
+            *self.format_histogram(
+                "zulip_queue_worker_event_age_seconds",
+                "Time from publishing an event until the worker started processing it.",
+                self.event_age_seconds,
+            ),
+            *self.format_histogram(
+                "zulip_queue_worker_consume_seconds",
+                "Time spent processing each batch of events.",
+                self.consume_seconds,
+            ),
+            *self.format_histogram(
+                "zulip_queue_worker_batch_size",
+                "Number of events processed together.",
+                self.batch_size,
+            ),
+        ]
+        return "\n".join(lines) + "\n"
@@ -11,7 +11,7 @@ from django.http import HttpRequest
 from typing_extensions import override
 
 from zerver.lib import redis_utils
-from zerver.lib.cache import cache_with_key
+from zerver.lib.cache import cache_with_key, register_cache_key_family
 from zerver.lib.exceptions import RateLimitedError
 from zerver.lib.redis_utils import get_redis_client
 from zerver.models import UserProfile
@@ -529,6 +529,9 @@ def is_local_addr(addr: str) -> bool:
     return addr in ("127.0.0.1", "::1")
 
 
+register_cache_key_family("tor_ip_addresses", timeout=60 * 60, value="set[str]")
+
+
 @cache_with_key(lambda: "tor_ip_addresses:", timeout=60 * 60)
 @circuit(failure_threshold=2, recovery_timeout=60 * 10)
 def get_tor_ips() -> set[str]:
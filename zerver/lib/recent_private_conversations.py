@@ -0,0 +1,267 @@
+"""Maintenance of the RecentPrivateConversation table.
+
+The table is a denormalized copy of
+
+    SELECT other_recipient_id, max(message_id) ... GROUP BY other_recipient_id
+
+over each user's direct messages, which get_recent_private_conversations
+used to compute from the user's UserMessage rows on every /register.
+It is maintained incrementally when direct messages are sent
+(increment_recent_private_conversations), and recomputed for the
+affected conversations when direct messages are deleted, archived, or
+restored (update_recent_private_conversations).
+
+Recomputation runs inside the caller's transaction, but it reads
+zerver_message without locking, so a message sent concurrently with a
+deletion in the same conversation can leave a row pointing at an
+older message than the latest one; the next message sent in that
+conversation fixes it.
+"""
+
+from collections.abc import Collection, Iterable
+from dataclasses import dataclass
+
+from django.db import connection
+from psycopg2.sql import SQL, Literal
+
+from zerver.models import Message, Recipient, Subscription, UserMessage, UserProfile
+
+REBUILD_RECENT_PRIVATE_CONVERSATIONS_QUERY = SQL(
+    """
+    INSERT INTO zerver_recentprivateconversation (user_profile_id, recipient_id, max_message_id)
+    SELECT
+        {user_profile_id},
+        CASE
+            WHEN zerver_message.recipient_id = {my_recipient_id}
+            THEN sender.recipient_id
+            ELSE zerver_message.recipient_id
+        END AS other_recipient_id,
+        max(zerver_message.id)
+    FROM zerver_usermessage
+    JOIN zerver_message ON zerver_message.id = zerver_usermessage.message_id
+    JOIN zerver_userprofile sender ON sender.id = zerver_message.sender_id
+    WHERE zerver_usermessage.user_profile_id = {user_profile_id}
+    AND zerver_usermessage.flags & 2048 <> 0
+    GROUP BY other_recipient_id
+    ON CONFLICT (user_profile_id, recipient_id) DO UPDATE SET
+        max_message_id = EXCLUDED.max_message_id
+    """
+)
+
+
+@dataclass(frozen=True)
+class RecentPrivateConversationKey:
+    realm_id: int
+    user_profile_id: int
+    # The user's own personal recipient.
+    my_recipient_id: int
+    # The conversation, as stored in RecentPrivateConversation.recipient.
+    other_recipient_id: int
+
+
+def increment_recent_private_conversations(
+    messages: Iterable[tuple[Message, Collection[int]]],
+) -> None:
+    """
+    Account for newly sent direct messages in RecentPrivateConversation;
+    called from do_send_messages, inside its transaction, with each
+    message and the IDs of the users who received a UserMessage row
+    for it.  Stream messages are ignored.
+    """
+    new_max_message_ids: dict[tuple[int, int], int] = {}
+    for message, user_profile_ids in messages:
+        if message.recipient.type not in [Recipient.PERSONAL, Recipient.DIRECT_MESSAGE_GROUP]:
+            continue
+        for user_profile_id in user_profile_ids:
+            # The other party to a 1:1 direct message sent to this
+            # user is its sender.
+            if (
+                message.recipient.type == Recipient.PERSONAL
+                and user_profile_id != message.sender_id
+            ):
+                other_recipient_id = message.sender.recipient_id
+            else:
+                other_recipient_id = message.recipient_id
+            assert other_recipient_id is not None
+            key = (user_profile_id, other_recipient_id)
+            new_max_message_ids[key] = max(new_max_message_ids.get(key, 0), message.id)
+
+    if not new_max_message_ids:
+        return
+
+    rows = [
+        SQL("({},{},{})").format(
+            Literal(user_profile_id), Literal(other_recipient_id), Literal(max_message_id)
+        )
+        for (user_profile_id, other_recipient_id), max_message_id in new_max_message_ids.items()
+    ]
+    query = SQL(
+        """
+        INSERT INTO zerver_recentprivateconversation (user_profile_id, recipient_id, max_message_id)
+        VALUES {rows}
+        ON CONFLICT (user_profile_id, recipient_id) DO UPDATE SET
+            max_message_id = greatest(
+                zerver_recentprivateconversation.max_message_id, excluded.max_message_id
+            )
+        """
+    ).format(rows=SQL(", ").join(rows))
+    with connection.cursor() as cursor:
+        cursor.execute(query)
+
+
+def get_recent_private_conversation_keys(
+    message_ids: Collection[int],
+) -> set[RecentPrivateConversationKey]:
+    """
+    Returns the conversations, for each user who has received them,
+    of the direct messages among message_ids, for use with
+    update_recent_private_conversations after those messages are
+    deleted or restored.
+    """
+    if not message_ids:
+        return set()
+
+    rows = (
+        UserMessage.objects.filter(message_id__in=message_ids)
+        .extra(  # noqa: S610
+            where=[UserMessage.where_flag_is_present(UserMessage.flags.is_private)],
+        )
+        .values_list(
+            "user_profile__realm_id",
+            "user_profile_id",
+            "user_profile__recipient_id",
+            "message__recipient_id",
+            "message__sender__recipient_id",
+        )
+    )
+    keys = set()
+    for realm_id, user_profile_id, my_recipient_id, recipient_id, sender_recipient_id in rows:
+        keys.add(
+            RecentPrivateConversationKey(
+                realm_id=realm_id,
+                user_profile_id=user_profile_id,
+                my_recipient_id=my_recipient_id,
+                other_recipient_id=(
+                    sender_recipient_id if recipient_id == my_recipient_id else recipient_id
+                ),
+            )
+        )
+    return keys
+
+
+def get_direct_message_group_conversation_keys(
+    recipient_ids: Collection[int],
+) -> set[RecentPrivateConversationKey]:
+    """
+    Returns the conversations of every member of the given group
+    direct message recipients, e.g. for use after deleting a user
+    whose messages in those groups are deleted with them.
+    """
+    rows = Subscription.objects.filter(
+        recipient_id__in=recipient_ids, recipient__type=Recipient.DIRECT_MESSAGE_GROUP
+    ).values_list(
+        "user_profile__realm_id", "user_profile_id", "user_profile__recipient_id", "recipient_id"
+    )
+    return {
+        RecentPrivateConversationKey(
+            realm_id=realm_id,
+            user_profile_id=user_profile_id,
+            my_recipient_id=my_recipient_id,
+            other_recipient_id=recipient_id,
+        )
+        for realm_id, user_profile_id, my_recipient_id, recipient_id in rows
+    }
+
+
+def update_recent_private_conversations(keys: Iterable[RecentPrivateConversationKey]) -> None:
+    """
+    Recompute the RecentPrivateConversation rows for the given
+    conversations from zerver_usermessage, in a single query which
+    upserts the conversations that still have messages and deletes
+    the rest.
+    """
+    rows = [
+        SQL("({},{},{},{})").format(
+            Literal(key.realm_id),
+            Literal(key.user_profile_id),
+            Literal(key.my_recipient_id),
+            Literal(key.other_recipient_id),
+        )
+        for key in set(keys)
+    ]
+    if not rows:
+        return
+
+    query = SQL(
+        """
+        WITH conversation (realm_id, user_profile_id, my_recipient_id, other_recipient_id) AS (
+            VALUES {rows}
+        ),
+        latest AS (
+            SELECT
+                conversation.user_profile_id,
+                conversation.other_recipient_id,
+                (
+                    SELECT max(zerver_message.id)
+                    FROM zerver_message
+                    JOIN zerver_usermessage ON zerver_usermessage.message_id = zerver_message.id
+                    WHERE zerver_message.realm_id = conversation.realm_id
+                    AND zerver_usermessage.user_profile_id = conversation.user_profile_id
+                    AND zerver_usermessage.flags & 2048 <> 0
+                    AND (
+                        (
+                            zerver_message.recipient_id = conversation.other_recipient_id
+                            AND zerver_message.recipient_id <> conversation.my_recipient_id
+                        )
+                        OR (
+                            zerver_message.recipient_id = conversation.my_recipient_id
+                            AND zerver_message.sender_id IN (
+                                SELECT id
+                                FROM zerver_userprofile
+                                WHERE recipient_id = conversation.other_recipient_id
+                            )
+                        )
+                    )
+                ) AS max_message_id
+            FROM conversation
+        ),
+        deleted AS (
+            DELETE FROM zerver_recentprivateconversation
+            USING latest
+            WHERE zerver_recentprivateconversation.user_profile_id = latest.user_profile_id
+            AND zerver_recentprivateconversation.recipient_id = latest.other_recipient_id
+            AND latest.max_message_id IS NULL
+        )
+        INSERT INTO zerver_recentprivateconversation (user_profile_id, recipient_id, max_message_id)
+        SELECT user_profile_id, other_recipient_id, max_message_id
+        FROM latest
+        WHERE max_message_id IS NOT NULL
+        ON CONFLICT (user_profile_id, recipient_id) DO UPDATE SET
+            max_message_id = EXCLUDED.max_message_id
+        """
+    ).format(rows=SQL(", ").join(rows))
+    with connection.cursor() as cursor:
+        # Uses index: zerver_message_realm_recipient_id and
+        # zerver_message_realm_sender_recipient
+        cursor.execute(query)
+
+
+def rebuild_recent_private_conversations(user_profiles: Iterable[UserProfile]) -> None:
+    """
+    Recompute all of the RecentPrivateConversation rows for the given
+    users, e.g. after importing a realm.
+    """
+    for user_profile in user_profiles:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                SQL(
+                    "DELETE FROM zerver_recentprivateconversation WHERE user_profile_id = {id}"
+                ).format(id=Literal(user_profile.id))
+            )
+            # Uses index: zerver_usermessage_is_private_message_id
+            cursor.execute(
+                REBUILD_RECENT_PRIVATE_CONVERSATIONS_QUERY.format(
+                    user_profile_id=Literal(user_profile.id),
+                    my_recipient_id=Literal(user_profile.recipient_id),
+                )
+            )
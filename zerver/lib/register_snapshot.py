@@ -0,0 +1,136 @@
+"""Shared, per-realm cache of the sections of the /register response
+that are identical for every user in a realm (custom emoji, linkifiers,
+user groups, default channels, etc.).
+
+After a server restart, every client registers a new event queue at
+about the same time; without this cache, each of those registrations
+recomputes the same realm-wide data from the database.
+
+Each section is cached under a per-realm, per-section generation
+token (see get_generation_tokens).  Sending an event of a type that
+can change a section (see REGISTER_SNAPSHOT_SECTIONS_BY_EVENT_TYPE)
+discards the token for that section, so the next registration
+recomputes it.  Since clients rely on those same events to keep their
+copy of the state up to date, any change that is correctly reflected
+in clients is also reflected in this cache.
+
+The tokens double as section versions for clients: a reconnecting
+client can send the versions from its previous registration, and
+sections whose version has not changed are left out of the response.
+"""
+
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from typing import Any
+
+from zerver.lib.cache import (
+    cache_get_many,
+    cache_set_many,
+    discard_generation_tokens,
+    get_generation_tokens,
+    register_cache_key_family,
+)
+
+REGISTER_SNAPSHOT_CACHE_TIMEOUT = 3600 * 24
+
+# For each event type, the snapshot sections that events of that type
+# can change.  Sections are named after the /register state key they
+# provide.
+REGISTER_SNAPSHOT_SECTIONS_BY_EVENT_TYPE: dict[str, list[str]] = {
+    "custom_profile_fields": ["custom_profile_fields"],
+    "default_stream_groups": ["realm_default_stream_groups"],
+    "default_streams": ["realm_default_streams"],
+    "realm_domains": ["realm_domains"],
+    "realm_emoji": ["realm_emoji"],
+    "realm_linkifiers": ["realm_linkifiers"],
+    "realm_playgrounds": ["realm_playgrounds"],
+    # Default channels and default channel groups embed channel
+    # properties like the name and description.
+    "stream": ["realm_default_streams", "realm_default_stream_groups"],
+    "user_group": ["realm_user_groups"],
+}
+
+
+register_cache_key_family("register_snapshot_generation", timeout=None, value="str")
+register_cache_key_family(
+    "register_snapshot", timeout=REGISTER_SNAPSHOT_CACHE_TIMEOUT, value="Any; a /register section"
+)
+
+
+def register_snapshot_generation_key(realm_id: int, section: str) -> str:
+    return f"register_snapshot_generation:{realm_id}:{section}"
+
+
+def register_snapshot_key(realm_id: int, section: str, token: str) -> str:
+    return f"register_snapshot:{realm_id}:{section}:{token}"
+
+
+@dataclass
+class RegisterSnapshot:
+    sections: dict[str, Any]
+    # The current generation token for every requested section,
+    # which clients can send back in their next /register request
+    # to avoid redownloading sections that have not changed.
+    versions: dict[str, str]
+
+
+def get_register_snapshot(
+    realm_id: int,
+    fetchers: dict[str, Callable[[], Any]],
+    known_versions: dict[str, str] | None = None,
+) -> RegisterSnapshot:
+    """Returns the value of each requested section, computing and
+    caching any that are missing using the provided fetchers.
+
+    Sections whose current version matches the one in known_versions
+    are omitted, since the client already has them.
+
+    Values are unpickled from the cache for each call, so the caller
+    is free to mutate them.
+    """
+    if not fetchers:
+        return RegisterSnapshot(sections={}, versions={})
+    if known_versions is None:
+        known_versions = {}
+
+    tokens = get_generation_tokens(
+        [register_snapshot_generation_key(realm_id, section) for section in fetchers]
+    )
+    versions = {
+        section: tokens[register_snapshot_generation_key(realm_id, section)] for section in fetchers
+    }
+    keys = {
+        section: register_snapshot_key(realm_id, section, version)
+        for section, version in versions.items()
+        if known_versions.get(section) != version
+    }
+    cached = cache_get_many(list(keys.values()))
+
+    sections: dict[str, Any] = {}
+    items_for_remote_cache: dict[str, Any] = {}
+    for section, key in keys.items():
+        if key in cached:
+            sections[section] = cached[key][0]
+        else:
+            sections[section] = fetchers[section]()
+            items_for_remote_cache[key] = (sections[section],)
+
+    if items_for_remote_cache:
+        cache_set_many(items_for_remote_cache, timeout=REGISTER_SNAPSHOT_CACHE_TIMEOUT)
+    return RegisterSnapshot(sections=sections, versions=versions)
+
+
+def get_register_snapshot_sections_for_events(events: Iterable[dict[str, Any]]) -> set[str]:
+    return {
+        section
+        for event in events
+        for section in REGISTER_SNAPSHOT_SECTIONS_BY_EVENT_TYPE.get(event["type"], [])
+    }
+
+
+def invalidate_register_snapshot_for_event(realm_id: int, event_type: str) -> None:
+    sections = REGISTER_SNAPSHOT_SECTIONS_BY_EVENT_TYPE.get(event_type)
+    if sections:
+        discard_generation_tokens(
+            [register_snapshot_generation_key(realm_id, section) for section in sections]
+        )
@@ -28,6 +28,7 @@
 # deletions.
 import logging
 import time
+from collections import defaultdict
 from collections.abc import Iterable, Mapping
 from datetime import timedelta
 from typing import Any
@@ -38,8 +39,14 @@ from django.db.models import Model
 from django.utils.timezone import now as timezone_now
 from psycopg2.sql import SQL, Composable, Identifier, Literal
 
+from zerver.lib.first_unread_cache import invalidate_first_unread_for_recipients
 from zerver.lib.logging_util import log_to_file
+from zerver.lib.recent_private_conversations import (
+    get_recent_private_conversation_keys,
+    update_recent_private_conversations,
+)
 from zerver.lib.request import RequestVariableConversionError
+from zerver.lib.topic import update_topic_summaries_for_keys
 from zerver.models import (
     ArchivedAttachment,
     ArchivedReaction,
@@ -318,14 +325,47 @@ def move_attachment_messages_to_archive(msg_ids: list[int]) -> None:
         cursor.execute(query, dict(message_ids=tuple(msg_ids)))
 
 
+def get_conversation_keys(
+    msg_ids: list[int],
+) -> tuple[dict[tuple[int, int], set[str]], list[int]]:
+    """
+    Returns the (realm_id, recipient_id) -> {topic names} map for the
+    stream messages among msg_ids, for use with
+    update_topic_summaries_for_keys, and the IDs of the direct
+    messages among them, so that get_recent_private_conversation_keys
+    only scans UserMessage rows when there are direct messages.
+    """
+    topic_summary_keys: dict[tuple[int, int], set[str]] = defaultdict(set)
+    direct_message_ids: list[int] = []
+    if not msg_ids:
+        return topic_summary_keys, direct_message_ids
+
+    # Uses index: zerver_message_pkey
+    rows = Message.objects.filter(id__in=msg_ids).values_list(
+        "id", "realm_id", "recipient_id", "recipient__type", "subject"
+    )
+    for message_id, realm_id, recipient_id, recipient_type, topic_name in rows:
+        if recipient_type == Recipient.STREAM:
+            topic_summary_keys[(realm_id, recipient_id)].add(topic_name)
+        else:
+            direct_message_ids.append(message_id)
+    return topic_summary_keys, direct_message_ids
+
+
 def delete_messages(msg_ids: list[int]) -> None:
     # Important note: This also deletes related objects with a foreign
     # key to Message (due to `on_delete=CASCADE` in our models
     # configuration), so we need to be sure we've taken care of
     # archiving the messages before doing this step.
-    #
+    topic_summary_keys, direct_message_ids = get_conversation_keys(msg_ids)
+    recent_private_conversation_keys = get_recent_private_conversation_keys(direct_message_ids)
     # Uses index: zerver_message_pkey
     Message.objects.filter(id__in=msg_ids).delete()
+    update_topic_summaries_for_keys(topic_summary_keys)
+    update_recent_private_conversations(recent_private_conversation_keys)
+    invalidate_first_unread_for_recipients(
+        recipient_id for realm_id, recipient_id in topic_summary_keys
+    )
 
 
 def delete_expired_attachments(realm: Realm) -> None:
@@ -581,7 +621,16 @@ def restore_data_from_archive(archive_transaction: ArchiveTransaction) -> int:
     # the block ends.
     with transaction.atomic():
         msg_ids = restore_messages_from_archive(archive_transaction.id)
+        topic_summary_keys, direct_message_ids = get_conversation_keys(msg_ids)
+        update_topic_summaries_for_keys(topic_summary_keys)
+        invalidate_first_unread_for_recipients(
+            recipient_id for realm_id, recipient_id in topic_summary_keys
+        )
         restore_models_with_message_key_from_archive(archive_transaction.id)
+        # This needs the restored UserMessage rows.
+        update_recent_private_conversations(
+            get_recent_private_conversation_keys(direct_message_ids)
+        )
         restore_attachments_from_archive(archive_transaction.id)
         restore_attachment_messages_from_archive(archive_transaction.id)
 
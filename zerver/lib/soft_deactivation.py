@@ -11,6 +11,7 @@ from django.db.models.functions import Greatest
 from django.utils.timezone import now as timezone_now
 from sentry_sdk import capture_exception
 
+from zerver.lib.first_unread_cache import invalidate_first_unread_for_users
 from zerver.lib.logging_util import log_to_file
 from zerver.lib.queue import queue_json_publish
 from zerver.lib.user_message import bulk_insert_all_ums
@@ -237,6 +238,9 @@ def add_missing_messages(user_profile: UserProfile) -> None:
         user_profile, stream_messages, all_stream_subscription_logs
     )
 
+    if len(message_ids_to_insert) > 0:
+        invalidate_first_unread_for_users([user_profile.id])
+
     # Doing a bulk create for all the UserMessage objects stored for creation.
     while len(message_ids_to_insert) > 0:
         message_ids, message_ids_to_insert = (
@@ -2,7 +2,9 @@ import collections
 import itertools
 import os
 import re
+import socketserver
 import sys
+import threading
 import time
 from collections.abc import Callable, Iterable, Iterator, Mapping
 from contextlib import contextmanager
@@ -236,6 +238,53 @@ def stdout_suppressed() -> Iterator[IO[str]]:
             sys.stdout = stdout
 
 
+@dataclass
+class SMTPServerStats:
+    connections: int = 0
+    noops: int = 0
+    messages: int = 0
+
+
+@contextmanager
+def local_smtp_server() -> Iterator[tuple[int, SMTPServerStats]]:
+    """A minimal SMTP server on a local port, which accepts and discards
+    every email, and counts the connections, NOOPs and emails it
+    receives.  Yields the port it listens on, and the counts."""
+    stats = SMTPServerStats()
+
+    class Handler(socketserver.StreamRequestHandler):
+        @override
+        def handle(self) -> None:
+            stats.connections += 1
+            self.wfile.write(b"220 localhost ESMTP\r\n")
+            while line := self.rfile.readline():
+                command = line.split(b" ", 1)[0].strip().upper()
+                if command == b"EHLO":
+                    self.wfile.write(b"250 localhost\r\n")
+                elif command == b"DATA":
+                    self.wfile.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                    while self.rfile.readline() not in (b".\r\n", b""):
+                        pass
+                    stats.messages += 1
+                    self.wfile.write(b"250 OK\r\n")
+                elif command == b"QUIT":
+                    self.wfile.write(b"221 Bye\r\n")
+                    return
+                else:
+                    if command == b"NOOP":
+                        stats.noops += 1
+                    self.wfile.write(b"250 OK\r\n")
+
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield server.server_address[1], stats
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
 def reset_email_visibility_to_everyone_in_zulip_realm() -> None:
     """
     This function is used to reset email visibility for all users and
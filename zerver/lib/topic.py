@@ -1,4 +1,4 @@
-from collections.abc import Callable
+from collections.abc import Callable, Iterable
 from datetime import datetime
 from typing import Any
 
@@ -6,11 +6,12 @@ import orjson
 from django.db import connection
 from django.db.models import F, Func, JSONField, Q, QuerySet, Subquery, TextField, Value
 from django.db.models.functions import Cast
+from psycopg2.sql import SQL, Literal
 
 from zerver.lib.request import REQ
 from zerver.lib.types import EditHistoryEvent
 from zerver.lib.utils import assert_is_not_none
-from zerver.models import Message, Reaction, Stream, UserMessage, UserProfile
+from zerver.models import Message, Reaction, Stream, TopicSummary, UserMessage, UserProfile
 
 # Only use these constants for events.
 ORIG_TOPIC = "orig_subject"
@@ -237,28 +238,17 @@ def generate_topic_history_from_db_rows(rows: list[tuple[str, int]]) -> list[dic
 
 
 def get_topic_history_for_public_stream(realm_id: int, recipient_id: int) -> list[dict[str, Any]]:
-    cursor = connection.cursor()
-    # Uses index: zerver_message_realm_recipient_subject
-    # Note that this is *case-sensitive*, so that we can display the
-    # most recently-used case (in generate_topic_history_from_db_rows)
-    query = """
-    SELECT
-        "zerver_message"."subject" as topic,
-        max("zerver_message".id) as max_message_id
-    FROM "zerver_message"
-    WHERE (
-        "zerver_message"."realm_id" = %s AND
-        "zerver_message"."recipient_id" = %s
-    )
-    GROUP BY (
-        "zerver_message"."subject"
+    # Rather than grouping every message in the stream by topic, we
+    # read the precomputed TopicSummary rows.  These are
+    # *case-sensitive*, so that we can display the most recently-used
+    # case (in generate_topic_history_from_db_rows).
+    #
+    # Uses index: zerver_topicsummary_recipient_topic_uniq (prefix)
+    rows = list(
+        TopicSummary.objects.filter(realm_id=realm_id, recipient_id=recipient_id).values_list(
+            "topic_name", "max_message_id"
+        )
     )
-    ORDER BY max("zerver_message".id) DESC
-    """
-    cursor.execute(query, [realm_id, recipient_id])
-    rows = cursor.fetchall()
-    cursor.close()
-
     return generate_topic_history_from_db_rows(rows)
 
 
@@ -268,6 +258,9 @@ def get_topic_history_for_stream(
     if public_history:
         return get_topic_history_for_public_stream(user_profile.realm_id, recipient_id)
 
+    # For streams with protected history, which topics (and which
+    # max_message_id) a user can see depends on which messages they
+    # have UserMessage rows for, so TopicSummary can't be used here.
     cursor = connection.cursor()
     # Uses index: zerver_message_realm_recipient_subject
     # Note that this is *case-sensitive*, so that we can display the
@@ -333,3 +326,187 @@ def participants_for_topic(realm_id: int, recipient_id: int, topic_name: str) ->
         ).values_list("id", flat=True)
     )
     return participants
+
+
+# The TopicSummary table is a denormalized copy of
+#   SELECT subject, max(id), count(*) FROM zerver_message GROUP BY subject
+# for each stream, used to serve topic lists without scanning every
+# message in the stream.  It is maintained incrementally when
+# messages are sent (increment_topic_summaries), and recomputed for
+# the affected topics when messages are edited, moved, deleted,
+# archived, or restored (update_topic_summaries).
+#
+# Recomputation runs inside the caller's transaction, but it reads
+# zerver_message without locking, so a message sent concurrently
+# with a topic move can leave a row off by one; the
+# audit_topic_summaries management command repairs any such drift.
+TOPIC_SUMMARY_RECOMPUTE_QUERY = SQL(
+    """
+    INSERT INTO zerver_topicsummary
+        (realm_id, recipient_id, topic_name, max_message_id, message_count, is_resolved)
+    SELECT
+        zerver_message.realm_id,
+        zerver_message.recipient_id,
+        zerver_message.subject,
+        max(zerver_message.id),
+        count(*),
+        starts_with(zerver_message.subject, {resolved_topic_prefix})
+    FROM zerver_message
+    WHERE zerver_message.realm_id = {realm_id}
+    AND zerver_message.recipient_id = {recipient_id}
+    {topic_condition}
+    GROUP BY zerver_message.realm_id, zerver_message.recipient_id, zerver_message.subject
+    ON CONFLICT (recipient_id, topic_name) DO UPDATE SET
+        max_message_id = EXCLUDED.max_message_id,
+        message_count = EXCLUDED.message_count,
+        is_resolved = EXCLUDED.is_resolved
+    """
+)
+
+
+def increment_topic_summaries(messages: Iterable[Message]) -> None:
+    """
+    Account for newly sent messages in TopicSummary; called from
+    do_send_messages, inside its transaction.  Non-stream messages
+    are ignored.
+    """
+    new_topic_messages: dict[tuple[int, int, str], tuple[int, int]] = {}
+    for message in messages:
+        if not message.is_stream_message():
+            continue
+        key = (message.realm_id, message.recipient_id, message.topic_name())
+        max_message_id, count = new_topic_messages.get(key, (0, 0))
+        new_topic_messages[key] = (max(max_message_id, message.id), count + 1)
+
+    if not new_topic_messages:
+        return
+
+    rows = []
+    for key_tuple, value_tuple in new_topic_messages.items():
+        realm_id, recipient_id, topic_name = key_tuple
+        max_message_id, count = value_tuple
+        rows.append(
+            SQL("({},{},{},{},{},{})").format(
+                Literal(realm_id),
+                Literal(recipient_id),
+                Literal(topic_name),
+                Literal(max_message_id),
+                Literal(count),
+                Literal(topic_name.startswith(RESOLVED_TOPIC_PREFIX)),
+            )
+        )
+
+    # Perform a single bulk UPSERT for all of the rows
+    query = SQL(
+        """
+        INSERT INTO zerver_topicsummary
+            (realm_id, recipient_id, topic_name, max_message_id, message_count, is_resolved)
+        VALUES {rows}
+        ON CONFLICT (recipient_id, topic_name) DO UPDATE SET
+            max_message_id = greatest(zerver_topicsummary.max_message_id, excluded.max_message_id),
+            message_count = zerver_topicsummary.message_count + excluded.message_count
+        """
+    ).format(rows=SQL(", ").join(rows))
+    with connection.cursor() as cursor:
+        cursor.execute(query)
+
+
+def update_topic_summaries(realm_id: int, recipient_id: int, topic_names: Iterable[str]) -> None:
+    """
+    Recompute the TopicSummary rows for the given topics of a stream
+    from zerver_message.  Topic names are matched case-insensitively,
+    since topic edits, moves, and deletions all operate on every
+    casing of a topic.
+    """
+    for topic_name in set(topic_names):
+        topic_condition = SQL("AND upper(zerver_message.subject) = upper({topic_name})").format(
+            topic_name=Literal(topic_name)
+        )
+        with connection.cursor() as cursor:
+            # Uses index: zerver_topicsummary_recipient_upper_topic
+            cursor.execute(
+                SQL(
+                    """
+                    DELETE FROM zerver_topicsummary
+                    WHERE recipient_id = {recipient_id}
+                    AND upper(topic_name) = upper({topic_name})
+                    """
+                ).format(recipient_id=Literal(recipient_id), topic_name=Literal(topic_name))
+            )
+            # Uses index: zerver_message_realm_recipient_upper_subject
+            cursor.execute(
+                TOPIC_SUMMARY_RECOMPUTE_QUERY.format(
+                    realm_id=Literal(realm_id),
+                    recipient_id=Literal(recipient_id),
+                    resolved_topic_prefix=Literal(RESOLVED_TOPIC_PREFIX),
+                    topic_condition=topic_condition,
+                )
+            )
+
+
+def update_topic_summaries_for_keys(topics: dict[tuple[int, int], set[str]]) -> None:
+    for (realm_id, recipient_id), topic_names in topics.items():
+        update_topic_summaries(realm_id, recipient_id, topic_names)
+
+
+def rebuild_topic_summaries_for_stream(realm_id: int, recipient_id: int) -> None:
+    """
+    Recompute all of the TopicSummary rows for a stream, e.g. after
+    bulk operations like merging streams or importing a realm.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            SQL("DELETE FROM zerver_topicsummary WHERE recipient_id = {recipient_id}").format(
+                recipient_id=Literal(recipient_id)
+            )
+        )
+        # Uses index: zerver_message_realm_recipient_subject
+        cursor.execute(
+            TOPIC_SUMMARY_RECOMPUTE_QUERY.format(
+                realm_id=Literal(realm_id),
+                recipient_id=Literal(recipient_id),
+                resolved_topic_prefix=Literal(RESOLVED_TOPIC_PREFIX),
+                topic_condition=SQL(""),
+            )
+        )
+
+
+def get_stale_topic_summaries(realm_id: int, recipient_id: int) -> list[str]:
+    """
+    Returns the topic names in a stream whose TopicSummary row (or
+    lack thereof) doesn't match the messages in zerver_message; used
+    by the audit_topic_summaries management command.
+    """
+    query = SQL(
+        """
+        SELECT coalesce(actual.topic_name, summary.topic_name)
+        FROM (
+            SELECT
+                zerver_message.subject AS topic_name,
+                max(zerver_message.id) AS max_message_id,
+                count(*) AS message_count
+            FROM zerver_message
+            WHERE zerver_message.realm_id = {realm_id}
+            AND zerver_message.recipient_id = {recipient_id}
+            GROUP BY zerver_message.subject
+        ) AS actual
+        FULL OUTER JOIN (
+            SELECT topic_name, max_message_id, message_count, is_resolved
+            FROM zerver_topicsummary
+            WHERE zerver_topicsummary.recipient_id = {recipient_id}
+        ) AS summary
+        ON actual.topic_name = summary.topic_name
+        WHERE actual.topic_name IS NULL
+        OR summary.topic_name IS NULL
+        OR actual.max_message_id != summary.max_message_id
+        OR actual.message_count != summary.message_count
+        OR starts_with(actual.topic_name, {resolved_topic_prefix}) != summary.is_resolved
+        """
+    ).format(
+        realm_id=Literal(realm_id),
+        recipient_id=Literal(recipient_id),
+        resolved_topic_prefix=Literal(RESOLVED_TOPIC_PREFIX),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(query)
+        return [topic_name for (topic_name,) in cursor.fetchall()]
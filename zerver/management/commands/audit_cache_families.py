@@ -0,0 +1,147 @@
+import pickle
+from argparse import ArgumentParser
+from collections.abc import Callable
+from typing import Any
+
+from django.db.models import QuerySet
+from typing_extensions import override
+
+from zerver.lib import cache
+from zerver.lib.cache import (
+    active_non_guest_user_ids_cache_key,
+    active_user_ids_cache_key,
+    bot_dicts_in_realm_cache_key,
+    cache_get_many,
+    cache_key_families,
+    display_recipient_cache_key,
+    get_muting_users_cache_key,
+    get_realm_seat_count_cache_key,
+    get_realm_used_upload_space_cache_key,
+    realm_alert_words_automaton_cache_key,
+    realm_alert_words_cache_key,
+    realm_rendered_description_cache_key,
+    realm_text_description_cache_key,
+    realm_user_dicts_cache_key,
+    single_user_display_recipient_cache_key,
+    to_dict_cache_key_id,
+    user_profile_by_api_key_cache_key,
+    user_profile_by_id_cache_key,
+    user_profile_cache_key_id,
+    user_profile_delivery_email_cache_key,
+)
+from zerver.lib.management import ZulipBaseCommand
+from zerver.models import Client, Message, Realm, Recipient, UserProfile
+from zerver.models.clients import get_client_cache_key
+from zerver.models.realm_emoji import get_all_custom_emoji_for_realm_cache_key
+
+
+def realm_ids() -> QuerySet[Any]:
+    return Realm.objects.values_list("id", flat=True)
+
+
+def user_ids() -> QuerySet[Any]:
+    return UserProfile.objects.values_list("id", flat=True)
+
+
+# For each cache key family whose keys can be derived from database
+# rows, a function returning those rows, and a function computing a
+# row's cache key.
+CACHE_KEY_FAMILY_SAMPLERS: dict[str, tuple[Callable[[], QuerySet[Any]], Callable[[Any], str]]] = {
+    "active_non_guest_user_ids": (realm_ids, active_non_guest_user_ids_cache_key),
+    "active_user_ids": (realm_ids, active_user_ids_cache_key),
+    "bot_dicts_in_realm": (realm_ids, bot_dicts_in_realm_cache_key),
+    "display_recipient_dict": (
+        lambda: Recipient.objects.values_list("id", flat=True),
+        display_recipient_cache_key,
+    ),
+    "get_client": (lambda: Client.objects.values_list("name", flat=True), get_client_cache_key),
+    "message_dict": (lambda: Message.objects.values_list("id", flat=True), to_dict_cache_key_id),
+    "muting_users_list": (user_ids, get_muting_users_cache_key),
+    "realm_alert_words": (realm_ids, realm_alert_words_cache_key),
+    "realm_alert_words_automaton": (realm_ids, realm_alert_words_automaton_cache_key),
+    "realm_emoji": (realm_ids, get_all_custom_emoji_for_realm_cache_key),
+    "realm_rendered_description": (
+        lambda: Realm.objects.only("string_id"),
+        realm_rendered_description_cache_key,
+    ),
+    "realm_seat_count": (realm_ids, get_realm_seat_count_cache_key),
+    "realm_text_description": (
+        lambda: Realm.objects.only("string_id"),
+        realm_text_description_cache_key,
+    ),
+    "realm_used_upload_space": (realm_ids, get_realm_used_upload_space_cache_key),
+    "realm_user_dicts": (realm_ids, realm_user_dicts_cache_key),
+    "single_user_display_recipient": (user_ids, single_user_display_recipient_cache_key),
+    "user_profile": (
+        lambda: UserProfile.objects.values_list("email", "realm_id"),
+        lambda row: user_profile_cache_key_id(*row),
+    ),
+    "user_profile_by_api_key": (
+        lambda: UserProfile.objects.values_list("api_key", flat=True),
+        user_profile_by_api_key_cache_key,
+    ),
+    "user_profile_by_delivery_email": (
+        lambda: UserProfile.objects.values_list("delivery_email", "realm_id"),
+        lambda row: user_profile_delivery_email_cache_key(*row),
+    ),
+    "user_profile_by_id": (user_ids, user_profile_by_id_cache_key),
+}
+
+
+def format_timeout(timeout: int | None) -> str:
+    if timeout is None:
+        return "default"
+    return f"{timeout}s"
+
+
+class Command(ZulipBaseCommand):
+    help = """Estimate how much memcached memory each cache key family uses.
+
+For each registered family whose keys can be derived from database rows,
+looks up the keys for the most recently created rows, and extrapolates
+from how many of them are cached, and their (uncompressed) size, to the
+whole table.  Since recent rows are more likely to be cached, this
+overestimates families of per-row keys."""
+
+    @override
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument(
+            "--sample-size",
+            type=int,
+            default=1000,
+            help="Number of keys to look up in each family.",
+        )
+        parser.add_argument(
+            "--family",
+            action="append",
+            choices=sorted(CACHE_KEY_FAMILY_SAMPLERS),
+            help="Only sample this family; may be repeated.",
+        )
+
+    @override
+    def handle(self, *args: Any, **options: Any) -> None:
+        families = options["family"] or sorted(CACHE_KEY_FAMILY_SAMPLERS)
+        print(
+            f"{'family':<32} {'timeout':>9} {'cached':>13} {'avg bytes':>10} {'estimated MB':>13}"
+        )
+        for family in families:
+            rows_function, key_function = CACHE_KEY_FAMILY_SAMPLERS[family]
+            rows = rows_function()
+            population = rows.count()
+            keys = [key_function(row) for row in rows.order_by("-id")[: options["sample_size"]]]
+            values = cache_get_many(keys)
+            sizes = [
+                len(cache.KEY_PREFIX + key) + len(pickle.dumps(value, protocol=4))
+                for key, value in values.items()
+            ]
+            average_size = sum(sizes) / len(sizes) if sizes else 0
+            cached_fraction = len(values) / len(keys) if keys else 0
+            estimated_mb = population * cached_fraction * average_size / 2**20
+            print(
+                f"{family:<32} {format_timeout(cache_key_families[family].timeout):>9}"
+                f" {len(values):>6}/{len(keys):<6} {average_size:>10.0f} {estimated_mb:>13.1f}"
+            )
+
+        unsampled = sorted(set(cache_key_families) - set(CACHE_KEY_FAMILY_SAMPLERS))
+        if options["family"] is None and unsampled:
+            print("\nNot sampled: " + ", ".join(unsampled))
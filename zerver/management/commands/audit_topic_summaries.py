@@ -0,0 +1,46 @@
+from argparse import ArgumentParser
+from typing import Any
+
+from django.db import transaction
+from typing_extensions import override
+
+from zerver.lib.management import ZulipBaseCommand
+from zerver.lib.topic import get_stale_topic_summaries, update_topic_summaries
+from zerver.models import Stream
+
+
+class Command(ZulipBaseCommand):
+    help = """Find and fix topic summaries which don't match the messages in their stream."""
+
+    @override
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        self.add_realm_args(parser)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report out-of-date topics, without fixing them.",
+        )
+
+    @override
+    def handle(self, *args: Any, **options: Any) -> None:
+        realm = self.get_realm(options)
+        streams = Stream.objects.exclude(recipient_id=None).order_by("id")
+        if realm is not None:
+            streams = streams.filter(realm=realm)
+
+        fixed_topic_count = 0
+        for stream_id, realm_id, recipient_id in streams.values_list(
+            "id", "realm_id", "recipient_id"
+        ):
+            with transaction.atomic():
+                stale_topic_names = get_stale_topic_summaries(realm_id, recipient_id)
+                if not stale_topic_names:
+                    continue
+                if options["dry_run"]:
+                    print(f"Stream {stream_id}: {len(stale_topic_names)} out-of-date topics.")
+                    continue
+                update_topic_summaries(realm_id, recipient_id, stale_topic_names)
+                fixed_topic_count += len(stale_topic_names)
+
+        if not options["dry_run"]:
+            print(f"Fixed {fixed_topic_count} topics.")
@@ -1,9 +1,16 @@
 from argparse import ArgumentParser
 from typing import Any
 
+from django.conf import settings
+from django.core.management.base import CommandError
 from typing_extensions import override
 
-from zerver.lib.cache_helpers import cache_fillers, fill_remote_cache
+from zerver.lib.cache_helpers import (
+    cache_fillers,
+    fill_realms_remote_caches,
+    fill_remote_cache,
+    realm_cache_fillers,
+)
 from zerver.lib.management import ZulipBaseCommand
 
 
@@ -11,14 +18,40 @@ class Command(ZulipBaseCommand):
     @override
     def add_arguments(self, parser: ArgumentParser) -> None:
         parser.add_argument(
-            "--cache", help="Populate one specific cache", choices=cache_fillers.keys()
+            "--cache",
+            help="Populate one specific cache",
+            choices=[*cache_fillers.keys(), *realm_cache_fillers.keys()],
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=settings.DEFAULT_DATA_EXPORT_IMPORT_PARALLELISM,
+            help="Processes to use for populating per-realm caches in parallel",
+        )
+        parser.add_argument(
+            "--max-db-queries-per-second",
+            type=float,
+            help="Limit on the rate of database queries, shared between the processes",
         )
 
     @override
-    def handle(self, *args: Any, **options: str | None) -> None:
-        if options["cache"] is not None:
-            fill_remote_cache(options["cache"])
+    def handle(self, *args: Any, **options: Any) -> None:
+        if options["processes"] < 1:
+            raise CommandError("You must have at least one process.")
+        max_db_queries_per_second = options["max_db_queries_per_second"]
+
+        if options["cache"] in cache_fillers:
+            fill_remote_cache(options["cache"], max_db_queries_per_second)
+            return
+        if options["cache"] in realm_cache_fillers:
+            fill_realms_remote_caches(
+                [options["cache"]], options["processes"], max_db_queries_per_second
+            )
             return
 
-        for cache in cache_fillers:
-            fill_remote_cache(cache)
+        # Clients are needed by almost every request, and are few.
+        fill_remote_cache("client", max_db_queries_per_second)
+        fill_realms_remote_caches(
+            list(realm_cache_fillers), options["processes"], max_db_queries_per_second
+        )
+        fill_remote_cache("session", max_db_queries_per_second)
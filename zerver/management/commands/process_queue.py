@@ -1,16 +1,20 @@
+import gc
 import logging
 import os
 import signal
 import sys
 import threading
+import time
 from argparse import ArgumentParser
 from collections.abc import Iterator
-from contextlib import contextmanager
+from contextlib import contextmanager, suppress
 from types import FrameType
 from typing import Any
 
 from django.conf import settings
+from django.core.cache import caches
 from django.core.management.base import CommandError
+from django.db import connections
 from django.utils import autoreload
 from sentry_sdk import configure_scope
 from typing_extensions import override
@@ -35,6 +39,123 @@ def log_and_exit_if_exception(
             sys.exit(1)
 
 
+def run_worker(queue_name: str, worker_num: int, logger: logging.Logger) -> None:
+    def signal_handler(signal: int, frame: FrameType | None) -> None:
+        logger.info("Worker %d disconnecting from queue %s", worker_num, queue_name)
+        worker.stop()
+        sys.exit(0)
+
+    logger.info("Worker %d connecting to queue %s", worker_num, queue_name)
+    with log_and_exit_if_exception(logger, queue_name, threaded=False):
+        worker = get_worker(queue_name, worker_num=worker_num)
+        with configure_scope() as scope:
+            scope.set_tag("queue_worker", queue_name)
+            scope.set_tag("worker_num", worker_num)
+
+            worker.setup()
+            signal.signal(signal.SIGTERM, signal_handler)
+            signal.signal(signal.SIGINT, signal_handler)
+            signal.signal(signal.SIGUSR1, signal_handler)
+            worker.start()
+
+
+class ForkingWorkerHost:
+    """Runs each of the given queue workers in its own process, like
+    running process_queue once per queue does, but forked from one
+    parent process which has already imported Django and all of the
+    queue workers' code.  The children share the parent's memory for
+    all of that code, copy-on-write, rather than each loading their
+    own copy.
+
+    The parent restarts any worker which exits, until it is asked to
+    stop with SIGTERM or SIGINT, which it passes on to the workers.
+    """
+
+    # How long to wait before restarting a worker which exited, so
+    # that a worker which fails on startup doesn't spin.
+    RESTART_DELAY_SECONDS = 1
+
+    def __init__(self, workers: list[tuple[str, int]], logger: logging.Logger) -> None:
+        self.workers = workers
+        self.logger = logger
+        self.children: dict[int, tuple[str, int]] = {}
+        self.stopping = False
+
+    def preload(self) -> None:
+        get_active_worker_queues()
+        # The children must not share the parent's database or cache
+        # connections; they open their own as needed.
+        connections.close_all()
+        caches.close_all()
+        # Move everything allocated so far out of the garbage
+        # collector's view, so that collections in the children
+        # don't write to (and thus copy) those pages.
+        gc.collect()
+        gc.freeze()
+
+    def start_worker(self, queue_name: str, worker_num: int) -> None:
+        pid = os.fork()
+        if pid == 0:  # nocoverage
+            exit_code = 1
+            try:
+                for signum in (signal.SIGTERM, signal.SIGINT):
+                    signal.signal(signum, signal.SIG_DFL)
+                run_worker(queue_name, worker_num, self.logger)
+                exit_code = 0
+            except SystemExit as e:
+                exit_code = e.code if isinstance(e.code, int) else 1
+            finally:
+                # Never return into the parent's code.
+                os._exit(exit_code)
+        self.children[pid] = (queue_name, worker_num)
+
+    def stop(self, signum: int, frame: FrameType | None) -> None:
+        self.stopping = True
+        for pid in self.children:
+            with suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGTERM)
+
+    def run(self) -> None:
+        self.preload()
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for queue_name, worker_num in self.workers:
+            if self.stopping:
+                break
+            self.start_worker(queue_name, worker_num)
+        self.logger.info("%d queue worker processes were launched", len(self.children))
+
+        while self.children:
+            pid, status = os.wait()
+            if pid not in self.children:
+                continue
+            queue_name, worker_num = self.children.pop(pid)
+            if self.stopping:
+                continue
+            self.logger.warning(
+                "Worker %d for queue %s exited with status %d; restarting",
+                worker_num,
+                queue_name,
+                os.waitstatus_to_exitcode(status),
+            )
+            time.sleep(self.RESTART_DELAY_SECONDS)
+            self.start_worker(queue_name, worker_num)
+
+
+def parse_worker_specs(specs: list[str]) -> list[tuple[str, int]]:
+    """Parses QUEUE or QUEUE:COUNT specifications into a list of
+    (queue name, worker number) pairs; COUNT workers are numbered from
+    1, like supervisor's process_num."""
+    workers = []
+    for spec in specs:
+        queue_name, _, count = spec.partition(":")
+        if count:
+            workers.extend((queue_name, worker_num) for worker_num in range(1, int(count) + 1))
+        else:
+            workers.append((queue_name, 0))
+    return workers
+
+
 class Command(ZulipBaseCommand):
     @override
     def add_arguments(self, parser: ArgumentParser) -> None:
@@ -50,6 +171,13 @@ class Command(ZulipBaseCommand):
             required=False,
             help="list of queue to process",
         )
+        parser.add_argument(
+            "--multi_process",
+            nargs="+",
+            metavar="<queue name>[:<worker count>]",
+            required=False,
+            help="list of queues to process, each in a process forked from this one",
+        )
 
     help = "Runs a queue processing worker"
 
@@ -92,27 +220,10 @@ class Command(ZulipBaseCommand):
             signal.signal(signal.SIGUSR1, exit_with_three)
             queues = options["multi_threaded"]
             autoreload.run_with_reloader(run_threaded_workers, queues, logger)
+        elif options["multi_process"]:
+            ForkingWorkerHost(parse_worker_specs(options["multi_process"]), logger).run()
         else:
-            queue_name = options["queue_name"]
-            worker_num = options["worker_num"]
-
-            def signal_handler(signal: int, frame: FrameType | None) -> None:
-                logger.info("Worker %d disconnecting from queue %s", worker_num, queue_name)
-                worker.stop()
-                sys.exit(0)
-
-            logger.info("Worker %d connecting to queue %s", worker_num, queue_name)
-            with log_and_exit_if_exception(logger, queue_name, threaded=False):
-                worker = get_worker(queue_name, worker_num=worker_num)
-                with configure_scope() as scope:
-                    scope.set_tag("queue_worker", queue_name)
-                    scope.set_tag("worker_num", worker_num)
-
-                    worker.setup()
-                    signal.signal(signal.SIGTERM, signal_handler)
-                    signal.signal(signal.SIGINT, signal_handler)
-                    signal.signal(signal.SIGUSR1, signal_handler)
-                    worker.start()
+            run_worker(options["queue_name"], options["worker_num"], logger)
 
 
 class ThreadedWorker(threading.Thread):
@@ -0,0 +1,36 @@
+from argparse import ArgumentParser
+from typing import Any
+
+from django.db import transaction
+from typing_extensions import override
+
+from zerver.lib.management import ZulipBaseCommand
+from zerver.lib.topic import rebuild_topic_summaries_for_stream
+from zerver.models import Stream
+
+
+class Command(ZulipBaseCommand):
+    help = """Recompute the precomputed topic list for every stream, from scratch.
+
+This is only needed if the topic summaries are known to be badly out
+of date; audit_topic_summaries is a cheaper way to repair drift."""
+
+    @override
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        self.add_realm_args(parser)
+
+    @override
+    def handle(self, *args: Any, **options: Any) -> None:
+        realm = self.get_realm(options)
+        streams = Stream.objects.exclude(recipient_id=None).order_by("id")
+        if realm is not None:
+            streams = streams.filter(realm=realm)
+
+        stream_count = 0
+        for realm_id, recipient_id in streams.values_list("realm_id", "recipient_id"):
+            # One transaction per stream, to avoid holding locks on
+            # zerver_topicsummary for the whole server at once.
+            with transaction.atomic():
+                rebuild_topic_summaries_for_stream(realm_id, recipient_id)
+            stream_count += 1
+        print(f"Rebuilt topic summaries for {stream_count} streams.")
@@ -0,0 +1,54 @@
+import django.db.models.deletion
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("zerver", "0562_remove_realm_create_web_public_stream_policy"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TopicSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("topic_name", models.CharField(max_length=60)),
+                ("max_message_id", models.IntegerField()),
+                ("message_count", models.IntegerField()),
+                ("is_resolved", models.BooleanField(default=False)),
+                (
+                    "realm",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="zerver.realm"
+                    ),
+                ),
+                (
+                    "recipient",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="zerver.recipient"
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        models.F("recipient"),
+                        django.db.models.functions.text.Upper("topic_name"),
+                        name="zerver_topicsummary_recipient_upper_topic",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("recipient", "topic_name"),
+                        name="zerver_topicsummary_recipient_topic_uniq",
+                    )
+                ],
+            },
+        ),
+    ]
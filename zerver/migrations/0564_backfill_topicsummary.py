@@ -0,0 +1,57 @@
+from django.db import migrations
+from django.db.backends.base.schema import BaseDatabaseSchemaEditor
+from django.db.migrations.state import StateApps
+from psycopg2.sql import SQL
+
+# Keep in sync with zerver.lib.topic.TOPIC_SUMMARY_RECOMPUTE_QUERY; we
+# can't import it here, since migrations must not depend on code
+# which may change later.
+BACKFILL_QUERY = SQL(
+    """
+    INSERT INTO zerver_topicsummary
+        (realm_id, recipient_id, topic_name, max_message_id, message_count, is_resolved)
+    SELECT
+        zerver_message.realm_id,
+        zerver_message.recipient_id,
+        zerver_message.subject,
+        max(zerver_message.id),
+        count(*),
+        starts_with(zerver_message.subject, '✔ ')
+    FROM zerver_message
+    WHERE zerver_message.realm_id = %(realm_id)s
+    AND zerver_message.recipient_id = %(recipient_id)s
+    GROUP BY zerver_message.realm_id, zerver_message.recipient_id, zerver_message.subject
+    ON CONFLICT (recipient_id, topic_name) DO UPDATE SET
+        max_message_id = EXCLUDED.max_message_id,
+        message_count = EXCLUDED.message_count,
+        is_resolved = EXCLUDED.is_resolved
+    """
+)
+
+
+def backfill_topic_summaries(apps: StateApps, schema_editor: BaseDatabaseSchemaEditor) -> None:
+    Stream = apps.get_model("zerver", "Stream")
+
+    # One transaction per stream, so that we don't hold locks on
+    # zerver_topicsummary for the whole backfill on large servers.
+    streams = Stream.objects.exclude(recipient_id=None).values_list("realm_id", "recipient_id")
+    with schema_editor.connection.cursor() as cursor:
+        for realm_id, recipient_id in streams.iterator():
+            # Uses index: zerver_message_realm_recipient_subject
+            cursor.execute(BACKFILL_QUERY, dict(realm_id=realm_id, recipient_id=recipient_id))
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("zerver", "0563_topicsummary"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            backfill_topic_summaries,
+            reverse_code=migrations.RunPython.noop,
+            elidable=True,
+        ),
+    ]
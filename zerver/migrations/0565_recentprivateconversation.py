@@ -0,0 +1,51 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("zerver", "0564_backfill_topicsummary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecentPrivateConversation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("max_message_id", models.IntegerField()),
+                (
+                    "recipient",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="zerver.recipient"
+                    ),
+                ),
+                (
+                    "user_profile",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        models.F("user_profile"),
+                        models.OrderBy(models.F("max_message_id"), descending=True),
+                        name="zerver_recentprivateconversation_user_max_message_id",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user_profile", "recipient"),
+                        name="zerver_recentprivateconversation_user_recipient_uniq",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,64 @@
+from django.db import migrations
+from django.db.backends.base.schema import BaseDatabaseSchemaEditor
+from django.db.migrations.state import StateApps
+from psycopg2.sql import SQL
+
+# Keep in sync with
+# zerver.lib.recent_private_conversations.REBUILD_RECENT_PRIVATE_CONVERSATIONS_QUERY;
+# we can't import it here, since migrations must not depend on code
+# which may change later.
+BACKFILL_QUERY = SQL(
+    """
+    INSERT INTO zerver_recentprivateconversation (user_profile_id, recipient_id, max_message_id)
+    SELECT
+        %(user_profile_id)s,
+        CASE
+            WHEN zerver_message.recipient_id = %(my_recipient_id)s
+            THEN sender.recipient_id
+            ELSE zerver_message.recipient_id
+        END AS other_recipient_id,
+        max(zerver_message.id)
+    FROM zerver_usermessage
+    JOIN zerver_message ON zerver_message.id = zerver_usermessage.message_id
+    JOIN zerver_userprofile sender ON sender.id = zerver_message.sender_id
+    WHERE zerver_usermessage.user_profile_id = %(user_profile_id)s
+    AND zerver_usermessage.flags & 2048 <> 0
+    GROUP BY other_recipient_id
+    ON CONFLICT (user_profile_id, recipient_id) DO UPDATE SET
+        max_message_id = EXCLUDED.max_message_id
+    """
+)
+
+
+def backfill_recent_private_conversations(
+    apps: StateApps, schema_editor: BaseDatabaseSchemaEditor
+) -> None:
+    UserProfile = apps.get_model("zerver", "UserProfile")
+
+    # One transaction per user, so that we don't hold locks on
+    # zerver_recentprivateconversation for the whole backfill on
+    # large servers.
+    users = UserProfile.objects.exclude(recipient_id=None).values_list("id", "recipient_id")
+    with schema_editor.connection.cursor() as cursor:
+        for user_profile_id, recipient_id in users.iterator():
+            # Uses index: zerver_usermessage_is_private_message_id
+            cursor.execute(
+                BACKFILL_QUERY,
+                dict(user_profile_id=user_profile_id, my_recipient_id=recipient_id),
+            )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("zerver", "0565_recentprivateconversation"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            backfill_recent_private_conversations,
+            reverse_code=migrations.RunPython.noop,
+            elidable=True,
+        ),
+    ]
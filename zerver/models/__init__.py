@@ -49,6 +49,9 @@ from zerver.models.realm_playgrounds import RealmPlayground as RealmPlayground
 from zerver.models.realms import Realm as Realm
 from zerver.models.realms import RealmAuthenticationMethod as RealmAuthenticationMethod
 from zerver.models.realms import RealmDomain as RealmDomain
+from zerver.models.recent_private_conversations import (
+    RecentPrivateConversation as RecentPrivateConversation,
+)
 from zerver.models.recipients import DirectMessageGroup as DirectMessageGroup
 from zerver.models.recipients import Recipient as Recipient
 from zerver.models.scheduled_jobs import AbstractScheduledJob as AbstractScheduledJob
@@ -62,6 +65,7 @@ from zerver.models.streams import DefaultStream as DefaultStream
 from zerver.models.streams import DefaultStreamGroup as DefaultStreamGroup
 from zerver.models.streams import Stream as Stream
 from zerver.models.streams import Subscription as Subscription
+from zerver.models.topic_summaries import TopicSummary as TopicSummary
 from zerver.models.user_activity import UserActivity as UserActivity
 from zerver.models.user_activity import UserActivityInterval as UserActivityInterval
 from zerver.models.user_topics import UserTopic as UserTopic
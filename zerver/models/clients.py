@@ -5,7 +5,7 @@ from django.db import models
 from typing_extensions import override
 
 from zerver.lib import cache
-from zerver.lib.cache import cache_with_key
+from zerver.lib.cache import cache_with_key, register_cache_key_family
 
 
 class Client(models.Model):
@@ -66,6 +66,9 @@ def get_client(name: str) -> Client:
     return get_client_cache[cache_name]
 
 
+register_cache_key_family("get_client", timeout=3600 * 24 * 7, value="Client")
+
+
 def get_client_cache_key(name: str) -> str:
     return f"get_client:{hashlib.sha1(name.encode()).hexdigest()}"
 
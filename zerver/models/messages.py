@@ -225,7 +225,8 @@ class Message(AbstractMessage):
                 name="zerver_message_realm_recipient_subject",
             ),
             models.Index(
-                # Only used by update_first_visible_message_id
+                # Used by update_first_visible_message_id, and when
+                # filling the to_dict cache with recent messages
                 "realm_id",
                 F("id").desc(nulls_last=True),
                 name="zerver_message_realm_id",
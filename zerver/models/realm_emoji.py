@@ -7,7 +7,7 @@ from django.db.models.signals import post_delete, post_save
 from django.utils.translation import gettext_lazy
 from typing_extensions import override
 
-from zerver.lib.cache import cache_set, cache_with_key
+from zerver.lib.cache import cache_set, cache_with_key, register_cache_key_family
 from zerver.models.realms import Realm
 
 
@@ -20,6 +20,9 @@ class EmojiInfo(TypedDict):
     still_url: str | None
 
 
+register_cache_key_family("realm_emoji", timeout=3600 * 24 * 7, value="dict[str, EmojiInfo]")
+
+
 def get_all_custom_emoji_for_realm_cache_key(realm_id: int) -> str:
     return f"realm_emoji:{realm_id}"
 
@@ -0,0 +1,48 @@
+from django.db import models
+from django.db.models import CASCADE, F
+from typing_extensions import override
+
+from zerver.models.recipients import Recipient
+from zerver.models.users import UserProfile
+
+
+class RecentPrivateConversation(models.Model):
+    """
+    A denormalized record of the most recent direct message in each of
+    a user's direct message conversations, used to serve the
+    `recent_private_conversations` section of /register without
+    scanning the user's recent direct messages.
+
+    `recipient` identifies the conversation the way
+    get_recent_private_conversations always has: the group's
+    recipient for group direct messages, and the other user's
+    personal recipient for 1:1 direct messages (the user's own, for
+    direct messages to themself).  Rows are kept up to date by
+    zerver.lib.recent_private_conversations helpers called from the
+    message send and archiving code paths.
+    """
+
+    user_profile = models.ForeignKey(UserProfile, on_delete=CASCADE)
+    recipient = models.ForeignKey(Recipient, on_delete=CASCADE)
+    max_message_id = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user_profile", "recipient"],
+                name="zerver_recentprivateconversation_user_recipient_uniq",
+            ),
+        ]
+
+        indexes = [
+            # Used to fetch a user's most recent conversations.
+            models.Index(
+                "user_profile",
+                F("max_message_id").desc(),
+                name="zerver_recentprivateconversation_user_max_message_id",
+            ),
+        ]
+
+    @override
+    def __str__(self) -> str:
+        return f"{self.user_profile_id} / {self.recipient_id} ({self.max_message_id})"
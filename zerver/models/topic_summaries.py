@@ -0,0 +1,55 @@
+from django.db import models
+from django.db.models import CASCADE
+from django.db.models.functions import Upper
+from typing_extensions import override
+
+from zerver.models.constants import MAX_TOPIC_NAME_LENGTH
+from zerver.models.realms import Realm
+from zerver.models.recipients import Recipient
+
+
+class TopicSummary(models.Model):
+    """
+    A denormalized summary of the topics in a stream, maintained
+    alongside the Message table so that the topic list for a stream
+    can be served without grouping every message in the stream.
+
+    There is one row per case-sensitive topic name, mirroring what
+    `GROUP BY subject` on zerver_message would return; callers merge
+    casings the same way they did for the raw query.  Rows are kept
+    up to date by zerver.lib.topic helpers called from the message
+    send, edit, and archiving code paths; the `audit_topic_summaries`
+    management command can be used to detect and repair drift.
+    """
+
+    realm = models.ForeignKey(Realm, on_delete=CASCADE)
+    # Always a Recipient.STREAM recipient.
+    recipient = models.ForeignKey(Recipient, on_delete=CASCADE)
+    topic_name = models.CharField(max_length=MAX_TOPIC_NAME_LENGTH)
+
+    max_message_id = models.IntegerField()
+    message_count = models.IntegerField()
+    is_resolved = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["recipient", "topic_name"],
+                name="zerver_topicsummary_recipient_topic_uniq",
+            ),
+        ]
+
+        indexes = [
+            # Used when recomputing the rows for a topic after it has
+            # been edited, moved, or had messages deleted, which are
+            # all case-insensitive operations on the topic name.
+            models.Index(
+                "recipient",
+                Upper("topic_name"),
+                name="zerver_topicsummary_recipient_upper_topic",
+            ),
+        ]
+
+    @override
+    def __str__(self) -> str:
+        return f"{self.recipient_id} / {self.topic_name} ({self.message_count} messages)"
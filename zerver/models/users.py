@@ -1086,7 +1086,10 @@ def get_user_by_id_in_realm_including_cross_realm(
     raise UserProfile.DoesNotExist
 
 
-@cache_with_key(realm_user_dicts_cache_key, timeout=3600 * 24 * 7)
+# These realm-wide queries are flushed whenever any user in the realm
+# changes, and then requested by many processes at once, so we avoid
+# running them concurrently; see single_flight_cache_fill.
+@cache_with_key(realm_user_dicts_cache_key, timeout=3600 * 24 * 7, single_flight=True)
 def get_realm_user_dicts(realm_id: int) -> list[RawUserDict]:
     return list(
         UserProfile.objects.filter(
@@ -1095,7 +1098,7 @@ def get_realm_user_dicts(realm_id: int) -> list[RawUserDict]:
     )
 
 
-@cache_with_key(active_user_ids_cache_key, timeout=3600 * 24 * 7)
+@cache_with_key(active_user_ids_cache_key, timeout=3600 * 24 * 7, single_flight=True)
 def active_user_ids(realm_id: int) -> list[int]:
     query = UserProfile.objects.filter(
         realm_id=realm_id,
@@ -1104,7 +1107,7 @@ def active_user_ids(realm_id: int) -> list[int]:
     return list(query)
 
 
-@cache_with_key(active_non_guest_user_ids_cache_key, timeout=3600 * 24 * 7)
+@cache_with_key(active_non_guest_user_ids_cache_key, timeout=3600 * 24 * 7, single_flight=True)
 def active_non_guest_user_ids(realm_id: int) -> list[int]:
     query = (
         UserProfile.objects.filter(
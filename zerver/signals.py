@@ -110,7 +110,9 @@ def email_on_new_login(sender: Any, user: UserProfile, request: Any, **kwargs: A
             "from_address": FromAddress.NOREPLY,
             "context": context,
         }
-        queue_json_publish("email_senders", email_dict)
+        # A security notice about a login which just happened, which
+        # shouldn't wait behind bulk email.
+        queue_json_publish("email_senders", email_dict, priority=True)
 
 
 @receiver(user_logged_out)
@@ -1,21 +1,35 @@
 from unittest.mock import Mock, patch
 
 from django.conf import settings
+from django.test import override_settings
+from typing_extensions import override
 
 from zerver.apps import flush_cache
 from zerver.lib.cache import (
+    LOCAL_CACHE_KEY_FAMILIES,
     MEMCACHED_MAX_KEY_LENGTH,
+    UNREGISTERED_CACHE_KEY_FAMILY,
     InvalidCacheKeyError,
     bulk_cached_fetch,
     cache_delete,
     cache_delete_many,
     cache_get,
     cache_get_many,
+    cache_key_families,
     cache_set,
     cache_set_many,
     cache_with_key,
+    display_recipient_cache_key,
+    flush_local_cache,
+    get_cache_key_family_stats,
+    get_local_cache_hits,
+    get_local_cache_misses,
+    get_single_flight_stampedes_avoided,
+    local_cache_generation_key,
     safe_cache_get_many,
     safe_cache_set_many,
+    single_flight_lock_cache_key,
+    stale_value_cache_key,
     user_profile_by_id_cache_key,
     validate_cache_key,
 )
@@ -157,6 +171,146 @@ class CacheWithKeyDecoratorTest(ZulipTestCase):
 
         self.assertEqual(result_two, None)
 
+    def test_cache_with_key_single_flight(self) -> None:
+        def cache_key_function(user_id: int) -> str:
+            return f"CacheWithKeyDecoratorTest:test_cache_with_key_single_flight:{user_id}"
+
+        @cache_with_key(cache_key_function, timeout=1000, single_flight=True, serve_stale=True)
+        def get_user_function_single_flight(user_id: int) -> UserProfile:
+            return UserProfile.objects.get(id=user_id)
+
+        hamlet = self.example_user("hamlet")
+        key = cache_key_function(hamlet.id)
+        lock_key = single_flight_lock_cache_key(key)
+
+        # Without contention, the value is computed and cached as usual.
+        with self.assert_database_query_count(1):
+            self.assertEqual(get_user_function_single_flight(hamlet.id), hamlet)
+        self.assertIsNone(cache_get(lock_key))
+
+        # While another process is computing the value, the previous
+        # value is served.
+        cache_delete(key)
+        cache_set(lock_key, True)
+        stampedes_avoided = get_single_flight_stampedes_avoided()
+        with self.assert_database_query_count(0, keep_cache_warm=True):
+            self.assertEqual(get_user_function_single_flight(hamlet.id), hamlet)
+        self.assertEqual(get_single_flight_stampedes_avoided(), stampedes_avoided + 1)
+
+        # Without a previous value, we wait for the other process.
+        cache_delete(stale_value_cache_key(key))
+        with (
+            patch("zerver.lib.cache.time.sleep", side_effect=lambda _: cache_set(key, hamlet)),
+            self.assert_database_query_count(0, keep_cache_warm=True),
+        ):
+            self.assertEqual(get_user_function_single_flight(hamlet.id), hamlet)
+        self.assertEqual(get_single_flight_stampedes_avoided(), stampedes_avoided + 2)
+
+        # If the other process takes too long, we compute the value ourselves.
+        cache_delete(key)
+        with (
+            patch("zerver.lib.cache.SINGLE_FLIGHT_WAIT_TIME", 0),
+            self.assert_database_query_count(1, keep_cache_warm=True),
+        ):
+            self.assertEqual(get_user_function_single_flight(hamlet.id), hamlet)
+        self.assertEqual(get_single_flight_stampedes_avoided(), stampedes_avoided + 2)
+
+
+@override_settings(REMOTE_CACHE_LOCAL_TIER_MAX_ENTRIES=2)
+class LocalCacheTest(ZulipTestCase):
+    @override
+    def setUp(self) -> None:
+        super().setUp()
+        flush_local_cache()
+
+    @override
+    def tearDown(self) -> None:
+        flush_local_cache()
+        super().tearDown()
+
+    def test_local_cache_hits_and_invalidation(self) -> None:
+        key = display_recipient_cache_key(1)
+        hits = get_local_cache_hits()["display_recipient_dict"]
+        misses = get_local_cache_misses()["display_recipient_dict"]
+
+        cache_set(key, "value")
+        with patch("zerver.lib.cache.remote_cache_stats_finish") as mock_stats:
+            self.assertEqual(cache_get(key), ("value",))
+            self.assertEqual(cache_get_many([key]), {key: ("value",)})
+        mock_stats.assert_not_called()
+        self.assertEqual(get_local_cache_hits()["display_recipient_dict"], hits + 2)
+        self.assertEqual(get_local_cache_misses()["display_recipient_dict"], misses)
+
+        # Another process deleting the key discards its bucket's
+        # generation token, which we notice on our next check.
+        generation_key = local_cache_generation_key(key)
+        assert generation_key is not None
+        cache_delete(generation_key)
+        with (
+            patch("zerver.lib.cache.local_cache_generations_checked", 0.0),
+            patch("zerver.lib.cache.remote_cache_stats_finish") as mock_stats,
+        ):
+            self.assertEqual(cache_get(key), ("value",))
+        self.assertEqual(get_local_cache_misses()["display_recipient_dict"], misses + 1)
+        self.assertTrue(mock_stats.called)
+
+        # Deleting the key in this process takes effect immediately.
+        cache_delete(key)
+        self.assertIsNone(cache_get(key))
+
+    def test_local_cache_size_and_families(self) -> None:
+        keys = [display_recipient_cache_key(recipient_id) for recipient_id in range(3)]
+        cache_set_many({key: ("value",) for key in keys})
+        with patch("zerver.lib.cache.remote_cache_stats_finish") as mock_stats:
+            self.assertEqual(cache_get(keys[2]), ("value",))
+        mock_stats.assert_not_called()
+        with patch("zerver.lib.cache.remote_cache_stats_finish") as mock_stats:
+            self.assertEqual(cache_get(keys[0]), ("value",))
+        mock_stats.assert_called_once()
+
+        # Keys outside LOCAL_CACHE_KEY_FAMILIES always go to memcached.
+        cache_set("realm_seat_count:1", 5)
+        with patch("zerver.lib.cache.remote_cache_stats_finish") as mock_stats:
+            self.assertEqual(cache_get("realm_seat_count:1"), (5,))
+        mock_stats.assert_called_once()
+
+        # Including user profiles, so that deactivating a user takes
+        # effect in every process immediately.
+        key = user_profile_by_id_cache_key(1)
+        cache_set(key, "value")
+        with patch("zerver.lib.cache.remote_cache_stats_finish") as mock_stats:
+            self.assertEqual(cache_get(key), ("value",))
+        mock_stats.assert_called_once()
+
+
+class CacheKeyFamilyTest(ZulipTestCase):
+    def test_cache_key_family_stats(self) -> None:
+        stats = get_cache_key_family_stats()["realm_seat_count"]
+        hits, misses, sets, deletes = stats.hits, stats.misses, stats.sets, stats.deletes
+        timeout_mismatches = stats.timeout_mismatches
+
+        cache_set("realm_seat_count:1", 5, timeout=3600 * 24)
+        cache_set_many({"realm_seat_count:2": (5,)})
+        cache_get_many(["realm_seat_count:1", "realm_seat_count:3"])
+        cache_get("realm_seat_count:2")
+        cache_delete("realm_seat_count:1")
+
+        self.assertEqual(stats.hits, hits + 2)
+        self.assertEqual(stats.misses, misses + 1)
+        self.assertEqual(stats.sets, sets + 2)
+        self.assertEqual(stats.deletes, deletes + 1)
+        # Only the set without the family's declared timeout is counted.
+        self.assertEqual(stats.timeout_mismatches, timeout_mismatches + 1)
+
+        unregistered_stats = get_cache_key_family_stats()[UNREGISTERED_CACHE_KEY_FAMILY]
+        unregistered_misses = unregistered_stats.misses
+        cache_get("no_such_family:1")
+        self.assertEqual(unregistered_stats.misses, unregistered_misses + 1)
+        self.assertNotIn("no_such_family", get_cache_key_family_stats())
+
+    def test_local_cache_key_families_registered(self) -> None:
+        self.assertLessEqual(LOCAL_CACHE_KEY_FAMILIES, set(cache_key_families))
+
 
 class SafeCacheFunctionsTest(ZulipTestCase):
     def test_safe_cache_functions_with_all_good_keys(self) -> None:
@@ -1,3 +1,4 @@
+import threading
 import time
 from collections.abc import Callable
 from typing import Any
@@ -12,12 +13,14 @@ from django.utils.timezone import now as timezone_now
 from typing_extensions import override
 
 from zerver.actions.custom_profile_fields import try_update_realm_custom_profile_field
+from zerver.actions.default_streams import do_add_default_stream
 from zerver.actions.message_send import check_send_message
 from zerver.actions.presence import do_update_user_presence
+from zerver.actions.realm_playgrounds import check_add_realm_playground
 from zerver.actions.user_settings import do_change_user_setting
 from zerver.actions.users import do_change_user_role
 from zerver.lib.event_schema import check_web_reload_client_event
-from zerver.lib.events import fetch_initial_state_data
+from zerver.lib.events import RegisterSectionFetcher, fetch_initial_state_data
 from zerver.lib.exceptions import AccessDeniedError
 from zerver.lib.request import RequestVariableMissingError
 from zerver.lib.test_classes import ZulipTestCase
@@ -746,6 +749,78 @@ class FetchInitialStateDataTest(ZulipTestCase):
             else:
                 self.assertFalse("avatar_url" in user_dict)
 
+    def test_user_list_columnar(self) -> None:
+        user = self.example_user("hamlet")
+        cordelia = self.example_user("cordelia")
+        cordelia.long_term_idle = True
+        cordelia.save()
+
+        def register(client_capabilities: dict[str, bool]) -> dict[str, Any]:
+            with stub_event_queue_user_events("15:11", []):
+                result = self.api_post(
+                    user,
+                    "/api/v1/register",
+                    dict(
+                        fetch_event_types=orjson.dumps(["realm_user"]).decode(),
+                        client_capabilities=orjson.dumps(
+                            dict(notification_settings_null=False, **client_capabilities)
+                        ).decode(),
+                    ),
+                )
+            return self.assert_json_success(result)
+
+        columnar = register(dict(user_list_columnar=True))
+        self.assertNotIn("realm_users", columnar)
+        self.assertNotIn("realm_non_active_users", columnar)
+        columns = columnar["realm_users_columns"]
+        self.assertNotIn("is_admin", columns)
+        self.assertEqual(len(set(map(len, columns.values()))), 1)
+
+        def decode(columns: dict[str, list[Any]]) -> list[dict[str, Any]]:
+            user_dicts: list[dict[str, Any]] = [{} for user_id in columns.get("user_id", [])]
+            for field, values in columns.items():
+                for user_dict, value in zip(user_dicts, values, strict=True):
+                    # `false` marks users whose avatar URL wasn't sent.
+                    if field == "avatar_url" and value is False:
+                        continue
+                    user_dict[field] = value
+            return user_dicts
+
+        defaults = dict(is_billing_admin=False, is_bot=False, is_system_bot=False)
+
+        def normalize(user_dicts: list[dict[str, Any]], fields: set[str]) -> list[dict[str, Any]]:
+            # Fill in the fields the columnar encoding sends for every
+            # user, but leave avatar_url absent where it was absent.
+            return [
+                {
+                    field: user_dict.get(field, defaults.get(field))
+                    for field in fields
+                    if field != "avatar_url" or field in user_dict
+                }
+                for user_dict in user_dicts
+            ]
+
+        expected = register(dict(user_avatar_url_field_optional=True))
+        for columns_key, users_key in [
+            ("realm_users_columns", "realm_users"),
+            ("realm_non_active_users_columns", "realm_non_active_users"),
+        ]:
+            expected_users = expected[users_key]
+            fields = {field for user_dict in expected_users for field in user_dict} - {
+                "is_admin",
+                "is_owner",
+                "is_guest",
+            }
+            self.assertEqual(
+                normalize(decode(columnar[columns_key]), fields),
+                normalize(expected_users, fields),
+            )
+
+        # Users with and without an avatar URL sent are told apart.
+        avatar_urls = columns["avatar_url"]
+        self.assertIn(False, avatar_urls)
+        self.assertTrue(any(isinstance(avatar_url, str) for avatar_url in avatar_urls))
+
     def test_user_settings_based_on_client_capabilities(self) -> None:
         hamlet = self.example_user("hamlet")
         result = fetch_initial_state_data(
@@ -826,6 +901,134 @@ class FetchInitialStateDataTest(ZulipTestCase):
         [pronouns_field] = (field for field in custom_profile_fields if field["name"] == "Pronouns")
         self.assertEqual(pronouns_field["type"], CustomProfileField.PRONOUNS)
 
+    def test_register_snapshot(self) -> None:
+        hamlet = self.example_user("hamlet")
+        iago = self.example_user("iago")
+        realm = hamlet.realm
+
+        def fetch_playgrounds(user_profile: UserProfile) -> list[dict[str, Any]]:
+            state = fetch_initial_state_data(
+                user_profile, realm=realm, event_types=["realm_playgrounds"]
+            )
+            return state["realm_playgrounds"]
+
+        with self.assert_database_query_count(1):
+            self.assertEqual(fetch_playgrounds(hamlet), [])
+
+        # Other users in the realm share the cached section.
+        with self.assert_database_query_count(0):
+            self.assertEqual(fetch_playgrounds(iago), [])
+
+        # Sending the event for a change invalidates the section.
+        playground_id = check_add_realm_playground(
+            realm,
+            acting_user=iago,
+            name="Python playground",
+            pygments_language="Python",
+            url_template="https://python.example.com{code}",
+        )
+        with self.assert_database_query_count(1):
+            [playground] = fetch_playgrounds(hamlet)
+        self.assertEqual(playground["id"], playground_id)
+        with self.assert_database_query_count(0):
+            self.assertEqual(fetch_playgrounds(iago), [playground])
+
+        # The cached values can be freely modified by the caller.
+        fetch_playgrounds(hamlet).clear()
+        self.assertEqual(fetch_playgrounds(iago), [playground])
+
+    def test_register_snapshot_first_message_id(self) -> None:
+        hamlet = self.example_user("hamlet")
+        realm = hamlet.realm
+        stream = self.make_stream("new default channel", realm=realm)
+        do_add_default_stream(stream)
+
+        def fetch_default_stream() -> dict[str, Any]:
+            state = fetch_initial_state_data(hamlet, realm=realm, event_types=["default_streams"])
+            [default_stream] = (
+                default_stream
+                for default_stream in state["realm_default_streams"]
+                if default_stream["stream_id"] == stream.id
+            )
+            return default_stream
+
+        self.assertIsNone(fetch_default_stream()["first_message_id"])
+
+        # There is no event for a channel's first message, but the
+        # cached default channels are still updated.
+        self.subscribe(hamlet, stream.name)
+        message_id = self.send_stream_message(hamlet, stream.name)
+        self.assertEqual(fetch_default_stream()["first_message_id"], message_id)
+
+    def test_register_section_versions(self) -> None:
+        user = self.example_user("hamlet")
+
+        def register(
+            section_versions: dict[str, str], user_events: list[dict[str, Any]]
+        ) -> dict[str, Any]:
+            with stub_event_queue_user_events("15:11", user_events):
+                result = self.api_post(
+                    user,
+                    "/api/v1/register",
+                    dict(
+                        event_types=orjson.dumps(["realm_emoji", "realm_playgrounds"]).decode(),
+                        section_versions=orjson.dumps(section_versions).decode(),
+                    ),
+                )
+            return self.assert_json_success(result)
+
+        result_dict = register({}, [])
+        self.assertEqual(result_dict["realm_playgrounds"], [])
+        self.assertIn("realm_emoji", result_dict)
+        versions = result_dict["section_versions"]
+        self.assertEqual(set(versions), {"realm_emoji", "realm_playgrounds"})
+
+        # Sections the client already has are omitted.
+        result_dict = register(versions, [])
+        self.assertNotIn("realm_emoji", result_dict)
+        self.assertNotIn("realm_playgrounds", result_dict)
+        self.assertEqual(result_dict["section_versions"], versions)
+
+        # Only the changed section is sent after a change.
+        check_add_realm_playground(
+            user.realm,
+            acting_user=None,
+            name="Python playground",
+            pygments_language="Python",
+            url_template="https://python.example.com{code}",
+        )
+        result_dict = register(versions, [])
+        self.assertNotIn("realm_emoji", result_dict)
+        self.assertEqual(len(result_dict["realm_playgrounds"]), 1)
+        new_versions = result_dict["section_versions"]
+        self.assertEqual(new_versions["realm_emoji"], versions["realm_emoji"])
+        self.assertNotEqual(new_versions["realm_playgrounds"], versions["realm_playgrounds"])
+
+        # If an omitted section changes while the state is being
+        # fetched, the full state is sent instead.
+        event = dict(id=6, type="realm_emoji", realm_emoji={})
+        result_dict = register(new_versions, [event])
+        self.assertEqual(result_dict["realm_emoji"], {})
+        self.assertEqual(len(result_dict["realm_playgrounds"]), 1)
+        self.assertEqual(result_dict["last_event_id"], 6)
+
+    @override_settings(REGISTER_SECTION_FETCH_THREADS=2)
+    def test_register_section_fetcher(self) -> None:
+        # The test suite runs inside a transaction, whose data other
+        # threads' database connections cannot see.
+        self.assertFalse(RegisterSectionFetcher().concurrent)
+
+        with mock.patch("zerver.lib.events.connection") as mock_connection:
+            mock_connection.in_atomic_block = False
+            fetcher = RegisterSectionFetcher()
+            self.assertTrue(fetcher.concurrent)
+            fetch_thread_name = fetcher.submit(lambda: threading.current_thread().name)
+            self.assertTrue(fetch_thread_name().startswith("register-section"))
+            # The thread keeps its database connection for later
+            # sections, unless it is no longer usable.
+            mock_connection.close_if_unusable_or_obsolete.assert_called_once()
+            mock_connection.close.assert_not_called()
+
 
 class ClientDescriptorsTest(ZulipTestCase):
     def test_get_client_info_for_all_public_streams(self) -> None:
@@ -3409,6 +3409,21 @@ class NormalActionsTest(BaseAction):
                 logs.output, ["WARNING:root:Got a web_reload_client event during apply_events"]
             )
 
+    def test_unexpected_event_type(self) -> None:
+        state = fetch_initial_state_data(self.user_profile, realm=self.user_profile.realm)
+        with self.assertRaisesRegex(AssertionError, "Unexpected event type no_such_type"):
+            apply_events(
+                self.user_profile,
+                state=state,
+                events=[{"type": "no_such_type"}],
+                fetch_event_types=None,
+                client_gravatar=False,
+                slim_presence=False,
+                include_subscribers=True,
+                linkifier_url_template=False,
+                user_list_incomplete=False,
+            )
+
     def test_display_setting_event_not_sent(self) -> None:
         with self.verify_action(state_change_expected=True, user_settings_object=True) as events:
             do_change_user_setting(
@@ -510,6 +510,50 @@ class PreviewTestCase(ZulipTestCase):
             in info_logs.output[0]
         )
 
+    @responses.activate
+    @override_settings(INLINE_URL_EMBED_PREVIEW=True, URL_PREVIEW_THREADS=2)
+    def test_batch_fetches_each_url_once(self) -> None:
+        user = self.example_user("hamlet")
+        shared_url = "http://test.org/"
+        other_url = "http://other.org/"
+        events = []
+        for content in [shared_url, f"{shared_url} {other_url}", shared_url]:
+            with mock_queue_publish("zerver.actions.message_send.queue_event_on_commit") as patched:
+                self.send_stream_message(user, "Denmark", topic_name="foo", content=content)
+                events.append(patched.call_args[0][1])
+        for url in [shared_url, other_url]:
+            cache_delete(preview_url_cache_key(url))
+            self.create_mock_response(url)
+
+        worker = FetchLinksEmbedData()
+        with self.settings(TEST_SUITE=False), self.assertLogs(level="INFO") as info_logs:
+            worker.consume_batch(events)
+        self.assertEqual(
+            sorted(line.split(": ")[0] for line in info_logs.output[:2]),
+            [
+                f"INFO:root:Time spent on get_link_embed_data for {other_url}",
+                f"INFO:root:Time spent on get_link_embed_data for {shared_url}",
+            ],
+        )
+        self.assertTrue(
+            any("Fetched 2 URLs for 3 messages" in line for line in info_logs.output[2:])
+        )
+
+        # Each URL was fetched just once, though the shared URL
+        # appears in all three messages: one request to check its
+        # content type, and one for its content.
+        self.assertTrue(responses.assert_call_count(shared_url, 2))
+        self.assertTrue(responses.assert_call_count(other_url, 2))
+
+        for event in events:
+            msg = Message.objects.get(id=event["message_id"])
+            assert msg.rendered_content is not None
+            self.assertIn(f'<a href="{shared_url}" title="The Rock">', msg.rendered_content)
+
+        stats = worker.get_extra_statistics()
+        assert stats["recent_max_queue_latency"] is not None
+        self.assertGreaterEqual(stats["recent_max_queue_latency"], 0)
+
     def test_get_link_embed_data(self) -> None:
         url = "http://test.org/"
         embedded_link = f'<a href="{url}" title="The Rock">The Rock</a>'
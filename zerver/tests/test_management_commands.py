@@ -1,5 +1,9 @@
+import logging
 import os
 import re
+import signal
+from collections.abc import Callable
+from concurrent.futures import Future
 from datetime import timedelta
 from typing import Any
 from unittest import mock, skipUnless
@@ -14,16 +18,25 @@ from django.test import override_settings
 from django.utils.timezone import now as timezone_now
 from typing_extensions import override
 
+from analytics.models import RealmCount
 from confirmation.models import RealmCreationKey, generate_realm_creation_url
 from zerver.actions.create_user import do_create_user
 from zerver.actions.reactions import do_add_reaction
+from zerver.lib.cache import (
+    cache_delete_many,
+    cache_get,
+    display_recipient_cache_key,
+    to_dict_cache_key_id,
+)
+from zerver.lib.cache_helpers import fill_realms_remote_caches
 from zerver.lib.management import ZulipBaseCommand, check_config
 from zerver.lib.test_classes import ZulipTestCase
 from zerver.lib.test_helpers import most_recent_message, stdout_suppressed
+from zerver.management.commands.process_queue import ForkingWorkerHost, parse_worker_specs
 from zerver.models import Message, Reaction, Realm, Recipient, UserProfile
 from zerver.models.realms import get_realm
 from zerver.models.streams import get_stream
-from zerver.models.users import get_user_profile_by_email
+from zerver.models.users import get_user_profile_by_email, get_user_profile_by_id
 
 
 class TestCheckConfig(ZulipTestCase):
@@ -385,6 +398,116 @@ class TestCalculateFirstVisibleMessageID(ZulipTestCase):
         m.assert_has_calls(calls, any_order=True)
 
 
+class TestAuditCacheFamilies(ZulipTestCase):
+    COMMAND_NAME = "audit_cache_families"
+
+    def test_audit_cache_families(self) -> None:
+        hamlet = self.example_user("hamlet")
+        get_user_profile_by_id(hamlet.id)
+        with patch("builtins.print") as mock_print:
+            call_command(self.COMMAND_NAME, "--family=user_profile_by_id", "--sample-size=1000")
+        output = [call_args[0][0] for call_args in mock_print.call_args_list]
+        self.assert_length(output, 2)
+        family, timeout, cached, sampled = output[1].replace("/", " ").split()[:4]
+        self.assertEqual(family, "user_profile_by_id")
+        self.assertEqual(timeout, "604800s")
+        self.assertGreaterEqual(int(cached), 1)
+        self.assertEqual(int(sampled), UserProfile.objects.count())
+
+        with patch("builtins.print") as mock_print:
+            call_command(self.COMMAND_NAME, "--sample-size=1")
+        self.assertTrue(mock_print.call_args_list[-1][0][0].startswith("\nNot sampled: "))
+
+
+class TestFillMemcachedCaches(ZulipTestCase):
+    COMMAND_NAME = "fill_memcached_caches"
+
+    def test_fill_realm_caches_by_activity(self) -> None:
+        zulip = get_realm("zulip")
+        lear = get_realm("lear")
+        for realm, actives in [(zulip, 5), (lear, 1000000)]:
+            RealmCount.objects.create(
+                realm=realm, property="1day_actives::day", end_time=timezone_now(), value=actives
+            )
+        message_id = self.send_stream_message(self.example_user("hamlet"), "Verona")
+        verona = get_stream("Verona", zulip)
+        cache_delete_many(
+            [to_dict_cache_key_id(message_id), display_recipient_cache_key(verona.recipient_id)]
+        )
+
+        with self.assertLogs(level="INFO") as info_logs:
+            call_command(self.COMMAND_NAME, "--processes=1")
+        realm_ids = [
+            int(match[1])
+            for line in info_logs.output
+            if (match := re.search(r"for realm (\d+) ", line)) is not None
+        ]
+        self.assertLess(realm_ids.index(lear.id), realm_ids.index(zulip.id))
+
+        self.assertIsNotNone(cache_get(to_dict_cache_key_id(message_id)))
+        self.assertEqual(cache_get(display_recipient_cache_key(verona.recipient_id)), ("Verona",))
+
+    def test_fill_realm_caches_in_processes(self) -> None:
+        realm_ids = [get_realm("zulip").id, get_realm("lear").id]
+        calls: list[Any] = []
+
+        class FakeProcessPoolExecutor:
+            """Runs each task immediately, in this process."""
+
+            def __init__(self, max_workers: int) -> None:
+                calls.append(("pool", max_workers))
+
+            def __enter__(self) -> "FakeProcessPoolExecutor":
+                return self
+
+            def __exit__(self, *args: object) -> None:
+                pass
+
+            def submit(self, func: Callable[..., int], *args: Any) -> "Future[int]":
+                future: Future[int] = Future()
+                future.set_result(func(*args))
+                return future
+
+        def fill_realm_remote_caches(
+            realm_id: int, caches: list[str], max_db_queries_per_second: float | None
+        ) -> int:
+            calls.append(("fill", realm_id, max_db_queries_per_second))
+            return 1
+
+        with (
+            patch("zerver.lib.cache_helpers.get_realm_ids_by_activity", return_value=realm_ids),
+            patch(
+                "zerver.lib.cache_helpers.connection.close",
+                side_effect=lambda: calls.append("close database"),
+            ),
+            patch(
+                "zerver.lib.cache_helpers.django_cache._cache.disconnect_all",
+                side_effect=lambda: calls.append("close memcached"),
+            ),
+            patch("zerver.lib.cache_helpers.ProcessPoolExecutor", FakeProcessPoolExecutor),
+            patch(
+                "zerver.lib.cache_helpers.fill_realm_remote_caches",
+                side_effect=fill_realm_remote_caches,
+            ),
+            self.assertLogs(level="INFO"),
+        ):
+            fill_realms_remote_caches(["user"], processes=2, max_db_queries_per_second=10)
+
+        # The connections are closed before forking, so that the
+        # processes don't share them, and the query rate limit is
+        # split between the processes.
+        self.assertEqual(
+            calls,
+            [
+                "close database",
+                "close memcached",
+                ("pool", 2),
+                ("fill", realm_ids[0], 5),
+                ("fill", realm_ids[1], 5),
+            ],
+        )
+
+
 class TestPasswordRestEmail(ZulipTestCase):
     COMMAND_NAME = "send_password_reset_email"
 
@@ -652,3 +775,99 @@ class TestSendCustomEmail(ZulipTestCase):
                     call("  hamlet@zulip.com (zulip)"),
                 ],
             )
+
+
+class TestProcessQueue(ZulipTestCase):
+    def test_parse_worker_specs(self) -> None:
+        self.assertEqual(
+            parse_worker_specs(["user_activity", "embed_links:3", "deferred_work:1"]),
+            [
+                ("user_activity", 0),
+                ("embed_links", 1),
+                ("embed_links", 2),
+                ("embed_links", 3),
+                ("deferred_work", 1),
+            ],
+        )
+        self.assertEqual(parse_worker_specs([]), [])
+
+    def test_forking_worker_host(self) -> None:
+        logger = logging.getLogger("process_queue")
+        host = ForkingWorkerHost([("user_activity", 0), ("embed_links", 1)], logger)
+
+        def wait_for_stop() -> tuple[int, int]:
+            # SIGTERM arrives while waiting for the workers.
+            host.stop(signal.SIGTERM, None)
+            return (102, 0)
+
+        wait_results: list[tuple[int, int] | Callable[[], tuple[int, int]]] = [
+            # The first worker fails, and is restarted.
+            (101, 1 << 8),
+            wait_for_stop,
+            # Not one of our workers.
+            (999, 0),
+            (103, 0),
+        ]
+
+        def wait() -> tuple[int, int]:
+            result = wait_results.pop(0)
+            return result() if callable(result) else result
+
+        with (
+            patch.object(host, "preload") as mock_preload,
+            patch("zerver.management.commands.process_queue.signal.signal") as mock_signal,
+            patch("os.fork", side_effect=[101, 102, 103]) as mock_fork,
+            patch("os.wait", side_effect=wait),
+            # The restarted worker has already exited.
+            patch("os.kill", side_effect=[None, ProcessLookupError]) as mock_kill,
+            patch("time.sleep") as mock_sleep,
+            self.assertLogs("process_queue", level="INFO") as logs,
+        ):
+            host.run()
+
+        mock_preload.assert_called_once_with()
+        self.assertEqual(
+            mock_signal.call_args_list,
+            [call(signal.SIGTERM, host.stop), call(signal.SIGINT, host.stop)],
+        )
+        self.assertEqual(mock_fork.call_count, 3)
+        mock_sleep.assert_called_once_with(ForkingWorkerHost.RESTART_DELAY_SECONDS)
+        # Stopping passes SIGTERM on to the running workers, which
+        # aren't restarted when they exit.
+        self.assertEqual(
+            mock_kill.call_args_list, [call(102, signal.SIGTERM), call(103, signal.SIGTERM)]
+        )
+        self.assertEqual(host.children, {})
+        self.assertEqual(wait_results, [])
+        self.assertEqual(
+            logs.output,
+            [
+                "INFO:process_queue:2 queue worker processes were launched",
+                "WARNING:process_queue:Worker 0 for queue user_activity exited with status 1; restarting",
+            ],
+        )
+
+    def test_forking_worker_host_stopped_while_starting(self) -> None:
+        logger = logging.getLogger("process_queue")
+        host = ForkingWorkerHost([("user_activity", 0), ("embed_links", 1)], logger)
+
+        def fork() -> int:
+            # SIGTERM arrives while starting the workers.
+            host.stop(signal.SIGTERM, None)
+            return 101
+
+        with (
+            patch.object(host, "preload"),
+            patch("zerver.management.commands.process_queue.signal.signal"),
+            patch("os.fork", side_effect=fork) as mock_fork,
+            patch("os.wait", return_value=(101, 0)),
+            patch("os.kill") as mock_kill,
+            self.assertLogs("process_queue", level="INFO") as logs,
+        ):
+            host.run()
+
+        mock_fork.assert_called_once_with()
+        # The worker wasn't recorded yet when the signal arrived.
+        mock_kill.assert_not_called()
+        self.assertEqual(host.children, {})
+        self.assertEqual(logs.output, ["INFO:process_queue:1 queue worker processes were launched"])
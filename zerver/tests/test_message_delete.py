@@ -8,6 +8,8 @@ from django.utils.timezone import now as timezone_now
 
 from zerver.actions.message_delete import do_delete_messages
 from zerver.actions.realm_settings import do_set_realm_property
+from zerver.actions.users import do_delete_user
+from zerver.lib.message import get_recent_private_conversations
 from zerver.lib.test_classes import ZulipTestCase
 from zerver.models import Message, UserProfile
 from zerver.models.realms import CommonMessagePolicyEnum, get_realm
@@ -361,3 +363,75 @@ class DeleteMessageTest(ZulipTestCase):
             do_delete_messages(realm, all_messages, acting_user=None)
         stream = get_stream(stream_name, realm)
         self.assertEqual(stream.first_message_id, None)
+
+    def test_recent_private_conversations_on_message_deletion(self) -> None:
+        realm = get_realm("zulip")
+        hamlet = self.example_user("hamlet")
+        othello = self.example_user("othello")
+        iago = self.example_user("iago")
+
+        first_id = self.send_personal_message(hamlet, othello)
+        second_id = self.send_personal_message(othello, hamlet)
+        self_id = self.send_personal_message(hamlet, hamlet)
+        first_group_id = self.send_group_direct_message(hamlet, [othello, iago])
+        second_group_id = self.send_group_direct_message(iago, [hamlet, othello])
+        group_recipient_id = Message.objects.get(id=first_group_id).recipient_id
+        conversation_recipient_ids = [
+            hamlet.recipient_id,
+            othello.recipient_id,
+            group_recipient_id,
+        ]
+
+        def get_max_message_ids(user_profile: UserProfile) -> dict[int | None, int]:
+            recent_conversations = get_recent_private_conversations(user_profile)
+            return {
+                recipient_id: recent_conversations[recipient_id]["max_message_id"]
+                for recipient_id in conversation_recipient_ids
+                if recipient_id in recent_conversations
+            }
+
+        self.assertEqual(
+            get_max_message_ids(hamlet),
+            {
+                othello.recipient_id: second_id,
+                hamlet.recipient_id: self_id,
+                group_recipient_id: second_group_id,
+            },
+        )
+        self.assertEqual(
+            get_max_message_ids(othello),
+            {hamlet.recipient_id: second_id, group_recipient_id: second_group_id},
+        )
+
+        do_delete_messages(
+            realm,
+            Message.objects.filter(id__in=[second_id, second_group_id]),
+            acting_user=None,
+        )
+        self.assertEqual(
+            get_max_message_ids(hamlet),
+            {
+                othello.recipient_id: first_id,
+                hamlet.recipient_id: self_id,
+                group_recipient_id: first_group_id,
+            },
+        )
+        self.assertEqual(
+            get_max_message_ids(othello),
+            {hamlet.recipient_id: first_id, group_recipient_id: first_group_id},
+        )
+
+        do_delete_messages(realm, Message.objects.filter(id=first_id), acting_user=None)
+        self.assertEqual(
+            get_max_message_ids(hamlet),
+            {hamlet.recipient_id: self_id, group_recipient_id: first_group_id},
+        )
+        self.assertEqual(get_max_message_ids(othello), {group_recipient_id: first_group_id})
+
+        # Deleting a user deletes the messages they sent to group
+        # direct message conversations.
+        third_group_id = self.send_group_direct_message(iago, [hamlet, othello])
+        self.send_group_direct_message(hamlet, [othello, iago])
+        do_delete_user(hamlet, acting_user=None)
+        self.assertEqual(get_max_message_ids(othello), {group_recipient_id: third_group_id})
+        self.assertEqual(get_max_message_ids(iago), {group_recipient_id: third_group_id})
@@ -1,19 +1,39 @@
+import copy
+import zlib
 from typing import Any
 from unittest import mock
 
+import orjson
 from django.utils.timezone import now as timezone_now
 
+from zerver.actions.user_settings import do_change_user_setting
 from zerver.lib.cache import cache_delete, to_dict_cache_key_id
 from zerver.lib.display_recipient import get_display_recipient
 from zerver.lib.markdown import version as markdown_version
 from zerver.lib.message import messages_for_ids
-from zerver.lib.message_cache import MessageDict, sew_messages_and_reactions
+from zerver.lib.message_cache import (
+    MESSAGE_CACHE_FORMAT_VERSION_1,
+    MESSAGE_CACHE_FORMAT_VERSION_1_COMPRESSED,
+    MessageDict,
+    extract_message_dict,
+    sew_messages_and_reactions,
+    stringify_message_dict,
+)
 from zerver.lib.per_request_cache import flush_per_request_caches
 from zerver.lib.test_classes import ZulipTestCase
 from zerver.lib.test_helpers import make_client
 from zerver.lib.topic import TOPIC_LINKS
 from zerver.lib.types import DisplayRecipientT, UserDisplayRecipient
-from zerver.models import Message, Reaction, Realm, RealmFilter, Recipient, Stream, UserProfile
+from zerver.models import (
+    Message,
+    Reaction,
+    Realm,
+    RealmFilter,
+    Recipient,
+    Stream,
+    SubMessage,
+    UserProfile,
+)
 from zerver.models.realms import get_realm
 from zerver.models.streams import get_stream
 
@@ -178,6 +198,56 @@ class MessageDictTest(ZulipTestCase):
 
         self.assert_length(objs, num_ids)
 
+    def test_post_process_dicts_matches_finalize_payload(self) -> None:
+        realm = get_realm("zulip")
+        hamlet = self.example_user("hamlet")
+        cordelia = self.example_user("cordelia")
+        othello = self.example_user("othello")
+        do_change_user_setting(
+            othello,
+            "email_address_visibility",
+            UserProfile.EMAIL_ADDRESS_VISIBILITY_ADMINS,
+            acting_user=None,
+        )
+
+        ids = [
+            self.send_stream_message(hamlet, "Denmark"),
+            self.send_stream_message(othello, "Denmark"),
+            self.send_stream_message(hamlet, "Verona"),
+            self.send_personal_message(hamlet, cordelia),
+            self.send_personal_message(cordelia, hamlet),
+            self.send_personal_message(hamlet, hamlet),
+            self.send_group_direct_message(othello, [hamlet, cordelia]),
+            self.send_group_direct_message(hamlet, [othello, cordelia]),
+        ]
+
+        for apply_markdown in [False, True]:
+            for client_gravatar in [False, True]:
+                objs = MessageDict.ids_to_dict(ids)
+                for obj in objs:
+                    obj["can_access_sender"] = obj["sender_id"] != othello.id
+
+                expected = copy.deepcopy(objs)
+                MessageDict.bulk_hydrate_sender_info(expected)
+                MessageDict.bulk_hydrate_recipient_info(expected)
+                for obj in expected:
+                    MessageDict.finalize_payload(
+                        obj,
+                        apply_markdown,
+                        client_gravatar,
+                        skip_copy=True,
+                        can_access_sender=obj["can_access_sender"],
+                        realm_host=realm.host,
+                    )
+
+                MessageDict.post_process_dicts(
+                    objs,
+                    apply_markdown=apply_markdown,
+                    client_gravatar=client_gravatar,
+                    realm=realm,
+                )
+                self.assertEqual(objs, expected)
+
     def test_applying_markdown(self) -> None:
         sender = self.example_user("othello")
         receiver = self.example_user("hamlet")
@@ -301,6 +371,41 @@ class MessageDictTest(ZulipTestCase):
         self.assertEqual(msg_dict["reactions"][0]["user"]["email"], sender.email)
         self.assertEqual(msg_dict["reactions"][0]["user"]["full_name"], sender.full_name)
 
+    def test_message_cache_encoding(self) -> None:
+        hamlet = self.example_user("hamlet")
+        cordelia = self.example_user("cordelia")
+        short_message_id = self.send_stream_message(hamlet, "Denmark", content="short")
+        long_message_id = self.send_personal_message(hamlet, cordelia, content="long " * 1000)
+        self.api_post(
+            cordelia, f"/api/v1/messages/{short_message_id}/reactions", {"emoji_name": "smile"}
+        )
+        self.api_patch(hamlet, f"/api/v1/messages/{short_message_id}", {"content": "edited"})
+        SubMessage.objects.create(
+            message_id=short_message_id, sender=hamlet, msg_type="widget", content="{}"
+        )
+
+        short_dict, long_dict = MessageDict.ids_to_dict([short_message_id, long_message_id])
+        self.assertIn("edit_history", short_dict)
+        self.assertNotIn("edit_history", long_dict)
+        self.assert_length(short_dict["reactions"], 1)
+        self.assert_length(short_dict["submessages"], 1)
+
+        short_bytes = stringify_message_dict(short_dict)
+        self.assertEqual(short_bytes[:1], MESSAGE_CACHE_FORMAT_VERSION_1)
+        self.assertEqual(extract_message_dict(short_bytes), short_dict)
+        # The compact format is smaller than the original format,
+        # even before compression.
+        self.assertLess(len(short_bytes), len(orjson.dumps(short_dict)))
+
+        long_bytes = stringify_message_dict(long_dict)
+        self.assertEqual(long_bytes[:1], MESSAGE_CACHE_FORMAT_VERSION_1_COMPRESSED)
+        self.assertEqual(extract_message_dict(long_bytes), long_dict)
+
+        # Entries cached in the original, unversioned format are still
+        # readable.
+        legacy_bytes = zlib.compress(orjson.dumps(short_dict))
+        self.assertEqual(extract_message_dict(legacy_bytes), short_dict)
+
     def test_missing_anchor(self) -> None:
         self.login("hamlet")
         result = self.client_get(
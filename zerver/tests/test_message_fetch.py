@@ -1,4 +1,4 @@
-from collections.abc import Sequence
+from collections.abc import Callable, Sequence
 from dataclasses import dataclass
 from datetime import timedelta
 from typing import TYPE_CHECKING, Any
@@ -8,21 +8,27 @@ import orjson
 from django.db import connection
 from django.test import override_settings
 from django.utils.timezone import now as timezone_now
-from sqlalchemy.sql import ClauseElement, Select, and_, column, select, table
+from sqlalchemy.engine import Connection, Row
+from sqlalchemy.sql import ClauseElement, Select, and_, column, func, literal, select, table
+from sqlalchemy.sql.selectable import SelectBase
 from sqlalchemy.types import Integer
 from typing_extensions import override
 
 from analytics.lib.counts import COUNT_STATS
 from analytics.models import RealmCount
+from zerver.actions.message_delete import do_delete_messages
 from zerver.actions.message_edit import do_update_message
+from zerver.actions.message_flags import do_update_message_flags
 from zerver.actions.reactions import check_add_reaction
 from zerver.actions.realm_settings import do_set_realm_property
 from zerver.actions.uploads import do_claim_attachments
 from zerver.actions.user_settings import do_change_user_setting
+from zerver.actions.user_topics import do_set_user_topic_visibility_policy
 from zerver.actions.users import do_deactivate_user
 from zerver.lib.avatar import avatar_url
 from zerver.lib.display_recipient import get_display_recipient
 from zerver.lib.exceptions import JsonableError
+from zerver.lib.first_unread_cache import get_first_unread_cache_hits, get_first_unread_cache_misses
 from zerver.lib.markdown import render_message_markdown
 from zerver.lib.mention import MentionBackend, MentionData
 from zerver.lib.message import (
@@ -37,6 +43,7 @@ from zerver.lib.narrow import (
     NarrowBuilder,
     NarrowParameter,
     exclude_muting_conditions,
+    execute_with_statement_timeout,
     find_first_unread_anchor,
     is_spectator_compatible,
     ok_to_include_history,
@@ -44,6 +51,8 @@ from zerver.lib.narrow import (
 )
 from zerver.lib.narrow_helpers import NarrowTerm
 from zerver.lib.narrow_predicate import build_narrow_predicate
+from zerver.lib.queue import queue_json_publish
+from zerver.lib.request import RequestNotes
 from zerver.lib.sqlalchemy_utils import get_sqlalchemy_connection
 from zerver.lib.streams import StreamDict, create_streams_if_needed, get_public_streams_queryset
 from zerver.lib.test_classes import ZulipTestCase
@@ -3050,6 +3059,147 @@ class GetOldMessagesTest(ZulipTestCase):
             '<p>こんに <span class="highlight">ちは</span> 。 <span class="highlight">今日は</span> いい 天気ですね。</p>',
         )
 
+    @override_settings(
+        USING_PGROONGA=False, SEARCH_STATEMENT_TIMEOUT_SECONDS=10, SEARCH_CHUNK_MESSAGE_IDS=2
+    )
+    def test_get_messages_with_search_timeout(self) -> None:
+        self.login("cordelia")
+        cordelia = self.example_user("cordelia")
+        message_ids = [
+            self.send_stream_message(cordelia, "Verona", content=f"lunch {i}", topic_name="food")
+            for i in range(5)
+        ]
+        self._update_tsvector_index()
+
+        narrow = [
+            dict(operator="sender", operand=cordelia.email),
+            dict(operator="search", operand="lunch"),
+        ]
+        params = dict(
+            narrow=orjson.dumps(narrow).decode(),
+            anchor="newest",
+            num_before=3,
+            num_after=0,
+        )
+
+        # Searches which finish in time are unaffected.
+        result: dict[str, Any] = self.get_and_check_messages(params)
+        self.assertEqual([message["id"] for message in result["messages"]], message_ids[-3:])
+        self.assertNotIn("search_continuation", result)
+
+        def execute_cancelling_calls(
+            cancelled_calls: set[int],
+        ) -> Callable[[Connection, SelectBase, float], list[Row] | None]:
+            call_count = 0
+
+            def execute(sa_conn: Connection, query: SelectBase, timeout: float) -> list[Row] | None:
+                nonlocal call_count
+                call_count += 1
+                if call_count in cancelled_calls:
+                    return None
+                return execute_with_statement_timeout(sa_conn, query, timeout)
+
+            return execute
+
+        # If the single search query times out, we scan ranges of
+        # message IDs instead, with the same results.
+        with mock.patch(
+            "zerver.lib.narrow.execute_with_statement_timeout",
+            side_effect=execute_cancelling_calls({1}),
+        ):
+            result = self.get_and_check_messages(params)
+        self.assertEqual([message["id"] for message in result["messages"]], message_ids[-3:])
+        self.assertTrue(result["found_newest"])
+        self.assertNotIn("search_continuation", result)
+
+        # If we run out of time scanning, we return what we have.
+        with mock.patch(
+            "zerver.lib.narrow.execute_with_statement_timeout",
+            side_effect=execute_cancelling_calls({1, 3}),
+        ):
+            result = self.get_and_check_messages(params)
+        self.assertEqual([message["id"] for message in result["messages"]], message_ids[-2:])
+        self.assertFalse(result["found_oldest"])
+        self.assertEqual(result["search_continuation"], {"before": message_ids[-2]})
+
+        # The client can continue the search from there.
+        result = self.get_and_check_messages(
+            dict(params, anchor=result["search_continuation"]["before"], include_anchor="false")
+        )
+        self.assertEqual([message["id"] for message in result["messages"]], message_ids[:3])
+
+        # Searching newer messages than the anchor is scanned the same
+        # way, in the other direction.
+        after_params = dict(params, anchor=message_ids[0], num_before=0, num_after=3)
+        with mock.patch(
+            "zerver.lib.narrow.execute_with_statement_timeout",
+            side_effect=execute_cancelling_calls({1}),
+        ):
+            result = self.get_and_check_messages(after_params)
+        self.assertEqual([message["id"] for message in result["messages"]], message_ids[:4])
+        self.assertNotIn("search_continuation", result)
+
+        with mock.patch(
+            "zerver.lib.narrow.execute_with_statement_timeout",
+            side_effect=execute_cancelling_calls({1, 3}),
+        ):
+            result = self.get_and_check_messages(after_params)
+        self.assertEqual([message["id"] for message in result["messages"]], message_ids[:2])
+        self.assertFalse(result["found_newest"])
+        self.assertEqual(result["search_continuation"], {"after": message_ids[1]})
+
+        # And in both directions at once.
+        both_params = dict(params, anchor=message_ids[2], num_before=2, num_after=2)
+        with mock.patch(
+            "zerver.lib.narrow.execute_with_statement_timeout",
+            side_effect=execute_cancelling_calls({1}),
+        ):
+            result = self.get_and_check_messages(both_params)
+        self.assertEqual([message["id"] for message in result["messages"]], message_ids)
+        self.assertNotIn("search_continuation", result)
+
+        # If we run out of time scanning older messages, we don't
+        # start on the newer ones.
+        with mock.patch(
+            "zerver.lib.narrow.execute_with_statement_timeout",
+            side_effect=execute_cancelling_calls({1, 2}),
+        ) as mock_execute:
+            result = self.get_and_check_messages(both_params)
+        self.assertEqual(mock_execute.call_count, 2)
+        self.assertEqual(result["messages"], [])
+        self.assertFalse(result["found_oldest"])
+        self.assertFalse(result["found_newest"])
+        self.assertEqual(
+            result["search_continuation"], {"before": message_ids[2], "after": message_ids[1]}
+        )
+
+    def test_execute_with_statement_timeout(self) -> None:
+        def get_statement_timeout() -> str:
+            with connection.cursor() as cursor:
+                cursor.execute("SHOW statement_timeout")
+                row = cursor.fetchone()
+                assert row is not None
+                return row[0]
+
+        default_timeout = get_statement_timeout()
+        with get_sqlalchemy_connection() as sa_conn:
+            # A query which runs past the timeout is cancelled, without
+            # aborting the surrounding transaction.
+            self.assertIsNone(
+                execute_with_statement_timeout(sa_conn, select(func.pg_sleep(1)), 0.01)
+            )
+            self.assertEqual(get_statement_timeout(), default_timeout)
+
+            # With no time left, we don't run the query at all.
+            with queries_captured() as queries:
+                self.assertIsNone(execute_with_statement_timeout(sa_conn, select(literal(1)), 0))
+            self.assert_length(queries, 0)
+
+            rows = execute_with_statement_timeout(sa_conn, select(literal(1)), 10)
+            assert rows is not None
+            self.assertEqual([tuple(row) for row in rows], [(1,)])
+            self.assertEqual(get_statement_timeout(), default_timeout)
+
     @override_settings(USING_PGROONGA=False)
     def test_get_visible_messages_with_search(self) -> None:
         self.login("hamlet")
@@ -4019,6 +4169,99 @@ class GetOldMessagesTest(ZulipTestCase):
             {unsub_message_id, muted_message_id, first_message_id, extra_message_id},
         )
 
+    def test_find_first_unread_anchor_cache(self) -> None:
+        hamlet = self.example_user("hamlet")
+        cordelia = self.example_user("cordelia")
+        realm = hamlet.realm
+
+        self.make_stream("Wales")
+        self.subscribe(hamlet, "Wales")
+        self.subscribe(cordelia, "Wales")
+
+        def assert_first_unread(
+            narrow: list[NarrowParameter], expected_anchor: int, *, cached: bool
+        ) -> None:
+            hits = get_first_unread_cache_hits()
+            misses = get_first_unread_cache_misses()
+            with get_sqlalchemy_connection() as sa_conn, queries_captured() as queries:
+                anchor = find_first_unread_anchor(
+                    sa_conn=sa_conn, user_profile=hamlet, narrow=narrow
+                )
+            self.assertEqual(anchor, expected_anchor)
+            self.assertEqual(get_first_unread_cache_hits() - hits, 1 if cached else 0)
+            self.assertEqual(get_first_unread_cache_misses() - misses, 0 if cached else 1)
+            usermessage_queries = [q for q in queries if "zerver_usermessage" in q.sql]
+            self.assert_length(usermessage_queries, 0 if cached else 1)
+
+        channel_narrow = [NarrowParameter(operator="channel", operand="Wales")]
+        topic_narrow = [*channel_narrow, NarrowParameter(operator="topic", operand="lunch")]
+
+        assert_first_unread(channel_narrow, LARGER_THAN_MAX_MESSAGE_ID, cached=False)
+        assert_first_unread(channel_narrow, LARGER_THAN_MAX_MESSAGE_ID, cached=True)
+
+        # A new message invalidates a cached "no unread messages".
+        first_message_id = self.send_stream_message(cordelia, "Wales", topic_name="lunch")
+        assert_first_unread(channel_narrow, first_message_id, cached=False)
+
+        # But further messages cannot change the first unread message.
+        second_message_id = self.send_stream_message(cordelia, "Wales", topic_name="lunch")
+        assert_first_unread(channel_narrow, first_message_id, cached=True)
+        assert_first_unread(topic_narrow, first_message_id, cached=False)
+        assert_first_unread(topic_narrow, first_message_id, cached=True)
+
+        # Narrows we don't cache always go to the database.
+        negated_narrow = [NarrowParameter(operator="channel", operand="Wales", negated=True)]
+        with get_sqlalchemy_connection() as sa_conn:
+            misses = get_first_unread_cache_misses()
+            find_first_unread_anchor(sa_conn=sa_conn, user_profile=hamlet, narrow=negated_narrow)
+            self.assertEqual(get_first_unread_cache_misses(), misses)
+
+        # Reading messages invalidates the user's cached values.
+        do_update_message_flags(hamlet, "add", "read", [first_message_id])
+        assert_first_unread(channel_narrow, second_message_id, cached=False)
+        assert_first_unread(topic_narrow, second_message_id, cached=False)
+
+        # As does muting the topic.
+        channel = get_stream("Wales", realm)
+        do_set_user_topic_visibility_policy(
+            hamlet, channel, "lunch", visibility_policy=UserTopic.VisibilityPolicy.MUTED
+        )
+        assert_first_unread(channel_narrow, LARGER_THAN_MAX_MESSAGE_ID, cached=False)
+        do_set_user_topic_visibility_policy(
+            hamlet, channel, "lunch", visibility_policy=UserTopic.VisibilityPolicy.INHERIT
+        )
+        assert_first_unread(channel_narrow, second_message_id, cached=False)
+        assert_first_unread(channel_narrow, second_message_id, cached=True)
+
+        # Deleting messages invalidates everything cached for the channel.
+        do_delete_messages(realm, [Message.objects.get(id=second_message_id)], acting_user=None)
+        assert_first_unread(channel_narrow, LARGER_THAN_MAX_MESSAGE_ID, cached=False)
+
+        # Marking the channel's messages as read for everyone, as is
+        # done when deactivating it, invalidates the cached values.
+        third_message_id = self.send_stream_message(cordelia, "Wales", topic_name="lunch")
+        assert_first_unread(channel_narrow, third_message_id, cached=False)
+        assert_first_unread(channel_narrow, third_message_id, cached=True)
+        with self.assertLogs("zerver.worker.deferred_work", "INFO"):
+            queue_json_publish(
+                "deferred_work",
+                {
+                    "type": "mark_stream_messages_as_read_for_everyone",
+                    "stream_recipient_id": channel.recipient_id,
+                },
+            )
+        assert_first_unread(channel_narrow, LARGER_THAN_MAX_MESSAGE_ID, cached=False)
+
+        # Cache hits are noted in the access logs.
+        request = HostRequestMock(
+            dict(anchor="first_unread", num_before=0, num_after=0, narrow='[["channel", "Wales"]]'),
+            hamlet,
+        )
+        get_messages_backend(request, hamlet, num_before=0, num_after=0)
+        log_data = RequestNotes.get_notes(request).log_data
+        assert log_data is not None
+        self.assertEqual(log_data["extra"], "[channel][first_unread:cached]")
+
     def test_parse_anchor_value(self) -> None:
         hamlet = self.example_user("hamlet")
         cordelia = self.example_user("cordelia")
@@ -19,6 +19,7 @@ from zerver.actions.user_settings import do_change_user_setting
 from zerver.actions.user_topics import do_set_user_topic_visibility_policy
 from zerver.lib.email_notifications import (
     MissedMessageData,
+    MissedMessageEmailBatch,
     fix_emojis,
     fix_spoilers_in_html,
     handle_missedmessage_emails,
@@ -89,6 +90,55 @@ class TestMessageNotificationEmails(ZulipTestCase):
             )
         m.assert_not_called()
 
+    def test_missed_message_email_batch(self) -> None:
+        hamlet = self.example_user("hamlet")
+        othello = self.example_user("othello")
+        msg_id = self.send_group_direct_message(
+            self.example_user("cordelia"), [hamlet, othello], "Group direct message"
+        )
+        message_ids_by_user = {
+            hamlet.id: {msg_id: MissedMessageData(trigger=NotificationTriggers.DIRECT_MESSAGE)},
+            othello.id: {msg_id: MissedMessageData(trigger=NotificationTriggers.DIRECT_MESSAGE)},
+        }
+
+        batch = MissedMessageEmailBatch(message_ids_by_user)
+        for user_profile_id, message_ids in message_ids_by_user.items():
+            handle_missedmessage_emails(user_profile_id, message_ids, batch)
+        # The emails are only sent once the batch is published.
+        self.assert_length(batch.emails, 2)
+        self.assert_length(mail.outbox, 0)
+        # Both users see the message the same way, so it is only
+        # rendered once.
+        self.assert_length(batch.message_payloads, 1)
+
+        batch.publish_emails()
+        self.assertEqual(
+            sorted(email.to[0] for email in mail.outbox),
+            sorted([hamlet.delivery_email, othello.delivery_email]),
+        )
+        for email in mail.outbox:
+            self.assertIn("Group direct message", email.body)
+
+    def test_missed_message_email_batch_unread_flags(self) -> None:
+        hamlet = self.example_user("hamlet")
+        othello = self.example_user("othello")
+        cordelia = self.example_user("cordelia")
+        first_msg_id = self.send_group_direct_message(cordelia, [hamlet, othello], "First")
+        second_msg_id = self.send_group_direct_message(cordelia, [hamlet, othello], "Second")
+
+        # Each user's unread flags are only loaded for their own
+        # messages, though both users received both messages.
+        batch = MissedMessageEmailBatch(
+            {hamlet.id: {first_msg_id}, othello.id: {second_msg_id}, cordelia.id: set()}
+        )
+        self.assertEqual(
+            set(batch.unread_flags), {(hamlet.id, first_msg_id), (othello.id, second_msg_id)}
+        )
+        self.assertEqual(
+            batch.get_unread_messages(hamlet.id, {first_msg_id}),
+            [batch.messages[first_msg_id]],
+        )
+
     def normalize_string(self, s: str | StrPromise) -> str:
         s = s.strip()
         return re.sub(r"\s+", " ", s)
@@ -2,9 +2,17 @@ from unittest import mock
 
 from django.utils.timezone import now as timezone_now
 
+from zerver.actions.message_delete import do_delete_messages
 from zerver.actions.streams import do_change_stream_permission
+from zerver.actions.users import do_delete_user
+from zerver.lib.retention import restore_data_from_archive
 from zerver.lib.test_classes import ZulipTestCase
-from zerver.models import Message, UserMessage
+from zerver.lib.topic import (
+    get_stale_topic_summaries,
+    increment_topic_summaries,
+    update_topic_summaries,
+)
+from zerver.models import ArchiveTransaction, Message, TopicSummary, UserMessage
 from zerver.models.clients import get_client
 from zerver.models.realms import get_realm
 from zerver.models.streams import get_stream
@@ -52,6 +60,7 @@ class TopicHistoryTest(ZulipTestCase):
             )
             message.set_topic_name(topic_name)
             message.save()
+            increment_topic_summaries([message])
 
             UserMessage.objects.create(
                 user_profile=user_profile,
@@ -213,6 +222,118 @@ class TopicHistoryTest(ZulipTestCase):
         self.assert_json_error(result, "Invalid channel ID", 400)
 
 
+class TopicSummaryTest(ZulipTestCase):
+    def get_summaries(self, recipient_id: int) -> dict[str, tuple[int, int, bool]]:
+        return {
+            row.topic_name: (row.max_message_id, row.message_count, row.is_resolved)
+            for row in TopicSummary.objects.filter(recipient_id=recipient_id)
+        }
+
+    def test_send_message(self) -> None:
+        hamlet = self.example_user("hamlet")
+        stream = self.make_stream("summary stream")
+        self.subscribe(hamlet, stream.name)
+        assert stream.recipient_id is not None
+        self.assertEqual(self.get_summaries(stream.recipient_id), {})
+
+        first_id = self.send_stream_message(hamlet, stream.name, topic_name="lunch")
+        self.assertEqual(self.get_summaries(stream.recipient_id), {"lunch": (first_id, 1, False)})
+
+        second_id = self.send_stream_message(hamlet, stream.name, topic_name="lunch")
+        resolved_id = self.send_stream_message(hamlet, stream.name, topic_name="✔ dinner")
+        self.assertEqual(
+            self.get_summaries(stream.recipient_id),
+            {"lunch": (second_id, 2, False), "✔ dinner": (resolved_id, 1, True)},
+        )
+
+        # Direct messages are not tracked.
+        direct_message = Message.objects.select_related("recipient").get(
+            id=self.send_personal_message(hamlet, hamlet)
+        )
+        with self.assert_database_query_count(0):
+            increment_topic_summaries([direct_message])
+
+    def test_move_and_delete_messages(self) -> None:
+        hamlet = self.example_user("hamlet")
+        self.login_user(hamlet)
+        stream = self.make_stream("summary stream")
+        self.subscribe(hamlet, stream.name)
+        assert stream.recipient_id is not None
+
+        first_id = self.send_stream_message(hamlet, stream.name, topic_name="lunch")
+        second_id = self.send_stream_message(hamlet, stream.name, topic_name="LUNCH")
+        third_id = self.send_stream_message(hamlet, stream.name, topic_name="dinner")
+
+        # Moving a case-insensitive topic moves every casing of it.
+        result = self.client_patch(
+            f"/json/messages/{first_id}",
+            {"topic": "brunch", "propagate_mode": "change_all"},
+        )
+        self.assert_json_success(result)
+        self.assertEqual(
+            self.get_summaries(stream.recipient_id),
+            {"brunch": (second_id, 2, False), "dinner": (third_id, 1, False)},
+        )
+
+        do_delete_messages(hamlet.realm, Message.objects.filter(id=second_id), acting_user=hamlet)
+        self.assertEqual(
+            self.get_summaries(stream.recipient_id),
+            {"brunch": (first_id, 1, False), "dinner": (third_id, 1, False)},
+        )
+
+        archive_transaction = ArchiveTransaction.objects.order_by("id").last()
+        assert archive_transaction is not None
+        restore_data_from_archive(archive_transaction)
+        self.assertEqual(
+            self.get_summaries(stream.recipient_id),
+            {"brunch": (second_id, 2, False), "dinner": (third_id, 1, False)},
+        )
+
+        do_delete_messages(hamlet.realm, Message.objects.filter(id=third_id), acting_user=hamlet)
+        self.assertEqual(self.get_summaries(stream.recipient_id), {"brunch": (second_id, 2, False)})
+
+    def test_delete_user(self) -> None:
+        hamlet = self.example_user("hamlet")
+        cordelia = self.example_user("cordelia")
+        stream = self.make_stream("summary stream")
+        self.subscribe(hamlet, stream.name)
+        self.subscribe(cordelia, stream.name)
+        assert stream.recipient_id is not None
+
+        lunch_id = self.send_stream_message(hamlet, stream.name, topic_name="lunch")
+        self.send_stream_message(cordelia, stream.name, topic_name="lunch")
+        # Cordelia is the only one to have posted in this topic.
+        self.send_stream_message(cordelia, stream.name, topic_name="dinner")
+
+        # Deleting a user deletes the messages they sent.
+        do_delete_user(cordelia, acting_user=None)
+        self.assertEqual(self.get_summaries(stream.recipient_id), {"lunch": (lunch_id, 1, False)})
+        self.assertEqual(get_stale_topic_summaries(stream.realm_id, stream.recipient_id), [])
+
+    def test_audit(self) -> None:
+        hamlet = self.example_user("hamlet")
+        stream = self.make_stream("summary stream")
+        self.subscribe(hamlet, stream.name)
+        assert stream.recipient_id is not None
+
+        message_id = self.send_stream_message(hamlet, stream.name, topic_name="lunch")
+        self.send_stream_message(hamlet, stream.name, topic_name="dinner")
+        self.assertEqual(get_stale_topic_summaries(stream.realm_id, stream.recipient_id), [])
+
+        TopicSummary.objects.filter(recipient_id=stream.recipient_id, topic_name="lunch").update(
+            message_count=5
+        )
+        TopicSummary.objects.filter(recipient_id=stream.recipient_id, topic_name="dinner").delete()
+        self.assertEqual(
+            set(get_stale_topic_summaries(stream.realm_id, stream.recipient_id)),
+            {"lunch", "dinner"},
+        )
+
+        update_topic_summaries(stream.realm_id, stream.recipient_id, ["lunch", "dinner"])
+        self.assertEqual(get_stale_topic_summaries(stream.realm_id, stream.recipient_id), [])
+        self.assertEqual(self.get_summaries(stream.recipient_id)["lunch"], (message_id, 1, False))
+
+
 class TopicDeleteTest(ZulipTestCase):
     def test_topic_delete(self) -> None:
         initial_last_msg_id = self.get_last_message().id
@@ -49,6 +49,7 @@ from zerver.lib.push_notifications import (
     APNsContext,
     DeviceToken,
     InvalidRemotePushDeviceTokenError,
+    PushNotificationPayloads,
     UserPushIdentityCompat,
     b64_to_hex,
     get_apns_badge_count,
@@ -58,7 +59,9 @@ from zerver.lib.push_notifications import (
     get_message_payload_apns,
     get_message_payload_gcm,
     get_mobile_push_content,
+    get_push_notification_payloads,
     handle_push_notification,
+    handle_push_notifications,
     handle_remove_push_notification,
     hex_to_b64,
     modernize_apns_payload,
@@ -3463,6 +3466,164 @@ class HandlePushNotificationTest(PushNotificationTest):
             ),
         )
 
+    def test_non_bouncer_push_batch(self) -> None:
+        self.setup_apns_tokens()
+        self.setup_fcm_tokens()
+        cordelia = self.example_user("cordelia")
+        PushDeviceToken.objects.create(
+            kind=PushDeviceToken.APNS,
+            token=hex_to_b64("abcd"),
+            user=cordelia,
+            ios_app_id="org.zulip.Zulip",
+        )
+        missed_messages = []
+        for user_profile in [self.user_profile, cordelia, self.user_profile]:
+            message = self.get_message(
+                Recipient.PERSONAL,
+                type_id=self.personal_recipient_user.id,
+                realm_id=self.personal_recipient_user.realm_id,
+            )
+            UserMessage.objects.create(user_profile=user_profile, message=message)
+            missed_messages.append(
+                {
+                    "user_profile_id": user_profile.id,
+                    "message_id": message.id,
+                    "trigger": NotificationTriggers.DIRECT_MESSAGE,
+                }
+            )
+
+        with (
+            self.mock_apns() as (apns_context, send_notification),
+            self.mock_fcm() as (mock_fcm_app, mock_fcm_messaging),
+            mock.patch(
+                "zerver.lib.push_notifications.push_notifications_configured", return_value=True
+            ),
+            self.assertLogs("zerver.lib.push_notifications", level="INFO"),
+        ):
+            mock_fcm_messaging.send_each.return_value = self.make_fcm_success_response(
+                self.fcm_tokens * 2
+            )
+            send_notification.return_value.is_successful = True
+            handle_exception = mock.Mock()
+            self.assertEqual(handle_push_notifications(missed_messages, handle_exception), [])
+            handle_exception.assert_not_called()
+
+        # All of the notifications to Android devices were sent in
+        # one request, and the rest were sent on one APNs connection.
+        mock_fcm_messaging.send_each.assert_called_once()
+        self.assertEqual(len(mock_fcm_messaging.send_each.call_args[0][0]), 4)
+        self.assertEqual(send_notification.call_count, 5)
+        for missed_message in missed_messages:
+            user_message = UserMessage.objects.get(
+                user_profile_id=missed_message["user_profile_id"],
+                message_id=missed_message["message_id"],
+            )
+            self.assertTrue(user_message.flags.active_mobile_push_notification)
+
+        remote_realm_count = RealmCount.objects.values("property", "subgroup", "value").last()
+        self.assertEqual(
+            remote_realm_count,
+            dict(property="mobile_pushes_sent::day", subgroup=None, value=9),
+        )
+
+    def test_bouncer_push_batch(self) -> None:
+        cordelia = self.example_user("cordelia")
+        othello = self.example_user("othello")
+        iago = self.example_user("iago")
+        missed_messages = []
+        for user_profile in [self.user_profile, cordelia, othello, iago]:
+            message = self.get_message(
+                Recipient.PERSONAL,
+                type_id=self.personal_recipient_user.id,
+                realm_id=self.personal_recipient_user.realm_id,
+            )
+            UserMessage.objects.create(user_profile=user_profile, message=message)
+            missed_messages.append(
+                {
+                    "user_profile_id": user_profile.id,
+                    "message_id": message.id,
+                    "trigger": NotificationTriggers.DIRECT_MESSAGE,
+                }
+            )
+        # The user was deleted after the event was queued.
+        missed_messages.append(
+            {
+                "user_profile_id": UserProfile.objects.latest("id").id + 1,
+                "message_id": missed_messages[0]["message_id"],
+                "trigger": NotificationTriggers.DIRECT_MESSAGE,
+            }
+        )
+
+        handle_exception = mock.Mock()
+        with mock.patch(
+            "zerver.lib.push_notifications.push_notifications_configured", return_value=False
+        ):
+            self.assertEqual(handle_push_notifications(missed_messages, handle_exception), [])
+        self.assertFalse(
+            UserMessage.objects.filter(
+                message_id__in=[missed_message["message_id"] for missed_message in missed_messages],
+                flags__andnz=UserMessage.flags.active_mobile_push_notification.mask,
+            ).exists()
+        )
+
+        def get_payloads(
+            user_profile: UserProfile, missed_message: dict[str, Any]
+        ) -> PushNotificationPayloads | None:
+            if user_profile.id == iago.id:
+                raise Exception("Broken payload")
+            return get_push_notification_payloads(user_profile, missed_message)
+
+        def send_to_bouncer(user_profile: UserProfile, *args: object) -> None:
+            if user_profile.id == cordelia.id:
+                raise PushNotificationBouncerRetryLaterError("Bouncer is busy")
+            if user_profile.id == othello.id:
+                raise Exception("Bouncer is confused")
+
+        self.setup_apns_tokens()
+        self.setup_fcm_tokens()
+        with (
+            activate_push_notification_service(),
+            mock.patch(
+                "zerver.lib.push_notifications.get_push_notification_payloads",
+                side_effect=get_payloads,
+            ),
+            mock.patch(
+                "zerver.lib.push_notifications.send_notifications_to_bouncer",
+                side_effect=send_to_bouncer,
+            ) as mock_send,
+        ):
+            retry_missed_messages = handle_push_notifications(missed_messages, handle_exception)
+
+        # Each notification is its own request to the bouncer, and a
+        # failure for one user doesn't prevent sending the others.
+        self.assertEqual(
+            [call_args.args[0] for call_args in mock_send.call_args_list],
+            [self.user_profile, cordelia, othello],
+        )
+        self.assertEqual(
+            mock_send.call_args_list[0].args[4:],
+            (
+                list(
+                    PushDeviceToken.objects.filter(
+                        user=self.user_profile, kind=PushDeviceToken.FCM
+                    ).order_by("id")
+                ),
+                list(
+                    PushDeviceToken.objects.filter(
+                        user=self.user_profile, kind=PushDeviceToken.APNS
+                    ).order_by("id")
+                ),
+            ),
+        )
+        self.assertEqual(retry_missed_messages, [missed_messages[1]])
+        self.assertEqual(
+            [
+                (call_args.args[0], str(call_args.args[1]))
+                for call_args in handle_exception.call_args_list
+            ],
+            [(missed_messages[3], "Broken payload"), (missed_messages[2], "Bouncer is confused")],
+        )
+
     def test_send_remove_notifications_to_bouncer(self) -> None:
         self.setup_apns_tokens()
         self.setup_fcm_tokens()
@@ -1,16 +1,22 @@
+import time
+from contextlib import suppress
 from typing import Any
 from unittest import mock
 
 import orjson
+from django.db import transaction
 from django.test import override_settings
 from pika.exceptions import AMQPConnectionError, ConnectionClosed
 from typing_extensions import override
 
 from zerver.lib.queue import (
+    QueuedEvents,
     SimpleQueueClient,
     TornadoQueueClient,
     get_queue_client,
+    queue_event_on_commit,
     queue_json_publish,
+    queue_json_publish_batch,
 )
 from zerver.lib.test_classes import ZulipTestCase
 
@@ -34,6 +40,7 @@ class TestQueueImplementation(ZulipTestCase):
     @override_settings(USING_RABBITMQ=True)
     def test_register_consumer(self) -> None:
         output = []
+        publish_times: list[float | None] = []
 
         queue_client = get_queue_client()
 
@@ -41,14 +48,21 @@ class TestQueueImplementation(ZulipTestCase):
             assert isinstance(queue_client, SimpleQueueClient)
             assert len(events) == 1
             output.append(events[0])
+            publish_times.extend(queue_client.batch_publish_times)
             queue_client.stop_consuming()
 
+        before_publish = time.time()
         queue_json_publish("test_suite", {"event": "my_event"})
 
         queue_client.start_json_consumer("test_suite", collect)
 
         self.assert_length(output, 1)
         self.assertEqual(output[0]["event"], "my_event")
+        [publish_time] = publish_times
+        assert publish_time is not None
+        # The publish time only has a resolution of milliseconds.
+        self.assertGreaterEqual(publish_time, before_publish - 0.001)
+        self.assertLessEqual(publish_time, time.time())
 
     @override_settings(USING_RABBITMQ=True)
     def test_register_consumer_nack(self) -> None:
@@ -115,6 +129,67 @@ class TestQueueImplementation(ZulipTestCase):
         method, header, message = queue_client.channel.basic_get("test_suite")
         assert message is None
 
+    @override_settings(USING_RABBITMQ=True)
+    def test_publish_batch(self) -> None:
+        queue_client = get_queue_client()
+        assert isinstance(queue_client, SimpleQueueClient)
+        actual_publish_batch = queue_client.publish_batch
+
+        self.counter = 0
+
+        def throw_connection_error_once(self_obj: Any, *args: Any, **kwargs: Any) -> None:
+            self.counter += 1
+            if self.counter <= 1:
+                raise AMQPConnectionError("test")
+            actual_publish_batch(*args, **kwargs)
+
+        with (
+            mock.patch(
+                "zerver.lib.queue.SimpleQueueClient.publish_batch", throw_connection_error_once
+            ),
+            self.assertLogs("zulip.queue", level="WARN") as warn_logs,
+        ):
+            queue_json_publish_batch([("test_suite", {"event": i}) for i in range(3)])
+        self.assertEqual(
+            warn_logs.output,
+            ["WARNING:zulip.queue:Failed to send to rabbitmq, trying to reconnect and send again"],
+        )
+
+        assert queue_client.channel
+        events = []
+        while True:
+            method, header, message = queue_client.channel.basic_get("test_suite", auto_ack=True)
+            if message is None:
+                break
+            events.append(orjson.loads(message))
+        self.assertEqual(events, [{"event": 0}, {"event": 1}, {"event": 2}])
+
+    def test_queue_event_on_commit(self) -> None:
+        with self.captureOnCommitCallbacks() as callbacks:
+            queue_event_on_commit("test_suite", {"event": 1})
+            queue_event_on_commit("test_suite", {"event": 2})
+            with suppress(RuntimeError), transaction.atomic():
+                queue_event_on_commit("test_suite", {"event": "rolled back"})
+                raise RuntimeError
+            with transaction.atomic():
+                queue_event_on_commit("test_suite", {"event": 3})
+            transaction.on_commit(lambda: None)
+            queue_event_on_commit("test_suite", {"event": 4})
+            queue_event_on_commit("other_queue", {"event": 5})
+
+        self.assertEqual(
+            [
+                callback.events if isinstance(callback, QueuedEvents) else None
+                for callback in callbacks
+            ],
+            [
+                [("test_suite", {"event": 1}), ("test_suite", {"event": 2})],
+                [("test_suite", {"event": 3})],
+                None,
+                [("test_suite", {"event": 4}), ("other_queue", {"event": 5})],
+            ],
+        )
+
     @override_settings(USING_RABBITMQ=True)
     @override
     def setUp(self) -> None:
@@ -1,6 +1,8 @@
+import asyncio
 import base64
 import os
 import signal
+import threading
 import time
 from collections import defaultdict
 from collections.abc import Callable, Iterator, Mapping
@@ -18,12 +20,13 @@ from typing_extensions import override
 
 from zerver.lib.email_mirror import RateLimitedRealmMirror
 from zerver.lib.email_mirror_helpers import encode_email_address
-from zerver.lib.queue import MAX_REQUEST_RETRIES
+from zerver.lib.queue import MAX_REQUEST_RETRIES, queue_json_publish
 from zerver.lib.rate_limiter import RateLimiterLockingError
 from zerver.lib.remote_server import PushNotificationBouncerRetryLaterError
 from zerver.lib.send_email import EmailNotDeliveredError, FromAddress
 from zerver.lib.test_classes import ZulipTestCase
-from zerver.lib.test_helpers import mock_queue_publish
+from zerver.lib.test_helpers import local_smtp_server, mock_queue_publish
+from zerver.lib.url_preview.types import UrlEmbedData
 from zerver.models import ScheduledMessageNotificationEmail, UserActivity, UserProfile
 from zerver.models.clients import get_client
 from zerver.models.realms import get_realm
@@ -31,11 +34,14 @@ from zerver.models.scheduled_jobs import NotificationTriggers
 from zerver.models.streams import get_stream
 from zerver.tornado.event_queue import build_offline_notification
 from zerver.worker import base as base_worker
+from zerver.worker.deferred_work import DeferredWorker
 from zerver.worker.email_mirror import MirrorWorker
 from zerver.worker.email_senders import EmailSendingWorker
 from zerver.worker.embed_links import FetchLinksEmbedData
 from zerver.worker.missedmessage_emails import MissedMessageWorker
 from zerver.worker.missedmessage_mobile_notifications import PushNotificationsWorker
+from zerver.worker.outgoing_webhooks import OutgoingWebhookWorker
+from zerver.worker.queue_processors import get_active_worker_queues, get_worker
 from zerver.worker.user_activity import UserActivityWorker
 
 Event: TypeAlias = dict[str, Any]
@@ -43,25 +49,31 @@ Event: TypeAlias = dict[str, Any]
 
 class FakeClient:
     def __init__(self, prefetch: int = 0) -> None:
-        self.queues: dict[str, list[dict[str, Any]]] = defaultdict(list)
+        self.queues: dict[str, list[tuple[dict[str, Any], float]]] = defaultdict(list)
+        self.batch_publish_times: list[float | None] = []
 
     def enqueue(self, queue_name: str, data: dict[str, Any]) -> None:
-        self.queues[queue_name].append(data)
+        self.queues[queue_name].append((data, time.time()))
 
     def start_json_consumer(
         self,
         queue_name: str,
         callback: Callable[[list[dict[str, Any]]], None],
-        batch_size: int = 1,
+        batch_size: int | Callable[[], int] = 1,
         timeout: int | None = None,
     ) -> None:
         chunk: list[dict[str, Any]] = []
         queue = self.queues[queue_name]
         while queue:
-            chunk.append(queue.pop(0))
-            if len(chunk) >= batch_size or not len(queue):
+            data, publish_time = queue.pop(0)
+            chunk.append(data)
+            self.batch_publish_times.append(publish_time)
+            if len(chunk) >= (batch_size() if callable(batch_size) else batch_size) or not len(
+                queue
+            ):
                 callback(chunk)
                 chunk = []
+                self.batch_publish_times = []
 
     def local_queue_size(self) -> int:
         return sum(len(q) for q in self.queues.values())
@@ -482,11 +494,43 @@ class WorkerTest(ZulipTestCase):
             error_logs.output[0],
         )
 
+    def assert_consumes_event_on_arrival(self, worker: base_worker.QueueProcessingWorker) -> None:
+        """Runs the worker's real consumer on a channel which delivers
+        one event, and checks that the event is consumed as soon as it
+        arrives, rather than after the consumer waits up to the
+        worker's sleep_delay for more events to fill a batch."""
+        event = {"type": "test"}
+        channel = MagicMock()
+        channel.get_waiting_message_count.return_value = 0
+        channel._pending_events = []
+        consumed_on_arrival = []
+
+        def consume(
+            queue_name: str, inactivity_timeout: int | None
+        ) -> Iterator[tuple[MagicMock | None, MagicMock | None, bytes | None]]:
+            yield MagicMock(delivery_tag=1), MagicMock(headers=None), orjson.dumps(event)
+            # Next, the consumer would wait for another event.
+            consumed_on_arrival.append(mock_consume_batch.called)
+            worker.stop()
+            yield None, None, None
+
+        channel.consume.side_effect = consume
+        with (
+            patch("zerver.lib.queue.pika.BlockingConnection") as mock_connection,
+            patch.object(worker, "consume_batch") as mock_consume_batch,
+            self.assertLogs("zulip.queue", "INFO"),
+        ):
+            mock_connection.return_value.channel.return_value = channel
+            worker.setup()
+            worker.start()
+        self.assertEqual(consumed_on_arrival, [True])
+        mock_consume_batch.assert_called_once_with([event])
+
     def test_push_notifications_worker(self) -> None:
         """
         The push notifications system has its own comprehensive test suite,
         so we can limit ourselves to simple unit testing the queue processor,
-        without going deeper into the system - by mocking the handle_push_notification
+        without going deeper into the system - by mocking the handle_push_notifications
         functions to immediately produce the effect we want, to test its handling by the queue
         processor.
         """
@@ -512,7 +556,8 @@ class WorkerTest(ZulipTestCase):
             worker.setup()
             with (
                 patch(
-                    "zerver.worker.missedmessage_mobile_notifications.handle_push_notification"
+                    "zerver.worker.missedmessage_mobile_notifications.handle_push_notifications",
+                    return_value=[],
                 ) as mock_handle_new,
                 patch(
                     "zerver.worker.missedmessage_mobile_notifications.handle_remove_push_notification"
@@ -523,19 +568,34 @@ class WorkerTest(ZulipTestCase):
             ):
                 event_new = generate_new_message_notification()
                 event_remove = generate_remove_notification()
+                event_new_after_remove = build_offline_notification(1, 2)
                 fake_client.enqueue("missedmessage_mobile_notifications", event_new)
                 fake_client.enqueue("missedmessage_mobile_notifications", event_remove)
+                fake_client.enqueue("missedmessage_mobile_notifications", event_new_after_remove)
+
+                manager = MagicMock()
+                manager.attach_mock(mock_handle_new, "handle_new")
+                manager.attach_mock(mock_handle_remove, "handle_remove")
 
                 worker.start()
-                mock_handle_new.assert_called_once_with(event_new["user_profile_id"], event_new)
+                # The batch is split around the removal, which is
+                # handled after the notification queued before it.
+                self.assertEqual(
+                    [call_args.args[0] for call_args in mock_handle_new.call_args_list],
+                    [[event_new], [event_new_after_remove]],
+                )
                 mock_handle_remove.assert_called_once_with(
                     event_remove["user_profile_id"], event_remove["message_ids"]
                 )
+                self.assertEqual(
+                    [name for name, args, kwargs in manager.mock_calls],
+                    ["handle_new", "handle_remove", "handle_new"],
+                )
 
             with (
                 patch(
-                    "zerver.worker.missedmessage_mobile_notifications.handle_push_notification",
-                    side_effect=PushNotificationBouncerRetryLaterError("test"),
+                    "zerver.worker.missedmessage_mobile_notifications.handle_push_notifications",
+                    side_effect=lambda events, handle_exception: events,
                 ) as mock_handle_new,
                 patch(
                     "zerver.worker.missedmessage_mobile_notifications.handle_remove_push_notification",
@@ -569,6 +629,53 @@ class WorkerTest(ZulipTestCase):
                     * 2,
                 )
 
+            def fail_each_notification(
+                events: list[dict[str, Any]],
+                handle_exception: Callable[[dict[str, Any], Exception], None],
+            ) -> list[dict[str, Any]]:
+                for event in events:
+                    handle_exception(event, Exception("Broken payload"))
+                return []
+
+            fn = os.path.join(settings.QUEUE_ERROR_DIR, "missedmessage_mobile_notifications.errors")
+            with suppress(FileNotFoundError):
+                os.remove(fn)
+            with (
+                patch(
+                    "zerver.worker.missedmessage_mobile_notifications.handle_push_notifications",
+                    side_effect=fail_each_notification,
+                ),
+                patch(
+                    "zerver.worker.missedmessage_mobile_notifications.handle_remove_push_notification",
+                    side_effect=Exception("Broken removal"),
+                ),
+                patch(
+                    "zerver.worker.missedmessage_mobile_notifications.initialize_push_notifications"
+                ),
+                self.assertLogs(level="ERROR") as m,
+            ):
+                event_new = generate_new_message_notification()
+                event_remove = generate_remove_notification()
+                event_new_after_remove = build_offline_notification(1, 2)
+                for event in [event_new, event_remove, event_new_after_remove]:
+                    fake_client.enqueue("missedmessage_mobile_notifications", event)
+                worker.start()
+
+            # Each failed event is handled on its own.
+            self.assertEqual(
+                [record.message for record in m.records],
+                ["Problem handling data on queue missedmessage_mobile_notifications"] * 3,
+            )
+            with open(fn) as f:
+                failed_events = [orjson.loads(line.split("\t")[1]) for line in f]
+            self.assertEqual(failed_events, [[event_new], [event_remove], [event_new_after_remove]])
+
+    def test_push_notifications_worker_sends_on_arrival(self) -> None:
+        with patch(
+            "zerver.worker.missedmessage_mobile_notifications.initialize_push_notifications"
+        ):
+            self.assert_consumes_event_on_arrival(PushNotificationsWorker())
+
     @patch("zerver.worker.email_mirror.mirror_email")
     def test_mirror_worker(self, mock_mirror_email: MagicMock) -> None:
         fake_client = FakeClient()
@@ -702,6 +809,44 @@ class WorkerTest(ZulipTestCase):
 
         self.assertEqual(data["failed_tries"], 1 + MAX_REQUEST_RETRIES)
 
+    def test_email_sending_worker_reuses_connection(self) -> None:
+        fake_client = FakeClient()
+        for i in range(3):
+            fake_client.enqueue(
+                "email_senders",
+                {
+                    "template_prefix": "zerver/emails/confirm_new_email",
+                    "to_emails": [self.example_email("hamlet")],
+                    "from_name": "Zulip Account Security",
+                    "from_address": FromAddress.NOREPLY,
+                    "context": {},
+                },
+            )
+
+        with (
+            local_smtp_server() as (port, stats),
+            override_settings(
+                EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+                EMAIL_HOST="127.0.0.1",
+                EMAIL_PORT=port,
+                EMAIL_USE_TLS=False,
+                EMAIL_HOST_USER="",
+                EMAIL_HOST_PASSWORD="",
+            ),
+            simulated_queue_client(fake_client),
+        ):
+            worker = EmailSendingWorker()
+            worker.setup()
+            worker.start()
+            assert worker.connection is not None
+            worker.connection.close()
+
+            self.assertEqual(stats.messages, 3)
+            # The connection is opened once, and, having just been
+            # used, isn't checked with a NOOP before each email.
+            self.assertEqual(stats.connections, 1)
+            self.assertEqual(stats.noops, 0)
+
     def test_error_handling(self) -> None:
         processed = []
 
@@ -778,6 +923,98 @@ class WorkerTest(ZulipTestCase):
             ["good", "fine", "unexpected behaviour", "back to normal"],
         )
 
+    def test_worker_metrics(self) -> None:
+        @base_worker.assign_queue("metrics_worker", is_test_queue=True)
+        class MetricsWorker(base_worker.LoopQueueProcessingWorker):
+            batch_size = 2
+
+            @override
+            def consume_batch(self, events: list[dict[str, Any]]) -> None:
+                for event in events:
+                    if event["type"] == "unexpected behaviour":
+                        raise Exception("Worker task not performing as expected!")
+
+        fake_client = FakeClient()
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        with time_machine.travel(start, tick=False):
+            for msg in ["good", "fine", "unexpected behaviour"]:
+                fake_client.enqueue("metrics_worker", {"type": msg})
+            fake_client.enqueue("metrics_worker", {"type": "retry", "failed_tries": 1})
+
+        with (
+            simulated_queue_client(fake_client),
+            time_machine.travel(start + timedelta(seconds=3), tick=False),
+        ):
+            worker = MetricsWorker()
+            worker.setup()
+            with self.assertLogs(level="ERROR"):
+                worker.start()
+
+        with open(os.path.join(settings.QUEUE_STATS_DIR, "metrics_worker.0.prom")) as f:
+            metrics = f.read().splitlines()
+        labels = 'queue="metrics_worker",worker="0"'
+        for line in [
+            f"zulip_queue_worker_events_consumed_total{{{labels}}} 4",
+            f"zulip_queue_worker_events_retried_total{{{labels}}} 1",
+            f"zulip_queue_worker_events_failed_total{{{labels}}} 2",
+            f"zulip_queue_worker_events_timed_out_total{{{labels}}} 0",
+            f'zulip_queue_worker_event_age_seconds_bucket{{{labels},le="2.5"}} 0',
+            f'zulip_queue_worker_event_age_seconds_bucket{{{labels},le="5"}} 4',
+            f"zulip_queue_worker_event_age_seconds_sum{{{labels}}} 12.0",
+            f'zulip_queue_worker_batch_size_bucket{{{labels},le="2"}} 2',
+            f"zulip_queue_worker_batch_size_count{{{labels}}} 2",
+            # Only the batch which succeeded records its duration.
+            f"zulip_queue_worker_consume_seconds_count{{{labels}}} 1",
+        ]:
+            self.assertIn(line, metrics)
+
+    def test_adaptive_batch_size(self) -> None:
+        batch_sizes = []
+
+        @base_worker.assign_queue("adaptive_worker", is_test_queue=True)
+        class AdaptiveWorker(base_worker.LoopQueueProcessingWorker):
+            MAX_CONSUME_SECONDS = 1
+            batch_size = 2
+            max_batch_size = 8
+
+            @override
+            def consume_batch(self, events: list[dict[str, Any]]) -> None:
+                batch_sizes.append(len(events))
+
+        fake_client = FakeClient()
+        for i in range(20):
+            fake_client.enqueue("adaptive_worker", {"id": i})
+
+        with simulated_queue_client(fake_client):
+            worker = AdaptiveWorker()
+            worker.setup()
+            worker.start()
+
+        # The batch size doubles while there is a backlog, up to
+        # max_batch_size, and shrinks once the backlog is cleared.
+        self.assertEqual(batch_sizes, [2, 4, 8, 6])
+        self.assertEqual(worker.batch_size, 6)
+        with open(os.path.join(settings.QUEUE_STATS_DIR, "adaptive_worker.stats")) as f:
+            stats = orjson.loads(f.read())
+        # The statistics show the batch size after the last batch.
+        self.assertEqual(stats["batch_size"], 6)
+        self.assertEqual(stats["recent_average_batch_size"], 5)
+
+        # A batch which wasn't filled, once the queue is empty, means
+        # events are only trickling in, so the next batch doesn't wait
+        # for more than that.
+        worker.batch_size = 8
+        worker.adjust_batch_size(1, 0.0)
+        self.assertEqual(worker.batch_size, 1)
+
+        # Batches which take a large part of MAX_CONSUME_SECONDS shrink
+        # the batch size, to what should take a quarter of it.
+        worker.batch_size = 8
+        worker.adjust_batch_size(8, 1.0)
+        self.assertEqual(worker.batch_size, 2)
+        worker.adjust_batch_size(2, 10.0)
+        self.assertEqual(worker.batch_size, 1)
+
     def test_timeouts(self) -> None:
         processed = []
 
@@ -834,36 +1071,218 @@ class WorkerTest(ZulipTestCase):
         assert_timeout(should_timeout=True, threaded=False, disable_timeout=False)
         assert_timeout(should_timeout=False, threaded=False, disable_timeout=True)
 
+    def test_async_worker(self) -> None:
+        processed: list[tuple[str, str]] = []
+        concurrency = {"active": 0, "max_active": 0}
+        hamlet = self.example_user("hamlet")
+        # Only visible to the test's database connection, until the
+        # test's transaction commits.
+        UserProfile.objects.filter(id=hamlet.id).update(full_name="Async Hamlet")
+
+        @base_worker.assign_queue("async_worker", is_test_queue=True)
+        class AsyncWorker(base_worker.AsyncQueueProcessingWorker):
+            MAX_CONSUME_SECONDS = 1
+            batch_size = 5
+
+            @override
+            async def consume_async(self, event: dict[str, Any]) -> None:
+                concurrency["active"] += 1
+                concurrency["max_active"] = max(concurrency["max_active"], concurrency["active"])
+                await asyncio.sleep(0)
+                concurrency["active"] -= 1
+
+                if event["type"] == "timeout":
+                    await asyncio.sleep(1.5)
+                elif event["type"] == "unexpected behaviour":
+                    raise Exception("Worker task not performing as expected!")
+                full_name = await self.run_sync(
+                    lambda: UserProfile.objects.get(id=hamlet.id).full_name
+                )
+                processed.append((event["type"], full_name))
+
+        fake_client = FakeClient()
+        for msg in ["good", "fine", "timeout", "unexpected behaviour", "back to normal"]:
+            fake_client.enqueue("async_worker", {"type": msg})
+
+        fn = os.path.join(settings.QUEUE_ERROR_DIR, "async_worker.errors")
+        with suppress(FileNotFoundError):
+            os.remove(fn)
+
+        with simulated_queue_client(fake_client):
+            worker = AsyncWorker()
+            worker.setup()
+            with self.assertLogs(level="ERROR") as m:
+                worker.start()
+            self.assertEqual(
+                [record.message for record in m.records],
+                [
+                    "Problem handling data on queue async_worker",
+                    "Timed out in async_worker after 1 seconds processing 1 events",
+                ],
+            )
+
+        # All five events were in progress at once, and the failures
+        # didn't prevent the other events from being processed.
+        self.assertEqual(concurrency["max_active"], 5)
+        self.assertEqual(
+            sorted(processed),
+            [
+                ("back to normal", "Async Hamlet"),
+                ("fine", "Async Hamlet"),
+                ("good", "Async Hamlet"),
+            ],
+        )
+        with open(fn) as f:
+            lines = f.readlines()
+        self.assertEqual(
+            [orjson.loads(line.split("\t")[1]) for line in lines],
+            [[{"type": "unexpected behaviour"}], [{"type": "timeout"}]],
+        )
+
+    @override_settings(URL_PREVIEW_THREADS=0)
+    def test_async_worker_consumes_on_arrival(self) -> None:
+        @base_worker.assign_queue("async_worker", is_test_queue=True)
+        class AsyncWorker(base_worker.AsyncQueueProcessingWorker):
+            @override
+            async def consume_async(self, event: dict[str, Any]) -> None:
+                pass  # nocoverage # consume_batch is mocked
+
+        self.assert_consumes_event_on_arrival(AsyncWorker())
+
+    def test_embed_links_fetches_on_arrival(self) -> None:
+        self.assert_consumes_event_on_arrival(FetchLinksEmbedData())
+
     def test_embed_links_timeout(self) -> None:
         @base_worker.assign_queue("timeout_worker", is_test_queue=True)
         class TimeoutWorker(FetchLinksEmbedData):
             MAX_CONSUME_SECONDS = 1
+            batch_size = 3
 
             @override
-            def consume(self, data: Mapping[str, Any]) -> None:
-                # Send SIGALRM to ourselves to simulate a timeout.
-                pid = os.getpid()
-                os.kill(pid, signal.SIGALRM)
+            def get_link_embed_data(self, url: str) -> UrlEmbedData | None:
+                if url == "second":
+                    # Send SIGALRM to ourselves to simulate a timeout.
+                    pid = os.getpid()
+                    os.kill(pid, signal.SIGALRM)
+                return None
 
         fake_client = FakeClient()
-        fake_client.enqueue(
-            "timeout_worker",
-            {
-                "type": "timeout",
-                "message_id": 15,
-                "urls": ["first", "second"],
-            },
-        )
+        for message_id, urls in [(15, ["first", "second"]), (16, ["first"]), (17, ["third"])]:
+            fake_client.enqueue(
+                "timeout_worker", {"type": "timeout", "message_id": message_id, "urls": urls}
+            )
 
         with simulated_queue_client(fake_client):
             worker = TimeoutWorker()
             worker.setup()
-            with self.assertLogs(level="WARNING") as m:
+            with (
+                patch.object(worker, "update_embedded_data") as mock_update,
+                self.assertLogs(level="WARNING") as m,
+            ):
                 worker.start()
-                self.assertEqual(
-                    m.records[0].message,
-                    "Timed out in timeout_worker after 1 seconds while fetching URLs for message 15: ['first', 'second']",
-                )
+
+        # The message whose URLs were fetched before the timeout is
+        # still updated.
+        mock_update.assert_called_once_with(
+            {"type": "timeout", "message_id": 16, "urls": ["first"]}, {"first": None}
+        )
+        self.assertEqual(
+            [record.message for record in m.records],
+            [
+                "Timed out in timeout_worker after 1 seconds while fetching URLs for message 15: ['first', 'second']",
+                "Timed out in timeout_worker after 1 seconds while fetching URLs for message 17: ['third']",
+            ],
+        )
+
+    @override_settings(OUTGOING_WEBHOOK_THREADS=2)
+    def test_outgoing_webhook_worker_threads(self) -> None:
+        fake_client = FakeClient()
+        for bot_id, command in [
+            (1, "slow"),
+            (1, "a"),
+            (2, "b"),
+            (2, "fail"),
+            (2, "d"),
+            (1, "c"),
+        ]:
+            fake_client.enqueue(
+                "outgoing_webhooks", {"user_profile_id": bot_id, "command": command}
+            )
+
+        processed: dict[int, list[str]] = defaultdict(list)
+        thread_names: set[str] = set()
+        second_bot_done = threading.Event()
+        waited_for_second_bot: list[bool] = []
+
+        def send_requests(event: dict[str, Any]) -> None:
+            if event["command"] == "fail":
+                raise Exception("Bot server is confused")
+            if event["command"] == "slow":
+                # The first bot's server doesn't respond until the
+                # second bot's events, which arrive in later batches,
+                # have all been sent.
+                waited_for_second_bot.append(second_bot_done.wait(timeout=10))
+            processed[event["user_profile_id"]].append(event["command"])
+            thread_names.add(threading.current_thread().name)
+            if event["command"] == "d":
+                second_bot_done.set()
+
+        fn = os.path.join(settings.QUEUE_ERROR_DIR, "outgoing_webhooks.errors")
+        with suppress(FileNotFoundError):
+            os.remove(fn)
+
+        with simulated_queue_client(fake_client):
+            worker = OutgoingWebhookWorker()
+            worker.batch_size = 2
+            worker.setup()
+            # Threads can't see the test's uncommitted data, so
+            # consume_batch normally runs the events in this thread.
+            with (
+                patch("zerver.worker.outgoing_webhooks.connection") as mock_connection,
+                patch.object(worker, "send_requests", side_effect=send_requests),
+                self.assertLogs(level="ERROR") as m,
+            ):
+                mock_connection.in_atomic_block = False
+                worker.start()
+
+        self.assertEqual(m.records[0].message, "Problem handling data on queue outgoing_webhooks")
+        # Later batches were consumed without waiting for the slow
+        # bot, whose events are still processed in order.
+        self.assertEqual(waited_for_second_bot, [True])
+        self.assertEqual(processed, {1: ["slow", "a", "c"], 2: ["b", "d"]})
+        self.assertTrue(all(name.startswith("outgoing-webhook") for name in thread_names))
+        # Each thread closes its database connection only once the
+        # worker stops.
+        self.assertEqual(mock_connection.close.call_count, 2)
+        self.assertEqual(worker.threads, [])
+        with open(fn) as f:
+            line = f.readline().strip()
+        events = orjson.loads(line.split("\t")[1])
+        self.assertEqual(events, [{"user_profile_id": 2, "command": "fail"}])
+
+    @override_settings(OUTGOING_WEBHOOK_THREADS=2)
+    def test_outgoing_webhook_worker_threads_consume_on_arrival(self) -> None:
+        worker = OutgoingWebhookWorker()
+        self.assertEqual(worker.max_batch_size, OutgoingWebhookWorker.MAX_PENDING_EVENTS_PER_THREAD)
+        self.assert_consumes_event_on_arrival(worker)
+
+    def test_priority_lane(self) -> None:
+        self.assertIn("deferred_work_priority", get_active_worker_queues())
+        worker = get_worker("deferred_work_priority")
+        self.assertIsInstance(worker, DeferredWorker)
+        self.assertEqual(worker.queue_name, "deferred_work_priority")
+
+        event = {"type": "clear_push_device_tokens", "user_profile_id": 1}
+        with patch.object(DeferredWorker, "consume", autospec=True) as mock_consume:
+            queue_json_publish("deferred_work", event)
+            queue_json_publish("deferred_work", event, priority=True)
+        self.assertEqual(
+            [call_args.args[0].queue_name for call_args in mock_consume.call_args_list],
+            ["deferred_work", "deferred_work_priority"],
+        )
+
+        with self.assertRaises(AssertionError):
+            queue_json_publish("user_activity", {}, priority=True)
 
     def test_worker_noname(self) -> None:
         class TestWorker(base_worker.QueueProcessingWorker):
@@ -15,6 +15,7 @@ from urllib3.util import Retry
 
 from zerver.lib.partial import partial
 from zerver.lib.queue import queue_json_publish
+from zerver.lib.register_snapshot import invalidate_register_snapshot_for_event
 from zerver.models import Client, Realm, UserProfile
 from zerver.tornado.sharding import (
     get_realm_tornado_ports,
@@ -181,6 +182,8 @@ def send_event(
 ) -> None:
     """`users` is a list of user IDs, or in some special cases like message
     send/update or embeds, dictionaries containing extra data."""
+    invalidate_register_snapshot_for_event(realm.id, event["type"])
+
     realm_ports = get_realm_tornado_ports(realm)
     if len(realm_ports) == 1:
         port_user_map = {realm_ports[0]: list(users)}
@@ -201,4 +204,7 @@ def send_event(
 def send_event_on_commit(
     realm: Realm, event: Mapping[str, Any], users: Iterable[int] | Iterable[Mapping[str, Any]]
 ) -> None:
+    # Invalidate now, rather than only when the event is sent after
+    # commit, so that code later in this transaction sees the change.
+    invalidate_register_snapshot_for_event(realm.id, event["type"])
     transaction.on_commit(lambda: send_event(realm, event, users))
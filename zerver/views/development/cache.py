@@ -4,7 +4,7 @@ from django.http import HttpRequest, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 
 from zerver.decorator import require_post
-from zerver.lib.cache import get_cache_backend
+from zerver.lib.cache import flush_local_cache, get_cache_backend
 from zerver.lib.per_request_cache import flush_per_request_caches
 from zerver.lib.response import json_success
 from zerver.models.clients import clear_client_cache
@@ -18,6 +18,7 @@ ZULIP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../../
 def remove_caches(request: HttpRequest) -> HttpResponse:  # nocoverage
     cache = get_cache_backend(None)
     cache.clear()
+    flush_local_cache()
     clear_client_cache()
     flush_per_request_caches()
     return json_success(request)
@@ -49,6 +49,7 @@ def events_register_backend(
     event_types: Json[list[str]] | None = None,
     fetch_event_types: Json[list[str]] | None = None,
     narrow: Json[NarrowT] | None = None,
+    section_versions: Json[dict[str, str]] | None = None,
     queue_lifespan_secs: Annotated[
         Json[int], ApiParamConfig(documentation_status=DocumentationStatus.DOCUMENTATION_PENDING)
     ] = 0,
@@ -130,5 +131,6 @@ def events_register_backend(
         fetch_event_types=fetch_event_types,
         spectator_requested_language=spectator_requested_language,
         pronouns_field_type_supported=pronouns_field_type_supported,
+        section_versions=section_versions,
     )
     return json_success(request, data=ret)
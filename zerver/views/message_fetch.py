@@ -13,6 +13,7 @@ from sqlalchemy.types import Integer, Text
 
 from zerver.context_processors import get_valid_realm_from_request
 from zerver.lib.exceptions import JsonableError, MissingAuthenticationError
+from zerver.lib.first_unread_cache import get_first_unread_cache_hits
 from zerver.lib.message import get_first_visible_message_id, messages_for_ids
 from zerver.lib.narrow import (
     NarrowParameter,
@@ -203,6 +204,7 @@ def get_messages_backend(
             cursor = connection.cursor()
             cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
 
+        first_unread_cache_hits_start = get_first_unread_cache_hits()
         query_info = fetch_messages(
             narrow=narrow,
             user_profile=user_profile,
@@ -212,8 +214,16 @@ def get_messages_backend(
             include_anchor=include_anchor,
             num_before=num_before,
             num_after=num_after,
+            allow_partial_search_results=True,
         )
 
+        if narrow is not None and get_first_unread_cache_hits() != first_unread_cache_hits_start:
+            # Note in the access logs that the first unread anchor was
+            # served by zerver.lib.first_unread_cache.
+            log_data = RequestNotes.get_notes(request).log_data
+            assert log_data is not None
+            log_data["extra"] += "[first_unread:cached]"
+
         anchor = query_info.anchor
         include_history = query_info.include_history
         is_search = query_info.is_search
@@ -284,6 +294,8 @@ def get_messages_backend(
         history_limited=query_info.history_limited,
         anchor=anchor,
     )
+    if query_info.search_continuation is not None:
+        ret["search_continuation"] = query_info.search_continuation
     return json_success(request, data=ret)
 
 
@@ -1,13 +1,17 @@
 # Documented in https://zulip.readthedocs.io/en/latest/subsystems/queuing.html
+import asyncio
+import concurrent.futures
 import logging
 import os
+import queue
 import signal
+import threading
 import time
 from abc import ABC, abstractmethod
 from collections import deque
 from collections.abc import Callable, MutableSequence
 from types import FrameType
-from typing import Any, TypeVar
+from typing import Any, TypeVar, cast
 
 import orjson
 import sentry_sdk
@@ -20,7 +24,8 @@ from zerver.lib.db_connections import reset_queries
 from zerver.lib.partial import partial
 from zerver.lib.per_request_cache import flush_per_request_caches
 from zerver.lib.pysa import mark_sanitized
-from zerver.lib.queue import SimpleQueueClient
+from zerver.lib.queue import QUEUES_WITH_PRIORITY_LANE, SimpleQueueClient, get_priority_lane
+from zerver.lib.queue_metrics import QueueWorkerMetrics
 
 logger = logging.getLogger(__name__)
 
@@ -49,6 +54,7 @@ class WorkerDeclarationError(Exception):
 
 
 ConcreteQueueWorker = TypeVar("ConcreteQueueWorker", bound="QueueProcessingWorker")
+T = TypeVar("T")
 
 
 def assign_queue(
@@ -60,6 +66,18 @@ def assign_queue(
         clazz.queue_name = queue_name
         if enabled:
             register_worker(queue_name, clazz, is_test_queue)
+            if queue_name in QUEUES_WITH_PRIORITY_LANE:
+                # The priority lane's worker differs only in its queue.
+                priority_lane = get_priority_lane(queue_name)
+                priority_clazz = cast(
+                    type[ConcreteQueueWorker],
+                    type(
+                        f"{clazz.__name__}PriorityLane",
+                        (clazz,),
+                        {"queue_name": priority_lane, "__module__": clazz.__module__},
+                    ),
+                )
+                register_worker(priority_lane, priority_clazz, is_test_queue)
         return clazz
 
     return decorate
@@ -89,6 +107,9 @@ def check_and_send_restart_signal() -> None:
 class QueueProcessingWorker(ABC):
     queue_name: str
     MAX_CONSUME_SECONDS: int | None = 30
+    # Whether MAX_CONSUME_SECONDS is enforced with SIGALRM, around
+    # each call to the consume function.
+    ALARM_TIMEOUT = True
     CONSUME_ITERATIONS_BEFORE_UPDATE_STATS_NUM = 50
     MAX_SECONDS_BEFORE_UPDATE_STATS = 30
 
@@ -120,6 +141,7 @@ class QueueProcessingWorker(ABC):
         self.consume_iteration_counter = 0
         self.idle = True
         self.last_statistics_update_time = 0.0
+        self.metrics = QueueWorkerMetrics(self.queue_name, self.worker_num or 0)
 
         self.update_statistics()
 
@@ -136,6 +158,7 @@ class QueueProcessingWorker(ABC):
             recent_average_consume_time=recent_average_consume_time,
             queue_last_emptied_timestamp=self.queue_last_emptied_timestamp,
             consumed_since_last_emptied=self.consumed_since_last_emptied,
+            **self.get_extra_statistics(),
         )
 
         os.makedirs(settings.QUEUE_STATS_DIR, exist_ok=True)
@@ -149,8 +172,28 @@ class QueueProcessingWorker(ABC):
                     orjson.dumps(stats_dict, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_INDENT_2)
                 )
             os.rename(tmp_fn, fn)
+        self.write_metrics()
         self.last_statistics_update_time = time.time()
 
+    def write_metrics(self) -> None:
+        # Each worker process writes its own file, in the format
+        # read by node_exporter's textfile collector.
+        fn = os.path.join(
+            settings.QUEUE_STATS_DIR, f"{self.queue_name}.{self.metrics.worker_num}.prom"
+        )
+        tmp_fn = fn + ".tmp"
+        with open(tmp_fn, "w") as f:
+            f.write(
+                self.metrics.render(
+                    self.get_remaining_local_queue_size(), self.queue_last_emptied_timestamp
+                )
+            )
+        os.rename(tmp_fn, fn)
+
+    def get_extra_statistics(self) -> dict[str, Any]:
+        """Queue-specific values to include in the statistics file."""
+        return {}
+
     def get_remaining_local_queue_size(self) -> int:
         if self.q is not None:
             return self.q.local_queue_size()
@@ -164,10 +207,23 @@ class QueueProcessingWorker(ABC):
     def consume(self, data: dict[str, Any]) -> None:
         pass
 
+    def record_batch_metrics(self, events: list[dict[str, Any]]) -> None:
+        self.metrics.batch_size.observe(len(events))
+        self.metrics.events_retried += sum(1 for event in events if event.get("failed_tries"))
+        if self.q is None:
+            return
+        now = time.time()
+        for publish_time in self.q.batch_publish_times:
+            if publish_time is not None:
+                # Clocks on the server which published the event may
+                # be slightly ahead of ours.
+                self.metrics.event_age_seconds.observe(max(0.0, now - publish_time))
+
     def do_consume(
         self, consume_func: Callable[[list[dict[str, Any]]], None], events: list[dict[str, Any]]
     ) -> None:
         consume_time_seconds: float | None = None
+        self.record_batch_metrics(events)
         with sentry_sdk.start_transaction(
             op="task",
             name=f"consume {self.queue_name}",
@@ -189,7 +245,12 @@ class QueueProcessingWorker(ABC):
                     self.update_statistics()
 
                 time_start = time.time()
-                if self.MAX_CONSUME_SECONDS and not self.threaded and not self.disable_timeout:
+                if (
+                    self.MAX_CONSUME_SECONDS
+                    and self.ALARM_TIMEOUT
+                    and not self.threaded
+                    and not self.disable_timeout
+                ):
                     try:
                         signal.signal(
                             signal.SIGALRM,
@@ -213,8 +274,9 @@ class QueueProcessingWorker(ABC):
                 reset_queries()
 
                 with sentry_sdk.start_span(description="statistics"):
+                    self.metrics.events_consumed += len(events)
                     if consume_time_seconds is not None:
-                        self.recent_consume_times.append((len(events), consume_time_seconds))
+                        self.record_consume_time(len(events), consume_time_seconds)
 
                     remaining_local_queue_size = self.get_remaining_local_queue_size()
                     if remaining_local_queue_size == 0:
@@ -237,6 +299,10 @@ class QueueProcessingWorker(ABC):
                             self.consume_iteration_counter = 0
                             self.update_statistics()
 
+    def record_consume_time(self, events_number: int, consume_seconds: float) -> None:
+        self.recent_consume_times.append((events_number, consume_seconds))
+        self.metrics.consume_seconds.observe(consume_seconds)
+
     def consume_single_event(self, event: dict[str, Any]) -> None:
         consume_func = lambda events: self.consume(events[0])
         self.do_consume(consume_func, [event])
@@ -252,6 +318,9 @@ class QueueProcessingWorker(ABC):
             # is needed and the worker can proceed.
             return
 
+        self.metrics.events_failed += len(events)
+        if isinstance(exception, WorkerTimeoutError):
+            self.metrics.events_timed_out += len(events)
         with sentry_sdk.configure_scope() as scope:
             scope.set_context(
                 "events",
@@ -300,9 +369,23 @@ class LoopQueueProcessingWorker(QueueProcessingWorker):
     sleep_delay = 1
     batch_size = 100
 
+    # With max_batch_size set, batch_size is adjusted after each
+    # batch, within min_batch_size and max_batch_size: it grows while
+    # events are backed up behind full batches, shrinks back once the
+    # worker has caught up -- straight to the size of a batch which
+    # wasn't filled, so that a trickle of events isn't held for
+    # sleep_delay waiting to fill a batch -- and is capped at the size
+    # expected to take BATCH_CONSUME_SECONDS_FRACTION of
+    # MAX_CONSUME_SECONDS.
+    min_batch_size = 1
+    max_batch_size: int | None = None
+    BATCH_CONSUME_SECONDS_FRACTION = 0.25
+
     @override
     def setup(self) -> None:
-        self.q = SimpleQueueClient(prefetch=max(self.PREFETCH, self.batch_size))
+        self.q = SimpleQueueClient(
+            prefetch=max(self.PREFETCH, self.max_batch_size or self.batch_size)
+        )
 
     @override
     def start(self) -> None:  # nocoverage
@@ -311,10 +394,45 @@ class LoopQueueProcessingWorker(QueueProcessingWorker):
         self.q.start_json_consumer(
             self.queue_name,
             lambda events: self.do_consume(self.consume_batch, events),
-            batch_size=self.batch_size,
+            batch_size=self.batch_size if self.max_batch_size is None else lambda: self.batch_size,
             timeout=self.sleep_delay,
         )
 
+    @override
+    def get_extra_statistics(self) -> dict[str, Any]:
+        if self.max_batch_size is None:
+            return {}
+        total_events = sum(events_number for events_number, _ in self.recent_consume_times)
+        return dict(
+            batch_size=self.batch_size,
+            recent_average_batch_size=(
+                total_events / len(self.recent_consume_times) if self.recent_consume_times else None
+            ),
+        )
+
+    @override
+    def record_consume_time(self, events_number: int, consume_seconds: float) -> None:
+        super().record_consume_time(events_number, consume_seconds)
+        # This runs before do_consume writes the statistics, so that
+        # they show the batch size the next batch will use.
+        if self.max_batch_size is not None:
+            self.adjust_batch_size(events_number, consume_seconds)
+
+    def adjust_batch_size(self, events_number: int, consume_seconds: float) -> None:
+        assert self.max_batch_size is not None
+        remaining_local_queue_size = self.get_remaining_local_queue_size()
+        batch_size = self.batch_size
+        if events_number >= self.batch_size and remaining_local_queue_size > 0:
+            batch_size *= 2
+        elif remaining_local_queue_size == 0:
+            batch_size = events_number if events_number < batch_size else batch_size // 2
+
+        if self.MAX_CONSUME_SECONDS is not None and consume_seconds > 0:
+            target_seconds = self.MAX_CONSUME_SECONDS * self.BATCH_CONSUME_SECONDS_FRACTION
+            batch_size = min(batch_size, int(events_number * target_seconds / consume_seconds))
+
+        self.batch_size = max(self.min_batch_size, min(batch_size, self.max_batch_size))
+
     @abstractmethod
     def consume_batch(self, events: list[dict[str, Any]]) -> None:
         pass
@@ -323,3 +441,98 @@ class LoopQueueProcessingWorker(QueueProcessingWorker):
     def consume(self, event: dict[str, Any]) -> None:
         """In LoopQueueProcessingWorker, consume is used just for automated tests"""
         self.consume_batch([event])
+
+
+class AsyncQueueProcessingWorker(LoopQueueProcessingWorker):
+    """A worker for I/O-bound queues, whose consume_async coroutine
+    processes up to batch_size events concurrently, on an event loop
+    which runs in a separate thread for the life of the worker, so
+    that async clients may keep their connections open between
+    batches.
+
+    MAX_CONSUME_SECONDS applies to each event separately; an event
+    which times out or raises an exception is recorded in the error
+    file, without affecting the rest of its batch.
+
+    Django is not async-safe, so consume_async must call any code
+    which uses the database via run_sync, which runs it on the
+    worker's main thread, one call at a time.  This keeps all
+    database access on the main thread's connection, which is also
+    what allows these workers to be tested inside a transaction.
+    """
+
+    ALARM_TIMEOUT = False
+    # Batches start at a single event, so that an event on a quiet
+    # queue is processed as soon as it arrives, and grow while the
+    # queue is backed up.
+    batch_size = 1
+    max_batch_size = 10
+
+    def __init__(
+        self,
+        threaded: bool = False,
+        disable_timeout: bool = False,
+        worker_num: int | None = None,
+    ) -> None:
+        super().__init__(threaded, disable_timeout, worker_num)
+        self.loop: asyncio.AbstractEventLoop | None = None
+        # Functions which coroutines have passed to run_sync, for the
+        # main thread to run, and None when the batch is done.
+        self.sync_calls: queue.SimpleQueue[
+            tuple[Callable[[], Any], concurrent.futures.Future[Any]] | None
+        ] = queue.SimpleQueue()
+
+    @abstractmethod
+    async def consume_async(self, event: dict[str, Any]) -> None:
+        pass
+
+    async def run_sync(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        future: concurrent.futures.Future[T] = concurrent.futures.Future()
+        self.sync_calls.put((lambda: func(*args, **kwargs), future))
+        return await asyncio.wrap_future(future)
+
+    def get_loop(self) -> asyncio.AbstractEventLoop:
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=self.loop.run_forever, name=f"{self.queue_name}-loop", daemon=True
+            ).start()
+        return self.loop
+
+    @override
+    def consume_batch(self, events: list[dict[str, Any]]) -> None:
+        batch = asyncio.run_coroutine_threadsafe(self.consume_events(events), self.get_loop())
+        batch.add_done_callback(lambda batch: self.sync_calls.put(None))
+        while (sync_call := self.sync_calls.get()) is not None:
+            func, future = sync_call
+            if not future.set_running_or_notify_cancel():
+                continue  # nocoverage
+            try:
+                future.set_result(func())
+            except BaseException as e:
+                future.set_exception(e)
+        batch.result()
+
+    async def consume_events(self, events: list[dict[str, Any]]) -> None:
+        semaphore = asyncio.Semaphore(self.batch_size)
+
+        async def consume_event(event: dict[str, Any]) -> None:
+            async with semaphore:
+                try:
+                    if self.MAX_CONSUME_SECONDS and not self.disable_timeout:
+                        await asyncio.wait_for(
+                            self.consume_async(event), timeout=self.MAX_CONSUME_SECONDS
+                        )
+                    else:
+                        await self.consume_async(event)
+                except asyncio.TimeoutError:
+                    assert self.MAX_CONSUME_SECONDS is not None
+                    await self.run_sync(
+                        self._handle_consume_exception,
+                        [event],
+                        WorkerTimeoutError(self.queue_name, self.MAX_CONSUME_SECONDS, 1),
+                    )
+                except Exception as e:
+                    await self.run_sync(self._handle_consume_exception, [event], e)
+
+        await asyncio.gather(*(consume_event(event) for event in events))
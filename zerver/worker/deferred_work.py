@@ -17,6 +17,7 @@ from zerver.actions.message_flags import do_mark_stream_messages_as_read
 from zerver.actions.message_send import internal_send_private_message
 from zerver.actions.realm_export import notify_realm_export
 from zerver.lib.export import export_realm_wrapper
+from zerver.lib.first_unread_cache import invalidate_first_unread_for_users
 from zerver.lib.push_notifications import clear_push_device_tokens
 from zerver.lib.queue import queue_json_publish, retry_event
 from zerver.lib.remote_server import (
@@ -87,9 +88,14 @@ class DeferredWorker(QueueProcessingWorker):
                         .order_by("id")[:batch_size]
                         .values_list("id", flat=True)
                     )
-                    UserMessage.select_for_update_query().filter(message__in=messages).extra(  # noqa: S610
-                        where=[UserMessage.where_unread()]
-                    ).update(flags=F("flags").bitor(UserMessage.flags.read))
+                    unread_query = (
+                        UserMessage.select_for_update_query()
+                        .filter(message__in=messages)
+                        .extra(where=[UserMessage.where_unread()])  # noqa: S610
+                    )
+                    user_ids = set(unread_query.values_list("user_profile_id", flat=True))
+                    unread_query.update(flags=F("flags").bitor(UserMessage.flags.read))
+                    invalidate_first_unread_for_users(user_ids)
                 total_messages += len(messages)
                 if len(messages) < batch_size:
                     break
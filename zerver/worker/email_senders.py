@@ -2,6 +2,7 @@
 import copy
 import logging
 import socket
+import time
 from collections.abc import Callable
 from functools import wraps
 from typing import Any
@@ -47,6 +48,13 @@ def retry_send_email_failures(
 
 @assign_queue("email_senders")
 class EmailSendingWorker(LoopQueueProcessingWorker):
+    # Skip checking that the SMTP connection is still open with a NOOP
+    # if we sent an email on it within this many seconds.
+    CONNECTION_CHECK_SECONDS = 30
+
+    batch_size = 10
+    max_batch_size = 100
+
     def __init__(
         self,
         threaded: bool = False,
@@ -55,6 +63,9 @@ class EmailSendingWorker(LoopQueueProcessingWorker):
     ) -> None:
         super().__init__(threaded, disable_timeout, worker_num)
         self.connection: BaseEmailBackend | None = None
+        # When we last sent an email successfully on self.connection,
+        # per time.monotonic; None if the last attempt failed.
+        self.connection_last_used: float | None = None
 
     @retry_send_email_failures
     def send_email(self, event: dict[str, Any]) -> None:
@@ -69,8 +80,18 @@ class EmailSendingWorker(LoopQueueProcessingWorker):
             # "realm" does not serialize over the queue, so we send the realm_id
             copied_event["realm"] = Realm.objects.get(id=copied_event["realm_id"])
             del copied_event["realm_id"]
-        self.connection = initialize_connection(self.connection)
+        if (
+            self.connection is None
+            or self.connection_last_used is None
+            or time.monotonic() - self.connection_last_used > self.CONNECTION_CHECK_SECONDS
+        ):
+            # A connection which was just used is very unlikely to
+            # have been closed by the server, so we only pay for the
+            # round-trip of checking it after it has been idle.
+            self.connection = initialize_connection(self.connection)
+        self.connection_last_used = None
         send_email(**copied_event, connection=self.connection)
+        self.connection_last_used = time.monotonic()
 
     @override
     def consume_batch(self, events: list[dict[str, Any]]) -> None:
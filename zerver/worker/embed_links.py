@@ -1,10 +1,16 @@
 # Documented in https://zulip.readthedocs.io/en/latest/subsystems/queuing.html
 import logging
+import threading
 import time
-from collections.abc import Mapping
+from collections import deque
+from collections.abc import Iterator, Mapping
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from types import FrameType
 from typing import Any
+from urllib.parse import urlsplit
 
+from django.conf import settings
 from django.db import transaction
 from typing_extensions import override
 
@@ -13,27 +19,158 @@ from zerver.actions.message_send import render_incoming_message
 from zerver.lib.url_preview import preview as url_preview
 from zerver.lib.url_preview.types import UrlEmbedData
 from zerver.models import Message, Realm
-from zerver.worker.base import InterruptConsumeError, QueueProcessingWorker, assign_queue
+from zerver.worker.base import InterruptConsumeError, LoopQueueProcessingWorker, assign_queue
 
 logger = logging.getLogger(__name__)
 
 
 @assign_queue("embed_links")
-class FetchLinksEmbedData(QueueProcessingWorker):
+class FetchLinksEmbedData(LoopQueueProcessingWorker):
+    """Fetches the previews for a batch of messages at once, on up to
+    URL_PREVIEW_THREADS threads, so that one slow site doesn't hold
+    up the previews for every message queued behind it.  A URL which
+    appears in several messages in the batch is only fetched once.
+
+    The database is only accessed from the main thread, after all of
+    the URLs have been fetched, or when the batch times out, for the
+    messages whose URLs were all fetched in time.
+    """
+
     # This is a slow queue with network requests, so a disk write is negligible.
     # Update stats file after every consume call.
     CONSUME_ITERATIONS_BEFORE_UPDATE_STATS_NUM = 1
+    # Batches start at a single message, so that a message sent to a
+    # quiet queue gets its previews without waiting for sleep_delay,
+    # and grow while the queue is backed up.
+    batch_size = 1
+    max_batch_size = 20
+
+    def __init__(
+        self,
+        threaded: bool = False,
+        disable_timeout: bool = False,
+        worker_num: int | None = None,
+    ) -> None:
+        super().__init__(threaded, disable_timeout, worker_num)
+        self.executor: ThreadPoolExecutor | None = None
+        self.lock = threading.Lock()
+        self.host_semaphores: dict[str, threading.BoundedSemaphore] = {}
+        # The previews fetched so far for the current batch, and its
+        # messages which haven't been updated yet.
+        self.fetching = False
+        self.fetched: dict[str, UrlEmbedData | None | Exception] = {}
+        self.unprocessed_events: list[dict[str, Any]] = []
 
     @override
-    def consume(self, event: Mapping[str, Any]) -> None:
-        url_embed_data: dict[str, UrlEmbedData | None] = {}
-        for url in event["urls"]:
+    def initialize_statistics(self) -> None:
+        # How long recent events waited in the queue before we
+        # started fetching their URLs.
+        self.recent_queue_latencies: deque[float] = deque(maxlen=50)
+        super().initialize_statistics()
+
+    @override
+    def get_extra_statistics(self) -> dict[str, Any]:
+        if not self.recent_queue_latencies:
+            return dict(recent_average_queue_latency=None, recent_max_queue_latency=None)
+        return dict(
+            recent_average_queue_latency=sum(self.recent_queue_latencies)
+            / len(self.recent_queue_latencies),
+            recent_max_queue_latency=max(self.recent_queue_latencies),
+        )
+
+    @contextmanager
+    def limit_requests_to_host(self, url: str) -> Iterator[None]:
+        host = urlsplit(url).netloc.lower()
+        with self.lock:
+            if host not in self.host_semaphores:
+                self.host_semaphores[host] = threading.BoundedSemaphore(
+                    settings.URL_PREVIEW_MAX_REQUESTS_PER_HOST
+                )
+            semaphore = self.host_semaphores[host]
+        with semaphore:
+            yield
+
+    def get_link_embed_data(self, url: str) -> UrlEmbedData | None:
+        with self.limit_requests_to_host(url):
             start_time = time.time()
-            url_embed_data[url] = url_preview.get_link_embed_data(url)
+            url_embed_data = url_preview.get_link_embed_data(url)
             logging.info(
                 "Time spent on get_link_embed_data for %s: %s", url, time.time() - start_time
             )
+        return url_embed_data
+
+    def fetch_urls(
+        self, urls: list[str], fetched: dict[str, UrlEmbedData | None | Exception]
+    ) -> None:
+        # Each result is stored as soon as it is fetched, so that
+        # timer_expired can use the ones which finished in time.
+        def fetch(url: str) -> None:
+            try:
+                fetched[url] = self.get_link_embed_data(url)
+            except InterruptConsumeError:
+                # Raised by timer_expired, when fetching on this thread.
+                raise
+            except Exception as e:
+                fetched[url] = e
+
+        if settings.URL_PREVIEW_THREADS == 0 or len(urls) == 1:
+            for url in urls:
+                fetch(url)
+            return
 
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(
+                max_workers=settings.URL_PREVIEW_THREADS, thread_name_prefix="embed-links"
+            )
+        list(self.executor.map(fetch, urls))
+
+    @override
+    def consume_batch(self, events: list[dict[str, Any]]) -> None:
+        now = time.time()
+        queue_latencies = [now - event["queued_at"] for event in events if "queued_at" in event]
+        self.recent_queue_latencies.extend(queue_latencies)
+
+        # dict.fromkeys drops URLs repeated across messages, keeping
+        # the order they were queued in.
+        urls = list(dict.fromkeys(url for event in events for url in event["urls"]))
+        self.fetched = {}
+        self.unprocessed_events = list(events)
+        self.fetching = True
+        try:
+            self.fetch_urls(urls, self.fetched)
+        finally:
+            self.fetching = False
+        logging.info(
+            "Fetched %d URLs for %d messages in %.3fs; longest wait in queue %s",
+            len(urls),
+            len(events),
+            time.time() - now,
+            f"{max(queue_latencies):.3f}s" if queue_latencies else "unknown",
+        )
+
+        self.update_fetched_events()
+
+    def update_fetched_events(self) -> None:
+        for event in list(self.unprocessed_events):
+            if not all(url in self.fetched for url in event["urls"]):
+                continue
+            try:
+                url_embed_data: dict[str, UrlEmbedData | None] = {}
+                for url in event["urls"]:
+                    result = self.fetched[url]
+                    if isinstance(result, Exception):
+                        raise result
+                    url_embed_data[url] = result
+                self.update_embedded_data(event, url_embed_data)
+            except Exception as e:
+                # As with one event at a time, a failure processing one
+                # message shouldn't prevent updating the others.
+                self._handle_consume_exception([event], e)
+            self.unprocessed_events.remove(event)
+
+    def update_embedded_data(
+        self, event: Mapping[str, Any], url_embed_data: dict[str, UrlEmbedData | None]
+    ) -> None:
         with transaction.atomic():
             try:
                 message = Message.objects.select_for_update().get(id=event["message_id"])
@@ -62,14 +199,20 @@ class FetchLinksEmbedData(QueueProcessingWorker):
     def timer_expired(
         self, limit: int, events: list[dict[str, Any]], signal: int, frame: FrameType | None
     ) -> None:
-        assert len(events) == 1
-        event = events[0]
-
-        logging.warning(
-            "Timed out in %s after %s seconds while fetching URLs for message %s: %s",
-            self.queue_name,
-            limit,
-            event["message_id"],
-            event["urls"],
-        )
+        # Rather than dropping the previews for the whole batch, update
+        # the messages whose URLs were all fetched before the timeout.
+        # If we were already updating messages, we may be inside one
+        # of their transactions, which this exception rolls back.
+        if self.fetching:
+            self.update_fetched_events()
+        for event in events:
+            if all(url in self.fetched for url in event["urls"]):
+                continue
+            logging.warning(
+                "Timed out in %s after %s seconds while fetching URLs for message %s: %s",
+                self.queue_name,
+                limit,
+                event["message_id"],
+                event["urls"],
+            )
         raise InterruptConsumeError
@@ -12,7 +12,11 @@ from django.utils.timezone import now as timezone_now
 from typing_extensions import override
 
 from zerver.lib.db_connections import reset_queries
-from zerver.lib.email_notifications import MissedMessageData, handle_missedmessage_emails
+from zerver.lib.email_notifications import (
+    MissedMessageData,
+    MissedMessageEmailBatch,
+    handle_missedmessage_emails,
+)
 from zerver.lib.per_request_cache import flush_per_request_caches
 from zerver.models import ScheduledMessageNotificationEmail
 from zerver.models.users import get_user_profile_by_id
@@ -228,6 +232,9 @@ class MissedMessageWorker(QueueProcessingWorker):
                     trigger=event.trigger, mentioned_user_group_id=event.mentioned_user_group_id
                 )
 
+            # Load the messages for every user's emails together, and
+            # publish the emails to the email_senders queue together.
+            batch = MissedMessageEmailBatch(events_by_recipient)
             for user_profile_id in events_by_recipient:
                 events = events_by_recipient[user_profile_id]
 
@@ -247,7 +254,7 @@ class MissedMessageWorker(QueueProcessingWorker):
                         # duplicate messages being sent for other
                         # users in the same events_to_process batch,
                         # and no guarantee of forward progress.
-                        handle_missedmessage_emails(user_profile_id, events)
+                        handle_missedmessage_emails(user_profile_id, events, batch)
                     except Exception:
                         logging.exception(
                             "Failed to process %d missedmessage_emails for user %s",
@@ -256,6 +263,7 @@ class MissedMessageWorker(QueueProcessingWorker):
                             stack_info=True,
                         )
 
+            batch.publish_emails()
             events_to_process.delete()
 
     @override
@@ -6,19 +6,29 @@ from django.conf import settings
 from typing_extensions import override
 
 from zerver.lib.push_notifications import (
-    handle_push_notification,
+    handle_push_notifications,
     handle_remove_push_notification,
     initialize_push_notifications,
 )
 from zerver.lib.queue import retry_event
 from zerver.lib.remote_server import PushNotificationBouncerRetryLaterError
-from zerver.worker.base import QueueProcessingWorker, assign_queue
+from zerver.worker.base import LoopQueueProcessingWorker, assign_queue
 
 logger = logging.getLogger(__name__)
 
 
 @assign_queue("missedmessage_mobile_notifications")
-class PushNotificationsWorker(QueueProcessingWorker):
+class PushNotificationsWorker(LoopQueueProcessingWorker):
+    """Sends the push notifications for a batch of events together; see
+    handle_push_notifications.  Batches start at one event, so that a
+    notification on a quiet queue is sent as soon as it arrives,
+    rather than waiting sleep_delay for a batch to fill; they only
+    grow while the queue is backed up.
+    """
+
+    batch_size = 1
+    max_batch_size = 100
+
     # The use of aioapns in the backend means that we cannot use
     # SIGALRM to limit how long a consume takes, as SIGALRM does not
     # play well with asyncio.
@@ -44,19 +54,36 @@ class PushNotificationsWorker(QueueProcessingWorker):
         super().start()
 
     @override
-    def consume(self, event: dict[str, Any]) -> None:
-        try:
+    def consume_batch(self, events: list[dict[str, Any]]) -> None:
+        missed_messages: list[dict[str, Any]] = []
+        for event in events:
             if event.get("type", "add") == "remove":
-                message_ids = event["message_ids"]
-                handle_remove_push_notification(event["user_profile_id"], message_ids)
+                # Send the notifications queued before this removal
+                # first, in case it removes one of them.
+                self.send_push_notifications(missed_messages)
+                missed_messages = []
+                try:
+                    handle_remove_push_notification(event["user_profile_id"], event["message_ids"])
+                except PushNotificationBouncerRetryLaterError:
+                    retry_event(self.queue_name, event, self.failure_processor)
+                except Exception as e:
+                    # As with one event at a time, a failure processing
+                    # one event shouldn't prevent processing the others.
+                    self._handle_consume_exception([event], e)
             else:
-                handle_push_notification(event["user_profile_id"], event)
-        except PushNotificationBouncerRetryLaterError:
+                missed_messages.append(event)
+        self.send_push_notifications(missed_messages)
 
-            def failure_processor(event: dict[str, Any]) -> None:
-                logger.warning(
-                    "Maximum retries exceeded for trigger:%s event:push_notification",
-                    event["user_profile_id"],
-                )
+    def send_push_notifications(self, missed_messages: list[dict[str, Any]]) -> None:
+        if not missed_messages:
+            return
+        for event in handle_push_notifications(
+            missed_messages, lambda event, e: self._handle_consume_exception([event], e)
+        ):
+            retry_event(self.queue_name, event, self.failure_processor)
 
-            retry_event(self.queue_name, event, failure_processor)
+    def failure_processor(self, event: dict[str, Any]) -> None:
+        logger.warning(
+            "Maximum retries exceeded for trigger:%s event:push_notification",
+            event["user_profile_id"],
+        )
@@ -1,25 +1,190 @@
 # Documented in https://zulip.readthedocs.io/en/latest/subsystems/queuing.html
 import logging
+import queue
+import threading
+from collections import defaultdict, deque
+from collections.abc import Iterator
+from contextlib import contextmanager
 from typing import Any
+from urllib.parse import urlsplit
 
+import requests
+from django.conf import settings
+from django.db import connection
 from typing_extensions import override
 
-from zerver.lib.outgoing_webhook import do_rest_call, get_outgoing_webhook_service_handler
+from zerver.lib.outgoing_webhook import (
+    do_rest_call,
+    get_outgoing_webhook_service_handler,
+    make_outgoing_webhook_session,
+)
 from zerver.models.bots import get_bot_services
-from zerver.worker.base import QueueProcessingWorker, assign_queue
+from zerver.worker.base import LoopQueueProcessingWorker, assign_queue
 
 logger = logging.getLogger(__name__)
 
 
 @assign_queue("outgoing_webhooks")
-class OutgoingWebhookWorker(QueueProcessingWorker):
+class OutgoingWebhookWorker(LoopQueueProcessingWorker):
+    """With OUTGOING_WEBHOOK_THREADS set, this hands each event to a
+    pool of threads, which send the requests for different bots
+    concurrently.  Each bot's events are processed in the order they
+    were queued, one at a time, and consume_batch does not wait for
+    them, so a slow bot server only delays the requests for its own
+    bots.  Requests to any one host are limited to
+    OUTGOING_WEBHOOK_MAX_REQUESTS_PER_HOST at a time.
+
+    Events handed to the threads are acknowledged to the queue before
+    their requests are sent, so if the process dies, the events still
+    waiting in memory are lost, rather than redelivered.  To bound
+    that loss, consume_batch waits rather than holding more than
+    MAX_PENDING_EVENTS_PER_THREAD events per thread.
+
+    Otherwise, events are processed one at a time, as they arrive.
+    """
+
+    MAX_PENDING_EVENTS_PER_THREAD = 10
+
+    # Batches start at a single event, so that an event on a quiet
+    # queue is handed off as soon as it arrives; with threads, they
+    # grow while the queue is backed up.
+    batch_size = 1
+
+    def __init__(
+        self,
+        threaded: bool = False,
+        disable_timeout: bool = False,
+        worker_num: int | None = None,
+    ) -> None:
+        super().__init__(threaded, disable_timeout, worker_num)
+        if settings.OUTGOING_WEBHOOK_THREADS > 0:
+            self.max_batch_size = self.MAX_PENDING_EVENTS_PER_THREAD
+        self.lock = threading.Lock()
+        # Reused across events, so that requests to a bot's server
+        # can reuse an open connection.
+        self.sessions: dict[int, requests.Session] = {}
+        self.host_semaphores: dict[str, threading.BoundedSemaphore] = {}
+
+        self.threads: list[threading.Thread] = []
+        # The events not yet processed for each bot, including the
+        # one being processed; guarded by pending_events_changed.
+        self.pending_events: dict[int, deque[dict[str, Any]]] = defaultdict(deque)
+        self.pending_events_count = 0
+        self.pending_events_changed = threading.Condition()
+        # Bots with pending events, each waiting for a thread to
+        # process its next event, or None for a thread to exit.
+        self.ready_bots: queue.SimpleQueue[int | None] = queue.SimpleQueue()
+
+    def get_session(self, bot_id: int) -> requests.Session:
+        with self.lock:
+            if bot_id not in self.sessions:
+                self.sessions[bot_id] = make_outgoing_webhook_session()
+            return self.sessions[bot_id]
+
+    @contextmanager
+    def limit_requests_to_host(self, base_url: str) -> Iterator[None]:
+        host = urlsplit(base_url).netloc
+        with self.lock:
+            if host not in self.host_semaphores:
+                self.host_semaphores[host] = threading.BoundedSemaphore(
+                    settings.OUTGOING_WEBHOOK_MAX_REQUESTS_PER_HOST
+                )
+            semaphore = self.host_semaphores[host]
+        with semaphore:
+            yield
+
     @override
-    def consume(self, event: dict[str, Any]) -> None:
+    def start(self) -> None:
+        try:
+            super().start()
+        finally:
+            self.stop_threads()
+
+    @override
+    def consume_batch(self, events: list[dict[str, Any]]) -> None:
+        # Other threads cannot see data written by an uncommitted
+        # transaction (which includes the test suite), so we only use
+        # threads outside of a transaction.
+        if settings.OUTGOING_WEBHOOK_THREADS == 0 or connection.in_atomic_block:
+            self.consume_bot_events(events)
+            return
+
+        if not self.threads:
+            self.threads = [
+                threading.Thread(target=self.run_thread, name=f"outgoing-webhook-{i}", daemon=True)
+                for i in range(settings.OUTGOING_WEBHOOK_THREADS)
+            ]
+            for thread in self.threads:
+                thread.start()
+
+        max_pending_events = settings.OUTGOING_WEBHOOK_THREADS * self.MAX_PENDING_EVENTS_PER_THREAD
+        with self.pending_events_changed:
+            for event in events:
+                self.pending_events_changed.wait_for(
+                    lambda: self.pending_events_count < max_pending_events
+                )
+                bot_events = self.pending_events[event["user_profile_id"]]
+                bot_events.append(event)
+                self.pending_events_count += 1
+                if len(bot_events) == 1:
+                    self.ready_bots.put(event["user_profile_id"])
+
+    def run_thread(self) -> None:
+        try:
+            while (bot_id := self.ready_bots.get()) is not None:
+                self.consume_next_bot_event(bot_id)
+        finally:
+            # Each thread keeps its own database connection until the
+            # worker stops, as the worker process does.
+            connection.close()
+
+    def consume_next_bot_event(self, bot_id: int) -> None:
+        with self.pending_events_changed:
+            # The event stays pending while it is processed, so that
+            # consume_batch doesn't make the bot ready again, which
+            # would let another thread process its next event
+            # concurrently.
+            event = self.pending_events[bot_id][0]
+        connection.close_if_unusable_or_obsolete()
+        self.consume_bot_events([event])
+        with self.pending_events_changed:
+            bot_events = self.pending_events[bot_id]
+            bot_events.popleft()
+            self.pending_events_count -= 1
+            if bot_events:
+                # Go to the back of the line, behind other bots.
+                self.ready_bots.put(bot_id)
+            else:
+                del self.pending_events[bot_id]
+            self.pending_events_changed.notify_all()
+
+    def stop_threads(self) -> None:
+        with self.pending_events_changed:
+            self.pending_events_changed.wait_for(lambda: self.pending_events_count == 0)
+        for _ in self.threads:
+            self.ready_bots.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def consume_bot_events(self, events: list[dict[str, Any]]) -> None:
+        for event in events:
+            # As with one event at a time, a failure processing one
+            # event shouldn't prevent processing the others.
+            try:
+                self.send_requests(event)
+            except Exception as e:
+                self._handle_consume_exception([event], e)
+
+    def send_requests(self, event: dict[str, Any]) -> None:
         message = event["message"]
         event["command"] = message["content"]
 
         services = get_bot_services(event["user_profile_id"])
         for service in services:
             event["service_name"] = str(service.name)
-            service_handler = get_outgoing_webhook_service_handler(service)
-            do_rest_call(service.base_url, event, service_handler)
+            service_handler = get_outgoing_webhook_service_handler(
+                service, session=self.get_session(service.user_profile_id)
+            )
+            with self.limit_requests_to_host(service.base_url):
+                do_rest_call(service.base_url, event, service_handler)
@@ -3,6 +3,7 @@ import importlib
 import pkgutil
 
 import zerver.worker
+from zerver.lib.queue import PRIORITY_LANE_SUFFIX
 from zerver.worker.base import QueueProcessingWorker, test_queues, worker_classes
 
 
@@ -16,7 +17,8 @@ def get_worker(
     if queue_name in {"test", "noop", "noop_batch"}:
         import_module = "zerver.worker.test"
     else:
-        import_module = f"zerver.worker.{queue_name}"
+        # Priority lanes are served by the module for their queue.
+        import_module = f"zerver.worker.{queue_name.removesuffix(PRIORITY_LANE_SUFFIX)}"
 
     importlib.import_module(import_module)
     return worker_classes[queue_name](
@@ -58,7 +58,8 @@ class NoopWorker(QueueProcessingWorker):
 
 @assign_queue("noop_batch", is_test_queue=True)
 class BatchNoopWorker(LoopQueueProcessingWorker):
-    """Used to profile the queue processing framework, in zilencer's queue_rate."""
+    """Used to profile the queue processing framework, in zilencer's
+    queue_rate and benchmark_batch_size."""
 
     batch_size = 100
 
@@ -68,14 +69,24 @@ class BatchNoopWorker(LoopQueueProcessingWorker):
         disable_timeout: bool = False,
         max_consume: int = 1000,
         slow_queries: Sequence[int] = [],
+        *,
+        batch_seconds: float = 0,
+        event_seconds: float = 0,
     ) -> None:
         super().__init__(threaded, disable_timeout)
         self.consumed = 0
         self.max_consume = max_consume
         self.slow_queries: set[int] = set(slow_queries)
+        # Simulated costs, for benchmark_batch_size: a fixed cost
+        # for each batch, like a database round-trip, and a cost for
+        # each event in it.
+        self.batch_seconds = batch_seconds
+        self.event_seconds = event_seconds
 
     @override
     def consume_batch(self, events: list[dict[str, Any]]) -> None:
+        if self.batch_seconds or self.event_seconds:
+            time.sleep(self.batch_seconds + self.event_seconds * len(events))
         event_numbers = set(range(self.consumed + 1, self.consumed + 1 + len(events)))
         found_slow = self.slow_queries & event_numbers
         if found_slow:
@@ -29,8 +29,12 @@ class UserActivityWorker(LoopQueueProcessingWorker):
       downtime of the queue processor, many clients will have several
       common events from doing an action multiple times.
 
+    The batch size adapts to the backlog, up to max_batch_size; the
+    larger the batch, the more events are deduplicated.
     """
 
+    max_batch_size = 1000
+
     client_id_map: dict[str, int] = {}
 
     @override
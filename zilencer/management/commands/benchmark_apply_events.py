@@ -0,0 +1,78 @@
+import copy
+import time
+from collections import defaultdict
+from typing import Any
+
+import orjson
+from django.core.management.base import CommandError, CommandParser
+from typing_extensions import override
+
+from zerver.lib.events import apply_events, fetch_initial_state_data
+from zerver.lib.management import ZulipBaseCommand
+
+
+class Command(ZulipBaseCommand):
+    help = """Replays a recorded stream of events against a user's initial
+/register state, and reports how long apply_events takes for each event
+type.
+
+The events file is a JSON list of events, such as the concatenated
+"events" arrays of a client's GET /events responses.  Recorded events
+need not match the current state of the database; events that cannot
+be applied (e.g., updates to drafts that no longer exist) are counted
+as failed.  To compare two versions of apply_events, run this on each
+with the same events file."""
+
+    @override
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("email", metavar="<email>", help="Email address of the user")
+        parser.add_argument("events_file", metavar="<events file>", help="JSON list of events")
+        parser.add_argument("--reps", help="Times to replay the events", default=5, type=int)
+        self.add_realm_args(parser)
+
+    @override
+    def handle(self, *args: Any, **options: Any) -> None:
+        realm = self.get_realm(options)
+        user_profile = self.get_user(options["email"], realm)
+        with open(options["events_file"], "rb") as f:
+            events = orjson.loads(f.read())
+        if not isinstance(events, list):
+            raise CommandError("The events file must contain a JSON list of events.")
+
+        initial_state = fetch_initial_state_data(user_profile, realm=user_profile.realm)
+        times: dict[str, float] = defaultdict(float)
+        counts: dict[str, int] = defaultdict(int)
+        failures: dict[str, int] = defaultdict(int)
+        for _ in range(options["reps"]):
+            state = copy.deepcopy(initial_state)
+            for event in copy.deepcopy(events):
+                start = time.perf_counter()
+                try:
+                    apply_events(
+                        user_profile,
+                        state=state,
+                        events=[event],
+                        fetch_event_types=None,
+                        client_gravatar=False,
+                        slim_presence=False,
+                        include_subscribers=True,
+                        linkifier_url_template=False,
+                        user_list_incomplete=False,
+                    )
+                except (AssertionError, KeyError, ValueError):
+                    failures[event["type"]] += 1
+                    continue
+                times[event["type"]] += time.perf_counter() - start
+                counts[event["type"]] += 1
+
+        print(f"{len(events)} events, {options['reps']} reps:")
+        for event_type in sorted(times, key=lambda event_type: -times[event_type]):
+            print(
+                f"  {event_type}: {counts[event_type]} applied, "
+                f"{times[event_type] / counts[event_type] * 1000000:.1f}us each, "
+                f"{times[event_type] / options['reps'] * 1000:.1f}ms per rep"
+            )
+        for event_type, count in sorted(failures.items()):
+            print(f"  {event_type}: {count} failed")
+        total_time = sum(times.values()) / options["reps"]
+        print(f"Total: {total_time * 1000:.1f}ms per rep")
@@ -0,0 +1,104 @@
+import threading
+import time
+from typing import Any
+
+from django.core.management.base import CommandParser
+from typing_extensions import override
+
+from zerver.lib.management import ZulipBaseCommand
+from zerver.lib.queue import SimpleQueueClient, queue_json_publish
+from zerver.worker.test import BatchNoopWorker
+
+
+def publish_events(count: int, rate: float) -> None:
+    start = time.monotonic()
+    for i in range(count):
+        if rate:
+            delay = start + i / rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        queue_json_publish("noop_batch", {})
+
+
+class Command(ZulipBaseCommand):
+    help = """Compares fixed and adaptive batch sizes for LoopQueueProcessingWorker,
+by publishing events to the noop_batch queue and processing them with
+BatchNoopWorker, which simulates a cost for each batch and for each event
+in it.  Reports the throughput, the time events waited in the queue, and
+the batch sizes used.  Requires a running RabbitMQ server."""
+
+    @override
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--count", help="Number of events", default=5000, type=int)
+        parser.add_argument(
+            "--rate",
+            help="Events published per second (default: all at once)",
+            default=0,
+            type=float,
+        )
+        parser.add_argument(
+            "--batch-seconds",
+            help="Simulated seconds spent on each batch",
+            default=0.01,
+            type=float,
+        )
+        parser.add_argument(
+            "--event-seconds",
+            help="Simulated seconds spent on each event",
+            default=0.001,
+            type=float,
+        )
+        parser.add_argument(
+            "--batch-sizes",
+            help="Fixed batch sizes to compare",
+            default=[1, 10, 100],
+            nargs="+",
+            type=int,
+        )
+        parser.add_argument(
+            "--max-batch-size",
+            help="max_batch_size for the adaptive run",
+            default=1000,
+            type=int,
+        )
+
+    def run(self, options: dict[str, Any], batch_size: int, max_batch_size: int | None) -> None:
+        count = options["count"]
+        worker = BatchNoopWorker(
+            disable_timeout=True,
+            max_consume=count,
+            batch_seconds=options["batch_seconds"],
+            event_seconds=options["event_seconds"],
+        )
+        worker.batch_size = batch_size
+        worker.max_batch_size = max_batch_size
+        worker.setup()
+
+        publisher = threading.Thread(target=publish_events, args=(count, options["rate"]))
+        start = time.monotonic()
+        publisher.start()
+        worker.start()
+        duration = time.monotonic() - start
+        publisher.join()
+
+        metrics = worker.metrics
+        layout = f"batch size {batch_size}"
+        if max_batch_size is not None:
+            layout = f"adaptive, up to {max_batch_size} (ended at {worker.batch_size})"
+        print(
+            f"  {layout}: {count / duration:.0f} events/s, "
+            f"average wait {metrics.event_age_seconds.sum / metrics.event_age_seconds.count:.3f}s, "
+            f"average batch {metrics.batch_size.sum / metrics.batch_size.count:.1f} events"
+        )
+
+    @override
+    def handle(self, *args: Any, **options: Any) -> None:
+        queue = SimpleQueueClient()
+        queue.ensure_queue("noop_batch", lambda channel: channel.queue_purge("noop_batch"))
+        queue.close()
+
+        rate = f"{options['rate']:g}/s" if options["rate"] else "all at once"
+        print(f"{options['count']} events, published {rate}")
+        for batch_size in options["batch_sizes"]:
+            self.run(options, batch_size, None)
+        self.run(options, min(options["batch_sizes"]), options["max_batch_size"])
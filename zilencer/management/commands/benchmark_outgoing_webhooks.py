@@ -0,0 +1,152 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+import orjson
+from django.core.management.base import CommandError, CommandParser
+from django.test import override_settings
+from typing_extensions import override
+
+from zerver.actions.create_user import do_create_user
+from zerver.lib.management import ZulipBaseCommand
+from zerver.lib.message_cache import MessageDict
+from zerver.lib.users import add_service
+from zerver.models import Message, Realm, Service, UserProfile
+from zerver.models.bots import GENERIC_INTERFACE
+from zerver.models.users import get_user_by_delivery_email
+from zerver.worker.outgoing_webhooks import OutgoingWebhookWorker
+
+
+def start_bot_server(latency: float, slow_latency: float) -> ThreadingHTTPServer:
+    """A stand-in for bot servers, which waits before answering each
+    request; requests to paths under /slow/ wait slow_latency
+    instead."""
+
+    class Handler(BaseHTTPRequestHandler):
+        @override
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+        def do_POST(self) -> None:
+            self.rfile.read(int(self.headers["Content-Length"]))
+            time.sleep(slow_latency if self.path.startswith("/slow/") else latency)
+            body = orjson.dumps({"response_not_required": True})
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def get_benchmark_bots(
+    realm: Realm, owner: UserProfile, count: int, slow_count: int, server_url: str
+) -> list[UserProfile]:
+    bots = []
+    for i in range(count):
+        email = f"benchmark-webhook-{i}-bot@{realm.host}"
+        try:
+            bot = get_user_by_delivery_email(email, realm)
+        except UserProfile.DoesNotExist:
+            bot = do_create_user(
+                email,
+                None,
+                realm,
+                f"Benchmark webhook {i}",
+                bot_type=UserProfile.OUTGOING_WEBHOOK_BOT,
+                bot_owner=owner,
+                acting_user=None,
+            )
+            add_service(
+                name=f"benchmark-webhook-{i}",
+                user_profile=bot,
+                base_url="",
+                interface=GENERIC_INTERFACE,
+                token="benchmark",
+            )
+        # The server listens on a new port every run.
+        path = "slow" if i < slow_count else "fast"
+        Service.objects.filter(user_profile=bot).update(base_url=f"{server_url}/{path}/{i}")
+        bots.append(bot)
+    return bots
+
+
+class Command(ZulipBaseCommand):
+    help = """Times processing outgoing webhook events serially and with
+OUTGOING_WEBHOOK_THREADS, against a local server which adds latency to
+each request.  Creates outgoing webhook bots in the realm if needed;
+intended for development environments."""
+
+    @override
+    def add_arguments(self, parser: CommandParser) -> None:
+        self.add_realm_args(parser, required=True)
+        parser.add_argument("--bots", help="Number of bots", default=20, type=int)
+        parser.add_argument("--events", help="Number of events", default=200, type=int)
+        parser.add_argument(
+            "--latency", help="Seconds the server takes to respond", default=0.05, type=float
+        )
+        parser.add_argument(
+            "--slow-bots",
+            help="Number of bots whose server responds slowly",
+            default=1,
+            type=int,
+        )
+        parser.add_argument(
+            "--slow-latency",
+            help="Seconds the slow bots' server takes to respond",
+            default=1.0,
+            type=float,
+        )
+        parser.add_argument(
+            "--threads",
+            help="Values of OUTGOING_WEBHOOK_THREADS to compare",
+            default=[0, 4, 16],
+            nargs="+",
+            type=int,
+        )
+
+    @override
+    def handle(self, *args: Any, **options: Any) -> None:
+        realm = self.get_realm(options)
+        assert realm is not None
+        owner = realm.get_human_admin_users().first()
+        message = Message.objects.filter(realm=realm).order_by("-id").first()
+        if owner is None or message is None:
+            raise CommandError("The realm needs an administrator and at least one message.")
+
+        server = start_bot_server(options["latency"], options["slow_latency"])
+        server_url = f"http://127.0.0.1:{server.server_address[1]}"
+        try:
+            bots = get_benchmark_bots(
+                realm, owner, options["bots"], options["slow_bots"], server_url
+            )
+            message_dict = MessageDict.wide_dict(message, realm.id)
+            events = [
+                {
+                    "message": message_dict,
+                    "trigger": "mention",
+                    "user_profile_id": bots[i % len(bots)].id,
+                }
+                for i in range(options["events"])
+            ]
+
+            for threads in options["threads"]:
+                with override_settings(OUTGOING_WEBHOOK_THREADS=threads):
+                    worker = OutgoingWebhookWorker(disable_timeout=True)
+                    start = time.perf_counter()
+                    for i in range(0, len(events), worker.batch_size):
+                        batch = [dict(event) for event in events[i : i + worker.batch_size]]
+                        worker.consume_batch(batch)
+                    elapsed = time.perf_counter() - start
+                    if worker.executor is not None:
+                        worker.executor.shutdown()
+                print(
+                    f"OUTGOING_WEBHOOK_THREADS={threads}: {len(events)} events in "
+                    f"{elapsed:.2f}s ({len(events) / elapsed:.1f} events/s)"
+                )
+        finally:
+            server.shutdown()
@@ -0,0 +1,113 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import CommandParser
+from typing_extensions import override
+
+from zerver.lib.management import ZulipBaseCommand
+from zerver.worker.queue_processors import get_active_worker_queues
+
+
+def get_child_pids(pid: int) -> list[int]:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The process name, in parentheses, may contain spaces.
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        if ppid == pid:
+            children.append(int(entry))
+    return children
+
+
+def get_process_tree(pid: int) -> list[int]:
+    pids = [pid]
+    for child_pid in get_child_pids(pid):
+        pids.extend(get_process_tree(child_pid))
+    return pids
+
+
+def get_memory_usage_kib(pid: int) -> tuple[int, int]:
+    """Returns the RSS and PSS of the process, in KiB."""
+    usage = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("Rss", "Pss"):
+                usage[key] = int(value.split()[0])
+    return usage["Rss"], usage["Pss"]
+
+
+class Command(ZulipBaseCommand):
+    help = """Starts the queue processors in each of process_queue's
+layouts -- one process per queue, one process per queue forked from a
+preloaded parent (--multi_process), and threads in one process
+(--multi_threaded) --
+and reports the total RSS and PSS of the processes for each.  Requires
+a running RabbitMQ server."""
+
+    @override
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--queues",
+            help="Queues to run processors for (default: all)",
+            nargs="+",
+        )
+        parser.add_argument(
+            "--settle-time",
+            help="Seconds to let the queue processors start before measuring",
+            default=15,
+            type=int,
+        )
+
+    def measure(self, commands: list[list[str]], settle_time: int) -> tuple[int, int, int]:
+        manage_py = os.path.join(settings.DEPLOY_ROOT, "manage.py")
+        processes = [
+            subprocess.Popen(
+                [sys.executable, manage_py, "process_queue", *command, "--skip-checks"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+            for command in commands
+        ]
+        try:
+            time.sleep(settle_time)
+            pids = [pid for process in processes for pid in get_process_tree(process.pid)]
+            rss = pss = 0
+            for pid in pids:
+                process_rss, process_pss = get_memory_usage_kib(pid)
+                rss += process_rss
+                pss += process_pss
+            return len(pids), rss, pss
+        finally:
+            for process in processes:
+                os.killpg(process.pid, signal.SIGTERM)
+            for process in processes:
+                process.wait()
+
+    @override
+    def handle(self, *args: Any, **options: Any) -> None:
+        queues = options["queues"] or get_active_worker_queues()
+        layouts = {
+            "one process per queue": [["--queue_name", queue] for queue in queues],
+            "forked processes (--multi_process)": [["--multi_process", *queues]],
+            "threads (--multi_threaded)": [["--multi_threaded", *queues]],
+        }
+        print(f"{len(queues)} queues")
+        for layout, commands in layouts.items():
+            process_count, rss, pss = self.measure(commands, options["settle_time"])
+            print(
+                f"  {layout}: {process_count} processes, "
+                f"RSS {rss / 1024:.0f} MiB, PSS {pss / 1024:.0f} MiB"
+            )
@@ -0,0 +1,101 @@
+import random
+import time
+import zlib
+from datetime import timedelta
+from typing import Any
+
+import orjson
+from django.core.management.base import CommandParser
+from django.utils.timezone import now as timezone_now
+from typing_extensions import override
+
+from zerver.lib.management import ZulipBaseCommand
+from zerver.lib.types import RawUserDict
+from zerver.lib.users import format_user_row, user_dicts_to_columns
+from zerver.models import UserProfile
+
+
+def make_user_rows(count: int) -> list[RawUserDict]:
+    """Synthetic rows in the format returned by get_realm_user_dicts,
+    with a mix of roles, avatar sources and bots resembling a large
+    organization."""
+    rng = random.Random(count)
+    now = timezone_now()
+    rows: list[RawUserDict] = []
+    for user_id in range(1, count + 1):
+        is_bot = rng.random() < 0.02
+        rows.append(
+            RawUserDict(
+                id=user_id,
+                full_name=f"Test User {user_id}",
+                email=f"user{user_id}@zulip.example.com",
+                avatar_source=rng.choice(
+                    [UserProfile.AVATAR_FROM_GRAVATAR, UserProfile.AVATAR_FROM_USER]
+                ),
+                avatar_version=rng.randint(1, 3),
+                is_active=rng.random() < 0.9,
+                role=UserProfile.ROLE_MEMBER if rng.random() < 0.95 else UserProfile.ROLE_GUEST,
+                is_billing_admin=False,
+                is_bot=is_bot,
+                timezone=rng.choice(["", "America/New_York", "Europe/Berlin", "Asia/Kolkata"]),
+                date_joined=now - timedelta(days=rng.randint(0, 2000)),
+                bot_owner_id=1 if is_bot else None,
+                delivery_email=f"user{user_id}@example.com",
+                bot_type=UserProfile.DEFAULT_BOT if is_bot else None,
+                long_term_idle=rng.random() < 0.7,
+                email_address_visibility=UserProfile.EMAIL_ADDRESS_VISIBILITY_ADMINS,
+            )
+        )
+    return rows
+
+
+class Command(ZulipBaseCommand):
+    help = """Compares the size and build time of the list and columnar
+encodings of the realm_user section of the /register response, using
+synthetic user data."""
+
+    @override
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--users",
+            help="Numbers of users to benchmark with",
+            default=[10000, 50000],
+            nargs="+",
+            type=int,
+        )
+        parser.add_argument("--reps", help="Iterations for each encoding", default=5, type=int)
+
+    @override
+    def handle(self, *args: Any, **options: Any) -> None:
+        acting_user = UserProfile(id=1, role=UserProfile.ROLE_MEMBER)
+
+        for count in options["users"]:
+            rows = make_user_rows(count)
+            print(f"{count} users:")
+            for encoding in ["list", "list (avatar URLs optional)", "columnar"]:
+                user_avatar_url_field_optional = encoding != "list"
+                total_time = 0.0
+                for _ in range(options["reps"]):
+                    start = time.perf_counter()
+                    user_dicts = [
+                        format_user_row(
+                            1,
+                            acting_user=acting_user,
+                            row=row,
+                            client_gravatar=False,
+                            user_avatar_url_field_optional=user_avatar_url_field_optional,
+                            custom_profile_field_data={},
+                        )
+                        for row in rows
+                    ]
+                    if encoding == "columnar":
+                        payload = orjson.dumps(user_dicts_to_columns(user_dicts))
+                    else:
+                        payload = orjson.dumps(user_dicts)
+                    total_time += time.perf_counter() - start
+
+                compressed_size = len(zlib.compress(payload, 6))
+                print(
+                    f"  {encoding}: {len(payload)} bytes ({compressed_size} compressed), "
+                    f"{total_time / options['reps'] * 1000:.1f}ms"
+                )
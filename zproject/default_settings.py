@@ -615,6 +615,47 @@ SERVER_UPGRADE_NAG_DEADLINE_DAYS = 30 * 18
 # How long servers have to respond to outgoing webhook requests
 OUTGOING_WEBHOOK_TIMEOUT_SECONDS = 10
 
+# If nonzero, the outgoing_webhooks worker sends requests for up to
+# this many different bots concurrently, each on its own thread and
+# database connection; requests for any one bot are still sent in
+# order.  No more than OUTGOING_WEBHOOK_MAX_REQUESTS_PER_HOST of
+# them are sent to the same host at once.
+OUTGOING_WEBHOOK_THREADS = 0
+OUTGOING_WEBHOOK_MAX_REQUESTS_PER_HOST = 4
+
+# The embed_links worker fetches URL previews for batches of messages
+# on up to this many threads (0 fetches them one at a time), with no
+# more than URL_PREVIEW_MAX_REQUESTS_PER_HOST requests to the same
+# host at once.
+URL_PREVIEW_THREADS = 8
+URL_PREVIEW_MAX_REQUESTS_PER_HOST = 2
+
+# If nonzero, the database statement timeout for full-text searches
+# from the message fetch API.  A search which exceeds it is retried by
+# scanning ranges of SEARCH_CHUNK_MESSAGE_IDS message IDs outwards
+# from the anchor, for at most another SEARCH_STATEMENT_TIMEOUT_SECONDS,
+# and the client is sent whatever was found along with where to
+# continue searching from.
+SEARCH_STATEMENT_TIMEOUT_SECONDS = 0
+SEARCH_CHUNK_MESSAGE_IDS = 100000
+
+# If nonzero, the number of threads used to compute the most expensive
+# sections of the /register response (users, subscriptions, presence,
+# unread messages, etc.) concurrently, each with its own database
+# connection.  Note that this increases the number of database
+# connections each Django process may hold open.
+REGISTER_SECTION_FETCH_THREADS = 0
+
+# Size of the in-process cache each Django process keeps in front of
+# memcached for the hottest cache keys (display recipients); 0, the
+# default, disables it.  Values cached there may be up to
+# REMOTE_CACHE_LOCAL_TIER_CHECK_SECONDS out of date after being
+# invalidated by another process, and expire after
+# REMOTE_CACHE_LOCAL_TIER_TTL_SECONDS in any case.
+REMOTE_CACHE_LOCAL_TIER_MAX_ENTRIES = 0
+REMOTE_CACHE_LOCAL_TIER_CHECK_SECONDS = 1.0
+REMOTE_CACHE_LOCAL_TIER_TTL_SECONDS = 30
+
 # Maximum length of message content allowed.
 # Any message content exceeding this limit will be truncated.
 # See: `_internal_prep_message` function in zerver/actions/message_send.py.
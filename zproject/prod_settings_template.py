@@ -734,6 +734,10 @@ SOCIAL_AUTH_SAML_SUPPORT_CONTACT = {
 ## How long outgoing webhook requests time out after
 # OUTGOING_WEBHOOK_TIMEOUT_SECONDS = 10
 
+## How many bots' outgoing webhook requests to send concurrently, so
+## that one slow bot server doesn't delay every other bot's requests.
+# OUTGOING_WEBHOOK_THREADS = 8
+
 ## Mobile push notifications require registering for the Zulip Mobile
 ## Push Notification Service and configuring your server to use the
 ## service here. For complete documentation, see: